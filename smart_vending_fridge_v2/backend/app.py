@@ -10,6 +10,7 @@ import sys
 import json
 import logging
 import random
+import threading
 from datetime import datetime, timedelta
 from flask import Flask, request, jsonify, render_template, redirect, url_for, session
 
@@ -41,6 +42,15 @@ except ImportError:
             self.config.update(new_config)
             return True
 
+from device_api import device_api, init_device_api, config_publisher, device_safe_config
+
+try:
+    from push_broker import PushBroker, flask_message_handler
+    PUSH_BROKER_AVAILABLE = True
+except ImportError:
+    logging.warning("无法导入推送通道模块，不支持长连接传输")
+    PUSH_BROKER_AVAILABLE = False
+
 # 创建Flask应用
 app = Flask(__name__, 
             static_folder='static',
@@ -58,6 +68,78 @@ logging.basicConfig(
 config_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config', 'config.json')
 config_manager = ConfigManager(config_path)
 
+# 设备接入API（设备上报数据写入嵌入式数据库，数据库在首次请求或启动时打开，导入模块时不创建文件）
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+app.register_blueprint(device_api)
+device_store = None
+push_broker = None
+device_ingest_lock = threading.Lock()
+
+
+def _device_db_path():
+    """
+    获取设备数据库路径：环境变量SVF_DEVICE_DB优先，其次为配置backend.device_db_path（相对路径相对于项目根目录）
+
+    Returns:
+        str: 数据库路径
+    """
+    path = os.environ.get('SVF_DEVICE_DB') or config_manager.get_value(
+        'backend.device_db_path', os.path.join('data', 'device_ingest.db'))
+    return path if os.path.isabs(path) else os.path.join(PROJECT_ROOT, path)
+
+
+def init_device_ingest():
+    """
+    打开设备数据存储，登记设备接入密钥，并按配置创建推送通道代理（只执行一次）
+
+    Returns:
+        DeviceStore: 设备数据存储
+    """
+    global device_store, push_broker
+    with device_ingest_lock:
+        if device_store is not None:
+            return device_store
+
+        device_db_path = _device_db_path()
+        os.makedirs(os.path.dirname(device_db_path), exist_ok=True)
+        store = init_device_api(device_db_path, config_manager.config)
+
+        # 登记设备接入密钥：数据库目录下device_keys.json（{设备ID: 密钥}）中的设备，以及本机配置的设备
+        device_keys = {}
+        device_keys_path = os.path.join(os.path.dirname(device_db_path), 'device_keys.json')
+        if os.path.exists(device_keys_path):
+            try:
+                with open(device_keys_path, 'r', encoding='utf-8') as f:
+                    device_keys.update(json.load(f))
+            except Exception as e:
+                logging.error(f"加载设备密钥失败: {str(e)}")
+        if config_manager.get_value('device.device_id') and config_manager.get_value('cloud.api_key'):
+            device_keys.setdefault(config_manager.get_value('device.device_id'),
+                                   config_manager.get_value('cloud.api_key'))
+        for key_device_id, device_key in device_keys.items():
+            try:
+                store.register_device(key_device_id, device_key)
+            except Exception as e:
+                logging.error(f"登记设备 {key_device_id} 的密钥失败: {str(e)}")
+
+        # 推送通道（设备使用长连接传输时，上报转发到设备接入API，配置变化时通知在线设备拉取）
+        if PUSH_BROKER_AVAILABLE and config_manager.get_value('cloud.transport', 'http') == 'push':
+            broker = PushBroker(port=config_manager.get_value('cloud.push.port', 1883),
+                                message_handler=flask_message_handler(app),
+                                authenticator=lambda client_id, token: store.authenticate(token) == client_id)
+            config_publisher.add_listener(lambda version: broker.broadcast_command('config', {'version': version}))
+            push_broker = broker
+
+        device_store = store
+        return store
+
+
+@app.before_request
+def _ensure_device_ingest():
+    """首次请求时打开设备数据存储"""
+    if device_store is None:
+        init_device_ingest()
+
 # 用户数据（实际应用中应使用数据库）
 users = {
     'admin': {
@@ -841,8 +923,9 @@ def api_settings():
         # 更新系统设置
         data = request.json
         
-        # 更新配置
+        # 更新配置，并通知设备（长轮询中的设备立即收到变化）
         config_manager.update_config(data)
+        config_publisher.publish(device_safe_config(config_manager.config))
         
         return jsonify({'success': True, 'message': '系统设置更新成功'})
 
@@ -859,5 +942,11 @@ if __name__ == '__main__':
     os.makedirs(os.path.join(static_dir, 'js'), exist_ok=True)
     os.makedirs(os.path.join(static_dir, 'css'), exist_ok=True)
     
+    # 调试模式下只在重载子进程中打开设备数据库和启动推送通道，避免端口冲突
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        init_device_ingest()
+        if push_broker:
+            push_broker.start()
+    
     # 启动应用
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+上报去重索引 - 按设备的序号高水位、精确滑动窗口和布隆过滤器判断记录是否重复
+"""
+
+import hashlib
+import threading
+
+# 判断结果
+NEW = 'new'  # 一定是新记录
+DUPLICATE = 'duplicate'  # 一定是重复记录
+UNKNOWN = 'unknown'  # 布隆过滤器命中，需要由数据库唯一索引确认
+
+
+class _DeviceWindow:
+    """单台设备的序号高水位及其之前固定长度的精确位图（环形）"""
+
+    __slots__ = ('high', 'bits')
+
+    def __init__(self, window):
+        self.high = 0
+        self.bits = bytearray((window + 7) // 8)
+
+
+class DedupIndex:
+    """
+    上报去重索引
+
+    设备按序号单调递增地产生记录，重试和缓存重放的通常是最近的记录：
+    - 序号高于高水位：一定是新记录；
+    - 序号在高水位之前的窗口内：由精确位图直接判断；
+    - 更早的序号：查询所有设备共享的布隆过滤器，未命中一定是新记录，
+      命中时（重复或误判）交给数据库唯一索引确认。
+    所有判断都是O(1)，重复记录不需要进入写队列。
+    """
+
+    def __init__(self, window=4096, bloom_bits=1 << 23, bloom_hashes=4):
+        """
+        初始化去重索引
+
+        Args:
+            window (int, optional): 每台设备精确位图覆盖的序号数
+            bloom_bits (int, optional): 布隆过滤器位数
+            bloom_hashes (int, optional): 布隆过滤器哈希函数个数
+        """
+        self.window = window
+        self.bloom_bits = bloom_bits
+        self.bloom_hashes = bloom_hashes
+        self.bloom = bytearray((bloom_bits + 7) // 8)
+        self.devices = {}
+        self.lock = threading.Lock()
+
+        # 统计
+        self.stats = {'new': 0, 'duplicate': 0, 'unknown': 0, 'added': 0}
+
+    def _bloom_positions(self, device_id, seq):
+        """计算键在布隆过滤器中的位置（双重哈希）"""
+        digest = hashlib.blake2b(f"{device_id}:{seq}".encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.bloom_bits for i in range(self.bloom_hashes)]
+
+    def _window_bit(self, seq):
+        """获取序号在设备位图中的字节下标和掩码"""
+        slot = seq % self.window
+        return slot >> 3, 1 << (slot & 7)
+
+    def check(self, device_id, seq):
+        """
+        判断记录是否重复
+
+        Args:
+            device_id (str): 设备ID
+            seq (int): 记录序号
+
+        Returns:
+            str: NEW、DUPLICATE或UNKNOWN
+        """
+        with self.lock:
+            device = self.devices.get(device_id)
+            if device is None or seq > device.high:
+                result = NEW
+            elif seq > device.high - self.window:
+                index, mask = self._window_bit(seq)
+                result = DUPLICATE if device.bits[index] & mask else NEW
+            elif all(self.bloom[pos >> 3] & (1 << (pos & 7)) for pos in self._bloom_positions(device_id, seq)):
+                result = UNKNOWN
+            else:
+                result = NEW
+            self.stats[result] += 1
+            return result
+
+    def add(self, device_id, seq):
+        """
+        记录已写入的序号
+
+        Args:
+            device_id (str): 设备ID
+            seq (int): 记录序号
+        """
+        with self.lock:
+            device = self.devices.get(device_id)
+            if device is None:
+                device = self.devices[device_id] = _DeviceWindow(self.window)
+
+            if seq > device.high:
+                # 高水位前移，清除移出窗口后被复用的槽位
+                if seq - device.high >= self.window:
+                    device.bits[:] = bytes(len(device.bits))
+                else:
+                    for cleared in range(device.high + 1, seq):
+                        index, mask = self._window_bit(cleared)
+                        device.bits[index] &= ~mask
+                device.high = seq
+
+            if seq > device.high - self.window:
+                index, mask = self._window_bit(seq)
+                device.bits[index] |= mask
+
+            for pos in self._bloom_positions(device_id, seq):
+                self.bloom[pos >> 3] |= 1 << (pos & 7)
+            self.stats['added'] += 1
+
+    def get_stats(self):
+        """
+        获取去重统计
+
+        Returns:
+            dict: 各判断结果计数、设备数及内存占用
+        """
+        with self.lock:
+            stats = dict(self.stats)
+            stats['devices'] = len(self.devices)
+            stats['memory_bytes'] = len(self.bloom) + len(self.devices) * ((self.window + 7) // 8)
+            return stats
@@ -0,0 +1,480 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+设备接入API - 接收CloudManager上报的连接、心跳、状态、交易和事件数据
+"""
+
+import copy
+import gzip
+import json
+import os
+import zlib
+import time
+import hashlib
+import logging
+import threading
+from flask import Blueprint, request, jsonify, abort, make_response, g
+
+from device_store import DeviceStore
+
+try:
+    from src.cloud.serializer import BINARY_CONTENT_TYPE, parse_content_type
+    from src.cloud.status_delta import apply_patch
+    CLOUD_CODEC_AVAILABLE = True
+except ImportError:
+    logging.warning("无法导入设备端编解码模块，不支持二进制负载和状态增量")
+    BINARY_CONTENT_TYPE = 'application/x-svf-binary'
+    CLOUD_CODEC_AVAILABLE = False
+
+# 负载格式协商请求头（与设备端http_session一致）
+PAYLOAD_ACCEPT_HEADER = 'X-Payload-Accept'
+PAYLOAD_FORMAT_HEADER = 'X-Payload-Format'
+
+# 单条和批量上报端点: 端点 -> (事件类别, 批量字段名)
+EVENT_ENDPOINTS = {
+    '/device/error': ('error', None),
+    '/device/errors_batch': ('error', 'errors'),
+    '/device/warning': ('warning', None),
+    '/device/warnings_batch': ('warning', 'warnings'),
+    '/device/replenishment': ('replenishment', None),
+    '/device/replenishments_batch': ('replenishment', 'replenishments'),
+    '/device/ota/result': ('ota_result', None),
+}
+
+# 下发给设备的配置项（True表示整个子树），密钥等其他配置不离开服务器
+DEVICE_CONFIG_KEYS = {
+    'products': True,
+    'replenishment': True,
+    'cloud': {
+        'report_interval': True,
+        'heartbeat_interval': True,
+        'data_sync_interval': True,
+        'config_sync': {'interval': True},
+    },
+}
+
+device_api = Blueprint('device_api', __name__)
+
+# 设备数据存储（由init_device_api初始化）
+store = None
+
+# 最新状态快照缓存: 设备ID -> (状态, 序号)，用于应用状态增量
+status_snapshots = {}
+status_lock = threading.Lock()
+
+
+def _config_diff(old, new):
+    """
+    计算两个配置之间变化的配置项
+
+    Returns:
+        dict: 与配置结构相同、只包含变化项的嵌套字典
+    """
+    changes = {}
+    for key, value in new.items():
+        if key not in old:
+            changes[key] = value
+        elif isinstance(value, dict) and isinstance(old[key], dict):
+            nested = _config_diff(old[key], value)
+            if nested:
+                changes[key] = nested
+        elif old[key] != value:
+            changes[key] = value
+    return changes
+
+
+def device_safe_config(config, keys=None):
+    """
+    从完整配置中取出可以下发给设备的配置项
+
+    Args:
+        config (dict): 完整配置
+        keys (dict, optional): 允许下发的配置项，默认为DEVICE_CONFIG_KEYS
+
+    Returns:
+        dict: 只包含允许配置项的配置副本
+    """
+    keys = DEVICE_CONFIG_KEYS if keys is None else keys
+    safe = {}
+    for key, allowed in keys.items():
+        if key not in config:
+            continue
+        if allowed is True:
+            safe[key] = copy.deepcopy(config[key])
+        elif isinstance(config[key], dict):
+            nested = device_safe_config(config[key], allowed)
+            if nested:
+                safe[key] = nested
+    return safe
+
+
+class ConfigPublisher:
+    """
+    设备配置发布
+
+    每次配置内容变化时版本号加一并保留最近的快照，设备携带旧版本号请求时只返回变化的配置项；
+    ETag取配置内容的哈希，服务重启后内容不变的配置仍返回304。
+    指定状态文件时版本号和快照随之持久化，服务重启后版本号继续递增，不会与设备保存的版本号冲突。
+    """
+
+    def __init__(self, max_snapshots=10, state_path=None):
+        """
+        初始化配置发布
+
+        Args:
+            max_snapshots (int, optional): 保留的历史快照数量
+            state_path (str, optional): 版本号和快照的持久化文件
+        """
+        self.max_snapshots = max_snapshots
+        self.listeners = []
+        self.condition = threading.Condition()
+        self.load_state(state_path)
+
+    def load_state(self, state_path):
+        """
+        切换持久化文件并加载其中保存的版本号和快照（文件不存在时从版本0开始）
+
+        Args:
+            state_path (str): 持久化文件路径，为None时不持久化
+        """
+        state = {}
+        if state_path and os.path.exists(state_path):
+            try:
+                with open(state_path, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+            except Exception as e:
+                logging.error(f"加载配置版本状态失败: {str(e)}")
+
+        with self.condition:
+            self.state_path = state_path
+            self.version = state.get('version', 0)
+            self.etag = state.get('etag')
+            self.snapshots = {int(version): config for version, config in state.get('snapshots', {}).items()}
+
+    def _save_state(self):
+        """保存版本号和快照（调用方持有锁）"""
+        if not self.state_path:
+            return
+        try:
+            temp_file = self.state_path + '.tmp'
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump({'version': self.version, 'etag': self.etag, 'snapshots': self.snapshots},
+                          f, ensure_ascii=False)
+            os.replace(temp_file, self.state_path)
+        except Exception as e:
+            logging.error(f"保存配置版本状态失败: {str(e)}")
+
+    def add_listener(self, callback):
+        """
+        注册配置变化回调（如通过推送通道通知在线设备）
+
+        Args:
+            callback (callable): 回调 callback(version)
+        """
+        self.listeners.append(callback)
+
+    def publish(self, config):
+        """
+        发布新配置（内容未变化时忽略）
+
+        Args:
+            config (dict): 完整设备配置
+        """
+        content = json.dumps(config, ensure_ascii=False, sort_keys=True, default=str)
+        etag = '"' + hashlib.sha1(content.encode('utf-8')).hexdigest() + '"'
+        with self.condition:
+            if etag == self.etag:
+                return
+            self.version += 1
+            self.etag = etag
+            self.snapshots[self.version] = json.loads(content)
+            for version in [v for v in self.snapshots if v <= self.version - self.max_snapshots]:
+                del self.snapshots[version]
+            self._save_state()
+            self.condition.notify_all()
+            version = self.version
+
+        for callback in self.listeners:
+            try:
+                callback(version)
+            except Exception as e:
+                logging.error(f"配置变化回调出错: {str(e)}")
+
+    def wait_for_change(self, etag, timeout):
+        """
+        长轮询：等待配置变化或超时
+
+        Args:
+            etag (str): 设备当前的ETag
+            timeout (float): 最长等待时间（秒）
+
+        Returns:
+            bool: 配置是否已变化
+        """
+        with self.condition:
+            return self.condition.wait_for(lambda: self.etag != etag, timeout=timeout)
+
+    def get_update(self, since_version):
+        """
+        获取自某版本以来的配置更新
+
+        Args:
+            since_version (int): 设备已应用的版本号，未知时返回完整配置
+
+        Returns:
+            tuple: (版本号, ETag, 配置更新)
+        """
+        with self.condition:
+            current = self.snapshots[self.version]
+            base = self.snapshots.get(since_version)
+            changes = _config_diff(base, current) if base is not None else current
+            return self.version, self.etag, copy.deepcopy(changes)
+
+
+config_publisher = ConfigPublisher()
+
+
+def init_device_api(db_path, device_config=None, **store_kwargs):
+    """
+    初始化设备接入API
+
+    Args:
+        db_path (str): 设备数据库路径（配置版本状态保存在<数据库路径>.config.json）
+        device_config (dict, optional): 完整配置（只下发device_safe_config中的配置项）
+        **store_kwargs: 传给DeviceStore的其他参数
+
+    Returns:
+        DeviceStore: 设备数据存储
+    """
+    global store
+    store = DeviceStore(db_path, **store_kwargs)
+    config_publisher.load_state(db_path + '.config.json')
+    config_publisher.publish(device_safe_config(device_config or {}))
+    return store
+
+
+@device_api.before_request
+def _authenticate_device():
+    """认证设备：请求须携带已登记的设备密钥（Authorization: Bearer <密钥>）"""
+    scheme, _, api_key = request.headers.get('Authorization', '').partition(' ')
+    device_id = store.authenticate(api_key.strip()) if scheme.lower() == 'bearer' else None
+    if device_id is None:
+        return jsonify({'status': 'error', 'message': '设备未认证'}), 401
+    g.device_id = device_id
+    return None
+
+
+def _check_device_id(device_id):
+    """请求中声明的设备ID必须与密钥对应的设备一致"""
+    if device_id is not None and device_id != g.device_id:
+        abort(403)
+
+
+def _read_payload():
+    """
+    读取请求负载（支持gzip压缩和二进制格式），负载中的设备ID缺省为认证的设备
+
+    Returns:
+        dict: 负载数据
+    """
+    payload = _decode_payload()
+    if not isinstance(payload, dict):
+        abort(400)
+    _check_device_id(payload.get('device_id'))
+    payload['device_id'] = g.device_id
+    return payload
+
+
+def _decode_payload():
+    """
+    解码请求体：不支持的编码或压缩方式返回415，损坏的gzip、二进制或JSON负载返回400
+
+    Returns:
+        负载数据
+    """
+    body = request.get_data()
+    encoding = request.headers.get('Content-Encoding', 'identity').strip().lower()
+    if encoding == 'gzip':
+        try:
+            body = gzip.decompress(body)
+        except (OSError, EOFError, zlib.error):
+            abort(400, description='gzip负载已损坏')
+    elif encoding != 'identity':
+        abort(415, description=f"不支持的内容编码: {encoding}")
+
+    content_type = request.headers.get('Content-Type', '')
+    if content_type.startswith(BINARY_CONTENT_TYPE):
+        if not CLOUD_CODEC_AVAILABLE:
+            abort(415)
+        try:
+            serializer = parse_content_type(content_type)
+        except ValueError as e:
+            abort(415, description=str(e))
+        try:
+            return serializer.decode(body)
+        except ValueError as e:
+            abort(400, description=str(e))
+
+    try:
+        return json.loads(body) if body else {}
+    except ValueError:
+        abort(400, description='JSON负载无效')
+
+
+def _respond(data=None):
+    """
+    生成成功响应，设备声明支持二进制格式时在响应头中确认
+
+    Args:
+        data (dict, optional): 响应数据
+
+    Returns:
+        Response: 响应对象
+    """
+    response = jsonify({'status': 'success', 'timestamp': time.time(), 'data': data or {}})
+    accept = request.headers.get(PAYLOAD_ACCEPT_HEADER)
+    if accept and CLOUD_CODEC_AVAILABLE and accept.startswith(BINARY_CONTENT_TYPE):
+        response.headers[PAYLOAD_FORMAT_HEADER] = accept
+    return response
+
+
+def _acks_response(acks):
+    """生成逐条确认的响应"""
+    return _respond({'acks': acks, 'accepted': sum(1 for ack in acks if ack != 'error')})
+
+
+@device_api.route('/device/connect', methods=['POST'])
+def device_connect():
+    """设备上线"""
+    payload = _read_payload()
+    store.set_connected(payload.get('device_id'), True, payload.get('version'))
+    return _respond()
+
+
+@device_api.route('/device/disconnect', methods=['POST'])
+def device_disconnect():
+    """设备下线"""
+    payload = _read_payload()
+    store.set_connected(payload.get('device_id'), False)
+    return _respond()
+
+
+@device_api.route('/device/heartbeat', methods=['POST'])
+def device_heartbeat():
+    """设备心跳（只更新内存，批量落盘）"""
+    payload = _read_payload()
+    store.heartbeat(payload.get('device_id'))
+    return _respond()
+
+
+@device_api.route('/device/status', methods=['POST'])
+def device_status():
+    """设备状态：完整关键帧或相对于最后确认快照的JSON Patch增量"""
+    payload = _read_payload()
+    device_id = payload.get('device_id')
+    encoding = payload.get('encoding')
+    status_seq = payload.get('status_seq')
+
+    if encoding == 'json-patch':
+        with status_lock:
+            snapshot = status_snapshots.get(device_id)
+        base, base_seq = snapshot if snapshot is not None else store.get_status(device_id)
+        if not CLOUD_CODEC_AVAILABLE or base is None or base_seq != payload.get('base_seq'):
+            return _respond({'resync': True})
+        try:
+            status = apply_patch(base, payload.get('ops', []))
+        except (KeyError, IndexError, TypeError, ValueError):
+            return _respond({'resync': True})
+    elif isinstance(payload.get('status'), dict):
+        # 离线缓存重放的状态
+        status = payload['status']
+    else:
+        status = {key: value for key, value in payload.items()
+                  if key not in ('device_id', 'timestamp', 'encoding', 'status_seq')}
+
+    store.save_status(device_id, status, status_seq, payload.get('timestamp'))
+    with status_lock:
+        status_snapshots[device_id] = (status, status_seq)
+    return _respond()
+
+
+@device_api.route('/device/transaction', methods=['POST'])
+def device_transaction():
+    """单条交易记录"""
+    payload = _read_payload()
+    ack = store.insert_transactions(payload.get('device_id'), [payload])[0]
+    return _respond({'ack': ack})
+
+
+def _read_batch(payload, key):
+    """读取批量上报的记录列表（不是列表时返回400）"""
+    records = payload.get(key, [])
+    if not isinstance(records, list):
+        abort(400, description=f"{key}必须是列表")
+    return records
+
+
+@device_api.route('/device/transactions_batch', methods=['POST'])
+def device_transactions_batch():
+    """批量交易记录"""
+    payload = _read_payload()
+    return _acks_response(store.insert_transactions(payload.get('device_id'), _read_batch(payload, 'transactions')))
+
+
+def device_events():
+    """错误、警告、补货需求等事件（单条或批量）"""
+    category, key = EVENT_ENDPOINTS[request.path]
+    payload = _read_payload()
+    if key is None:
+        ack = store.insert_events(payload.get('device_id'), category, [payload])[0]
+        return _respond({'ack': ack})
+    return _acks_response(store.insert_events(payload.get('device_id'), category, _read_batch(payload, key)))
+
+
+for _endpoint in EVENT_ENDPOINTS:
+    device_api.add_url_rule(_endpoint, f"device_events_{_endpoint.strip('/').replace('/', '_')}", device_events,
+                            methods=['POST'])
+
+
+@device_api.route('/device/telemetry_rollups', methods=['POST'])
+def device_telemetry_rollups():
+    """离线期间的遥测聚合数据"""
+    payload = _read_payload()
+    rollups = payload.get('rollups', {})
+    if not isinstance(rollups, dict):
+        abort(400, description='rollups必须是字典')
+    records = _read_batch(rollups, 'minute') + _read_batch(rollups, 'hour')
+    return _acks_response(store.upsert_rollups(payload.get('device_id'), records))
+
+
+@device_api.route('/device/ping', methods=['GET'])
+def device_ping():
+    """接入点延迟探测（不读写数据库）"""
+    return _respond()
+
+
+@device_api.route('/device/ota/check', methods=['POST'])
+def device_ota_check():
+    """检查OTA更新（暂无更新发布）"""
+    _read_payload()
+    return _respond({'has_update': False})
+
+
+@device_api.route('/device/config', methods=['GET'])
+def device_config():
+    """设备配置：条件请求（If-None-Match）与可选长轮询（wait参数）"""
+    _check_device_id(request.args.get('device_id'))
+    etag = request.headers.get('If-None-Match')
+    wait = min(request.args.get('wait', 0, type=float), 300)
+
+    if etag and etag == config_publisher.etag and wait > 0:
+        config_publisher.wait_for_change(etag, wait)
+
+    version, current_etag, changes = config_publisher.get_update(request.args.get('version', type=int))
+    if etag == current_etag:
+        response = make_response('', 304)
+    else:
+        response = _respond({'version': version, 'config': changes})
+    response.headers['ETag'] = current_etag
+    return response
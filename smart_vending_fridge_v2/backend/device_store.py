@@ -0,0 +1,597 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+设备数据存储模块 - 基于SQLite的设备上报数据存储，单写线程合并批量写入
+"""
+
+import json
+import time
+import hashlib
+import queue
+import sqlite3
+import logging
+import threading
+from concurrent.futures import Future
+
+from dedup_index import DedupIndex, DUPLICATE
+
+# 表结构与索引
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS devices (
+        device_id TEXT PRIMARY KEY,
+        connected INTEGER NOT NULL DEFAULT 0,
+        version TEXT,
+        last_seen REAL,
+        status TEXT,
+        status_seq INTEGER,
+        status_time REAL
+    )""",
+    """CREATE TABLE IF NOT EXISTS transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        device_id TEXT NOT NULL,
+        transaction_id TEXT,
+        timestamp REAL,
+        total_amount REAL,
+        record_epoch TEXT NOT NULL DEFAULT '',
+        record_seq INTEGER,
+        payload TEXT NOT NULL,
+        received_at REAL NOT NULL
+    )""",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_device_tid ON transactions (device_id, transaction_id)",
+    "CREATE INDEX IF NOT EXISTS idx_transactions_device_time ON transactions (device_id, timestamp)",
+    """CREATE TABLE IF NOT EXISTS events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        device_id TEXT NOT NULL,
+        category TEXT NOT NULL,
+        timestamp REAL,
+        record_epoch TEXT NOT NULL DEFAULT '',
+        record_seq INTEGER,
+        payload TEXT NOT NULL,
+        received_at REAL NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_events_device_category_time ON events (device_id, category, timestamp)",
+    # 设备记录序号（幂等键）在设备的每个序号纪元内唯一，交易和事件共用同一个序号空间
+    "DROP INDEX IF EXISTS idx_transactions_device_seq",
+    "DROP INDEX IF EXISTS idx_events_device_seq",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_device_epoch_seq "
+    "ON transactions (device_id, record_epoch, record_seq) WHERE record_seq IS NOT NULL",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_events_device_epoch_seq "
+    "ON events (device_id, record_epoch, record_seq) WHERE record_seq IS NOT NULL",
+    """CREATE TABLE IF NOT EXISTS telemetry_rollups (
+        device_id TEXT NOT NULL,
+        resolution INTEGER NOT NULL,
+        start REAL NOT NULL,
+        payload TEXT NOT NULL,
+        PRIMARY KEY (device_id, resolution, start)
+    )""",
+    # 设备接入密钥（只保存哈希）
+    """CREATE TABLE IF NOT EXISTS device_keys (
+        device_id TEXT PRIMARY KEY,
+        key_hash TEXT NOT NULL UNIQUE
+    )""",
+)
+
+# 记录确认状态
+ACK_OK = 'ok'
+ACK_DUPLICATE = 'duplicate'
+ACK_ERROR = 'error'
+
+
+def _dumps(value):
+    """紧凑JSON编码"""
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+# 只有(设备, 纪元, 幂等序号)或(设备, 交易ID)的唯一冲突视为重复，其他约束错误照常报错
+TRANSACTION_CONFLICTS = (
+    "ON CONFLICT(device_id, record_epoch, record_seq) WHERE record_seq IS NOT NULL DO NOTHING "
+    "ON CONFLICT(device_id, transaction_id) DO NOTHING"
+)
+EVENT_CONFLICTS = "ON CONFLICT(device_id, record_epoch, record_seq) WHERE record_seq IS NOT NULL DO NOTHING"
+
+
+def _key_hash(api_key):
+    """设备密钥的哈希"""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+
+
+def _insert_row(connection, statement, row):
+    """
+    写入一行，区分新写入、重复和错误
+
+    Returns:
+        bool: 写入时为True，唯一冲突（重复）时为False，约束或类型错误时为None
+    """
+    try:
+        return bool(connection.execute(statement, row).rowcount)
+    except sqlite3.Error as e:
+        logging.warning(f"设备记录写入失败: {str(e)}")
+        return None
+
+
+def _record_seq(record):
+    """取记录的幂等序号（设备端分配的单调序号），没有时返回None"""
+    value = record.get('record_seq')
+    return value if isinstance(value, int) and not isinstance(value, bool) and value > 0 else None
+
+
+def _record_epoch(record):
+    """取记录的序号纪元（设备序号文件丢失后重新编号时更换），旧版设备没有纪元时为空字符串"""
+    value = record.get('record_epoch')
+    return value if isinstance(value, str) else ''
+
+
+def _dedup_stream(device_id, epoch):
+    """去重索引中的序号流：每台设备的每个纪元各自单调编号"""
+    return f"{device_id}#{epoch}" if epoch else device_id
+
+
+def _timestamp(record, *keys):
+    """取记录中第一个有效的时间戳字段"""
+    for key in keys:
+        value = record.get(key)
+        if isinstance(value, (int, float)):
+            return float(value)
+    return None
+
+
+class DeviceStore:
+    """
+    设备数据存储
+
+    所有写操作提交到队列，由唯一的写线程按批取出，在一个事务中批量写入后统一提交，
+    多个并发请求共享一次提交的开销；心跳只更新内存中的最后在线时间，按间隔批量落盘。
+    读操作使用每个线程独立的只读连接（WAL模式下读写互不阻塞）。
+    带幂等序号的重复记录先由内存去重索引拒绝，不占用写事务。
+    """
+
+    def __init__(self, db_path, flush_interval=0.05, max_batch=1000, heartbeat_flush_interval=5.0,
+                 dedup_window=4096, dedup_bloom_bits=1 << 23):
+        """
+        初始化设备数据存储
+
+        Args:
+            db_path (str): 数据库文件路径
+            flush_interval (float, optional): 写线程等待新写操作的最长时间（秒）
+            max_batch (int, optional): 一个事务最多合并的写操作数
+            heartbeat_flush_interval (float, optional): 心跳时间批量落盘间隔（秒）
+            dedup_window (int, optional): 去重索引每台设备的精确窗口大小
+            dedup_bloom_bits (int, optional): 去重索引布隆过滤器位数
+        """
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.heartbeat_flush_interval = heartbeat_flush_interval
+
+        self.write_queue = queue.Queue()
+        self.local = threading.local()
+
+        # 心跳：设备ID -> 最后在线时间（内存中合并，定期批量写入）
+        self.heartbeats = {}
+        self.heartbeat_lock = threading.Lock()
+        self.last_heartbeat_flush = time.time()
+
+        # 统计
+        self.stats_lock = threading.Lock()
+        self.stats = {
+            'transactions': 0,
+            'commits': 0,
+            'operations': 0,
+            'heartbeats': 0,
+            'heartbeat_flushes': 0,
+            'duplicates_rejected': 0
+        }
+
+        connection = self._connect()
+        self._migrate(connection)
+        for statement in SCHEMA:
+            connection.execute(statement)
+        connection.commit()
+
+        # 重复上报的去重索引（启动时从已写入的序号重建）
+        self.dedup = DedupIndex(window=dedup_window, bloom_bits=dedup_bloom_bits)
+        for device_id, epoch, seq in connection.execute(
+                "SELECT device_id, record_epoch, record_seq FROM transactions WHERE record_seq IS NOT NULL "
+                "UNION ALL SELECT device_id, record_epoch, record_seq FROM events WHERE record_seq IS NOT NULL "
+                "ORDER BY 3"):
+            self.dedup.add(_dedup_stream(device_id, epoch), seq)
+
+        # 设备密钥哈希 -> 设备ID（每个请求都要认证，常驻内存）
+        self.device_keys = {key_hash: device_id
+                            for device_id, key_hash in connection.execute("SELECT device_id, key_hash FROM device_keys")}
+        self.device_keys_lock = threading.Lock()
+        connection.close()
+
+        self.running = True
+        self.writer_thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self.writer_thread.start()
+
+    def _connect(self):
+        """创建数据库连接"""
+        connection = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    @staticmethod
+    def _migrate(connection):
+        """为旧版数据库补充新增的列"""
+        for table in ('transactions', 'events'):
+            columns = [row[1] for row in connection.execute(f"PRAGMA table_info({table})")]
+            if columns and 'record_seq' not in columns:
+                connection.execute(f"ALTER TABLE {table} ADD COLUMN record_seq INTEGER")
+            if columns and 'record_epoch' not in columns:
+                connection.execute(f"ALTER TABLE {table} ADD COLUMN record_epoch TEXT NOT NULL DEFAULT ''")
+
+    def _filter_duplicates(self, device_id, records):
+        """
+        用去重索引过滤确定重复的记录（不进入写队列）
+
+        Args:
+            device_id (str): 设备ID
+            records (list): 上报记录列表
+
+        Returns:
+            tuple: (确认状态列表（待写入的位置为None）, 待写入的(位置, 记录, 纪元, 序号)列表)
+        """
+        acks = []
+        pending = []
+        for record in records:
+            if not isinstance(record, dict):
+                acks.append(ACK_ERROR)
+                continue
+            epoch, seq = _record_epoch(record), _record_seq(record)
+            if seq is not None and self.dedup.check(_dedup_stream(device_id, epoch), seq) == DUPLICATE:
+                acks.append(ACK_DUPLICATE)
+                continue
+            acks.append(None)
+            pending.append((len(acks) - 1, record, epoch, seq))
+
+        rejected = len(records) - len(pending) - acks.count(ACK_ERROR)
+        if rejected:
+            with self.stats_lock:
+                self.stats['duplicates_rejected'] += rejected
+        return acks, pending
+
+    def _reader(self):
+        """获取当前线程的读连接"""
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self._connect()
+            self.local.connection = connection
+        return connection
+
+    def _submit(self, operation, *args):
+        """
+        提交写操作并等待其所在事务提交
+
+        Returns:
+            写操作的返回值
+        """
+        future = Future()
+        self.write_queue.put((operation, args, future))
+        return future.result()
+
+    def _writer_loop(self):
+        """写线程：按批取出写操作，在一个事务中执行后统一提交"""
+        connection = self._connect()
+        while self.running or not self.write_queue.empty():
+            batch = []
+            try:
+                batch.append(self.write_queue.get(timeout=self.flush_interval))
+                while len(batch) < self.max_batch:
+                    batch.append(self.write_queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            heartbeats = self._take_heartbeats()
+            if not batch and not heartbeats:
+                continue
+
+            results = []
+            try:
+                if heartbeats:
+                    self._write_heartbeats(connection, heartbeats)
+                for operation, args, future in batch:
+                    # 每个写操作使用保存点，单个操作失败不影响同批的其他请求
+                    connection.execute('SAVEPOINT operation')
+                    try:
+                        results.append((future, operation(connection, *args), None))
+                    except Exception as e:
+                        connection.execute('ROLLBACK TO operation')
+                        results.append((future, None, e))
+                    connection.execute('RELEASE operation')
+                connection.commit()
+            except Exception as e:
+                logging.error(f"写入设备数据失败: {str(e)}")
+                connection.rollback()
+                results = [(future, None, e) for _, _, future in batch]
+
+            for future, result, error in results:
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+            with self.stats_lock:
+                self.stats['commits'] += 1
+                self.stats['operations'] += len(batch)
+
+        # 停止前写入剩余心跳
+        with self.heartbeat_lock:
+            heartbeats, self.heartbeats = self.heartbeats, {}
+        if heartbeats:
+            self._write_heartbeats(connection, heartbeats)
+            connection.commit()
+        connection.close()
+
+    def _take_heartbeats(self):
+        """到达落盘间隔时取出内存中合并的心跳"""
+        if time.time() - self.last_heartbeat_flush < self.heartbeat_flush_interval:
+            return None
+        self.last_heartbeat_flush = time.time()
+        with self.heartbeat_lock:
+            heartbeats, self.heartbeats = self.heartbeats, {}
+        return heartbeats
+
+    def _write_heartbeats(self, connection, heartbeats):
+        """批量写入心跳时间"""
+        connection.executemany(
+            "INSERT INTO devices (device_id, connected, last_seen) VALUES (?, 1, ?) "
+            "ON CONFLICT(device_id) DO UPDATE SET connected = 1, last_seen = MAX(COALESCE(last_seen, 0), excluded.last_seen)",
+            list(heartbeats.items())
+        )
+        with self.stats_lock:
+            self.stats['heartbeat_flushes'] += 1
+
+    def heartbeat(self, device_id, timestamp=None):
+        """
+        记录设备心跳（只更新内存，批量落盘）
+
+        Args:
+            device_id (str): 设备ID
+            timestamp (float, optional): 心跳时间
+        """
+        with self.heartbeat_lock:
+            self.heartbeats[device_id] = timestamp or time.time()
+        with self.stats_lock:
+            self.stats['heartbeats'] += 1
+
+    def register_device(self, device_id, api_key):
+        """
+        登记设备接入密钥（设备已有密钥时替换）
+
+        Args:
+            device_id (str): 设备ID
+            api_key (str): 设备密钥（设备以 Authorization: Bearer <密钥> 发送）
+        """
+        key_hash = _key_hash(api_key)
+
+        def operation(connection):
+            connection.execute(
+                "INSERT INTO device_keys (device_id, key_hash) VALUES (?, ?) "
+                "ON CONFLICT(device_id) DO UPDATE SET key_hash = excluded.key_hash",
+                (device_id, key_hash)
+            )
+
+        self._submit(operation)
+        with self.device_keys_lock:
+            self.device_keys = {existing: owner for existing, owner in self.device_keys.items() if owner != device_id}
+            self.device_keys[key_hash] = device_id
+
+    def authenticate(self, api_key):
+        """
+        根据密钥认证设备
+
+        Args:
+            api_key (str): 请求携带的密钥
+
+        Returns:
+            str: 设备ID，密钥为空或未登记时返回None
+        """
+        if not api_key:
+            return None
+        with self.device_keys_lock:
+            return self.device_keys.get(_key_hash(api_key))
+
+    def set_connected(self, device_id, connected, version=None):
+        """
+        更新设备连接状态
+
+        Args:
+            device_id (str): 设备ID
+            connected (bool): 是否在线
+            version (str, optional): 设备软件版本
+        """
+        def operation(connection):
+            connection.execute(
+                "INSERT INTO devices (device_id, connected, version, last_seen) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(device_id) DO UPDATE SET connected = excluded.connected, "
+                "version = COALESCE(excluded.version, version), last_seen = excluded.last_seen",
+                (device_id, int(connected), version, time.time())
+            )
+
+        self._submit(operation)
+
+    def save_status(self, device_id, status, status_seq=None, timestamp=None):
+        """
+        保存设备最新状态
+
+        Args:
+            device_id (str): 设备ID
+            status (dict): 完整状态
+            status_seq (int, optional): 状态序号（增量编码基准）
+            timestamp (float, optional): 状态时间
+        """
+        def operation(connection):
+            connection.execute(
+                "INSERT INTO devices (device_id, connected, last_seen, status, status_seq, status_time) "
+                "VALUES (?, 1, ?, ?, ?, ?) "
+                "ON CONFLICT(device_id) DO UPDATE SET connected = 1, last_seen = excluded.last_seen, "
+                "status = excluded.status, status_seq = excluded.status_seq, status_time = excluded.status_time",
+                (device_id, time.time(), _dumps(status), status_seq, timestamp)
+            )
+
+        self._submit(operation)
+
+    def get_status(self, device_id):
+        """
+        读取设备最新状态
+
+        Args:
+            device_id (str): 设备ID
+
+        Returns:
+            tuple: (状态字典, 状态序号)，不存在时返回(None, None)
+        """
+        row = self._reader().execute(
+            "SELECT status, status_seq FROM devices WHERE device_id = ?", (device_id,)
+        ).fetchone()
+        if not row or row[0] is None:
+            return None, None
+        return json.loads(row[0]), row[1]
+
+    def insert_transactions(self, device_id, records):
+        """
+        批量写入交易记录，按(设备, 纪元, 幂等序号)和(设备, 交易ID)去重
+
+        Args:
+            device_id (str): 设备ID
+            records (list): 交易记录列表
+
+        Returns:
+            list: 每条记录的确认状态
+        """
+        received_at = time.time()
+        acks, pending = self._filter_duplicates(device_id, records)
+
+        statement = (
+            "INSERT INTO transactions "
+            "(device_id, transaction_id, timestamp, total_amount, record_epoch, record_seq, payload, received_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?) " + TRANSACTION_CONFLICTS
+        )
+
+        def operation(connection):
+            inserted = []
+            for _, record, epoch, seq in pending:
+                transaction_id = record.get('id')
+                inserted.append(_insert_row(connection, statement, (
+                    device_id, str(transaction_id) if transaction_id is not None else None,
+                    _timestamp(record, 'end_time', 'start_time', 'report_time', 'cache_time'),
+                    record.get('total_amount'), epoch, seq, _dumps(record), received_at
+                )))
+            return inserted
+
+        if pending:
+            self._record_inserted(device_id, acks, pending, self._submit(operation))
+        with self.stats_lock:
+            self.stats['transactions'] += acks.count(ACK_OK)
+        return acks
+
+    def _record_inserted(self, device_id, acks, pending, inserted):
+        """根据写入结果填写确认状态，并把序号加入去重索引（写入失败的记录返回错误，设备会重新上报）"""
+        for (position, _, epoch, seq), ok in zip(pending, inserted):
+            if ok is None:
+                acks[position] = ACK_ERROR
+                continue
+            acks[position] = ACK_OK if ok else ACK_DUPLICATE
+            if seq is not None:
+                # 被唯一索引忽略的记录同样说明该序号已存在
+                self.dedup.add(_dedup_stream(device_id, epoch), seq)
+
+    def insert_events(self, device_id, category, records):
+        """
+        批量写入错误、警告、补货需求等事件，按(设备, 纪元, 幂等序号)去重
+
+        Args:
+            device_id (str): 设备ID
+            category (str): 事件类别
+            records (list): 事件记录列表
+
+        Returns:
+            list: 每条记录的确认状态
+        """
+        received_at = time.time()
+        acks, pending = self._filter_duplicates(device_id, records)
+        rows = [
+            (device_id, category, _timestamp(record, 'timestamp', 'report_time', 'cache_time'), epoch, seq,
+             _dumps(record), received_at)
+            for _, record, epoch, seq in pending
+        ]
+
+        statement = (
+            "INSERT INTO events (device_id, category, timestamp, record_epoch, record_seq, payload, received_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) " + EVENT_CONFLICTS
+        )
+
+        def operation(connection):
+            return [_insert_row(connection, statement, row) for row in rows]
+
+        if rows:
+            self._record_inserted(device_id, acks, pending, self._submit(operation))
+        return acks
+
+    def upsert_rollups(self, device_id, rollups):
+        """
+        写入遥测聚合数据，按(设备, 粒度, 起始时间)覆盖
+
+        Args:
+            device_id (str): 设备ID
+            rollups (list): 聚合数据列表
+
+        Returns:
+            list: 每条记录的确认状态
+        """
+        acks = []
+        rows = []
+        for rollup in rollups:
+            if isinstance(rollup, dict) and 'start' in rollup and 'resolution' in rollup:
+                rows.append((device_id, int(rollup['resolution']), float(rollup['start']), _dumps(rollup)))
+                acks.append(ACK_OK)
+            else:
+                acks.append(ACK_ERROR)
+
+        def operation(connection):
+            connection.executemany(
+                "INSERT INTO telemetry_rollups (device_id, resolution, start, payload) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(device_id, resolution, start) DO UPDATE SET payload = excluded.payload",
+                rows
+            )
+
+        if rows:
+            self._submit(operation)
+        return acks
+
+    def count(self, table):
+        """
+        统计表中的记录数
+
+        Args:
+            table (str): 表名
+
+        Returns:
+            int: 记录数
+        """
+        if table not in ('devices', 'transactions', 'events', 'telemetry_rollups'):
+            raise ValueError(f"未知的表: {table}")
+        return self._reader().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def get_stats(self):
+        """
+        获取写入统计
+
+        Returns:
+            dict: 统计数据
+        """
+        with self.stats_lock:
+            stats = dict(self.stats)
+        stats['queue_depth'] = self.write_queue.qsize()
+        stats['operations_per_commit'] = stats['operations'] / stats['commits'] if stats['commits'] else 0.0
+        stats['dedup'] = self.dedup.get_stats()
+        return stats
+
+    def close(self):
+        """停止写线程（先写完队列中的操作和心跳）"""
+        self.running = False
+        self.writer_thread.join(timeout=10)
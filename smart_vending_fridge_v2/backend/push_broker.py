@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+推送通道服务端 - 轻量的MQTT风格代理，接收设备长连接上的发布并向设备下发命令
+
+设备发布到 devices/{设备ID}/{端点} 的消息交给消息处理函数（默认携带设备连接时的令牌转发到设备接入API的同名端点），
+处理结果随QoS 1确认返回设备；服务器通过 devices/{设备ID}/commands/{命令} 向设备下发命令。
+"""
+
+import time
+import socket
+import logging
+import threading
+
+from src.cloud.push_transport import encode_frame, read_frame, topic_matches
+
+logger = logging.getLogger(__name__)
+
+
+def flask_message_handler(app):
+    """
+    创建把设备发布转发到Flask设备接入API的消息处理函数
+
+    Args:
+        app (Flask): 注册了device_api蓝图的应用
+
+    Returns:
+        callable: 消息处理函数 handler(client_id, topic, payload, token)
+    """
+    def handler(client_id, topic, payload, token):
+        endpoint = '/device/' + topic.split('/', 2)[2]
+        with app.test_client() as client:
+            response = client.post(endpoint, json=payload, headers={'Authorization': f"Bearer {token or ''}"})
+        if response.status_code >= 400:
+            return {'status': 'error', 'code': response.status_code}
+        return response.get_json(silent=True) or {'status': 'success', 'data': {}}
+
+    return handler
+
+
+class _ClientSession:
+    """已连接设备的会话"""
+
+    def __init__(self, client_id, sock, token=None):
+        self.client_id = client_id
+        self.sock = sock
+        self.token = token
+        self.write_lock = threading.Lock()
+        self.subscriptions = set()
+
+    def send(self, packet):
+        """发送报文，返回帧字节数"""
+        frame = encode_frame(packet)
+        with self.write_lock:
+            self.sock.sendall(frame)
+        return len(frame)
+
+    def disconnect(self):
+        """断开连接（先shutdown：读取线程的文件对象仍引用套接字，只close不会向设备发送FIN）"""
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class PushBroker:
+    """
+    推送通道代理
+
+    每个设备一条长连接，一个线程读取：设备发布的QoS 1消息处理后回复确认，
+    ping立即回复；向设备下发的命令按其订阅匹配，可选择等待设备确认。
+    """
+
+    def __init__(self, host='0.0.0.0', port=1883, message_handler=None, token=None, authenticator=None):
+        """
+        初始化推送通道代理
+
+        Args:
+            host (str, optional): 监听地址
+            port (int, optional): 监听端口，0表示随机端口
+            message_handler (callable, optional): 消息处理函数 handler(client_id, topic, payload, token)，
+                返回值随确认发回设备
+            token (str, optional): 所有设备共用的认证令牌，None表示不认证
+            authenticator (callable, optional): 按设备认证 authenticator(client_id, token)，返回是否允许连接
+        """
+        self.host = host
+        self.port = port
+        self.message_handler = message_handler
+        self.token = token
+        self.authenticator = authenticator
+
+        self.server = None
+        self.running = False
+        self.sessions = {}
+        self.pending = {}
+        self.next_packet_id = 0
+        self.lock = threading.Lock()
+
+        # 统计
+        self.stats = {
+            'connections': 0,
+            'rejected': 0,
+            'messages': 0,
+            'pings': 0,
+            'commands': 0,
+            'command_acks': 0,
+            'received_bytes': 0,
+            'sent_bytes': 0
+        }
+
+    def start(self):
+        """开始监听"""
+        self.server = socket.create_server((self.host, self.port))
+        self.port = self.server.getsockname()[1]
+        self.running = True
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        logger.info(f"推送通道代理已启动，端口 {self.port}")
+
+    def stop(self):
+        """停止监听并断开所有设备"""
+        self.running = False
+        if self.server:
+            self.server.close()
+        with self.lock:
+            sessions = list(self.sessions.values())
+        for session in sessions:
+            session.disconnect()
+
+    def _accept_loop(self):
+        """接受设备连接"""
+        while self.running:
+            try:
+                sock, _ = self.server.accept()
+            except OSError:
+                break
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._serve_client, args=(sock,), daemon=True).start()
+
+    def _count(self, key, value=1):
+        """累加统计"""
+        with self.lock:
+            self.stats[key] += value
+
+    def _serve_client(self, sock):
+        """处理一个设备连接，直到断开"""
+        stream = sock.makefile('rb')
+        session = None
+        try:
+            packet, size = read_frame(stream)
+            if not packet or packet.get('type') != 'connect':
+                return
+            self._count('received_bytes', size)
+            if not self._authenticate(packet.get('client_id'), packet.get('token')):
+                self._count('rejected')
+                sock.sendall(encode_frame({'type': 'connack', 'accepted': False}))
+                return
+
+            session = _ClientSession(packet.get('client_id'), sock, packet.get('token'))
+            with self.lock:
+                old_session = self.sessions.get(session.client_id)
+                self.sessions[session.client_id] = session
+                self.stats['connections'] += 1
+            if old_session:
+                # 同一设备重连时关闭旧连接
+                old_session.disconnect()
+            self._count('sent_bytes', session.send({'type': 'connack', 'accepted': True}))
+
+            while self.running:
+                packet, size = read_frame(stream)
+                if packet is None:
+                    break
+                self._count('received_bytes', size)
+                if not self._handle_packet(session, packet):
+                    break
+        except (OSError, ValueError) as e:
+            logger.debug(f"设备连接断开: {str(e)}")
+        finally:
+            if session:
+                with self.lock:
+                    if self.sessions.get(session.client_id) is session:
+                        del self.sessions[session.client_id]
+            sock.close()
+
+    def _authenticate(self, client_id, token):
+        """
+        认证连接的设备
+
+        Returns:
+            bool: 是否允许连接
+        """
+        if self.token is not None and token != self.token:
+            return False
+        if self.authenticator is not None:
+            try:
+                return bool(self.authenticator(client_id, token))
+            except Exception as e:
+                logger.error(f"设备认证出错: {str(e)}")
+                return False
+        return True
+
+    def _handle_packet(self, session, packet):
+        """
+        处理设备发来的报文
+
+        Returns:
+            bool: 是否保持连接
+        """
+        packet_type = packet.get('type')
+        if packet_type == 'publish':
+            self._count('messages')
+            data = {'status': 'success', 'data': {}}
+            if self.message_handler:
+                try:
+                    data = self.message_handler(session.client_id, packet.get('topic', ''),
+                                                packet.get('payload') or {}, session.token)
+                except Exception as e:
+                    logger.error(f"处理设备消息出错: {str(e)}")
+                    data = {'status': 'error', 'message': str(e)}
+            if packet.get('qos'):
+                self._count('sent_bytes', session.send({'type': 'puback', 'packet_id': packet.get('packet_id'),
+                                                        'data': data}))
+        elif packet_type == 'puback':
+            self._count('command_acks')
+            with self.lock:
+                pending = self.pending.get(packet.get('packet_id'))
+            if pending:
+                pending['ack'] = packet.get('data')
+                pending['event'].set()
+        elif packet_type == 'pingreq':
+            self._count('pings')
+            self._count('sent_bytes', session.send({'type': 'pingresp'}))
+        elif packet_type == 'subscribe':
+            session.subscriptions.add(packet.get('topic'))
+            self._count('sent_bytes', session.send({'type': 'suback', 'topic': packet.get('topic')}))
+        elif packet_type == 'disconnect':
+            return False
+        return True
+
+    def send_command(self, client_id, command, payload, timeout=None):
+        """
+        向设备下发命令
+
+        Args:
+            client_id (str): 设备ID
+            command (str): 命令名
+            payload (dict): 命令内容
+            timeout (float, optional): 等待设备确认的时间（秒），None表示不等待
+
+        Returns:
+            dict: 设备确认中返回的处理结果（不等待时为空字典），设备未连接、未订阅或超时时返回None
+        """
+        topic = f"devices/{client_id}/commands/{command}"
+        with self.lock:
+            session = self.sessions.get(client_id)
+            if session is None or not any(topic_matches(f, topic) for f in session.subscriptions):
+                return None
+            self.next_packet_id += 1
+            packet_id = self.next_packet_id
+            pending = {'event': threading.Event(), 'ack': None}
+            if timeout is not None:
+                self.pending[packet_id] = pending
+
+        try:
+            self._count('sent_bytes', session.send({'type': 'publish', 'topic': topic, 'qos': 1,
+                                                    'packet_id': packet_id, 'payload': payload}))
+            self._count('commands')
+            if timeout is None:
+                return {}
+            if not pending['event'].wait(timeout):
+                return None
+            return pending['ack'] or {}
+        except OSError as e:
+            logger.warning(f"向设备 {client_id} 下发命令失败: {str(e)}")
+            return None
+        finally:
+            with self.lock:
+                self.pending.pop(packet_id, None)
+
+    def broadcast_command(self, command, payload):
+        """
+        向所有在线设备下发命令（不等待确认）
+
+        Args:
+            command (str): 命令名
+            payload (dict): 命令内容
+
+        Returns:
+            int: 下发成功的设备数
+        """
+        with self.lock:
+            client_ids = list(self.sessions)
+        return sum(1 for client_id in client_ids if self.send_command(client_id, command, payload) is not None)
+
+    def get_connected_devices(self):
+        """
+        获取在线设备
+
+        Returns:
+            list: 设备ID列表
+        """
+        with self.lock:
+            return list(self.sessions)
+
+    def get_stats(self):
+        """
+        获取代理统计
+
+        Returns:
+            dict: 统计数据
+        """
+        with self.lock:
+            stats = dict(self.stats)
+            stats['online'] = len(self.sessions)
+        stats['timestamp'] = time.time()
+        return stats
@@ -0,0 +1,346 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+补货预测回测 - 用虚拟时钟重放历史交易，比较simple、predictive和ml算法的预测精度、库存结果和调用延迟
+
+用法:
+    python benchmarks/backtest.py [--machines 20] [--days 365] [--steady 12] [--intermittent 8]
+        [--algorithms simple,predictive,ml] [--warmup-days 28] [--retrain-hours 24]
+        [--safety-stock 0.2] [--processes 4] [--sales-log DIR ...] [--json-output result.json]
+
+每台设备、每种算法各建一个 ReplenishmentAlgorithm（独立的临时数据目录和虚拟时钟），按时间顺序通过
+update_sales_data 重放交易。预热期之后在每个本地零点调用 forecast_all 和 check_replenishment_needs，
+把预测销量与之后一个预测窗口的实际销量比较，计算MAPE（实际销量大于0的商品）和WAPE；同时模拟库存：
+每个零点按预测销量乘以(1+安全库存)向上取整补货到该水平，窗口内需求超过库存记为缺货天，
+窗口结束时剩余库存超过该窗口实际销量记为积压天。ml算法每隔retrain-hours虚拟小时训练一次模型
+（在本进程的后台线程中训练并等待完成）。
+
+默认使用模拟的设备群销售数据（平稳商品和间歇性商品，见 ml_forecast_benchmark.py）；
+指定 --sales-log 时每个目录作为一台设备的销售日志重放。设备按进程分片，在多个CPU核上并行回测
+（进程数超过CPU核数时，延迟分位数会包含进程调度等待）。
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+import multiprocessing
+import numpy as np
+from datetime import datetime, timedelta
+
+# 添加项目根目录和基准测试目录到系统路径
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+sys.path.insert(0, BENCHMARK_DIR)
+
+from ml_forecast_benchmark import simulate_sales
+from src.replenishment.replenishment_algorithm import ReplenishmentAlgorithm
+from src.replenishment.sales_log import SalesLog
+from src.utils.config_manager import ConfigManager
+
+
+def percentile(values, fraction):
+    """计算分位数"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+class VirtualClock:
+    """虚拟时钟（回放时由回测推进）"""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def simulated_machine(machine, args):
+    """
+    生成一台设备的模拟销售数据（按设备序号设定随机种子，结果与分片方式无关）
+
+    Returns:
+        dict: 商品ID列表、时间戳、数量、单价和温度观测
+    """
+    random.seed(args.seed + machine)
+    np.random.seed(args.seed + machine)
+    start_time = datetime.combine(datetime.now().date() - timedelta(days=args.days),
+                                  datetime.min.time()).timestamp()
+    product_ids, timestamps, quantities, temperatures = simulate_sales(args.steady, args.intermittent,
+                                                                       args.days * 24, start_time)
+    return {
+        'product_ids': product_ids,
+        'timestamps': timestamps,
+        'quantities': quantities,
+        'prices': np.full(len(timestamps), 5.0),
+        'temperatures': temperatures
+    }
+
+
+def logged_machine(log_dir):
+    """
+    读取一台设备的销售日志（快照加日志尾部）
+
+    Returns:
+        dict: 商品ID列表、时间戳、数量、单价，没有温度观测
+    """
+    _, history, tail = SalesLog(log_dir).load()
+    records = sorted((history.records() if history is not None else []) + tail,
+                     key=lambda record: record['timestamp'])
+    return {
+        'product_ids': [record['product_id'] for record in records],
+        'timestamps': np.array([record['timestamp'] for record in records], dtype=np.float64),
+        'quantities': np.array([record['quantity'] for record in records], dtype=np.float64),
+        'prices': np.array([record.get('price', 0.0) for record in records], dtype=np.float64),
+        'temperatures': None
+    }
+
+
+def backtest_algorithm(algorithm, data, args, config_manager):
+    """
+    用一种算法回测一台设备
+
+    Returns:
+        dict: 误差、库存和延迟的累计值
+    """
+    product_ids, timestamps, quantities, prices = (data['product_ids'], data['timestamps'], data['quantities'],
+                                                   data['prices'])
+    skus = sorted(set(product_ids))
+    sku_index = {sku: index for index, sku in enumerate(skus)}
+    codes = np.array([sku_index[product_id] for product_id in product_ids], dtype=np.int64)
+    window = args.prediction_window * 3600
+
+    # 预热期之后每个本地零点一个评估步，最后一个窗口必须在数据范围内
+    first_day = datetime.fromtimestamp(timestamps[0]).date() + timedelta(days=args.warmup_days)
+    step = datetime.combine(first_day, datetime.min.time()).timestamp()
+    steps = []
+    while step + window <= timestamps[-1]:
+        steps.append(step)
+        step = (datetime.fromtimestamp(step) + timedelta(days=1)).timestamp()
+
+    stats = {
+        'records': len(timestamps),
+        'steps': len(steps),
+        'abs_error': 0.0,
+        'actual': 0.0,
+        'ape_sum': 0.0,
+        'ape_count': 0,
+        'sku_days': 0,
+        'stockout_days': 0,
+        'overstock_days': 0,
+        'forecast_latencies': [],
+        'check_latencies': [],
+        'replay_seconds': 0.0,
+        'train_seconds': 0.0
+    }
+    if not steps:
+        return stats
+
+    work_dir = tempfile.mkdtemp(prefix='backtest_')
+    clock = VirtualClock(timestamps[0])
+    config = {
+        'algorithm': algorithm,
+        'prediction_window': args.prediction_window,
+        'data_dir': work_dir,
+        # 回测不需要持久化保证，不做fsync
+        'sales_log': {'fsync_batch': 10 ** 9, 'fsync_interval': 10 ** 9},
+        # 回测已在进程池中运行，模型在后台线程中训练
+        'ml_models': {'workers': 0}
+    }
+    replenishment = ReplenishmentAlgorithm(config, simulation=True, config_manager=config_manager, clock=clock)
+
+    temperatures = data['temperatures']
+    temperature_cursor = 0
+    cursor = 0
+    last_trained = None
+    stock = np.zeros(len(skus))
+    try:
+        for step in steps:
+            # 重放到当前步的交易和温度观测
+            begin = time.perf_counter()
+            end = int(np.searchsorted(timestamps, step, side='left'))
+            for index in range(cursor, end):
+                clock.now = timestamps[index]
+                if temperatures is not None:
+                    while (temperature_cursor < len(temperatures[0])
+                           and temperatures[0][temperature_cursor] <= clock.now):
+                        replenishment.record_temperature(float(temperatures[1][temperature_cursor]),
+                                                         float(temperatures[0][temperature_cursor]))
+                        temperature_cursor += 1
+                replenishment.update_sales_data({
+                    'status': 'completed',
+                    'end_time': float(timestamps[index]),
+                    'products_taken': [{
+                        'product_id': product_ids[index],
+                        'quantity': float(quantities[index]),
+                        'price': float(prices[index])
+                    }]
+                })
+            cursor = end
+            clock.now = step
+            stats['replay_seconds'] += time.perf_counter() - begin
+
+            if replenishment.model_trainer and (last_trained is None or
+                                                step - last_trained >= args.retrain_hours * 3600):
+                begin = time.perf_counter()
+                replenishment._train_models(force=True)
+                replenishment.model_trainer.wait()
+                stats['train_seconds'] += time.perf_counter() - begin
+                last_trained = step
+
+            inventory = {sku: {'quantity': int(stock[index])} for index, sku in enumerate(skus)}
+            begin = time.perf_counter()
+            forecast = replenishment.forecast_all(inventory, skus)
+            stats['forecast_latencies'].append((time.perf_counter() - begin) * 1e6)
+            begin = time.perf_counter()
+            replenishment.check_replenishment_needs(inventory)
+            stats['check_latencies'].append((time.perf_counter() - begin) * 1e6)
+
+            # 之后一个预测窗口的实际销量
+            window_end = int(np.searchsorted(timestamps, step + window, side='left'))
+            actual = np.bincount(codes[end:window_end], weights=quantities[end:window_end], minlength=len(skus))
+            predicted = forecast['predicted_sales']
+            error = np.abs(predicted - actual)
+            stats['abs_error'] += float(error.sum())
+            stats['actual'] += float(actual.sum())
+            sold = actual > 0
+            stats['ape_sum'] += float((error[sold] / actual[sold]).sum())
+            stats['ape_count'] += int(sold.sum())
+
+            # 补货到预测销量的(1+安全库存)倍，然后消耗实际需求
+            target = np.ceil(predicted * (1 + args.safety_stock))
+            stock = np.maximum(stock, target)
+            stats['stockout_days'] += int((actual > stock).sum())
+            stock = np.maximum(stock - actual, 0.0)
+            stats['overstock_days'] += int((stock > actual).sum())
+            stats['sku_days'] += len(skus)
+    finally:
+        if replenishment.model_trainer:
+            replenishment.model_trainer.close()
+        replenishment.sales_log.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return stats
+
+
+def run_shard(shard):
+    """
+    在一个进程中回测一组设备
+
+    Returns:
+        list: 每台设备的 {算法: 统计}
+    """
+    logging.disable(logging.ERROR)
+    args = argparse.Namespace(**shard['args'])
+    config_manager = ConfigManager()
+    results = []
+    for machine in shard['machines']:
+        if args.sales_log:
+            data = logged_machine(args.sales_log[machine])
+        else:
+            data = simulated_machine(machine, args)
+        if not len(data['timestamps']):
+            continue
+        results.append({algorithm: backtest_algorithm(algorithm, data, args, config_manager)
+                        for algorithm in args.algorithms})
+    return results
+
+
+def summarize(results, algorithms):
+    """
+    汇总所有设备的回测结果
+
+    Returns:
+        dict: 每种算法的指标
+    """
+    summary = {}
+    for algorithm in algorithms:
+        stats = [machine[algorithm] for machine in results]
+        forecast_latencies = [value for item in stats for value in item['forecast_latencies']]
+        check_latencies = [value for item in stats for value in item['check_latencies']]
+        ape_count = sum(item['ape_count'] for item in stats)
+        actual = sum(item['actual'] for item in stats)
+        sku_days = sum(item['sku_days'] for item in stats)
+        summary[algorithm] = {
+            'records': sum(item['records'] for item in stats),
+            'steps': sum(item['steps'] for item in stats),
+            'mape': sum(item['ape_sum'] for item in stats) / ape_count if ape_count else 0.0,
+            'wape': sum(item['abs_error'] for item in stats) / actual if actual else 0.0,
+            'sku_days': sku_days,
+            'stockout_days': sum(item['stockout_days'] for item in stats),
+            'overstock_days': sum(item['overstock_days'] for item in stats),
+            'stockout_rate': sum(item['stockout_days'] for item in stats) / sku_days if sku_days else 0.0,
+            'overstock_rate': sum(item['overstock_days'] for item in stats) / sku_days if sku_days else 0.0,
+            'forecast_p50_us': percentile(forecast_latencies, 0.5),
+            'forecast_p99_us': percentile(forecast_latencies, 0.99),
+            'check_p50_us': percentile(check_latencies, 0.5),
+            'check_p99_us': percentile(check_latencies, 0.99),
+            'replay_seconds': sum(item['replay_seconds'] for item in stats),
+            'train_seconds': sum(item['train_seconds'] for item in stats)
+        }
+    return summary
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='补货预测回测')
+    parser.add_argument('--machines', type=int, default=20, help='模拟设备数（指定--sales-log时忽略）')
+    parser.add_argument('--days', type=int, default=365, help='模拟天数')
+    parser.add_argument('--steady', type=int, default=12, help='每台设备的平稳商品数')
+    parser.add_argument('--intermittent', type=int, default=8, help='每台设备的间歇性商品数')
+    parser.add_argument('--algorithms', type=str, default='simple,predictive,ml', help='回测的算法（逗号分隔）')
+    parser.add_argument('--prediction-window', type=int, default=24, help='预测窗口（小时）')
+    parser.add_argument('--warmup-days', type=int, default=28, help='开始评估前的预热天数')
+    parser.add_argument('--retrain-hours', type=float, default=24, help='ml模型的重新训练间隔（虚拟小时）')
+    parser.add_argument('--safety-stock', type=float, default=0.2, help='安全库存比例')
+    parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count(), help='回测进程数')
+    parser.add_argument('--sales-log', type=str, nargs='+', help='销售日志目录（每个目录一台设备）')
+    parser.add_argument('--seed', type=int, default=1, help='随机种子')
+    parser.add_argument('--json-output', type=str, help='将结果写入JSON文件')
+    args = parser.parse_args()
+    args.algorithms = [value for value in args.algorithms.split(',') if value]
+
+    logging.disable(logging.ERROR)
+    machines = len(args.sales_log) if args.sales_log else args.machines
+    processes = max(1, min(args.processes, machines))
+    shards = [{'machines': list(range(index, machines, processes)), 'args': vars(args)}
+              for index in range(processes)]
+
+    print(f"设备: {machines}，{'销售日志' if args.sales_log else f'模拟{args.days}天'}，"
+          f"算法: {', '.join(args.algorithms)}，进程: {processes}")
+    start_time = time.monotonic()
+    if processes == 1:
+        results = run_shard(shards[0])
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            results = [machine for shard in pool.map(run_shard, shards) for machine in shard]
+    elapsed = time.monotonic() - start_time
+
+    summary = summarize(results, args.algorithms)
+    print(f"\n{'算法':>12}{'MAPE':>9}{'WAPE':>9}{'缺货天':>9}{'积压天':>9}"
+          f"{'预测p50/p99(us)':>18}{'检查p50/p99(us)':>18}{'重放(s)':>9}{'训练(s)':>9}")
+    for algorithm, item in summary.items():
+        print(f"{algorithm:>12}{item['mape']:>9.1%}{item['wape']:>9.1%}"
+              f"{item['stockout_rate']:>9.1%}{item['overstock_rate']:>9.1%}"
+              f"{item['forecast_p50_us']:>9.0f}/{item['forecast_p99_us']:<8.0f}"
+              f"{item['check_p50_us']:>9.0f}/{item['check_p99_us']:<8.0f}"
+              f"{item['replay_seconds']:>9.1f}{item['train_seconds']:>9.1f}")
+    first = summary[args.algorithms[0]] if args.algorithms else {'records': 0, 'sku_days': 0}
+    print(f"\n共 {len(results)} 台设备，每种算法重放 {first['records']} 条交易、评估 {first['sku_days']} 个商品日；"
+          f"耗时 {elapsed:.1f} 秒（缺货天、积压天为占商品日的比例）")
+
+    if args.json_output:
+        with open(args.json_output, 'w', encoding='utf-8') as f:
+            json.dump({'summary': summary, 'elapsed_seconds': elapsed, 'config': vars(args)}, f,
+                      ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
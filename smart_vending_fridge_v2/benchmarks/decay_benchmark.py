@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+销量衰减基准测试 - 比较不同半衰期的需求矩阵在需求结构变化后的预测误差，以及单笔写入和趋势查询耗时
+
+用法:
+    python benchmarks/decay_benchmark.py [--products 20] [--weeks 10] [--shift-week 6]
+        [--half-lives 0,28,14,7] [--eval-days 14]
+
+模拟按小时泊松分布的销售：前shift-week周为早高峰，之后变为晚高峰，且每种商品的销量水平随机变化。
+按时间顺序回放销售，在最后eval-days天每天预测未来24小时的销量，统计相对实际销量的误差，
+以及预测器中小时销量分布与当前真实分布的L1距离（0为不衰减的累计计数）。
+"""
+
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import numpy as np
+from datetime import datetime, timedelta
+
+# 添加项目根目录到系统路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.replenishment.demand_forecast import DemandForecaster
+
+
+def hourly_profile(peak_hour, width=3.0):
+    """以peak_hour为高峰的小时分布（和为1）"""
+    hours = np.arange(24)
+    distance = np.minimum(np.abs(hours - peak_hour), 24 - np.abs(hours - peak_hour))
+    profile = 0.2 + np.exp(-(distance / width) ** 2)
+    return profile / profile.sum()
+
+
+def simulate_sales(products, weeks, shift_week, start_time):
+    """
+    生成逐小时的销售记录
+
+    Returns:
+        tuple: (商品ID列表, 时间戳数组, 数量数组, 变化后的小时分布)
+    """
+    hours = weeks * 7 * 24
+    shift_hour = shift_week * 7 * 24
+    before, after = hourly_profile(8), hourly_profile(19)
+    daily_before = np.random.uniform(10, 40, products)
+    daily_after = daily_before * np.random.uniform(0.3, 1.6, products)
+
+    product_ids, timestamps, quantities = [], [], []
+    for hour in range(hours):
+        hour_of_day = hour % 24
+        rates = (daily_before * before[hour_of_day] if hour < shift_hour
+                 else daily_after * after[hour_of_day])
+        counts = np.random.poisson(rates)
+        for product, count in enumerate(counts):
+            if count:
+                product_ids.append(f"SKU{product + 1:03d}")
+                timestamps.append(start_time + hour * 3600 + random.uniform(0, 3600))
+                quantities.append(float(count))
+    order = np.argsort(timestamps, kind='stable')
+    return ([product_ids[index] for index in order], np.asarray(timestamps)[order],
+            np.asarray(quantities)[order], after)
+
+
+def evaluate(half_life, product_ids, timestamps, quantities, profile, eval_start, eval_days):
+    """
+    按时间顺序回放销售并在评估期内每天预测
+
+    Returns:
+        dict: 评估结果
+    """
+    forecaster = DemandForecaster(prediction_window=24, algorithm='simple', half_life_days=half_life)
+    skus = sorted(set(product_ids))
+    sku_index = {sku: index for index, sku in enumerate(skus)}
+    errors, profile_distances = [], []
+    cursor = 0
+    for day in range(eval_days):
+        now = eval_start + day * 24 * 3600
+        end = int(np.searchsorted(timestamps, now, side='right'))
+        forecaster.add_sales(product_ids[cursor:end], timestamps[cursor:end], quantities[cursor:end])
+        cursor = end
+
+        predicted = forecaster.forecast_all(skus, now=now)['predicted_sales']
+        window_end = int(np.searchsorted(timestamps, now + 24 * 3600, side='right'))
+        actual = np.zeros(len(skus))
+        for index in range(end, window_end):
+            actual[sku_index[product_ids[index]]] += quantities[index]
+        errors.append(np.abs(predicted - actual) / np.maximum(actual, 1.0))
+
+        rows = [forecaster.rows[sku] for sku in skus]
+        hour_of_day = forecaster.demand[rows].reshape(len(rows), 7, 24).sum(axis=1)
+        hour_of_day /= hour_of_day.sum(axis=1, keepdims=True)
+        profile_distances.append(np.abs(hour_of_day - profile).sum(axis=1).mean())
+
+    return {
+        'half_life': half_life,
+        'mape': float(np.mean(errors)),
+        'profile_l1': float(np.mean(profile_distances))
+    }
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='销量衰减基准测试')
+    parser.add_argument('--products', type=int, default=20, help='商品种类数')
+    parser.add_argument('--weeks', type=int, default=10, help='模拟周数')
+    parser.add_argument('--shift-week', type=int, default=6, help='需求结构变化的周')
+    parser.add_argument('--half-lives', type=str, default='0,28,14,7', help='半衰期（天，逗号分隔，0为不衰减）')
+    parser.add_argument('--eval-days', type=int, default=14, help='评估天数（模拟期末尾）')
+    args = parser.parse_args()
+
+    logging.disable(logging.ERROR)
+    random.seed(1)
+    np.random.seed(1)
+
+    # 从本地零点开始模拟，使模拟的小时与预测器的本地小时一致
+    start_time = datetime.combine(datetime.now().date() - timedelta(weeks=args.weeks),
+                                  datetime.min.time()).timestamp()
+    product_ids, timestamps, quantities, profile = simulate_sales(args.products, args.weeks, args.shift_week,
+                                                                  start_time)
+    eval_start = start_time + (args.weeks * 7 - args.eval_days - 1) * 24 * 3600
+
+    print(f"{len(product_ids)} 条销售记录，第{args.shift_week}周后需求结构变化，评估最后{args.eval_days}天")
+    print(f"{'半衰期(天)':>10}{'24小时预测误差':>16}{'小时分布L1距离':>16}")
+    for half_life in [float(value) for value in args.half_lives.split(',')]:
+        result = evaluate(half_life, product_ids, timestamps, quantities, profile, eval_start, args.eval_days)
+        label = '不衰减' if not half_life else f"{half_life:g}"
+        print(f"{label:>10}{result['mape']:>16.1%}{result['profile_l1']:>16.3f}")
+
+    # 单笔写入和趋势查询耗时（旧实现的趋势因子每次扫描最近100条记录）
+    forecaster = DemandForecaster(half_life_days=14)
+    calls = 20000
+    now = time.time()
+    begin = time.perf_counter()
+    for index in range(calls):
+        forecaster.add_sale(f"SKU{index % args.products + 1:03d}", now - (calls - index) * 60, 1.0)
+    add_us = (time.perf_counter() - begin) * 1e6 / calls
+
+    trend_data = [{'timestamp': now - index * 3600, 'quantity': 1} for index in range(100)]
+    begin = time.perf_counter()
+    for _ in range(calls):
+        recent = sum(item['quantity'] for item in trend_data if now - item['timestamp'] <= 7 * 24 * 3600)
+        older = sum(item['quantity'] for item in trend_data
+                    if 7 * 24 * 3600 < now - item['timestamp'] <= 14 * 24 * 3600)
+        max(min(recent / older if older else 1.0, 2.0), 0.5)
+    legacy_us = (time.perf_counter() - begin) * 1e6 / calls
+
+    begin = time.perf_counter()
+    for index in range(calls):
+        forecaster.trend_factor(f"SKU{index % args.products + 1:03d}", now)
+    trend_us = (time.perf_counter() - begin) * 1e6 / calls
+
+    print(f"\n单笔写入: {add_us:.2f} us，趋势查询: 扫描100条 {legacy_us:.2f} us，增量窗口 {trend_us:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+多接入点故障转移测试 - 验证按延迟选择接入点、粘性会话和请求失败时的透明故障转移
+
+用法:
+    python benchmarks/endpoint_failover.py [--latencies 300,50,120] [--duration 30]
+        [--outage 10:8] [--probe-interval 5]
+
+在本地启动多个注入了不同延迟的桩接入点，启动一个完整运行的CloudManager，
+持续上报交易并按秒记录当前接入点；故障窗口内最快的接入点返回503，
+输出接入点选择与切换时间线、各接入点收到的交易数和总送达率。
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+
+# 添加项目根目录和基准测试目录到系统路径
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+sys.path.insert(0, BENCHMARK_DIR)
+
+from fleet_simulator import StubCloudServer, make_transaction
+from src.cloud.cloud_manager import CloudManager
+
+
+def parse_outage(value):
+    """解析故障窗口参数 开始秒数:持续秒数"""
+    start, duration = value.split(':')
+    return float(start), float(duration)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='多接入点故障转移测试')
+    parser.add_argument('--latencies', type=str, default='300,50,120', help='各接入点注入的延迟（毫秒，逗号分隔）')
+    parser.add_argument('--duration', type=float, default=30, help='测试时长（秒）')
+    parser.add_argument('--outage', type=parse_outage, default=(10.0, 8.0), help='最快接入点的故障窗口 开始:持续（秒）')
+    parser.add_argument('--probe-interval', type=float, default=5, help='延迟探测间隔（秒）')
+    parser.add_argument('--transaction-interval', type=float, default=0.2, help='交易上报间隔（秒）')
+    parser.add_argument('--drain', type=float, default=5, help='结束后等待缓存重放的时间（秒）')
+    args = parser.parse_args()
+
+    logging.disable(logging.ERROR)
+    latencies = [float(value) / 1000 for value in args.latencies.split(',')]
+    fastest = latencies.index(min(latencies))
+    servers = []
+    for index, latency in enumerate(latencies):
+        server = StubCloudServer([args.outage] if index == fastest else [], latency=latency)
+        server.start()
+        servers.append(server)
+    names = {server.url: f"接入点{index + 1}（{latency * 1000:.0f}ms）"
+             for index, (server, latency) in enumerate(zip(servers, latencies))}
+
+    manager = CloudManager({
+        'server_urls': [server.url for server in servers],
+        'data_dir': tempfile.mkdtemp(prefix='endpoint_failover_'),
+        'heartbeat_interval': 2,
+        'data_sync_interval': 2,
+        'endpoint_selection': {'probe_interval': args.probe_interval, 'failure_cooldown': args.probe_interval * 2},
+        'circuit_breaker': {'base_delay': 1.0, 'max_delay': 5.0},
+        'ota_update': {'enabled': False}
+    }, 'FAILOVER-001')
+
+    for server in servers:
+        server.start_clock()
+    manager.start()
+    start_time = time.monotonic()
+
+    timeline = []
+    sent = 0
+    next_transaction = start_time
+    while time.monotonic() - start_time < args.duration:
+        now = time.monotonic()
+        if now >= next_transaction:
+            sent += 1
+            manager.report_transaction(make_transaction(manager.device_id, sent))
+            next_transaction += args.transaction_interval
+        second = int(now - start_time)
+        if not timeline or timeline[-1][0] != second:
+            timeline.append((second, manager.server_url))
+        time.sleep(min(max(next_transaction - time.monotonic(), 0), 0.05))
+
+    time.sleep(args.drain)
+    stats = manager.get_endpoint_stats()
+    manager.stop()
+
+    print("接入点选择时间线:")
+    previous = None
+    for second, url in timeline:
+        if url != previous:
+            print(f"  {second:>4} 秒: {names[url]}")
+            previous = url
+
+    print(f"\n切换次数: {stats['switches']}")
+    for endpoint in stats['endpoints']:
+        rtt = f"{endpoint['rtt_ms']:.1f} ms" if endpoint['rtt_ms'] is not None else '未知'
+        print(f"  {names[endpoint['url']]}: 探测延迟 {rtt}，请求 {endpoint['requests']}，连续失败 {endpoint['failures']}")
+
+    delivered = set()
+    print("\n各接入点收到的交易:")
+    for server in servers:
+        server_stats = server.get_stats()
+        delivered |= server.transaction_ids
+        print(f"  {names[server.url]}: {server_stats['transactions_received']} 条，拒绝请求 {server_stats['rejected']}")
+        server.shutdown()
+    print(f"\n交易: 生成 {sent}，送达 {len(delivered)}（{len(delivered) / max(sent, 1):.2%}）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,506 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+设备群负载模拟 - 云平台链路的基准测试与回归门禁
+
+用法:
+    python benchmarks/fleet_simulator.py [--devices 200] [--duration 60] [--processes 2]
+        [--outage 20:10] [--outage-mode error|hang] [--time-scale 10]
+        [--json-output result.json] [--baseline baseline.json --tolerance 0.2]
+
+在本地启动桩云服务器，按设备ID启动N个完整运行的CloudManager（含调度线程和上报队列），
+按真实的心跳、状态和交易节奏驱动上报，并可在指定时间窗口注入服务器故障。
+输出吞吐量、report_*调用的本地延迟p50/p99、线上字节数、离线缓存增长和交易送达率。
+指定 --baseline 时与基线结果比较，任一指标退化超过容差则以非零状态退出。
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import heapq
+import random
+import logging
+import argparse
+import tempfile
+import threading
+import multiprocessing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 添加项目根目录到系统路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.cloud.serializer import BINARY_CONTENT_TYPE, parse_content_type
+from src.cloud.cloud_manager import CloudManager
+from src.cloud.http_session import DEFAULT_ENDPOINT_TIMEOUTS
+
+
+def percentile(values, fraction):
+    """计算分位数"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+class StubCloudServer:
+    """
+    桩云服务器
+
+    对所有设备接口返回成功，记录请求数、接收字节数和收到的交易ID；
+    故障窗口内按模式返回503或挂起请求直到设备端超时。
+    """
+
+    def __init__(self, outages=None, outage_mode='error', hang_seconds=15.0, latency=0.0):
+        """
+        初始化桩云服务器
+
+        Args:
+            outages (list, optional): 故障窗口 [(开始秒数, 持续秒数)]，相对于start_clock()
+            outage_mode (str, optional): error 返回503，hang 挂起请求
+            hang_seconds (float, optional): hang模式下挂起的秒数
+            latency (float, optional): 每个请求注入的延迟（秒），模拟远端接入点的往返时间
+        """
+        self.outages = outages or []
+        self.outage_mode = outage_mode
+        self.hang_seconds = hang_seconds
+        self.latency = latency
+        self.clock_start = None
+
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.rejected = 0
+        self.received_bytes = 0
+        self.transactions_received = 0
+        self.transaction_ids = set()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # 响应头和响应体分两次写出，关闭Nagle避免与客户端的延迟确认叠加出40ms延迟
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                server.handle(self, body)
+
+            def do_GET(self):
+                server.handle(self, b'')
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def start(self):
+        """启动服务线程"""
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def start_clock(self):
+        """开始计时（故障窗口从此刻算起）"""
+        self.clock_start = time.monotonic()
+
+    def in_outage(self):
+        """当前是否处于故障窗口"""
+        if self.clock_start is None:
+            return False
+        elapsed = time.monotonic() - self.clock_start
+        return any(start <= elapsed < start + duration for start, duration in self.outages)
+
+    def handle(self, handler, body):
+        """处理一个请求"""
+        path = handler.path.split('?')[0]
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+            self.received_bytes += len(body)
+
+        if self.in_outage():
+            with self.lock:
+                self.rejected += 1
+            if self.outage_mode == 'hang':
+                time.sleep(self.hang_seconds)
+            handler.send_response(503)
+            handler.send_header('Content-Length', '0')
+            handler.end_headers()
+            return
+
+        if path == '/device/config':
+            handler.send_response(304)
+            handler.send_header('Content-Length', '0')
+            handler.end_headers()
+            return
+
+        if handler.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        content_type = handler.headers.get('Content-Type', '')
+        if body:
+            payload = parse_content_type(content_type).decode(body) if content_type.startswith(
+                BINARY_CONTENT_TYPE) else json.loads(body)
+        else:
+            payload = {}
+
+        if path == '/device/transaction':
+            self._record_transactions([payload])
+        elif path == '/device/transactions_batch':
+            self._record_transactions(payload.get('transactions', []))
+
+        out = json.dumps({'status': 'success', 'timestamp': time.time(), 'data': {}}).encode('utf-8')
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(out)))
+        accept = handler.headers.get('X-Payload-Accept')
+        if accept:
+            handler.send_header('X-Payload-Format', accept)
+        handler.end_headers()
+        handler.wfile.write(out)
+
+    def _record_transactions(self, transactions):
+        """记录收到的交易ID"""
+        with self.lock:
+            self.transactions_received += len(transactions)
+            for transaction in transactions:
+                self.transaction_ids.add(transaction.get('id'))
+
+    def get_stats(self):
+        """获取服务器统计"""
+        with self.lock:
+            return {
+                'requests': dict(self.requests),
+                'rejected': self.rejected,
+                'received_bytes': self.received_bytes,
+                'transactions_received': self.transactions_received,
+                'unique_transactions': len(self.transaction_ids)
+            }
+
+    def shutdown(self):
+        """停止服务器"""
+        self.httpd.shutdown()
+
+
+def make_status(device_id):
+    """按主程序的数据结构生成设备状态"""
+    return {
+        'running': True,
+        'door_status': random.choice(['closed'] * 9 + ['open']),
+        'temperature': round(4.0 + random.uniform(-0.5, 0.5), 1),
+        'humidity': round(45.0 + random.uniform(-2, 2), 1),
+        'power': {'voltage': round(220.0 + random.uniform(-5, 5), 1), 'current': 1.5, 'power_consumption': 330.0},
+        'inventory': {f"SKU{i:03d}": random.randint(0, 10) for i in range(1, 21)},
+        'errors': [],
+        'warnings': []
+    }
+
+
+def make_transaction(device_id, index):
+    """生成交易记录"""
+    now = time.time()
+    return {
+        'id': f"{device_id}-T{index}",
+        'user_id': f"U{random.randint(1, 9999)}",
+        'auth_method': 'qr_code',
+        'start_time': now - random.uniform(10, 60),
+        'end_time': now,
+        'products_taken': [{'product_id': f"SKU{random.randint(1, 20):03d}", 'quantity': 1, 'price': 3.5}],
+        'total_amount': 3.5,
+        'status': 'completed'
+    }
+
+
+def run_shard(args):
+    """
+    运行一部分设备（单独的进程或线程）
+
+    Args:
+        args (dict): 分片参数
+
+    Returns:
+        dict: 分片统计（原始延迟样本、缓存采样、设备端HTTP统计）
+    """
+    logging.disable(logging.ERROR)
+    random.seed(args['seed'])
+    scale = args['time_scale']
+    timeout = [min(3.05, args['request_timeout']), args['request_timeout']]
+
+    managers = []
+    for index in args['device_indexes']:
+        device_id = f"FLEET-{index:05d}"
+        config = {
+            'server_url': args['server_url'],
+            'data_dir': os.path.join(args['work_dir'], device_id),
+            'heartbeat_interval': 30 / scale,
+            'report_interval': 60 / scale,
+            'data_sync_interval': 300 / scale,
+            'http': {'pool_size': 1, 'timeout': timeout,
+                     'endpoint_timeouts': {endpoint: timeout for endpoint in DEFAULT_ENDPOINT_TIMEOUTS}},
+            'circuit_breaker': {'base_delay': 5.0 / scale, 'max_delay': 300.0 / scale},
+            'ota_update': {'enabled': False}
+        }
+        manager = CloudManager(config, device_id)
+        manager.connect()
+        manager.start()
+        managers.append(manager)
+
+    # 事件堆: (执行时间, 序号, 设备序号, 动作)
+    start_time = time.monotonic()
+    end_time = start_time + args['duration']
+    status_interval = 60 / scale
+    transaction_interval = args['transaction_interval'] / scale
+    events = []
+    counter = 0
+    for position in range(len(managers)):
+        heapq.heappush(events, (start_time + random.uniform(0, status_interval), counter, position, 'status'))
+        counter += 1
+        heapq.heappush(events, (start_time + random.expovariate(1 / transaction_interval), counter, position,
+                                'transaction'))
+        counter += 1
+
+    latencies = {'status': [], 'transaction': []}
+    transactions_sent = 0
+    cache_samples = []
+    next_sample = start_time
+
+    while events and events[0][0] < end_time:
+        now = time.monotonic()
+        if now >= next_sample:
+            cache_samples.append((now - start_time, sample_cache(managers)))
+            next_sample = now + args['sample_interval']
+
+        due, _, position, action = heapq.heappop(events)
+        wait_time = min(due, next_sample) - time.monotonic()
+        if wait_time > 0:
+            time.sleep(wait_time)
+        if time.monotonic() < due:
+            heapq.heappush(events, (due, counter, position, action))
+            counter += 1
+            continue
+
+        manager = managers[position]
+        begin = time.perf_counter()
+        if action == 'status':
+            manager.report_status(make_status(manager.device_id))
+            interval = status_interval
+        else:
+            transactions_sent += 1
+            manager.report_transaction(make_transaction(manager.device_id, transactions_sent))
+            interval = random.expovariate(1 / transaction_interval)
+        latencies[action].append(time.perf_counter() - begin)
+
+        heapq.heappush(events, (due + interval, counter, position, action))
+        counter += 1
+
+    # 故障结束后留出重放时间，再采样最终缓存
+    drain_end = time.monotonic() + args['drain']
+    while time.monotonic() < drain_end:
+        cache_samples.append((time.monotonic() - start_time, sample_cache(managers)))
+        time.sleep(args['sample_interval'])
+
+    http_stats = [manager.get_http_stats() for manager in managers]
+    link_stats = [manager.get_connection_stats() for manager in managers]
+    final_cache = sample_cache(managers)
+    for manager in managers:
+        manager.stop()
+
+    return {
+        'latencies': latencies,
+        'transactions_sent': transactions_sent,
+        'cache_samples': cache_samples,
+        'final_cache': final_cache,
+        'sent_bytes': sum(stats['sent_bytes'] for stats in http_stats),
+        'raw_bytes': sum(stats['raw_bytes'] for stats in http_stats),
+        'received_bytes': sum(stats['received_bytes'] for stats in http_stats),
+        'requests': sum(stats['requests'] for stats in http_stats),
+        'failures': sum(stats['failures'] for stats in http_stats),
+        'breaker_trips': sum(stats['trips'] for stats in link_stats),
+        'short_circuited': sum(stats['short_circuited'] for stats in link_stats)
+    }
+
+
+def sample_cache(managers):
+    """汇总各设备离线缓存的记录数和占用"""
+    records = memory_bytes = disk_bytes = 0
+    for manager in managers:
+        usage = manager.get_offline_usage()
+        records += sum(lane['records'] for lane in usage['lanes'].values())
+        memory_bytes += usage['memory_bytes']
+        disk_bytes += usage['disk_bytes']
+    return {'records': records, 'memory_bytes': memory_bytes, 'disk_bytes': disk_bytes}
+
+
+def summarize(shards, server_stats, elapsed):
+    """合并分片结果，计算汇总指标"""
+    status_latencies = [value for shard in shards for value in shard['latencies']['status']]
+    transaction_latencies = [value for shard in shards for value in shard['latencies']['transaction']]
+    all_latencies = status_latencies + transaction_latencies
+    transactions_sent = sum(shard['transactions_sent'] for shard in shards)
+
+    # 各分片的采样时间点不同，按采样序号对齐后求和得到缓存增长曲线的峰值
+    peak = {'records': 0, 'memory_bytes': 0, 'disk_bytes': 0}
+    for index in range(min(len(shard['cache_samples']) for shard in shards)):
+        for key in peak:
+            peak[key] = max(peak[key], sum(shard['cache_samples'][index][1][key] for shard in shards))
+
+    final = {key: sum(shard['final_cache'][key] for shard in shards) for key in peak}
+    requests = sum(shard['requests'] for shard in shards)
+
+    return {
+        'reports': len(all_latencies),
+        'reports_per_second': len(all_latencies) / elapsed,
+        'http_requests': requests,
+        'http_requests_per_second': requests / elapsed,
+        'http_failures': sum(shard['failures'] for shard in shards),
+        'breaker_trips': sum(shard['breaker_trips'] for shard in shards),
+        'short_circuited_requests': sum(shard['short_circuited'] for shard in shards),
+        'report_latency_p50_ms': percentile(all_latencies, 0.5) * 1000,
+        'report_latency_p99_ms': percentile(all_latencies, 0.99) * 1000,
+        'report_latency_max_ms': max(all_latencies, default=0) * 1000,
+        'status_latency_p99_ms': percentile(status_latencies, 0.99) * 1000,
+        'transaction_latency_p99_ms': percentile(transaction_latencies, 0.99) * 1000,
+        'wire_bytes_sent': sum(shard['sent_bytes'] for shard in shards),
+        'wire_bytes_received': sum(shard['received_bytes'] for shard in shards),
+        'raw_bytes': sum(shard['raw_bytes'] for shard in shards),
+        'peak_cache_records': peak['records'],
+        'peak_cache_memory_bytes': peak['memory_bytes'],
+        'peak_cache_disk_bytes': peak['disk_bytes'],
+        'final_cache_records': final['records'],
+        'transactions_sent': transactions_sent,
+        'transactions_delivered': server_stats['unique_transactions'],
+        'transaction_delivery_ratio': server_stats['unique_transactions'] / transactions_sent if transactions_sent else 1.0,
+        'duplicate_transactions': server_stats['transactions_received'] - server_stats['unique_transactions'],
+        'server_rejected': server_stats['rejected']
+    }
+
+
+# 回归门禁：指标 -> 方向（higher_is_worse为True表示数值越大越差）
+REGRESSION_METRICS = {
+    'report_latency_p50_ms': True,
+    'report_latency_p99_ms': True,
+    'wire_bytes_sent': True,
+    'peak_cache_memory_bytes': True,
+    'final_cache_records': True,
+    'duplicate_transactions': True,
+    'reports_per_second': False,
+    'transaction_delivery_ratio': False,
+}
+
+
+def compare_with_baseline(result, baseline, tolerance):
+    """
+    与基线结果比较
+
+    Returns:
+        list: 退化的指标说明
+    """
+    regressions = []
+    for metric, higher_is_worse in REGRESSION_METRICS.items():
+        if metric not in baseline:
+            continue
+        current, reference = result[metric], baseline[metric]
+        if higher_is_worse:
+            # 很小的基线值（如0条残留缓存）使用绝对余量，避免除零或对噪声过敏
+            limit = reference * (1 + tolerance) + (1 if reference < 10 else 0)
+            if current > limit:
+                regressions.append(f"{metric}: {current:.3f} > {limit:.3f}（基线 {reference:.3f}）")
+        else:
+            limit = reference * (1 - tolerance)
+            if current < limit:
+                regressions.append(f"{metric}: {current:.3f} < {limit:.3f}（基线 {reference:.3f}）")
+    return regressions
+
+
+def parse_outage(value):
+    """解析故障窗口参数 开始秒数:持续秒数"""
+    start, duration = value.split(':')
+    return float(start), float(duration)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='设备群负载模拟与云平台链路回归门禁')
+    parser.add_argument('--devices', type=int, default=200, help='模拟设备数量')
+    parser.add_argument('--duration', type=float, default=60, help='负载持续时间（秒）')
+    parser.add_argument('--processes', type=int, default=1, help='运行设备的进程数（1表示全部在本进程的线程中）')
+    parser.add_argument('--time-scale', type=float, default=10, help='时间压缩倍数（心跳30秒、状态60秒按此缩短）')
+    parser.add_argument('--transaction-interval', type=float, default=300, help='每台设备的平均交易间隔（未压缩，秒）')
+    parser.add_argument('--outage', type=parse_outage, action='append', default=[],
+                        help='故障窗口 开始:持续（秒），可重复指定')
+    parser.add_argument('--outage-mode', choices=['error', 'hang'], default='error', help='故障模式')
+    parser.add_argument('--request-timeout', type=float, default=5, help='设备端请求超时（秒）')
+    parser.add_argument('--drain', type=float, default=10, help='负载结束后等待缓存重放的时间（秒）')
+    parser.add_argument('--sample-interval', type=float, default=1.0, help='缓存采样间隔（秒）')
+    parser.add_argument('--seed', type=int, default=1, help='随机种子')
+    parser.add_argument('--json-output', type=str, help='将结果写入JSON文件（可作为基线）')
+    parser.add_argument('--baseline', type=str, help='基线结果JSON文件')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='允许的相对退化')
+    args = parser.parse_args()
+
+    logging.disable(logging.ERROR)
+    server = StubCloudServer(args.outage, args.outage_mode, hang_seconds=args.request_timeout * 2)
+    server.start()
+    work_dir = tempfile.mkdtemp(prefix='fleet_sim_')
+
+    processes = max(1, min(args.processes, args.devices))
+    shards = [{
+        'device_indexes': list(range(index, args.devices, processes)),
+        'server_url': server.url,
+        'work_dir': work_dir,
+        'duration': args.duration,
+        'time_scale': args.time_scale,
+        'transaction_interval': args.transaction_interval,
+        'request_timeout': args.request_timeout,
+        'drain': args.drain,
+        'sample_interval': args.sample_interval,
+        'seed': args.seed + index
+    } for index in range(processes)]
+
+    print(f"桩服务器: {server.url}，设备: {args.devices}，进程: {processes}，故障窗口: {args.outage or '无'}")
+    server.start_clock()
+    start_time = time.monotonic()
+    if processes == 1:
+        results = [run_shard(shards[0])]
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(run_shard, shards)
+    elapsed = time.monotonic() - start_time - args.drain
+    server_stats = server.get_stats()
+    server.shutdown()
+
+    result = summarize(results, server_stats, max(elapsed, 1e-6))
+    result['config'] = {key: value for key, value in vars(args).items() if key not in ('json_output', 'baseline')}
+
+    print(f"\n上报次数 {result['reports']}（{result['reports_per_second']:.1f} 次/秒），"
+          f"HTTP请求 {result['http_requests']}（{result['http_requests_per_second']:.1f} 次/秒，失败 {result['http_failures']}）")
+    print(f"熔断: {result['breaker_trips']} 次，短路请求 {result['short_circuited_requests']}")
+    print(f"report_* 本地延迟: p50 {result['report_latency_p50_ms']:.3f} ms，p99 {result['report_latency_p99_ms']:.3f} ms，"
+          f"最大 {result['report_latency_max_ms']:.3f} ms")
+    print(f"线上字节: 发送 {result['wire_bytes_sent']}（原始JSON {result['raw_bytes']}），接收 {result['wire_bytes_received']}")
+    print(f"离线缓存峰值: {result['peak_cache_records']} 条，内存 {result['peak_cache_memory_bytes']} 字节，"
+          f"磁盘 {result['peak_cache_disk_bytes']} 字节；结束时剩余 {result['final_cache_records']} 条")
+    print(f"交易: 生成 {result['transactions_sent']}，送达 {result['transactions_delivered']}"
+          f"（{result['transaction_delivery_ratio']:.2%}），重复 {result['duplicate_transactions']}；"
+          f"服务器拒绝请求 {result['server_rejected']}")
+
+    if args.json_output:
+        with open(args.json_output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(result, baseline, args.tolerance)
+        if regressions:
+            print("\n性能回归:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\n与基线相比没有超过容差的退化")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+批量需求预测基准测试 - 比较逐商品循环预测与商品×星期小时矩阵的向量化预测
+
+用法:
+    python benchmarks/forecast_benchmark.py [--products 80] [--history 10000]
+        [--machines 1000] [--machine-history 2000]
+
+单台设备：按商品循环调用 _predict_sales（旧路径）与一次 forecast_all（新路径）的耗时、两条路径的
+预测差异（各自按调用时刻计算，相对差应小于1e-6）以及相对精确趋势的预测偏差；设备群：以 (设备ID, 商品ID)
+为键把所有设备放进一个预测器，一次 forecast_all 完成中央计划的全量预测，与逐台逐商品循环的估算耗时比较。
+"""
+
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import numpy as np
+
+# 添加项目根目录和基准测试目录到系统路径
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+sys.path.insert(0, BENCHMARK_DIR)
+
+from replenishment_benchmark import generate_history
+from src.replenishment.replenishment_algorithm import ReplenishmentAlgorithm
+from src.replenishment.demand_forecast import DemandForecaster
+from src.replenishment.sales_history import SalesHistory
+
+
+def best_of(func, repeat=5):
+    """多次运行取最短耗时（毫秒）"""
+    timings = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start_time) * 1000)
+    return min(timings)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='批量需求预测基准测试')
+    parser.add_argument('--products', type=int, default=80, help='每台设备的商品种类数')
+    parser.add_argument('--history', type=int, default=10000, help='单台设备的销售历史记录数')
+    parser.add_argument('--machines', type=int, default=1000, help='设备群规模')
+    parser.add_argument('--machine-history', type=int, default=2000, help='设备群中每台设备的销售记录数')
+    args = parser.parse_args()
+
+    logging.disable(logging.ERROR)
+    random.seed(1)
+    np.random.seed(1)
+
+    # 单台设备
+    algorithm = ReplenishmentAlgorithm({'algorithm': 'predictive'})
+    history, sales_data = generate_history(args.history, args.products)
+    algorithm.sales_history = SalesHistory.from_records(history)
+    algorithm.sales_data = sales_data
+    algorithm._rebuild_indexes()
+
+    product_ids = sorted(sales_data)
+    inventory = {product_id: {'quantity': random.randint(0, 10)} for product_id in product_ids}
+
+    def loop_forecast():
+        return [algorithm._predict_sales(product_id) for product_id in product_ids]
+
+    loop_ms = best_of(loop_forecast)
+    batch_ms = best_of(lambda: algorithm.forecast_all(inventory, product_ids))
+
+    # 参考值：旧路径的加权公式，趋势因子按销售历史精确计算最近7天与之前7天的销量
+    # （旧路径的趋势只看每个商品最近100条记录，销量大的商品往往覆盖不到之前7天）
+    history_ids = np.array([record['product_id'] for record in history])
+    history_times = np.array([record['timestamp'] for record in history], dtype=np.float64)
+    history_quantities = np.array([record['quantity'] for record in history], dtype=np.float64)
+
+    def quantity_between(product_id, start_time, end_time):
+        mask = (history_ids == product_id) & (history_times >= start_time) & (history_times <= end_time)
+        return float(history_quantities[mask].sum())
+
+    def reference_prediction(product_id):
+        now = time.time()
+        week = 7 * 24 * 3600
+        recent = quantity_between(product_id, now - week, now)
+        older = quantity_between(product_id, now - 2 * week, now - week - 1e-6)
+        trend = min(max(recent / older, 0.5), 2.0) if older else 1.0
+        return algorithm._predictive_analysis(product_id) / algorithm._calculate_trend_factor(product_id) * trend
+
+    reference = np.array([reference_prediction(product_id) for product_id in product_ids])
+    batch = algorithm.forecast_all(inventory, product_ids)
+    deviation = np.abs(batch['predicted_sales'] - reference) / reference
+    loop = np.array(loop_forecast())
+    path_difference = np.abs(batch['predicted_sales'] - loop) / loop
+
+    print(f"单台设备（{len(product_ids)} 种商品，{args.history} 条历史）:")
+    print(f"  逐商品循环: {loop_ms:.3f} ms，forecast_all: {batch_ms:.3f} ms（{loop_ms / batch_ms:.0f}x）")
+    print(f"  预测相对偏差: 中位数 {np.median(deviation):.2%}，最大 {deviation.max():.2%}（相对精确趋势），"
+          f"与逐商品循环的最大相对差 {path_difference.max():.1e}")
+
+    # 设备群
+    forecaster = DemandForecaster()
+    now = time.time()
+    total_records = args.machines * args.machine_history
+    machine_ids = np.repeat(np.arange(args.machines), args.machine_history)
+    skus = np.random.randint(1, args.products + 1, total_records)
+    keys = [(f"SVF-{machine:05d}", f"SKU{sku:03d}") for machine, sku in zip(machine_ids, skus)]
+    timestamps = now - np.random.uniform(0, 30 * 24 * 3600, total_records)
+
+    start_time = time.perf_counter()
+    forecaster.add_sales(keys, timestamps, np.ones(total_records))
+    build_ms = (time.perf_counter() - start_time) * 1000
+
+    fleet_keys = list(forecaster.product_ids)
+    fleet_stock = np.random.randint(0, 11, len(fleet_keys))
+    fleet_ms = best_of(lambda: forecaster.forecast_all(fleet_keys, fleet_stock), repeat=3)
+    estimated_loop_ms = loop_ms * len(fleet_keys) / len(product_ids)
+
+    print(f"\n设备群（{args.machines} 台，{len(fleet_keys)} 个设备×商品，{total_records} 条历史）:")
+    print(f"  构建矩阵: {build_ms:.0f} ms，内存 {forecaster.get_stats()['memory_bytes'] / 1024 / 1024:.1f} MB")
+    print(f"  forecast_all: {fleet_ms:.1f} ms，逐台逐商品循环估算: {estimated_loop_ms:.0f} ms"
+          f"（{estimated_loop_ms / fleet_ms:.0f}x）")
+
+
+if __name__ == "__main__":
+    main()
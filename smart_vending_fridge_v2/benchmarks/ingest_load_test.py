@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+设备接入API负载测试 - 用大量模拟CloudManager客户端压测后台的心跳、状态和交易接口
+
+用法:
+    python benchmarks/ingest_load_test.py [--devices 500] [--duration 60] [--url http://host:5000]
+
+未指定 --url 时在本进程内启动后台设备接入API（临时数据库）。
+每台模拟设备是一个独立的CloudManager实例（独立的长连接和离线缓存目录），
+按真实间隔发送心跳、状态和交易，统计吞吐量、延迟分位数和失败数。
+"""
+
+import os
+import sys
+import time
+import heapq
+import random
+import logging
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# 添加项目根目录和后台目录到系统路径
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'backend'))
+
+from src.cloud.cloud_manager import CloudManager
+
+
+def percentile(values, fraction):
+    """计算分位数"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def start_local_server(db_path):
+    """
+    在本进程内启动设备接入API
+
+    Returns:
+        tuple: (服务器地址, 服务器对象, 设备数据存储)
+    """
+    from flask import Flask
+    from werkzeug.serving import make_server
+    from device_api import device_api, init_device_api
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    app = Flask('ingest_load_test')
+    store = init_device_api(db_path)
+    app.register_blueprint(device_api)
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server, store
+
+
+class SimulatedDevice:
+    """模拟设备：包装一个CloudManager并生成状态和交易"""
+
+    def __init__(self, index, server_url, data_dir):
+        self.device_id = f"SIM-{index:05d}"
+        self.manager = CloudManager({
+            'server_url': server_url,
+            'data_dir': os.path.join(data_dir, self.device_id),
+            'http': {'pool_size': 1}
+        }, self.device_id)
+        self.transaction_count = 0
+        self.status = {
+            'running': True,
+            'door_status': 'closed',
+            'temperature': 4.0,
+            'humidity': 45.0,
+            'power': {'voltage': 220.0, 'current': 1.5, 'power_consumption': 330.0},
+            'inventory': {f"SKU{i:03d}": random.randint(0, 10) for i in range(1, 21)},
+            'errors': [],
+            'warnings': []
+        }
+
+    def heartbeat(self):
+        return self.manager._send_heartbeat()
+
+    def report_status(self):
+        self.status['temperature'] = round(4.0 + random.uniform(-0.5, 0.5), 1)
+        status_data = dict(self.status, device_id=self.device_id, timestamp=time.time())
+        return self.manager._send_status(status_data)
+
+    def report_transaction(self):
+        self.transaction_count += 1
+        now = time.time()
+        transaction = {
+            'id': f"{self.device_id}-T{self.transaction_count}",
+            'device_id': self.device_id,
+            'start_time': now - 20,
+            'end_time': now,
+            'products_taken': [{'product_id': 'SKU001', 'quantity': 1, 'price': 3.5}],
+            'total_amount': 3.5,
+            'status': 'completed',
+            'report_time': now
+        }
+        return self.manager._send_report_batch('transaction', [transaction])
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='设备接入API负载测试')
+    parser.add_argument('--devices', type=int, default=500, help='模拟设备数量')
+    parser.add_argument('--duration', type=float, default=60, help='测试时长（秒）')
+    parser.add_argument('--heartbeat-interval', type=float, default=30, help='心跳间隔（秒）')
+    parser.add_argument('--status-interval', type=float, default=60, help='状态上报间隔（秒）')
+    parser.add_argument('--transaction-interval', type=float, default=120, help='每台设备的平均交易间隔（秒）')
+    parser.add_argument('--workers', type=int, default=64, help='客户端并发线程数')
+    parser.add_argument('--url', type=str, help='后台地址，未指定时在本进程内启动')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    work_dir = tempfile.mkdtemp(prefix='ingest_load_')
+    store = None
+    if args.url:
+        server_url = args.url
+    else:
+        server_url, server, store = start_local_server(os.path.join(work_dir, 'device_ingest.db'))
+
+    print(f"后台地址: {server_url}，初始化 {args.devices} 台模拟设备...")
+    devices = [SimulatedDevice(i, server_url, work_dir) for i in range(args.devices)]
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        connected = sum(executor.map(lambda device: device.manager.connect(), devices))
+    print(f"已连接设备: {connected}/{args.devices}")
+
+    # 事件堆: (执行时间, 序号, 设备, 动作)，各设备的首次执行时间随机错开
+    actions = {
+        'heartbeat': (args.heartbeat_interval, lambda device: device.heartbeat()),
+        'status': (args.status_interval, lambda device: device.report_status()),
+        'transaction': (args.transaction_interval, lambda device: device.report_transaction()),
+    }
+    start_time = time.monotonic()
+    events = []
+    counter = 0
+    for device in devices:
+        for name, (interval, _) in actions.items():
+            counter += 1
+            heapq.heappush(events, (start_time + random.uniform(0, interval), counter, device, name))
+
+    latencies = {name: [] for name in actions}
+    failures = {name: 0 for name in actions}
+    lock = threading.Lock()
+
+    def run(device, name):
+        begin = time.perf_counter()
+        try:
+            success = actions[name][1](device)
+        except Exception:
+            success = False
+        elapsed = time.perf_counter() - begin
+        with lock:
+            latencies[name].append(elapsed)
+            if not success:
+                failures[name] += 1
+
+    end_time = start_time + args.duration
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        while events and events[0][0] < end_time:
+            due, _, device, name = heapq.heappop(events)
+            wait_time = due - time.monotonic()
+            if wait_time > 0:
+                time.sleep(wait_time)
+            executor.submit(run, device, name)
+
+            interval = actions[name][0]
+            if name == 'transaction':
+                interval = random.expovariate(1.0 / interval)
+            counter += 1
+            heapq.heappush(events, (due + interval, counter, device, name))
+    elapsed = time.monotonic() - start_time
+
+    total = sum(len(values) for values in latencies.values())
+    print(f"\n时长 {elapsed:.1f} 秒，请求 {total} 次，吞吐量 {total / elapsed:.1f} 次/秒")
+    print(f"{'接口':<14}{'请求数':>8}{'失败':>8}{'p50(ms)':>10}{'p99(ms)':>10}{'最大(ms)':>10}")
+    for name, values in latencies.items():
+        print(f"{name:<14}{len(values):>8}{failures[name]:>8}{percentile(values, 0.5) * 1000:>10.1f}"
+              f"{percentile(values, 0.99) * 1000:>10.1f}{max(values, default=0) * 1000:>10.1f}")
+
+    required_rate = args.devices / args.heartbeat_interval
+    print(f"\n心跳所需速率: {required_rate:.1f} 次/秒")
+
+    for device in devices:
+        device.manager.cache_journal.close()
+        device.manager.http_session.close()
+
+    if store:
+        stats = store.get_stats()
+        print(f"写入事务: {stats['commits']}，写操作: {stats['operations']}，"
+              f"平均每事务合并 {stats['operations_per_commit']:.1f} 个写操作")
+        store.close()
+        print(f"入库: 设备 {store.count('devices')}，交易 {store.count('transactions')}")
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+预测模型基准测试 - 比较ml算法的训练模型与predictive需求矩阵的24小时预测误差，以及训练和推理耗时
+
+用法:
+    python benchmarks/ml_forecast_benchmark.py [--steady 12] [--intermittent 8] [--weeks 6]
+        [--eval-days 14] [--workers 2]
+
+模拟按小时泊松分布的销售：平稳商品有日内高峰、周末增量和随温度变化的销量，间歇性商品（如三明治）
+每天以较低概率售出几份。评估期内每天零点用截至当时的数据训练模型，并分别用模型和需求矩阵
+（simple和predictive，半衰期14天）预测未来24小时销量，按商品类型统计平均绝对误差和均方根误差
+（间歇性商品的大多数日子销量为0，MAE偏向总是预测0的方法，需同时看RMSE）。
+"""
+
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import tempfile
+import shutil
+import numpy as np
+from datetime import datetime, timedelta
+
+# 添加项目根目录到系统路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.replenishment.demand_forecast import DemandForecaster
+from src.replenishment.forecast_models import train_models, ModelSet, ModelTrainer
+
+
+def simulate_sales(steady, intermittent, hours, start_time):
+    """
+    生成逐小时的销售记录和温度观测
+
+    Returns:
+        tuple: (商品ID列表, 时间戳数组, 数量数组, (温度时间戳数组, 温度数组))
+    """
+    hour_index = np.arange(hours)
+    moments = [datetime.fromtimestamp(start_time + hour * 3600) for hour in hour_index]
+    hour_of_day = np.array([moment.hour for moment in moments])
+    weekend = np.array([moment.weekday() >= 5 for moment in moments])
+
+    # 温度：日变化加上几天一次的天气变化
+    temperature = (22 + 4 * np.sin((hour_of_day - 9) / 24 * 2 * np.pi)
+                   + np.repeat(np.random.normal(0, 3, hours // 24 + 1), 24)[:hours])
+
+    peak = np.random.choice([8, 12, 18], steady)
+    daily = np.random.uniform(8, 40, steady)
+    weekend_lift = np.random.uniform(0.7, 1.5, steady)
+    heat = np.random.uniform(0.0, 0.08, steady)
+
+    product_ids, timestamps, quantities = [], [], []
+    for product in range(steady):
+        distance = np.minimum(np.abs(hour_of_day - peak[product]), 24 - np.abs(hour_of_day - peak[product]))
+        profile = 0.1 + np.exp(-(distance / 2.5) ** 2)
+        rates = daily[product] * profile / profile.mean() / 24
+        rates *= np.where(weekend, weekend_lift[product], 1.0) * (1 + heat[product] * (temperature - 22))
+        for hour, count in enumerate(np.random.poisson(np.maximum(rates, 0))):
+            if count:
+                product_ids.append(f"SKU{product + 1:03d}")
+                timestamps.append(start_time + hour * 3600 + random.uniform(0, 3600))
+                quantities.append(float(count))
+
+    for product in range(intermittent):
+        probability = np.random.uniform(0.15, 0.5)
+        for day in range(hours // 24):
+            if random.random() < probability:
+                product_ids.append(f"SND{product + 1:03d}")
+                timestamps.append(start_time + day * 86400 + random.uniform(10, 14) * 3600)
+                quantities.append(float(random.randint(1, 3)))
+
+    order = np.argsort(timestamps, kind='stable')
+    temperatures = (start_time + hour_index * 3600 + 1800, temperature)
+    return ([product_ids[index] for index in order], np.asarray(timestamps)[order],
+            np.asarray(quantities)[order], temperatures)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='预测模型基准测试')
+    parser.add_argument('--steady', type=int, default=12, help='平稳商品数')
+    parser.add_argument('--intermittent', type=int, default=8, help='间歇性商品数')
+    parser.add_argument('--weeks', type=int, default=6, help='模拟周数')
+    parser.add_argument('--eval-days', type=int, default=14, help='评估天数（模拟期末尾）')
+    parser.add_argument('--workers', type=int, default=2, help='进程池训练的进程数')
+    args = parser.parse_args()
+
+    logging.disable(logging.ERROR)
+    random.seed(1)
+    np.random.seed(1)
+
+    # 从本地零点开始模拟，使模拟的小时与模型和需求矩阵的本地小时一致
+    start_time = datetime.combine(datetime.now().date() - timedelta(weeks=args.weeks),
+                                  datetime.min.time()).timestamp()
+    hours = args.weeks * 7 * 24
+    product_ids, timestamps, quantities, temperatures = simulate_sales(args.steady, args.intermittent, hours,
+                                                                       start_time)
+    skus = sorted(set(product_ids))
+    sku_index = {sku: index for index, sku in enumerate(skus)}
+    intermittent = np.array([sku.startswith('SND') for sku in skus])
+    eval_start = start_time + (args.weeks * 7 - args.eval_days) * 86400
+
+    simple = DemandForecaster(prediction_window=24, algorithm='simple', half_life_days=14)
+    forecaster = DemandForecaster(prediction_window=24, algorithm='predictive', half_life_days=14)
+    errors = {'simple': [], 'predictive': [], 'ml': []}
+    chosen = {}
+    train_seconds = []
+    cursor = 0
+    for day in range(args.eval_days):
+        now = eval_start + day * 86400
+        end = int(np.searchsorted(timestamps, now, side='right'))
+        simple.add_sales(product_ids[cursor:end], timestamps[cursor:end], quantities[cursor:end])
+        forecaster.add_sales(product_ids[cursor:end], timestamps[cursor:end], quantities[cursor:end])
+        cursor = end
+
+        begin = time.perf_counter()
+        params = train_models(product_ids[:end], timestamps[:end], quantities[:end], now, temperatures)
+        train_seconds.append(time.perf_counter() - begin)
+        models = ModelSet(params, day + 1, 24)
+        for model in params['products'].values():
+            chosen[model['model']] = chosen.get(model['model'], 0) + 1
+
+        window_end = int(np.searchsorted(timestamps, now + 86400, side='right'))
+        actual = np.zeros(len(skus))
+        for index in range(end, window_end):
+            actual[sku_index[product_ids[index]]] += quantities[index]
+        temperature = float(np.interp(now, temperatures[0], temperatures[1]))
+        errors['simple'].append(simple.forecast_all(skus, now=now)['predicted_sales'] - actual)
+        errors['predictive'].append(forecaster.forecast_all(skus, now=now)['predicted_sales'] - actual)
+        errors['ml'].append(forecaster.forecast_all(skus, now=now, models=models,
+                                                    temperature=temperature)['predicted_sales'] - actual)
+
+    print(f"{len(product_ids)} 条销售记录，{args.steady} 种平稳商品，{args.intermittent} 种间歇性商品，"
+          f"评估最后{args.eval_days}天")
+    print(f"{'算法':>12}{'平稳MAE':>10}{'平稳RMSE':>10}{'间歇MAE':>10}{'间歇RMSE':>10}")
+    for name, values in errors.items():
+        values = np.array(values)
+        steady, sparse = values[:, ~intermittent], values[:, intermittent]
+        print(f"{name:>12}{np.abs(steady).mean():>10.2f}{np.sqrt((steady ** 2).mean()):>10.2f}"
+              f"{np.abs(sparse).mean():>10.2f}{np.sqrt((sparse ** 2).mean()):>10.2f}")
+    print(f"模型选择次数: {chosen}")
+    print(f"单次训练（进程内）: {np.mean(train_seconds) * 1000:.1f} ms")
+
+    # 进程池训练（含进程启动）与推理耗时
+    work_dir = tempfile.mkdtemp(prefix='ml_forecast_benchmark_')
+    try:
+        trainer = ModelTrainer(os.path.join(work_dir, 'forecast_models.json'), workers=args.workers)
+        begin = time.perf_counter()
+        trainer.start_training(product_ids, timestamps, quantities, temperatures, end_time=timestamps[-1])
+        trainer.wait()
+        pool_seconds = time.perf_counter() - begin
+        trainer.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    calls = 5000
+    now = timestamps[-1]
+    begin = time.perf_counter()
+    for _ in range(calls):
+        forecaster.forecast_all(skus, now=now)
+    predictive_us = (time.perf_counter() - begin) * 1e6 / calls
+    begin = time.perf_counter()
+    for _ in range(calls):
+        forecaster.forecast_all(skus, now=now, models=trainer.model_set, temperature=22.0)
+    ml_us = (time.perf_counter() - begin) * 1e6 / calls
+
+    print(f"进程池训练（{args.workers} 进程，含启动）: {pool_seconds * 1000:.0f} ms，"
+          f"模型版本 {trainer.model_set.version}")
+    print(f"全商品预测: predictive {predictive_us:.1f} us，ml {ml_us:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+推送通道对比测试 - 比较HTTP轮询与长连接推送通道的线上字节数、连接数和上报延迟
+
+用法:
+    python benchmarks/push_channel.py [--idle 20] [--heartbeat 2] [--transactions 200]
+
+分别以HTTP和推送通道两种传输方式启动完整运行的CloudManager，设备与服务器之间经过计数代理，
+统计包括HTTP请求头在内的全部线上字节数：先空闲一段时间（只有心跳或保活ping），
+再逐条同步上报交易并记录延迟；推送通道额外测试服务器主动下发配置命令的往返时间。
+"""
+
+import os
+import sys
+import time
+import socket
+import logging
+import argparse
+import tempfile
+import threading
+
+# 添加项目根目录、后台和基准测试目录到系统路径
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, PROJECT_DIR)
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'backend'))
+sys.path.insert(0, BENCHMARK_DIR)
+
+from fleet_simulator import StubCloudServer, make_transaction, percentile
+from push_broker import PushBroker
+from src.cloud.cloud_manager import CloudManager
+
+
+class CountingProxy:
+    """TCP计数代理：转发设备与服务器之间的字节，统计双向字节数和连接数"""
+
+    def __init__(self, target_port):
+        """
+        初始化计数代理
+
+        Args:
+            target_port (int): 本地服务器端口
+        """
+        self.target_port = target_port
+        self.server = socket.create_server(('127.0.0.1', 0))
+        self.port = self.server.getsockname()[1]
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.bytes = {'up': 0, 'down': 0}
+
+    def start(self):
+        """启动转发线程"""
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def _accept_loop(self):
+        while True:
+            try:
+                client, _ = self.server.accept()
+            except OSError:
+                break
+            upstream = socket.create_connection(('127.0.0.1', self.target_port))
+            for sock in (client, upstream):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with self.lock:
+                self.connections += 1
+            threading.Thread(target=self._pipe, args=(client, upstream, 'up'), daemon=True).start()
+            threading.Thread(target=self._pipe, args=(upstream, client, 'down'), daemon=True).start()
+
+    def _pipe(self, source, target, direction):
+        try:
+            while True:
+                data = source.recv(65536)
+                if not data:
+                    break
+                with self.lock:
+                    self.bytes[direction] += len(data)
+                target.sendall(data)
+        except OSError:
+            pass
+        for sock in (source, target):
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def snapshot(self):
+        """获取当前计数"""
+        with self.lock:
+            return self.connections, self.bytes['up'] + self.bytes['down']
+
+    def close(self):
+        """停止代理"""
+        self.server.close()
+
+
+def run_transport(transport, args):
+    """
+    以指定传输方式运行一次测试
+
+    Returns:
+        dict: 测试结果
+    """
+    received = set()
+    broker = stub = None
+    if transport == 'push':
+        def handler(client_id, topic, payload, token):
+            if topic.endswith('/transaction'):
+                received.add(payload.get('id'))
+            return {'status': 'success', 'data': {}}
+        broker = PushBroker(host='127.0.0.1', port=0, message_handler=handler)
+        broker.start()
+        proxy = CountingProxy(broker.port)
+    else:
+        stub = StubCloudServer()
+        stub.start()
+        proxy = CountingProxy(stub.httpd.server_port)
+    proxy.start()
+
+    manager = CloudManager({
+        'server_url': f"http://127.0.0.1:{proxy.port}",
+        'transport': transport,
+        'push': {'host': '127.0.0.1', 'port': proxy.port, 'keepalive': args.heartbeat},
+        'data_dir': tempfile.mkdtemp(prefix=f'push_channel_{transport}_'),
+        'heartbeat_interval': args.heartbeat,
+        'data_sync_interval': 3600,
+        'config_sync': {'interval': 3600},
+        'ota_update': {'enabled': False},
+        'status_delta': {'enabled': False}
+    }, 'PUSH-001')
+    manager.start()
+    deadline = time.monotonic() + 5
+    while not manager.connected and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    # 空闲阶段：只有心跳或保活ping
+    connections_before, bytes_before = proxy.snapshot()
+    time.sleep(args.idle)
+    connections_idle, bytes_idle = proxy.snapshot()
+
+    # 上报阶段：逐条同步上报交易
+    latencies = []
+    for index in range(args.transactions):
+        transaction = manager._with_idempotency_key(make_transaction(manager.device_id, index))
+        start_time = time.perf_counter()
+        manager._send_request('/device/transaction', transaction)
+        latencies.append(time.perf_counter() - start_time)
+    connections_after, bytes_after = proxy.snapshot()
+
+    result = {
+        'transport': transport,
+        'idle_bytes_per_minute': (bytes_idle - bytes_before) * 60 / args.idle,
+        'bytes_per_transaction': (bytes_after - bytes_idle) / max(args.transactions, 1),
+        'connections': connections_after,
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'delivered': len(received) if broker else stub.get_stats()['unique_transactions'],
+        'command_rtt_ms': None
+    }
+
+    if broker:
+        # 服务器主动下发配置变更，设备在确认中返回已应用的版本
+        start_time = time.perf_counter()
+        ack = broker.send_command(manager.device_id, 'config', {
+            'version': 1, 'config': {'cloud': {'heartbeat_interval': args.heartbeat * 2}}
+        }, timeout=5)
+        result['command_rtt_ms'] = (time.perf_counter() - start_time) * 1000
+        result['command_applied'] = bool(ack) and manager.heartbeat_interval == args.heartbeat * 2
+
+    manager.stop()
+    proxy.close()
+    if broker:
+        broker.stop()
+    else:
+        stub.shutdown()
+    return result
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='推送通道对比测试')
+    parser.add_argument('--idle', type=float, default=20, help='空闲阶段时长（秒）')
+    parser.add_argument('--heartbeat', type=float, default=2, help='心跳/保活间隔（秒）')
+    parser.add_argument('--transactions', type=int, default=200, help='同步上报的交易数')
+    args = parser.parse_args()
+
+    logging.disable(logging.ERROR)
+    results = [run_transport(transport, args) for transport in ('http', 'push')]
+
+    print(f"{'传输方式':<8}{'空闲字节/分钟':>14}{'字节/交易':>10}{'连接数':>8}{'p50(ms)':>10}{'p99(ms)':>10}{'送达':>8}")
+    for result in results:
+        print(f"{result['transport']:<12}{result['idle_bytes_per_minute']:>14.0f}{result['bytes_per_transaction']:>12.0f}"
+              f"{result['connections']:>10}{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+              f"{result['delivered']:>8}/{args.transactions}")
+
+    push = results[1]
+    if push['command_rtt_ms'] is not None:
+        print(f"\n下发配置命令往返: {push['command_rtt_ms']:.2f} ms，"
+              f"{'已应用' if push.get('command_applied') else '未应用'}")
+
+
+if __name__ == "__main__":
+    main()
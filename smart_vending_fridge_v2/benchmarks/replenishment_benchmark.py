@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+补货预测基准测试 - 比较逐次扫描销售历史与按商品列式索引的单次预测延迟
+
+用法:
+    python benchmarks/replenishment_benchmark.py [--sizes 10000,100000,1000000] [--products 20]
+        [--calls 200]
+
+按指定规模生成销售历史（按时间递增，分布在30天内），分别用旧实现（每次预测都筛选整个
+销售历史，趋势因子扫描最近100条记录）和需求矩阵计算simple与predictive预测，输出单次调用延迟、
+索引重建耗时，并核对两种实现不含趋势因子的预测结果一致（不启用销量衰减）。
+"""
+
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import numpy as np
+from datetime import datetime
+
+# 添加项目根目录到系统路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.replenishment.replenishment_algorithm import ReplenishmentAlgorithm
+from src.replenishment.sales_history import SalesHistory
+
+
+def legacy_simple_prediction(algorithm, product_id):
+    """旧实现：筛选整个销售历史获取首末销售时间"""
+    if product_id not in algorithm.sales_data:
+        return 1.0
+    total_quantity = algorithm.sales_data[product_id]['total_quantity']
+    sales_records = algorithm.sales_history.records(product_id=product_id)
+    if not sales_records:
+        return 1.0
+    earliest_sale = min(record['timestamp'] for record in sales_records)
+    latest_sale = max(record['timestamp'] for record in sales_records)
+    days = max((latest_sale - earliest_sale) / (24 * 3600) + 1, 1)
+    return total_quantity / days * (algorithm.prediction_window / 24)
+
+
+def legacy_trend_factor(algorithm, product_id):
+    """旧实现：扫描最近100条销售趋势记录计算最近7天与之前7天的销量之比"""
+    trend_data = algorithm.sales_data[product_id]['sales_trend']
+    if len(trend_data) < 2:
+        return 1.0
+    now = time.time()
+    recent_sales = sum(item['quantity'] for item in trend_data if now - item['timestamp'] <= 7 * 24 * 3600)
+    older_sales = sum(item['quantity'] for item in trend_data
+                      if 7 * 24 * 3600 < now - item['timestamp'] <= 14 * 24 * 3600)
+    trend_factor = recent_sales / older_sales if older_sales else 1.0
+    return max(min(trend_factor, 2.0), 0.5)
+
+
+def legacy_weighted_prediction(algorithm, product_id):
+    """旧实现：筛选整个销售历史后按小时和星期加权（不含趋势因子）"""
+    if product_id not in algorithm.sales_data:
+        return 1.0
+    sales_records = algorithm.sales_history.records(product_id=product_id)
+    if not sales_records:
+        return 1.0
+    now = datetime.now()
+    hourly_sales = algorithm.sales_data[product_id]['hourly_sales']
+    daily_sales = algorithm.sales_data[product_id]['daily_sales']
+    total_hourly = sum(hourly_sales)
+    total_daily = sum(daily_sales)
+    hourly_weight = hourly_sales[now.hour] / total_hourly if total_hourly else 1.0
+    daily_weight = daily_sales[now.weekday()] / total_daily if total_daily else 1.0
+    base_prediction = legacy_simple_prediction(algorithm, product_id)
+    return base_prediction * (hourly_weight + daily_weight) / 2
+
+
+def legacy_predictive_analysis(algorithm, product_id):
+    """旧实现：加权预测乘以趋势因子"""
+    if product_id not in algorithm.sales_data:
+        return 1.0
+    return max(legacy_weighted_prediction(algorithm, product_id) * legacy_trend_factor(algorithm, product_id), 0.1)
+
+
+def generate_history(size, products):
+    """
+    生成销售历史和商品销售统计
+
+    Returns:
+        tuple: (销售历史, 商品销售数据)
+    """
+    now = time.time()
+    timestamps = np.sort(now - np.random.uniform(0, 30 * 24 * 3600, size))
+    product_ids = [f"SKU{random.randint(1, products):03d}" for _ in range(size)]
+    history = [{
+        'product_id': product_id,
+        'quantity': 1,
+        'price': 3.5,
+        'amount': 3.5,
+        'timestamp': float(timestamp)
+    } for product_id, timestamp in zip(product_ids, timestamps)]
+
+    sales_data = {}
+    for record in history:
+        product = sales_data.setdefault(record['product_id'], {
+            'total_sales': 0, 'total_quantity': 0, 'last_sale': None,
+            'hourly_sales': [0] * 24, 'daily_sales': [0] * 7, 'sales_trend': []
+        })
+        product['total_quantity'] += record['quantity']
+        product['total_sales'] += record['amount']
+        product['last_sale'] = record['timestamp']
+        moment = datetime.fromtimestamp(record['timestamp'])
+        product['hourly_sales'][moment.hour] += record['quantity']
+        product['daily_sales'][moment.weekday()] += record['quantity']
+    for product_id, product in sales_data.items():
+        product['sales_trend'] = [{'timestamp': record['timestamp'], 'quantity': record['quantity']}
+                                  for record in history[-2000:] if record['product_id'] == product_id][-100:]
+    return history, sales_data
+
+
+def time_calls(func, product_ids, calls):
+    """测量单次调用的平均延迟（毫秒）"""
+    start_time = time.perf_counter()
+    for index in range(calls):
+        func(product_ids[index % len(product_ids)])
+    return (time.perf_counter() - start_time) * 1000 / calls
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='补货预测基准测试')
+    parser.add_argument('--sizes', type=str, default='10000,100000,1000000', help='销售历史规模（逗号分隔）')
+    parser.add_argument('--products', type=int, default=20, help='商品种类数')
+    parser.add_argument('--calls', type=int, default=200, help='每种实现的调用次数')
+    args = parser.parse_args()
+
+    logging.disable(logging.ERROR)
+    random.seed(1)
+    np.random.seed(1)
+    algorithm = ReplenishmentAlgorithm({'algorithm': 'predictive', 'decay_half_life_days': 0})
+
+    print(f"{'记录数':>10}{'索引重建(ms)':>14}{'simple旧(ms)':>14}{'simple新(ms)':>14}"
+          f"{'predictive旧(ms)':>18}{'predictive新(ms)':>18}{'加速':>10}{'最大偏差':>12}")
+    for size in [int(value) for value in args.sizes.split(',')]:
+        history, sales_data = generate_history(size, args.products)
+        algorithm.sales_history = SalesHistory.from_records(history)
+        algorithm.sales_data = sales_data
+
+        start_time = time.perf_counter()
+        algorithm._rebuild_indexes()
+        rebuild_ms = (time.perf_counter() - start_time) * 1000
+
+        product_ids = sorted(sales_data)
+        # 旧实现在大规模下很慢，限制调用次数
+        legacy_calls = max(min(args.calls, 2000000 // size), 3)
+        simple_old = time_calls(lambda pid: legacy_simple_prediction(algorithm, pid), product_ids, legacy_calls)
+        simple_new = time_calls(algorithm._simple_prediction, product_ids, args.calls)
+        predictive_old = time_calls(lambda pid: legacy_predictive_analysis(algorithm, pid), product_ids,
+                                    legacy_calls)
+        predictive_new = time_calls(algorithm._predictive_analysis, product_ids, args.calls)
+
+        deviation = max(abs(legacy_weighted_prediction(algorithm, pid)
+                            - algorithm._simple_prediction(pid) * algorithm.forecaster.seasonal_weight(pid))
+                        for pid in product_ids)
+        print(f"{size:>10}{rebuild_ms:>14.1f}{simple_old:>14.3f}{simple_new:>14.4f}"
+              f"{predictive_old:>18.3f}{predictive_new:>18.4f}{predictive_old / predictive_new:>9.0f}x"
+              f"{deviation:>12.2e}")
+
+
+if __name__ == "__main__":
+    main()
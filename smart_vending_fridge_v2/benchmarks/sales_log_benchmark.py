@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+销售数据持久化基准测试 - 比较整文件JSON重写与分段销售日志加快照的保存和启动开销
+
+用法:
+    python benchmarks/sales_log_benchmark.py [--sizes 1000,10000,100000] [--products 20]
+        [--transactions 200]
+
+旧实现每10笔交易把商品销售统计和全部销售历史以缩进JSON重写一次，启动时解析整个文件；
+新实现每笔销售追加一条日志帧，每snapshot-interval条写入一次列式快照，启动时内存映射快照并重放尾部。
+输出每笔交易分摊的保存耗时、单次快照耗时、启动耗时和磁盘占用。
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+
+# 添加项目根目录和基准测试目录到系统路径
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+sys.path.insert(0, BENCHMARK_DIR)
+
+from replenishment_benchmark import generate_history
+from src.replenishment.sales_log import SalesLog
+from src.replenishment.sales_history import SalesHistory
+
+
+def directory_size(path):
+    """目录中所有文件的总字节数"""
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def legacy_costs(history, sales_data, transactions, work_dir):
+    """
+    旧实现：每10笔交易重写一次缩进JSON
+
+    Returns:
+        tuple: (每笔交易分摊的保存耗时ms, 启动耗时ms, 文件字节数)
+    """
+    path = os.path.join(work_dir, 'sales_data.json')
+    saves = max(transactions // 10, 1)
+    start_time = time.perf_counter()
+    for _ in range(saves):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'product_sales': sales_data, 'sales_history': history, 'last_update': time.time()},
+                      f, ensure_ascii=False, indent=2)
+    save_ms = (time.perf_counter() - start_time) * 1000 / (saves * 10)
+
+    start_time = time.perf_counter()
+    with open(path, 'r', encoding='utf-8') as f:
+        json.load(f)
+    load_ms = (time.perf_counter() - start_time) * 1000
+    return save_ms, load_ms, os.path.getsize(path)
+
+
+def log_costs(history, sales_data, transactions, work_dir):
+    """
+    新实现：每笔销售追加日志帧，快照后启动时重放尾部
+
+    Returns:
+        tuple: (每笔交易的追加耗时ms, 单次快照耗时ms, 启动耗时ms, 目录字节数)
+    """
+    log_dir = os.path.join(work_dir, 'sales_log')
+    sales_log = SalesLog(log_dir, snapshot_interval=10 ** 9)
+    columns = SalesHistory.from_records(history)
+    sales_log.write_snapshot(columns, sales_data)
+
+    start_time = time.perf_counter()
+    for index in range(transactions):
+        sales_log.append(dict(history[index % len(history)]))
+    append_ms = (time.perf_counter() - start_time) * 1000 / transactions
+
+    start_time = time.perf_counter()
+    sales_log.write_snapshot(columns, sales_data)
+    snapshot_ms = (time.perf_counter() - start_time) * 1000
+
+    # 启动：快照加上一批未压缩的日志尾部
+    for index in range(transactions):
+        sales_log.append(dict(history[index % len(history)]))
+    sales_log.close()
+    start_time = time.perf_counter()
+    SalesLog(log_dir).load()
+    load_ms = (time.perf_counter() - start_time) * 1000
+    return append_ms, snapshot_ms, load_ms, directory_size(log_dir)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='销售数据持久化基准测试')
+    parser.add_argument('--sizes', type=str, default='1000,10000,100000', help='销售历史规模（逗号分隔）')
+    parser.add_argument('--products', type=int, default=20, help='商品种类数')
+    parser.add_argument('--transactions', type=int, default=200, help='每种实现写入的交易数')
+    args = parser.parse_args()
+
+    logging.disable(logging.ERROR)
+    random.seed(1)
+
+    print(f"{'记录数':>10}{'JSON保存/笔(ms)':>16}{'日志追加/笔(ms)':>16}{'快照(ms)':>10}"
+          f"{'JSON启动(ms)':>14}{'日志启动(ms)':>14}{'JSON字节':>12}{'日志字节':>12}")
+    for size in [int(value) for value in args.sizes.split(',')]:
+        history, sales_data = generate_history(size, args.products)
+        for product in sales_data.values():
+            product.pop('sales_trend', None)
+
+        work_dir = tempfile.mkdtemp(prefix='sales_log_benchmark_')
+        try:
+            json_save, json_load, json_bytes = legacy_costs(history, sales_data, args.transactions, work_dir)
+            append_ms, snapshot_ms, log_load, log_bytes = log_costs(history, sales_data, args.transactions, work_dir)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        print(f"{size:>10}{json_save:>16.3f}{append_ms:>16.4f}{snapshot_ms:>10.1f}"
+              f"{json_load:>14.1f}{log_load:>14.1f}{json_bytes:>12}{log_bytes:>12}")
+
+
+if __name__ == "__main__":
+    main()
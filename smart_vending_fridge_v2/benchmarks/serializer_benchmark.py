@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+云平台负载序列化基准测试 - 比较各格式的字节数和编解码CPU耗时
+
+用法:
+    python benchmarks/serializer_benchmark.py [--input payloads.jsonl] [--rounds 20]
+
+--input 为 http.record_payloads_path 记录的请求负载（JSON Lines），
+未指定时使用按主程序数据结构生成的样例负载。
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import random
+import argparse
+
+# 添加项目根目录到系统路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.cloud.serializer import JsonSerializer, BinarySerializer, ZSTD_AVAILABLE
+
+
+class GzipJsonSerializer(JsonSerializer):
+    """JSON + gzip（当前HTTP会话的默认线上格式）"""
+
+    name = 'json+gzip'
+
+    def encode(self, obj):
+        return gzip.compress(super().encode(obj), compresslevel=6)
+
+    def decode(self, data):
+        return super().decode(gzip.decompress(data))
+
+
+def load_payloads(path):
+    """加载记录的请求负载"""
+    payloads = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                payloads.append(json.loads(line)['data'])
+    return payloads
+
+
+def generate_payloads(count=200):
+    """按主程序的数据结构生成样例负载"""
+    now = time.time()
+    inventory = {f"SKU{i:03d}": {'product_id': f"SKU{i:03d}", 'name': f"商品{i}", 'quantity': random.randint(0, 10),
+                                 'price': random.choice([2.0, 3.5, 5.5, 15.0])} for i in range(1, 41)}
+    payloads = []
+    for i in range(count):
+        kind = i % 4
+        timestamp = now + i * 30
+        if kind == 0:
+            payloads.append({'device_id': 'SVF-00001', 'timestamp': timestamp})
+        elif kind == 1:
+            payloads.append({
+                'device_id': 'SVF-00001', 'timestamp': timestamp, 'running': True, 'door_status': 'closed',
+                'temperature': round(random.uniform(3.0, 5.0), 2), 'humidity': round(random.uniform(40, 60), 1),
+                'inventory': inventory, 'errors': [], 'warnings': [
+                    {'message': '温度过高: 5.2°C', 'timestamp': timestamp - 600, 'resolved': False}
+                ],
+                'location': {'latitude': 39.9042, 'longitude': 116.4074, 'address': '北京市朝阳区某商场'}
+            })
+        elif kind == 2:
+            products = [{'product_id': f"SKU{random.randint(1, 40):03d}", 'name': '可口可乐', 'quantity': 1,
+                         'price': 3.5} for _ in range(random.randint(1, 3))]
+            payloads.append({
+                'device_id': 'SVF-00001', 'timestamp': timestamp, 'transactions': [{
+                    'id': f"T{int(timestamp) + j}", 'user_id': f"U{random.randint(1000, 9999)}",
+                    'auth_method': 'qr_code', 'start_time': timestamp - 40, 'end_time': timestamp,
+                    'products_taken': products, 'total_amount': sum(p['price'] for p in products),
+                    'status': 'completed', 'cache_time': timestamp
+                } for j in range(20)]
+            })
+        else:
+            payloads.append({
+                'device_id': 'SVF-00001', 'report_time': timestamp, 'timestamp': timestamp, 'products': [{
+                    'product_id': f"SKU{j:03d}", 'name': f"商品{j}", 'current_stock': random.randint(0, 2),
+                    'predicted_sales': round(random.uniform(0.1, 5.0), 3), 'replenishment_quantity': 8,
+                    'priority': round(random.uniform(1, 100), 2)
+                } for j in range(1, 9)]
+            })
+    return payloads
+
+
+def benchmark(serializer, payloads, rounds):
+    """测量一个序列化器的字节数和编解码耗时"""
+    encoded = [serializer.encode(payload) for payload in payloads]
+    total_bytes = sum(len(data) for data in encoded)
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for payload in payloads:
+            serializer.encode(payload)
+    encode_time = (time.perf_counter() - start) / (rounds * len(payloads))
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for data in encoded:
+            serializer.decode(data)
+    decode_time = (time.perf_counter() - start) / (rounds * len(payloads))
+
+    return total_bytes, encode_time, decode_time
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='云平台负载序列化基准测试')
+    parser.add_argument('--input', type=str, help='记录的请求负载文件（JSON Lines）')
+    parser.add_argument('--rounds', type=int, default=20, help='编解码重复轮数')
+    args = parser.parse_args()
+
+    payloads = load_payloads(args.input) if args.input else generate_payloads()
+
+    serializers = [
+        ('json', JsonSerializer()),
+        ('json+gzip', GzipJsonSerializer()),
+        ('binary', BinarySerializer(compression='none')),
+        ('binary+zlib', BinarySerializer(compression='zlib')),
+    ]
+    if ZSTD_AVAILABLE:
+        serializers.append(('binary+zstd', BinarySerializer(compression='zstd')))
+
+    print(f"负载数量: {len(payloads)}")
+    print(f"{'格式':<14}{'总字节':>12}{'相对JSON':>10}{'编码(us)':>12}{'解码(us)':>12}")
+
+    baseline = None
+    for name, serializer in serializers:
+        total_bytes, encode_time, decode_time = benchmark(serializer, payloads, args.rounds)
+        baseline = baseline or total_bytes
+        print(f"{name:<14}{total_bytes:>12}{total_bytes / baseline:>10.2%}"
+              f"{encode_time * 1e6:>12.1f}{decode_time * 1e6:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -116,13 +116,15 @@ class SmartVendingFridge:
             self.cloud_manager = CloudManager(
                 self.config.get('cloud', {}),
                 self.device_id,
-                simulation=self.simulation_mode
+                simulation=self.simulation_mode,
+                config_manager=self.config_manager
             )
             
             # 智能补货算法
             self.replenishment_system = ReplenishmentAlgorithm(
                 self.config.get('replenishment', {}),
-                simulation=self.simulation_mode
+                simulation=self.simulation_mode,
+                config_manager=self.config_manager
             )
             
             # 广告系统
@@ -341,6 +343,8 @@ class SmartVendingFridge:
         # 获取当前温度
         current_temp = self.temp_system.get_current_temperature()
         self.system_status['temperature'] = current_temp
+        # 温度观测同时作为补货预测回归模型的温度特征
+        self.replenishment_system.record_temperature(current_temp)
         
         # 检查温度是否在正常范围内
         temp_range = self.config.get('hardware', {}).get('temperature_control', {}).get('range', {})
@@ -0,0 +1,433 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+云平台缓存日志模块 - 分段追加写入的离线缓存预写日志
+"""
+
+import os
+import time
+import json
+import struct
+import zlib
+import itertools
+import threading
+from collections import deque
+
+from src.utils.logger import get_logger
+from src.cloud.serializer import BinarySerializer
+
+logger = get_logger('cache_journal')
+
+
+class CacheJournal:
+    """
+    分段追加写入的缓存日志
+
+    每条缓存记录追加到当前段文件（JSON格式为一行，二进制格式为带长度和CRC的帧），
+    确认（ack）以水位线形式追加，写入为O(1)，fsync按批次或时间间隔合并执行。
+    已确认的记录由后台压缩步骤清理。每条未确认记录在段文件中的位置保存在偏移索引中，
+    分页读取时直接定位，不必扫描全部段。
+    """
+
+    SEGMENT_PREFIX = 'segment_'
+    SEGMENT_SUFFIXES = {'json': '.log', 'binary': '.bin'}
+
+    # 二进制帧头：负载长度 + CRC32
+    FRAME_HEADER = struct.Struct('<II')
+
+    def __init__(self, journal_dir, segment_max_bytes=256 * 1024, fsync_batch=16, fsync_interval=2.0, on_pending=None,
+                 record_format='json'):
+        """
+        初始化缓存日志
+
+        Args:
+            journal_dir (str): 日志目录
+            segment_max_bytes (int, optional): 单个段文件最大字节数
+            fsync_batch (int, optional): 累积多少条写入后执行一次fsync
+            fsync_interval (float, optional): 距上次fsync超过多少秒后执行fsync
+            on_pending (callable, optional): 出现未落盘写入时的回调，用于安排延迟fsync
+            record_format (str, optional): 新写入段的记录格式 json 或 binary，旧格式的段仍可读取
+        """
+        self.journal_dir = journal_dir
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self.on_pending = on_pending
+        self.record_format = record_format if record_format in self.SEGMENT_SUFFIXES else 'json'
+        self.binary_serializer = BinarySerializer(compression='none')
+
+        # 记录序号与各类别未确认的(序号, 字节数)队列
+        self.next_seq = 1
+        self.live_seqs = {}
+        self.acked_seq = {}
+        # 各类别未确认记录的偏移索引：序号 -> (段文件路径, 字节位置)
+        self.live_offsets = {}
+
+        # 段文件状态
+        self.segment_index = 0
+        self.segment_file = None
+        self.segment_size = 0
+        self.pending_sync = 0
+        self.last_sync_time = time.time()
+        self.acked_bytes = 0
+
+        self.lock = threading.RLock()
+
+        os.makedirs(self.journal_dir, exist_ok=True)
+
+    def _segment_path(self, index):
+        """获取当前格式的段文件路径"""
+        suffix = self.SEGMENT_SUFFIXES[self.record_format]
+        return os.path.join(self.journal_dir, f"{self.SEGMENT_PREFIX}{index:08d}{suffix}")
+
+    def _list_segments(self):
+        """
+        按顺序列出所有段文件
+
+        Returns:
+            list: (段序号, 路径) 列表
+        """
+        segments = []
+        for name in os.listdir(self.journal_dir):
+            if not name.startswith(self.SEGMENT_PREFIX):
+                continue
+            for suffix in self.SEGMENT_SUFFIXES.values():
+                if name.endswith(suffix):
+                    try:
+                        index = int(name[len(self.SEGMENT_PREFIX):-len(suffix)])
+                    except ValueError:
+                        break
+                    segments.append((index, os.path.join(self.journal_dir, name)))
+                    break
+        return sorted(segments)
+
+    def _encode_entry(self, entry):
+        """按当前格式编码一条日志记录"""
+        if self.record_format == 'binary':
+            payload = self.binary_serializer.encode(entry)
+            return self.FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        return (json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+
+    def _is_binary(self, path):
+        """按文件后缀判断段文件是否为二进制格式"""
+        return path.endswith(self.SEGMENT_SUFFIXES['binary'])
+
+    def _read_entry(self, f, binary):
+        """
+        从文件当前位置读取一条记录
+
+        Args:
+            f (file): 以二进制模式打开的段文件
+            binary (bool): 是否为二进制格式
+
+        Returns:
+            tuple: (记录, 字节数)，到达文件末尾时字节数为0，记录损坏时记录为None
+        """
+        if binary:
+            header_size = self.FRAME_HEADER.size
+            header = f.read(header_size)
+            if len(header) < header_size:
+                return None, 0
+            length, crc = self.FRAME_HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                return None, header_size + len(payload)
+            return self.binary_serializer.decode(payload), header_size + length
+
+        line = f.readline()
+        try:
+            return json.loads(line), len(line)
+        except ValueError:
+            return None, len(line)
+
+    def _read_entries(self, path):
+        """
+        读取段文件中的全部记录（按文件后缀识别格式）
+
+        Yields:
+            tuple: (记录, 字节数, 在段文件中的字节位置)
+        """
+        binary = self._is_binary(path)
+        with open(path, 'rb') as f:
+            position = 0
+            while True:
+                entry, size = self._read_entry(f, binary)
+                if size == 0:
+                    break
+                if entry is not None:
+                    yield entry, size, position
+                elif binary:
+                    # 断电造成的不完整帧，之后的数据不可信
+                    logger.warning(f"忽略损坏的缓存日志记录: {path}")
+                    break
+                else:
+                    # 断电造成的半行写入，忽略
+                    logger.warning(f"忽略损坏的缓存日志记录: {path}")
+                position += size
+
+    def recover(self):
+        """
+        从段文件恢复未确认的缓存记录
+
+        Returns:
+            dict: 类别 -> 按写入顺序排列的记录列表
+        """
+        with self.lock:
+            records = {}
+            acked = {}
+            max_seq = 0
+
+            for index, path in self._list_segments():
+                for entry, size, position in self._read_entries(path):
+                    category = entry.get('cat')
+                    seq = entry.get('seq', 0)
+                    if entry.get('op') == 'add':
+                        # 压缩中途断电可能留下重复记录，按序号去重
+                        records.setdefault(category, {})[seq] = (entry.get('rec'), size, (path, position))
+                        max_seq = max(max_seq, seq)
+                    elif entry.get('op') == 'ack':
+                        acked[category] = max(acked.get(category, 0), seq)
+
+                self.segment_index = index
+
+            self.next_seq = max_seq + 1
+            self.acked_seq = acked
+            self.live_seqs = {}
+            self.live_offsets = {}
+
+            recovered = {}
+            for category, items in records.items():
+                watermark = acked.get(category, 0)
+                live = sorted((seq, item) for seq, item in items.items() if seq > watermark)
+                self.live_seqs[category] = deque((seq, size) for seq, (_, size, _) in live)
+                self.live_offsets[category] = {seq: location for seq, (_, _, location) in live}
+                recovered[category] = [record for _, (record, _, _) in live]
+
+            # 恢复后总是开启新段，避免在可能损坏的尾部继续追加
+            self._open_segment(self.segment_index + 1)
+
+            logger.info(f"从缓存日志恢复: {sum(len(v) for v in recovered.values())} 条记录")
+            return recovered
+
+    def _open_segment(self, index):
+        """打开新的段文件"""
+        if self.segment_file:
+            self._sync()
+            self.segment_file.close()
+
+        self.segment_index = index
+        self.segment_file = open(self._segment_path(index), 'ab')
+        self.segment_size = self.segment_file.tell()
+
+    def _write(self, entry):
+        """
+        追加一条记录并按需合并fsync
+
+        Returns:
+            tuple: (写入字节数, (段文件路径, 字节位置))
+        """
+        if self.segment_file is None:
+            self._open_segment(self.segment_index + 1)
+
+        location = (self.segment_file.name, self.segment_size)
+        data = self._encode_entry(entry)
+        self.segment_file.write(data)
+        self.segment_file.flush()
+        self.segment_size += len(data)
+        self.pending_sync += 1
+
+        if self.pending_sync >= self.fsync_batch or time.time() - self.last_sync_time >= self.fsync_interval:
+            self._sync()
+        elif self.pending_sync == 1 and self.on_pending:
+            # 本批第一条未落盘写入，通知调用方在fsync间隔后落盘
+            self.on_pending()
+
+        if self.segment_size >= self.segment_max_bytes:
+            self._open_segment(self.segment_index + 1)
+
+        return len(data), location
+
+    def _sync(self):
+        """将已写入的数据刷到磁盘"""
+        if self.segment_file and self.pending_sync:
+            os.fsync(self.segment_file.fileno())
+            self.pending_sync = 0
+        self.last_sync_time = time.time()
+
+    def append(self, category, record):
+        """
+        追加一条缓存记录
+
+        Args:
+            category (str): 记录类别
+            record (dict): 记录内容
+
+        Returns:
+            tuple: (记录序号, 写入字节数)
+        """
+        with self.lock:
+            seq = self.next_seq
+            self.next_seq += 1
+            size, location = self._write({'op': 'add', 'cat': category, 'seq': seq, 'rec': record})
+            self.live_seqs.setdefault(category, deque()).append((seq, size))
+            self.live_offsets.setdefault(category, {})[seq] = location
+            return seq, size
+
+    def ack(self, category, count):
+        """
+        确认某类别最早的若干条记录（已发送或已被淘汰）
+
+        Args:
+            category (str): 记录类别
+            count (int): 确认的记录数量
+        """
+        with self.lock:
+            live = self.live_seqs.get(category)
+            if not live or count <= 0:
+                return
+
+            offsets = self.live_offsets.get(category, {})
+            seq = 0
+            for _ in range(min(count, len(live))):
+                seq, size = live.popleft()
+                offsets.pop(seq, None)
+                self.acked_bytes += size
+
+            self.acked_seq[category] = seq
+            self._write({'op': 'ack', 'cat': category, 'seq': seq})
+
+    def read_live(self, category, offset, limit):
+        """
+        从段文件读取某类别未确认记录中的一段（用于分页载入只保存在磁盘上的记录）
+
+        Args:
+            category (str): 记录类别
+            offset (int): 在未确认记录中的起始位置
+            limit (int): 最多读取的记录数
+
+        Returns:
+            list: 按写入顺序排列的记录
+        """
+        with self.lock:
+            live = self.live_seqs.get(category)
+            if not live or offset >= len(live) or limit <= 0:
+                return []
+
+            offsets = self.live_offsets.get(category, {})
+
+            # 当前段可能还有未刷出的缓冲数据
+            if self.segment_file:
+                self.segment_file.flush()
+
+            records = []
+            files = {}
+            try:
+                for seq, _ in itertools.islice(live, offset, offset + limit):
+                    path, position = offsets.get(seq, (None, 0))
+                    entry = None
+                    if path is not None:
+                        f = files.get(path)
+                        if f is None:
+                            f = files[path] = open(path, 'rb')
+                        f.seek(position)
+                        entry, _ = self._read_entry(f, self._is_binary(path))
+                    if entry is None or entry.get('seq') != seq:
+                        logger.warning(f"缓存日志偏移索引中找不到记录: {category} #{seq}")
+                        continue
+                    records.append(entry.get('rec'))
+            finally:
+                for f in files.values():
+                    f.close()
+
+            return records
+
+    def get_disk_usage(self):
+        """
+        获取日志占用的磁盘空间
+
+        Returns:
+            int: 所有段文件的总字节数
+        """
+        with self.lock:
+            total = 0
+            for _, path in self._list_segments():
+                try:
+                    total += os.path.getsize(path)
+                except OSError:
+                    pass
+            return total
+
+    def sync(self):
+        """立即执行fsync（定时任务或停止时调用）"""
+        with self.lock:
+            self._sync()
+
+    def needs_compaction(self, threshold_bytes=None):
+        """
+        判断是否需要压缩
+
+        Args:
+            threshold_bytes (int, optional): 已确认数据字节阈值，默认为一个段的大小
+
+        Returns:
+            bool: 是否需要压缩
+        """
+        threshold = threshold_bytes or self.segment_max_bytes
+        return self.acked_bytes >= threshold and len(self._list_segments()) > 1
+
+    def compact(self):
+        """
+        压缩日志：将已关闭段中仍未确认的记录重写到新段，删除旧段
+
+        Returns:
+            int: 删除的段数量
+        """
+        with self.lock:
+            closed = [(index, path) for index, path in self._list_segments() if index < self.segment_index]
+            if not closed:
+                return 0
+
+            live = {category: {seq for seq, _ in items} for category, items in self.live_seqs.items()}
+            survivors = []
+            for _, path in closed:
+                for entry, _, _ in self._read_entries(path):
+                    if entry.get('op') == 'add' and entry.get('seq') in live.get(entry.get('cat'), ()):
+                        survivors.append(entry)
+
+            # 先写入压缩段并落盘，再删除旧段，保证任意时刻断电都不丢记录
+            target_path = self._segment_path(closed[-1][0])
+            compacted_path = target_path + '.compact'
+            locations = []
+            with open(compacted_path, 'wb') as f:
+                position = 0
+                for entry in survivors:
+                    data = self._encode_entry(entry)
+                    f.write(data)
+                    locations.append((entry.get('cat'), entry.get('seq'), position))
+                    position += len(data)
+                for category, seq in self.acked_seq.items():
+                    f.write(self._encode_entry({'op': 'ack', 'cat': category, 'seq': seq}))
+                f.flush()
+                os.fsync(f.fileno())
+
+            os.replace(compacted_path, target_path)
+            for _, path in closed:
+                if path != target_path:
+                    os.remove(path)
+
+            # 存活记录已移到压缩段中的新位置
+            for category, seq, position in locations:
+                self.live_offsets[category][seq] = (target_path, position)
+
+            self.acked_bytes = 0
+            logger.debug(f"压缩缓存日志: 合并 {len(closed)} 个段, 保留 {len(survivors)} 条记录")
+            return len(closed) - 1
+
+    def close(self):
+        """关闭日志"""
+        with self.lock:
+            if self.segment_file:
+                self._sync()
+                self.segment_file.close()
+                self.segment_file = None
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+熔断器模块 - 云平台连接状态机（关闭、断开、半开）与带抖动的指数退避
+"""
+
+import time
+import random
+import threading
+
+from src.utils.logger import get_logger
+
+logger = get_logger('circuit_breaker')
+
+# 连接状态
+CLOSED = 'closed'  # 链路正常，请求直接发送
+OPEN = 'open'  # 熔断，请求立即失败，上报直接写入离线缓存
+HALF_OPEN = 'half_open'  # 退避结束，只放行一个探测请求
+
+
+class CircuitBreaker:
+    """
+    云平台链路熔断器
+
+    连续失败达到阈值后进入断开状态，在退避时间内所有请求立即失败，
+    不再阻塞在注定超时的请求上；退避结束后进入半开状态并只放行一个探测请求，
+    探测成功则恢复，失败则以更长的退避时间重新断开。
+    退避时间按指数增长并加入随机抖动，避免设备群在服务恢复时同时重连。
+    """
+
+    def __init__(self, failure_threshold=3, base_delay=5.0, max_delay=300.0, jitter=0.5, on_state_change=None,
+                 clock=None):
+        """
+        初始化熔断器
+
+        Args:
+            failure_threshold (int, optional): 连续失败多少次后断开
+            base_delay (float, optional): 首次断开的退避时间（秒）
+            max_delay (float, optional): 最长退避时间（秒）
+            jitter (float, optional): 抖动比例，实际退避时间在 [delay * (1 - jitter), delay] 之间
+            on_state_change (callable, optional): 状态变化回调 on_state_change(old_state, new_state)
+            clock (callable, optional): 计算退避到期的单调时钟，默认为time.monotonic（测试时传入虚拟时钟）
+        """
+        self.failure_threshold = max(1, failure_threshold)
+        self.base_delay = base_delay
+        self.max_delay = max(max_delay, base_delay)
+        self.jitter = min(max(jitter, 0.0), 1.0)
+        self.on_state_change = on_state_change
+        self.clock = clock or time.monotonic
+
+        self.state = CLOSED
+        self.failures = 0
+        self.open_count = 0
+        self.retry_at = 0.0
+        self.probe_in_flight = False
+
+        # 统计
+        self.short_circuited = 0
+        self.probes = 0
+        self.trips = 0
+        self.last_state_change = time.time()
+
+        self.lock = threading.Lock()
+
+    def _backoff(self):
+        """计算本次断开的退避时间（指数增长，加抖动）"""
+        delay = min(self.base_delay * 2 ** max(self.open_count - 1, 0), self.max_delay)
+        return delay * (1 - random.uniform(0, self.jitter))
+
+    def _transition(self, state):
+        """
+        切换状态（调用方持有锁）
+
+        Returns:
+            tuple: (旧状态, 新状态)，状态未变化时返回None
+        """
+        if state == self.state:
+            return None
+        old_state = self.state
+        self.state = state
+        self.last_state_change = time.time()
+        return old_state, state
+
+    def _notify(self, change):
+        """在锁外调用状态变化回调"""
+        if change and self.on_state_change:
+            try:
+                self.on_state_change(*change)
+            except Exception as e:
+                logger.error(f"熔断器状态回调出错: {str(e)}")
+
+    def allow_request(self):
+        """
+        判断是否放行请求
+
+        断开状态下退避时间到期后转为半开，并放行一个探测请求。
+
+        Returns:
+            bool: 是否放行
+        """
+        change = None
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+
+            if self.state == OPEN and self.clock() >= self.retry_at:
+                change = self._transition(HALF_OPEN)
+
+            if self.state == HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                self.probes += 1
+                allowed = True
+            else:
+                self.short_circuited += 1
+                allowed = False
+
+        self._notify(change)
+        return allowed
+
+    def record_success(self):
+        """记录请求成功（半开状态下探测成功则恢复）"""
+        change = None
+        with self.lock:
+            self.failures = 0
+            self.probe_in_flight = False
+            if self.state != CLOSED:
+                self.open_count = 0
+                change = self._transition(CLOSED)
+                logger.info("云平台链路恢复，熔断器关闭")
+
+        self._notify(change)
+
+    def record_failure(self):
+        """记录请求失败（连续失败达到阈值或探测失败时断开）"""
+        change = None
+        with self.lock:
+            self.failures += 1
+            self.probe_in_flight = False
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self.open_count += 1
+                self.trips += 1
+                delay = self._backoff()
+                self.retry_at = self.clock() + delay
+                change = self._transition(OPEN)
+                logger.warning(f"云平台链路不可用，熔断 {delay:.1f} 秒后探测")
+
+        self._notify(change)
+
+    def release(self):
+        """放弃已放行但未实际发出的请求（不计成功或失败），半开状态下允许下一个探测"""
+        with self.lock:
+            self.probe_in_flight = False
+
+    def retry_in(self):
+        """
+        获取距离下次探测的时间
+
+        Returns:
+            float: 秒数，非断开状态时为0
+        """
+        with self.lock:
+            if self.state != OPEN:
+                return 0.0
+            return max(self.retry_at - self.clock(), 0.0)
+
+    def reset(self):
+        """强制恢复到关闭状态"""
+        change = None
+        with self.lock:
+            self.failures = 0
+            self.open_count = 0
+            self.probe_in_flight = False
+            change = self._transition(CLOSED)
+
+        self._notify(change)
+
+    def get_stats(self):
+        """
+        获取熔断器统计
+
+        Returns:
+            dict: 状态、连续失败次数、短路请求数等
+        """
+        with self.lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'retry_in': max(self.retry_at - self.clock(), 0.0) if self.state == OPEN else 0.0,
+                'trips': self.trips,
+                'probes': self.probes,
+                'short_circuited': self.short_circuited,
+                'last_state_change': self.last_state_change
+            }
@@ -6,13 +6,28 @@
 """
 
 import os
+import copy
 import time
 import json
 import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 from src.utils.logger import get_logger
+from src.cloud.cache_journal import CacheJournal
+from src.cloud.offline_store import OfflineStore
+from src.cloud.telemetry_rollup import TelemetryRollup
+from src.cloud.http_session import CloudHttpSession
+from src.cloud.circuit_breaker import CircuitBreaker, OPEN, HALF_OPEN, CLOSED
+from src.cloud.traffic_shaper import TrafficShaper, TrafficBudgetExceeded, classify_endpoint
+from src.cloud.push_transport import PushTransport
+from src.cloud.endpoint_selector import EndpointSelector
+from src.cloud.report_queue import ReportQueue
+from src.cloud.record_sequence import RecordSequence
+from src.cloud.status_delta import StatusDeltaEncoder
+from src.cloud.ota_downloader import OtaDownloader
+from src.cloud.scheduler import TaskScheduler
 
 logger = get_logger('cloud_manager')
 
@@ -20,7 +35,36 @@ logger = get_logger('cloud_manager')
 class CloudManager:
     """云平台管理类"""
     
-    def __init__(self, config=None, device_id=None, simulation=False):
+    # 离线缓存类别
+    CACHE_CATEGORIES = ('status', 'transaction', 'error', 'warning', 'replenishment')
+    
+    # 类别名称（用于日志）
+    CATEGORY_NAMES = {
+        'status': '设备状态',
+        'transaction': '交易记录',
+        'error': '错误',
+        'warning': '警告',
+        'replenishment': '补货需求'
+    }
+    
+    # 单条上报端点
+    REPORT_ENDPOINTS = {
+        'status': '/device/status',
+        'transaction': '/device/transaction',
+        'error': '/device/error',
+        'warning': '/device/warning',
+        'replenishment': '/device/replenishment'
+    }
+    
+    # 批量上报端点及记录字段名
+    BATCH_ENDPOINTS = {
+        'transaction': ('/device/transactions_batch', 'transactions'),
+        'error': ('/device/errors_batch', 'errors'),
+        'warning': ('/device/warnings_batch', 'warnings'),
+        'replenishment': ('/device/replenishments_batch', 'replenishments')
+    }
+    
+    def __init__(self, config=None, device_id=None, simulation=False, config_manager=None):
         """
         初始化云平台管理器
         
@@ -28,10 +72,12 @@ class CloudManager:
             config (dict, optional): 云平台配置
             device_id (str, optional): 设备ID
             simulation (bool, optional): 是否使用模拟模式
+            config_manager (ConfigManager, optional): 配置管理器，云端下发的配置更新合并到其中
         """
         self.config = config or {}
         self.device_id = device_id or 'UNKNOWN'
         self.simulation = simulation
+        self.config_manager = config_manager
         
         # 云平台配置
         self.server_url = self.config.get('server_url', 'https://api.smartfridge.example.com')
@@ -40,10 +86,45 @@ class CloudManager:
         self.heartbeat_interval = self.config.get('heartbeat_interval', 30)
         self.data_sync_interval = self.config.get('data_sync_interval', 300)
         
+        # 区域接入点（按延迟选择最快的健康接入点，请求失败时故障转移）
+        selection_config = self.config.get('endpoint_selection', {})
+        self.endpoint_selector = EndpointSelector(
+            self.config.get('server_urls') or [self.server_url],
+            switch_margin=selection_config.get('switch_margin', 0.3),
+            failure_cooldown=selection_config.get('failure_cooldown', 60.0),
+            on_switch=self._on_endpoint_switch
+        )
+        self.server_url = self.endpoint_selector.url
+        self.endpoint_probe_interval = selection_config.get('probe_interval', 300)
+        self.endpoint_probe_timeout = selection_config.get('probe_timeout', 2.0)
+        self.max_failover_attempts = selection_config.get('max_failover_attempts', 2)
+        
         # OTA更新配置
         self.ota_config = self.config.get('ota_update', {})
         self.ota_enabled = self.ota_config.get('enabled', True)
         self.ota_check_interval = self.ota_config.get('check_interval', 3600)
+        self.ota_progress = {'version': None, 'downloaded': 0, 'total': None}
+        
+        # 数据目录（可由配置指定，便于在同一台机器上模拟多台设备）
+        self.data_dir = self.config.get('data_dir') or os.path.join(
+            os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data')
+        os.makedirs(self.data_dir, exist_ok=True)
+        
+        # 流量整形（按优先级分类的带宽预算和月流量上限）
+        shaping_config = self.config.get('traffic_shaping', {})
+        self.traffic_shaper = TrafficShaper(
+            bytes_per_second=shaping_config.get('bytes_per_second', 0),
+            burst_bytes=shaping_config.get('burst_bytes', 64 * 1024),
+            monthly_cap_bytes=shaping_config.get('monthly_cap_bytes', 0),
+            cap_ratios=shaping_config.get('cap_ratios'),
+            usage_file=os.path.join(self.data_dir, f'traffic_usage_{self.device_id}.json')
+        )
+        
+        # HTTP长连接会话
+        self.http_session = CloudHttpSession(self.config.get('http', {}), headers={
+            'Authorization': f"Bearer {self.api_key}",
+            'User-Agent': f"SmartVendingFridge/{self.device_id}"
+        }, traffic_shaper=self.traffic_shaper, traffic_wait_timeout=shaping_config.get('max_wait', 30.0))
         
         # 连接状态
         self.connected = False
@@ -52,60 +133,176 @@ class CloudManager:
         self.last_sync_time = 0
         self.last_ota_check_time = 0
         
-        # 数据缓存
-        self.status_cache = []
-        self.transaction_cache = []
-        self.error_cache = []
-        self.warning_cache = []
-        self.replenishment_cache = []
-        self.max_cache_size = 1000
+        # 链路熔断器（连续失败后短路请求，退避结束后半开探测）
+        breaker_config = self.config.get('circuit_breaker', {})
+        self.circuit_breaker = CircuitBreaker(
+            failure_threshold=breaker_config.get('failure_threshold', 3),
+            base_delay=breaker_config.get('base_delay', 5.0),
+            max_delay=breaker_config.get('max_delay', 300.0),
+            jitter=breaker_config.get('jitter', 0.5),
+            on_state_change=self._on_link_state_change
+        )
+        
+        # 传输方式：http为逐个请求，push为长连接推送通道（上报以QoS 1发布，保活ping代替HTTP心跳，
+        # 服务器可随时下发命令；配置拉取和OTA下载仍使用HTTP）
+        self.transport = self.config.get('transport', 'http')
+        self.command_handlers = {'config': self._on_config_command}
+        self.push_transport = None
+        if self.transport == 'push':
+            push_config = self.config.get('push', {})
+            self.push_transport = PushTransport(
+                push_config.get('host', 'localhost'),
+                push_config.get('port', 1883),
+                self.device_id,
+                token=self.api_key,
+                keepalive=push_config.get('keepalive', self.heartbeat_interval),
+                ack_timeout=push_config.get('ack_timeout', 10.0),
+                connect_timeout=push_config.get('connect_timeout', 5.0),
+                on_disconnect=self._on_push_disconnect,
+                traffic_shaper=self.traffic_shaper
+            )
+            self.push_transport.subscribe(f"devices/{self.device_id}/commands/#", self._on_push_command)
+        
+        # 缓存重放配置
+        replay_config = self.config.get('replay', {})
+        self.replay_chunk_size = replay_config.get('chunk_size', 100)
+        self.replay_workers = replay_config.get('max_workers', 4)
+        
+        # 非阻塞上报队列
+        queue_config = self.config.get('report_queue', {})
+        self.report_queue = ReportQueue(
+            self._send_report_batch,
+            overflow_handler=self._cache_report,
+            max_size=queue_config.get('max_size', 500),
+            batch_size=queue_config.get('batch_size', 50),
+            max_age=queue_config.get('max_age', 2.0)
+        )
+        
+        # 状态增量编码
+        delta_config = self.config.get('status_delta', {})
+        self.status_delta_enabled = delta_config.get('enabled', True)
+        self.status_encoder = StatusDeltaEncoder(
+            keyframe_interval=delta_config.get('keyframe_interval', 30),
+            keyframe_max_age=delta_config.get('keyframe_max_age', 3600)
+        )
+        
+        # 配置同步（条件请求，可选长轮询）
+        config_sync = self.config.get('config_sync', {})
+        self.config_check_interval = config_sync.get('interval', self.report_interval * 10)
+        self.config_long_poll = config_sync.get('long_poll', False)
+        self.config_long_poll_timeout = config_sync.get('long_poll_timeout', 60)
+        self.config_etag = None
+        self.config_version = None
         
         # 线程控制
         self.running = False
         self.cloud_thread = None
+        self.config_poll_thread = None
+        self.config_poll_stop = threading.Event()
+        self.scheduler = None
         
-        # 数据目录
-        self.data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data')
-        os.makedirs(self.data_dir, exist_ok=True)
+        # 记录序号（设备ID+单调序号组成幂等键，服务器据此丢弃重复上报）
+        self.record_sequence = RecordSequence(os.path.join(self.data_dir, f'record_seq_{self.device_id}.json'))
         
-        # 缓存文件
+        # 已应用的配置版本
+        self.config_version_file = os.path.join(self.data_dir, f'config_version_{self.device_id}.json')
+        self._load_config_version()
+        
+        # 缓存文件（旧版整文件JSON缓存，仅用于迁移）
         self.cache_file = os.path.join(self.data_dir, f'cloud_cache_{self.device_id}.json')
         
+        # 缓存预写日志
+        journal_config = self.config.get('cache_journal', {})
+        self.cache_journal = CacheJournal(
+            os.path.join(self.data_dir, f'cloud_journal_{self.device_id}'),
+            segment_max_bytes=journal_config.get('segment_max_bytes', 256 * 1024),
+            fsync_batch=journal_config.get('fsync_batch', 16),
+            fsync_interval=journal_config.get('fsync_interval', 2.0),
+            on_pending=self._on_journal_pending,
+            record_format=journal_config.get('record_format', 'json')
+        )
+        self.cache_save_interval = journal_config.get('save_interval', 300)
+        
+        # 离线存储（按优先级分通道，按字节配额淘汰）
+        store_config = self.config.get('offline_store', {})
+        self.offline_store = OfflineStore(
+            self.cache_journal,
+            lanes=store_config.get('lanes'),
+            max_memory_bytes=store_config.get('max_memory_bytes', 1024 * 1024),
+            max_disk_bytes=store_config.get('max_disk_bytes', 64 * 1024 * 1024),
+            page_size=store_config.get('page_size', self.replay_chunk_size)
+        )
+        
+        # 离线遥测汇总（替代缓存完整状态快照）
+        rollup_config = self.config.get('telemetry_rollup', {})
+        self.telemetry_rollup = None
+        self.rollup_file = os.path.join(self.data_dir, f'telemetry_rollup_{self.device_id}.bin')
+        if rollup_config.get('enabled', True):
+            self.telemetry_rollup = TelemetryRollup(
+                minute_slots=rollup_config.get('minute_slots', 1440),
+                hour_slots=rollup_config.get('hour_slots', 168)
+            )
+        
         # 加载缓存
         self._load_cache()
         
         logger.info(f"云平台管理器初始化完成，{'模拟' if simulation else '实际'}模式")
     
     def _load_cache(self):
-        """加载缓存数据"""
+        """加载缓存数据（从预写日志恢复）"""
         try:
+            recovered = self.cache_journal.recover()
+            self.offline_store.load(recovered)
+            
+            # 迁移旧版整文件JSON缓存
             if os.path.exists(self.cache_file):
-                with open(self.cache_file, 'r', encoding='utf-8') as f:
-                    cache = json.load(f)
-                
-                self.status_cache = cache.get('status_cache', [])
-                self.transaction_cache = cache.get('transaction_cache', [])
-                self.error_cache = cache.get('error_cache', [])
-                self.warning_cache = cache.get('warning_cache', [])
-                self.replenishment_cache = cache.get('replenishment_cache', [])
-                
-                logger.info(f"加载云平台缓存: {len(self.status_cache)} 状态, {len(self.transaction_cache)} 交易")
+                self._migrate_legacy_cache()
+            
+            if self.telemetry_rollup:
+                self.telemetry_rollup.load(self.rollup_file)
+            
+            store = self.offline_store
+            logger.info(f"加载云平台缓存: {store.count('status')} 状态, {store.count('transaction')} 交易")
         except Exception as e:
             logger.error(f"加载云平台缓存失败: {str(e)}")
     
+    def _migrate_legacy_cache(self):
+        """将旧版JSON缓存文件导入预写日志"""
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                content = f.read()
+            cache = json.loads(content) if content.strip() else {}
+            
+            for category in self.CACHE_CATEGORIES:
+                for record in cache.get(f'{category}_cache', []):
+                    self.offline_store.append(category, record)
+            
+            self.cache_journal.sync()
+            os.replace(self.cache_file, self.cache_file + '.migrated')
+            logger.info(f"迁移旧版云平台缓存: {self.cache_file}")
+        except Exception as e:
+            logger.error(f"迁移旧版云平台缓存失败: {str(e)}")
+    
+    def _sync_journal(self):
+        """落盘缓存预写日志（只对日志段执行fsync，由未落盘写入触发）"""
+        try:
+            self.cache_journal.sync()
+        except Exception as e:
+            logger.error(f"缓存日志落盘失败: {str(e)}")
+    
     def _save_cache(self):
-        """保存缓存数据"""
+        """保存缓存数据（按较慢的周期检查磁盘预算，落盘预写日志、遥测汇总和流量统计，并按需压缩已确认记录）"""
         try:
-            cache = {
-                'status_cache': self.status_cache[-self.max_cache_size:] if len(self.status_cache) > self.max_cache_size else self.status_cache,
-                'transaction_cache': self.transaction_cache[-self.max_cache_size:] if len(self.transaction_cache) > self.max_cache_size else self.transaction_cache,
-                'error_cache': self.error_cache[-self.max_cache_size:] if len(self.error_cache) > self.max_cache_size else self.error_cache,
-                'warning_cache': self.warning_cache[-self.max_cache_size:] if len(self.warning_cache) > self.max_cache_size else self.warning_cache,
-                'replenishment_cache': self.replenishment_cache[-self.max_cache_size:] if len(self.replenishment_cache) > self.max_cache_size else self.replenishment_cache
-            }
+            self.offline_store.enforce_disk_budget()
+            self.cache_journal.sync()
             
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(cache, f, ensure_ascii=False)
+            if self.telemetry_rollup:
+                self.telemetry_rollup.save(self.rollup_file)
+            
+            self.traffic_shaper.save()
+            
+            if self.cache_journal.needs_compaction():
+                self.cache_journal.compact()
             
             logger.debug("保存云平台缓存")
         except Exception as e:
@@ -119,10 +316,20 @@ class CloudManager:
         
         self.running = True
         
+        # 启动上报发送线程
+        self.report_queue.start()
+        
         # 启动云平台线程
+        self.scheduler = self._create_scheduler()
         self.cloud_thread = threading.Thread(target=self._cloud_monitor, daemon=True)
         self.cloud_thread.start()
         
+        # 长轮询模式下配置同步使用独立线程，避免阻塞调度器
+        if self.config_long_poll:
+            self.config_poll_stop.clear()
+            self.config_poll_thread = threading.Thread(target=self._config_poll_loop, daemon=True)
+            self.config_poll_thread.start()
+        
         logger.info("云平台管理器启动完成")
     
     def stop(self):
@@ -132,13 +339,23 @@ class CloudManager:
             return
         
         self.running = False
+        self.scheduler.stop()
+        self.config_poll_stop.set()
         
         # 等待线程结束
         if self.cloud_thread and self.cloud_thread.is_alive():
             self.cloud_thread.join(timeout=2.0)
+        if self.config_poll_thread and self.config_poll_thread.is_alive():
+            self.config_poll_thread.join(timeout=2.0)
+        
+        # 停止上报队列，未发出的记录转入离线缓存
+        self.report_queue.stop()
+        for category, record in self.report_queue.drain():
+            self._cache_report(category, record)
         
         # 保存缓存
         self._save_cache()
+        self.cache_journal.close()
         
         # 断开连接
         if self.connected:
@@ -148,6 +365,11 @@ class CloudManager:
             })
             self.connected = False
         
+        # 关闭推送通道，释放连接池
+        if self.push_transport:
+            self.push_transport.close()
+        self.http_session.close()
+        
         logger.info("云平台管理器停止完成")
     
     def connect(self):
@@ -177,13 +399,13 @@ class CloudManager:
     
     def report_status(self, status):
         """
-        上报设备状态
+        上报设备状态（入队后立即返回，由后台线程发送）
         
         Args:
             status (dict): 设备状态
         
         Returns:
-            bool: 是否上报成功
+            bool: 是否上报成功（异步模式下为是否入队成功）
         """
         if not self.connected:
             # 缓存状态
@@ -191,225 +413,441 @@ class CloudManager:
             logger.debug("未连接到云平台，缓存状态")
             return False
         
-        try:
-            # 添加设备ID和时间戳
-            status_data = status.copy()
-            status_data.update({
-                'device_id': self.device_id,
-                'timestamp': time.time()
-            })
-            
-            # 发送状态
-            response = self._send_request('/device/status', status_data)
-            
-            if response and response.get('status') == 'success':
-                logger.info("成功上报设备状态")
-                self.last_report_time = time.time()
-                return True
-            else:
-                # 缓存状态
-                self._cache_status(status)
-                logger.warning(f"上报设备状态失败: {response}")
-                return False
-        except Exception as e:
-            # 缓存状态
-            self._cache_status(status)
-            logger.error(f"上报设备状态出错: {str(e)}")
-            return False
+        # 添加设备ID和时间戳（深拷贝，状态字典会在主循环中被原地修改）
+        status_data = copy.deepcopy(status)
+        status_data.update({
+            'device_id': self.device_id,
+            'timestamp': time.time()
+        })
+        
+        return self._submit_report('status', status_data)
     
     def report_transaction(self, transaction):
         """
-        上报交易记录
+        上报交易记录（入队后立即返回，由后台线程发送）
         
         Args:
             transaction (dict): 交易记录
         
         Returns:
-            bool: 是否上报成功
+            bool: 是否上报成功（异步模式下为是否入队成功）
         """
+        # 分配幂等键，重试和缓存重放时随记录一起发送
+        transaction = self._with_idempotency_key(transaction)
+        
         if not self.connected:
             # 缓存交易
             self._cache_transaction(transaction)
             logger.debug("未连接到云平台，缓存交易")
             return False
         
-        try:
-            # 添加设备ID
-            transaction_data = transaction.copy()
-            transaction_data.update({
-                'device_id': self.device_id,
-                'report_time': time.time()
-            })
-            
-            # 发送交易
-            response = self._send_request('/device/transaction', transaction_data)
-            
-            if response and response.get('status') == 'success':
-                logger.info(f"成功上报交易记录: {transaction.get('id')}")
-                return True
-            else:
-                # 缓存交易
-                self._cache_transaction(transaction)
-                logger.warning(f"上报交易记录失败: {response}")
-                return False
-        except Exception as e:
-            # 缓存交易
-            self._cache_transaction(transaction)
-            logger.error(f"上报交易记录出错: {str(e)}")
-            return False
+        # 添加设备ID
+        transaction_data = transaction
+        transaction_data.update({
+            'device_id': self.device_id,
+            'report_time': time.time()
+        })
+        
+        return self._submit_report('transaction', transaction_data)
     
     def report_error(self, error):
         """
-        上报错误
+        上报错误（入队后立即返回，由后台线程发送）
         
         Args:
             error (dict): 错误信息
         
         Returns:
-            bool: 是否上报成功
+            bool: 是否上报成功（异步模式下为是否入队成功）
         """
+        # 分配幂等键，重试和缓存重放时随记录一起发送
+        error = self._with_idempotency_key(error)
+        
         if not self.connected:
             # 缓存错误
             self._cache_error(error)
             logger.debug("未连接到云平台，缓存错误")
             return False
         
-        try:
-            # 添加设备ID
-            error_data = error.copy()
-            error_data.update({
-                'device_id': self.device_id,
-                'report_time': time.time()
-            })
-            
-            # 发送错误
-            response = self._send_request('/device/error', error_data)
-            
-            if response and response.get('status') == 'success':
-                logger.info(f"成功上报错误: {error.get('message')}")
-                return True
-            else:
-                # 缓存错误
-                self._cache_error(error)
-                logger.warning(f"上报错误失败: {response}")
-                return False
-        except Exception as e:
-            # 缓存错误
-            self._cache_error(error)
-            logger.error(f"上报错误出错: {str(e)}")
-            return False
+        # 添加设备ID
+        error_data = error
+        error_data.update({
+            'device_id': self.device_id,
+            'report_time': time.time()
+        })
+        
+        return self._submit_report('error', error_data)
     
     def report_warning(self, warning):
         """
-        上报警告
+        上报警告（入队后立即返回，由后台线程发送）
         
         Args:
             warning (dict): 警告信息
         
         Returns:
-            bool: 是否上报成功
+            bool: 是否上报成功（异步模式下为是否入队成功）
         """
+        # 分配幂等键，重试和缓存重放时随记录一起发送
+        warning = self._with_idempotency_key(warning)
+        
         if not self.connected:
             # 缓存警告
             self._cache_warning(warning)
             logger.debug("未连接到云平台，缓存警告")
             return False
         
-        try:
-            # 添加设备ID
-            warning_data = warning.copy()
-            warning_data.update({
-                'device_id': self.device_id,
-                'report_time': time.time()
-            })
-            
-            # 发送警告
-            response = self._send_request('/device/warning', warning_data)
-            
-            if response and response.get('status') == 'success':
-                logger.info(f"成功上报警告: {warning.get('message')}")
-                return True
-            else:
-                # 缓存警告
-                self._cache_warning(warning)
-                logger.warning(f"上报警告失败: {response}")
-                return False
-        except Exception as e:
-            # 缓存警告
-            self._cache_warning(warning)
-            logger.error(f"上报警告出错: {str(e)}")
-            return False
+        # 添加设备ID
+        warning_data = warning
+        warning_data.update({
+            'device_id': self.device_id,
+            'report_time': time.time()
+        })
+        
+        return self._submit_report('warning', warning_data)
     
     def report_replenishment_needs(self, replenishment_needs):
         """
-        上报补货需求
+        上报补货需求（入队后立即返回，由后台线程发送）
         
         Args:
             replenishment_needs (dict): 补货需求
         
         Returns:
-            bool: 是否上报成功
+            bool: 是否上报成功（异步模式下为是否入队成功）
         """
+        # 分配幂等键，重试和缓存重放时随记录一起发送
+        replenishment_needs = self._with_idempotency_key(replenishment_needs)
+        
         if not self.connected:
             # 缓存补货需求
             self._cache_replenishment(replenishment_needs)
             logger.debug("未连接到云平台，缓存补货需求")
             return False
         
+        # 添加设备ID
+        replenishment_data = replenishment_needs
+        replenishment_data.update({
+            'device_id': self.device_id,
+            'report_time': time.time()
+        })
+        
+        return self._submit_report('replenishment', replenishment_data)
+    
+    def _with_idempotency_key(self, record):
+        """
+        复制记录并分配幂等键（已有幂等键的记录保持不变）
+        
+        Args:
+            record (dict): 上报记录
+        
+        Returns:
+            dict: 带record_epoch、record_seq和idempotency_key的记录副本（分配失败时不带幂等键）
+        """
+        record = record.copy()
+        if 'idempotency_key' not in record:
+            try:
+                epoch, seq = self.record_sequence.next()
+            except Exception as e:
+                logger.error(f"分配幂等键失败: {str(e)}")
+                return record
+            record['record_epoch'] = epoch
+            record['record_seq'] = seq
+            record['idempotency_key'] = f"{self.device_id}:{epoch}:{seq}" if epoch else f"{self.device_id}:{seq}"
+        return record
+    
+    def _submit_report(self, category, record):
+        """
+        提交上报记录：发送线程运行时入队，否则同步发送
+        
+        Args:
+            category (str): 记录类别
+            record (dict): 记录内容
+        
+        Returns:
+            bool: 是否入队或发送成功
+        """
+        if self.report_queue.running:
+            return self.report_queue.put(category, record)
+        
+        return self._send_report_batch(category, [record])
+    
+    def _send_report_batch(self, category, records):
+        """
+        发送同一类别的一批上报记录，失败的记录写入离线缓存
+        
+        Args:
+            category (str): 记录类别
+            records (list): 记录列表
+        
+        Returns:
+            bool: 是否发送成功
+        """
         try:
-            # 添加设备ID
-            replenishment_data = replenishment_needs.copy()
-            replenishment_data.update({
-                'device_id': self.device_id,
-                'report_time': time.time()
-            })
-            
-            # 发送补货需求
-            response = self._send_request('/device/replenishment', replenishment_data)
+            if category == 'status':
+                # 状态为快照，合并后只发送最新一条
+                records = records[-1:]
+                return self._send_status(records[0])
+            elif len(records) == 1:
+                response = self._send_request(self.REPORT_ENDPOINTS[category], records[0])
+            else:
+                endpoint, key = self.BATCH_ENDPOINTS[category]
+                response = self._send_request(endpoint, {
+                    'device_id': self.device_id,
+                    'timestamp': time.time(),
+                    key: records
+                })
             
             if response and response.get('status') == 'success':
-                logger.info(f"成功上报补货需求: {len(replenishment_needs.get('products', []))} 种商品")
+                if category == 'status':
+                    self.last_report_time = time.time()
+                logger.info(f"成功上报{self.CATEGORY_NAMES[category]}: {len(records)} 条")
                 return True
-            else:
-                # 缓存补货需求
-                self._cache_replenishment(replenishment_needs)
-                logger.warning(f"上报补货需求失败: {response}")
-                return False
+            
+            logger.warning(f"上报{self.CATEGORY_NAMES[category]}失败: {response}")
         except Exception as e:
-            # 缓存补货需求
-            self._cache_replenishment(replenishment_needs)
-            logger.error(f"上报补货需求出错: {str(e)}")
-            return False
+            logger.error(f"上报{self.CATEGORY_NAMES[category]}出错: {str(e)}")
+        
+        # 发送失败，写入离线缓存
+        for record in records:
+            self._cache_report(category, record)
+        return False
     
-    def get_config_update(self):
+    def _send_status(self, status_data):
+        """
+        发送状态（启用增量编码时只发送相对于最后确认快照的变化）
+        
+        Args:
+            status_data (dict): 带设备ID和时间戳的完整状态
+        
+        Returns:
+            bool: 是否发送成功
+        """
+        if not self.status_delta_enabled:
+            payload = status_data
+            seq = None
+        else:
+            state = {k: v for k, v in status_data.items() if k not in ('device_id', 'timestamp')}
+            payload = self.status_encoder.encode(state)
+            payload.update({
+                'device_id': self.device_id,
+                'timestamp': status_data.get('timestamp', time.time())
+            })
+            seq = payload['status_seq']
+            self.status_encoder.record_size(
+                len(json.dumps(status_data, ensure_ascii=False, separators=(',', ':'))),
+                len(json.dumps(payload, ensure_ascii=False, separators=(',', ':')))
+            )
+        
+        try:
+            response = self._send_request(self.REPORT_ENDPOINTS['status'], payload)
+        except Exception as e:
+            response = None
+            logger.error(f"上报设备状态出错: {str(e)}")
+        
+        if response and response.get('status') == 'success':
+            if seq is not None:
+                # 服务器无法应用增量（如缺少基准快照）时要求重新同步
+                if (response.get('data') or {}).get('resync'):
+                    self.status_encoder.reject(seq)
+                    self.status_encoder.request_resync()
+                else:
+                    self.status_encoder.acknowledge(seq)
+            self.last_report_time = time.time()
+            logger.info("成功上报设备状态")
+            return True
+        
+        if seq is not None:
+            self.status_encoder.reject(seq)
+        if response:
+            logger.warning(f"上报设备状态失败: {response}")
+        
+        # 发送失败，缓存完整状态
+        self._cache_status(status_data)
+        return False
+    
+    def get_status_delta_stats(self):
+        """
+        获取状态增量编码统计
+        
+        Returns:
+            dict: 统计数据
+        """
+        return self.status_encoder.get_stats()
+    
+    def _cache_report(self, category, record):
+        """按类别缓存上报记录"""
+        getattr(self, f'_cache_{category}')(record)
+    
+    def get_report_queue_stats(self):
+        """
+        获取上报队列统计（队列深度、丢弃计数等）
+        
+        Returns:
+            dict: 统计数据
+        """
+        return self.report_queue.get_stats()
+    
+    def _load_config_version(self):
+        """加载已应用的配置版本和ETag"""
+        try:
+            if os.path.exists(self.config_version_file):
+                with open(self.config_version_file, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+                self.config_etag = state.get('etag')
+                self.config_version = state.get('version')
+        except Exception as e:
+            logger.error(f"加载配置版本失败: {str(e)}")
+    
+    def _save_config_version(self, etag, version):
+        """
+        保存已应用的配置版本和ETag
+        
+        Args:
+            etag (str): 服务器返回的ETag
+            version: 服务器返回的配置版本号
+        """
+        if etag == self.config_etag and version == self.config_version:
+            return
+        
+        self.config_etag = etag
+        self.config_version = version
+        try:
+            temp_file = self.config_version_file + '.tmp'
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump({'etag': etag, 'version': version}, f)
+            os.replace(temp_file, self.config_version_file)
+        except Exception as e:
+            logger.error(f"保存配置版本失败: {str(e)}")
+    
+    def get_config_update(self, wait=None):
         """
         获取配置更新
         
+        携带上次的ETag发送条件请求，配置未变化时服务器返回304，不传输配置内容；
+        有变化时服务器只返回自该版本以来变化的配置项，合并到配置管理器中。
+        
+        Args:
+            wait (float, optional): 长轮询等待时间（秒），服务器在配置变化或超时前保持请求
+        
         Returns:
-            dict: 配置更新
+            dict: 配置更新（未变化时为空字典），失败时返回None
         """
         if not self.connected:
             logger.debug("未连接到云平台，无法获取配置更新")
             return None
         
+        if self.simulation:
+            return {}
+        
+        endpoint = '/device/config'
+        params = {'device_id': self.device_id}
+        headers = {}
+        if self.config_version is not None:
+            params['version'] = self.config_version
+        if self.config_etag:
+            headers['If-None-Match'] = self.config_etag
+        
+        timeout = None
+        if wait:
+            # 读取超时需要比服务器保持请求的时间更长
+            params['wait'] = wait
+            connect_timeout, read_timeout = self.http_session.get_timeout(endpoint)
+            timeout = (connect_timeout, wait + read_timeout)
+        
+        if not self.circuit_breaker.allow_request():
+            logger.debug("云平台链路熔断中，跳过配置检查")
+            return None
+        
+        base_url = self.server_url
         try:
-            # 发送请求
-            response = self._send_request('/device/config', {
-                'device_id': self.device_id,
-                'timestamp': time.time()
-            })
+            response = self.http_session.get(f"{base_url}{endpoint}", endpoint,
+                                             params=params, headers=headers, timeout=timeout)
+            if response.status_code == 304:
+                self.circuit_breaker.record_success()
+                logger.debug("云端配置未变化")
+                return {}
             
-            if response and response.get('status') == 'success':
-                config_update = response.get('data', {})
-                if config_update:
-                    logger.info(f"获取配置更新: {config_update}")
-                return config_update
-            else:
-                logger.warning(f"获取配置更新失败: {response}")
-                return None
-        except Exception as e:
+            response.raise_for_status()
+            self.circuit_breaker.record_success()
+            result = self.http_session.decode_response(response)
+        except TrafficBudgetExceeded as e:
+            self.circuit_breaker.release()
+            logger.warning(f"流量整形拒绝配置检查: {str(e)}")
+            return None
+        except requests.exceptions.RequestException as e:
+            if self._is_link_failure(e):
+                # 下一次请求使用其他健康接入点
+                self.endpoint_selector.record_failure(base_url)
+            self._record_request_failure(e)
             logger.error(f"获取配置更新出错: {str(e)}")
             return None
+        except ValueError as e:
+            logger.error(f"解析配置更新出错: {str(e)}")
+            return None
+        
+        if not result or result.get('status') != 'success':
+            logger.warning(f"获取配置更新失败: {result}")
+            return None
+        
+        data = result.get('data') or {}
+        if 'config' in data:
+            config_update = data.get('config') or {}
+        else:
+            # 不支持版本化的旧服务器直接返回配置内容
+            config_update = {key: value for key, value in data.items() if key != 'version'}
+        
+        if config_update:
+            logger.info(f"获取配置更新: 版本 {data.get('version')}, {config_update}")
+            self._apply_config_update(config_update)
+        
+        self._save_config_version(response.headers.get('ETag'), data.get('version', self.config_version))
+        return config_update
+    
+    def _apply_config_update(self, config_update):
+        """
+        增量应用配置更新
+        
+        Args:
+            config_update (dict): 变化的配置项（与完整配置结构相同的嵌套字典）
+        """
+        if self.config_manager:
+            self.config_manager.update_config(config_update)
+        
+        cloud_update = config_update.get('cloud')
+        if not isinstance(cloud_update, dict):
+            return
+        
+        if not self.config_manager or self.config_manager.get_config().get('cloud') is not self.config:
+            # 云平台配置不是配置管理器中的同一字典时单独合并
+            self._merge_dict(self.config, cloud_update)
+        
+        # 调整定时任务间隔
+        for key, job in (('heartbeat_interval', 'heartbeat'), ('data_sync_interval', 'sync'), ('report_interval', None)):
+            if key in cloud_update:
+                setattr(self, key, cloud_update[key])
+                if job and self.scheduler:
+                    self.scheduler.set_interval(job, cloud_update[key])
+        
+        interval = (cloud_update.get('config_sync') or {}).get('interval')
+        if interval:
+            self.config_check_interval = interval
+            if self.scheduler:
+                self.scheduler.set_interval('config', interval)
+    
+    def _merge_dict(self, target, source):
+        """
+        递归合并字典
+        
+        Args:
+            target (dict): 目标字典
+            source (dict): 源字典
+        """
+        for key, value in source.items():
+            if key in target and isinstance(target[key], dict) and isinstance(value, dict):
+                self._merge_dict(target[key], value)
+            else:
+                target[key] = value
     
     def check_ota_update(self):
         """
@@ -464,14 +902,28 @@ class CloudManager:
                 logger.warning("更新信息中没有下载URL")
                 return False
             
-            # 下载文件
-            response = requests.get(download_url, timeout=300)
-            response.raise_for_status()
-            
-            # 保存文件
+            # 流式下载到文件（支持断点续传和SHA-256校验）
             update_file = os.path.join(self.data_dir, f"ota_update_{update_info.get('version')}.bin")
-            with open(update_file, 'wb') as f:
-                f.write(response.content)
+            self.ota_progress = {'version': update_info.get('version'), 'downloaded': 0, 'total': update_info.get('size')}
+            
+            # 下载器使用自己的会话，设备密钥不发往下载地址所在的主机
+            downloader = OtaDownloader(
+                chunk_size=self.ota_config.get('chunk_size', 64 * 1024),
+                max_bytes_per_second=self.ota_config.get('max_bytes_per_second', 0),
+                max_retries=self.ota_config.get('max_retries', 5),
+                progress_callback=self._on_ota_progress,
+                traffic_shaper=self.traffic_shaper
+            )
+            
+            try:
+                downloaded = downloader.download(download_url, update_file,
+                                                 expected_sha256=update_info.get('sha256'),
+                                                 expected_size=update_info.get('size'))
+            finally:
+                downloader.close()
+            if not downloaded:
+                logger.warning(f"下载OTA更新失败: {update_info.get('version')}")
+                return False
             
             logger.info(f"成功下载OTA更新: {update_file}")
             return True
@@ -479,6 +931,27 @@ class CloudManager:
             logger.error(f"下载OTA更新出错: {str(e)}")
             return False
     
+    def _on_ota_progress(self, downloaded, total):
+        """OTA下载进度回调"""
+        previous = self.ota_progress.get('downloaded', 0)
+        self.ota_progress.update({'downloaded': downloaded, 'total': total})
+        
+        # 每下载1MB记录一次进度
+        if downloaded // (1024 * 1024) != previous // (1024 * 1024):
+            if total:
+                logger.info(f"OTA下载进度: {downloaded}/{total} 字节 ({downloaded * 100 // total}%)")
+            else:
+                logger.info(f"OTA下载进度: {downloaded} 字节")
+    
+    def get_ota_progress(self):
+        """
+        获取OTA下载进度
+        
+        Returns:
+            dict: 版本、已下载字节数和总字节数
+        """
+        return dict(self.ota_progress)
+    
     def apply_ota_update(self, update_info):
         """
         应用OTA更新
@@ -548,25 +1021,275 @@ class CloudManager:
                 'data': {}
             }
         
-        # 实际请求
+        # 熔断期间立即失败，不阻塞在注定超时的请求上
+        if not self.circuit_breaker.allow_request():
+            logger.debug(f"云平台链路熔断中，跳过请求: {endpoint}")
+            return None
+        
+        if self.push_transport:
+            return self._publish(endpoint, data)
+        
+        # 实际请求（复用长连接），当前接入点链路故障时转移到下一个最快的健康接入点重试
+        # （记录带幂等键，重复送达由服务器去重）
+        base_url = self.server_url
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = self.http_session.post(f"{base_url}{endpoint}", endpoint, data)
+                response.raise_for_status()
+                break
+            except TrafficBudgetExceeded as e:
+                # 请求未发出，不影响熔断器对链路的判断
+                self.circuit_breaker.release()
+                logger.warning(f"流量整形拒绝请求 {endpoint}: {str(e)}")
+                return None
+            except requests.exceptions.RequestException as e:
+                if self._is_link_failure(e):
+                    alternative = self.endpoint_selector.record_failure(base_url)
+                    if alternative and attempt < self.max_failover_attempts:
+                        logger.warning(f"请求 {base_url} 失败，故障转移到 {alternative}: {str(e)}")
+                        base_url = alternative
+                        continue
+                self._record_request_failure(e)
+                logger.error(f"请求云平台失败: {str(e)}")
+                return None
+        
+        self.endpoint_selector.record_success(base_url)
+        self.circuit_breaker.record_success()
+        return self.http_session.decode_response(response)
+    
+    def _publish(self, endpoint, data):
+        """
+        通过推送通道发布上报（调用方已通过熔断器检查）
+        
+        端点 /device/xxx 对应主题 devices/{设备ID}/xxx，服务器的处理结果随确认返回。
+        
+        Args:
+            endpoint (str): API端点
+            data (dict): 上报数据
+        
+        Returns:
+            dict: 响应数据，未连接或确认超时时返回None
+        """
+        topic = f"devices/{self.device_id}/{endpoint[len('/device/'):]}"
         try:
-            url = f"{self.server_url}{endpoint}"
-            headers = {
-                'Content-Type': 'application/json',
-                'Authorization': f"Bearer {self.api_key}",
-                'User-Agent': f"SmartVendingFridge/{self.device_id}"
-            }
-            
-            response = requests.post(url, json=data, headers=headers, timeout=10)
-            response.raise_for_status()
-            
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            logger.error(f"请求云平台失败: {str(e)}")
+            if self.push_transport.is_connected() or self.push_transport.connect():
+                result = self.push_transport.publish(topic, data, traffic_class=classify_endpoint(endpoint))
+            else:
+                result = None
+        except TrafficBudgetExceeded as e:
+            self.circuit_breaker.release()
+            logger.warning(f"流量整形拒绝发布 {topic}: {str(e)}")
             return None
+        
+        if result is None:
+            self.circuit_breaker.record_failure()
+            logger.error(f"推送通道发布失败: {topic}")
+            return None
+        
+        self.circuit_breaker.record_success()
+        # 不返回处理结果的代理只确认送达
+        return result or {'status': 'success', 'timestamp': time.time(), 'data': {}}
+    
+    def _on_push_disconnect(self, reason):
+        """
+        推送通道断开回调：立即通过心跳任务重连（重连失败由熔断器计数）
+        
+        Args:
+            reason (str): 断开原因
+        """
+        scheduler = self.scheduler
+        if self.running and scheduler:
+            scheduler.trigger('heartbeat', self.circuit_breaker.retry_in())
+    
+    def _on_push_command(self, topic, payload):
+        """
+        处理服务器通过推送通道下发的命令（主题 devices/{设备ID}/commands/{命令}）
+        
+        Args:
+            topic (str): 主题
+            payload (dict): 命令内容
+        
+        Returns:
+            dict: 处理结果（随确认返回服务器）
+        """
+        command = topic.rsplit('/', 1)[-1]
+        handler = self.command_handlers.get(command)
+        if handler is None:
+            logger.warning(f"未知的云端命令: {command}")
+            return {'status': 'error', 'message': f"unknown command: {command}"}
+        
+        logger.info(f"收到云端命令: {command}")
+        return {'status': 'success', 'data': handler(payload) or {}}
+    
+    def register_command_handler(self, command, handler):
+        """
+        注册云端命令处理函数（如价格更新），在推送通道的读取线程中调用，应尽快返回
+        
+        Args:
+            command (str): 命令名
+            handler (callable): 处理函数 handler(payload)，返回值随确认发回服务器
+        """
+        self.command_handlers[command] = handler
+    
+    def _on_config_command(self, payload):
+        """
+        配置命令：携带配置内容时直接应用，只携带版本号时安排一次条件请求拉取变化的配置项
+        
+        Args:
+            payload (dict): 命令内容
+        
+        Returns:
+            dict: 处理结果
+        """
+        if 'config' in payload:
+            config_update = payload.get('config') or {}
+            if config_update:
+                self._apply_config_update(config_update)
+            self._save_config_version(payload.get('etag'), payload.get('version', self.config_version))
+            return {'version': self.config_version}
+        
+        if payload.get('version') != self.config_version and self.scheduler and not self.config_long_poll:
+            self.scheduler.trigger('config')
+        return {'version': self.config_version}
+    
+    def get_push_stats(self):
+        """
+        获取推送通道统计
+        
+        Returns:
+            dict: 统计数据，未使用推送通道时为空字典
+        """
+        return self.push_transport.get_stats() if self.push_transport else {}
+    
+    @staticmethod
+    def _is_link_failure(error):
+        """连接失败、超时和5xx为链路故障，4xx说明链路可达"""
+        response = getattr(error, 'response', None)
+        return response is None or response.status_code >= 500
+    
+    def _record_request_failure(self, error):
+        """
+        按请求异常更新熔断器
+        
+        Args:
+            error (RequestException): 请求异常
+        """
+        if self._is_link_failure(error):
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.record_success()
+    
+    def _probe_endpoints(self):
+        """
+        探测各接入点的往返延迟，并按结果重新选择接入点
+        
+        Returns:
+            bool: 是否有可用的接入点
+        """
+        endpoint = '/device/ping'
+        timeout = (self.endpoint_probe_timeout, self.endpoint_probe_timeout)
+        reachable = False
+        for base_url in self.endpoint_selector.get_urls():
+            start_time = time.perf_counter()
+            try:
+                # 任何HTTP响应（包括不支持探测端点的旧服务器返回的404）都说明接入点可达
+                response = self.http_session.get(f"{base_url}{endpoint}", endpoint, timeout=timeout)
+                rtt = time.perf_counter() - start_time if response.status_code < 500 else None
+            except TrafficBudgetExceeded:
+                return True
+            except requests.exceptions.RequestException:
+                rtt = None
+            self.endpoint_selector.record_probe(base_url, rtt)
+            reachable = reachable or rtt is not None
+        
+        self.endpoint_selector.reselect()
+        return reachable
+    
+    def _on_endpoint_switch(self, old_url, new_url):
+        """
+        接入点切换回调：后续请求发往新接入点，下一次状态上报发送完整关键帧
+        （新接入点可能没有增量编码的基准快照）
+        
+        Args:
+            old_url (str): 旧接入点
+            new_url (str): 新接入点
+        """
+        self.server_url = new_url
+        self.status_encoder.request_resync()
+    
+    def get_endpoint_stats(self):
+        """
+        获取接入点延迟和切换统计
+        
+        Returns:
+            dict: 统计数据
+        """
+        return self.endpoint_selector.get_stats()
+    
+    def _on_link_state_change(self, old_state, new_state):
+        """
+        熔断器状态变化回调
+        
+        断开时标记离线，上报直接写入离线缓存，并安排在退避结束时发送探测心跳；
+        探测成功恢复后立即触发缓存重放。
+        
+        Args:
+            old_state (str): 旧状态
+            new_state (str): 新状态
+        """
+        scheduler = self.scheduler
+        if new_state == OPEN:
+            self.connected = False
+            if scheduler:
+                scheduler.trigger('heartbeat', self.circuit_breaker.retry_in())
+        elif new_state == CLOSED and old_state == HALF_OPEN:
+            self.connected = True
+            self.last_heartbeat_time = time.time()
+            if scheduler:
+                scheduler.trigger('sync')
+    
+    def get_traffic_stats(self):
+        """
+        获取本月各流量类别的用量统计
+        
+        Returns:
+            dict: 统计数据
+        """
+        return self.traffic_shaper.get_stats()
+    
+    def get_connection_stats(self):
+        """
+        获取链路熔断器统计
+        
+        Returns:
+            dict: 统计数据
+        """
+        stats = self.circuit_breaker.get_stats()
+        stats['connected'] = self.connected
+        return stats
+    
+    def get_http_stats(self):
+        """
+        获取HTTP连接复用统计
+        
+        Returns:
+            dict: 统计数据
+        """
+        return self.http_session.get_stats()
     
     def _send_heartbeat(self):
-        """发送心跳"""
+        """发送心跳（熔断期间跳过，退避结束时作为探测请求发送）"""
+        retry_in = self.circuit_breaker.retry_in()
+        if retry_in > 0:
+            if self.scheduler:
+                self.scheduler.trigger('heartbeat', retry_in)
+            return True
+        
+        if self.push_transport:
+            return self._check_push_link()
+        
         try:
             response = self._send_request('/device/heartbeat', {
                 'device_id': self.device_id,
@@ -575,79 +1298,106 @@ class CloudManager:
             
             if response and response.get('status') == 'success':
                 self.last_heartbeat_time = time.time()
+                if not self.connected and self.scheduler:
+                    # 恢复连接后尽快发送缓存数据
+                    self.scheduler.trigger('sync')
                 self.connected = True
                 return True
-            else:
+            elif response:
+                # 链路可达但服务器拒绝心跳
                 logger.warning(f"发送心跳失败: {response}")
                 self.connected = False
                 return False
+            else:
+                # 链路故障由熔断器判定，连续失败达到阈值后才标记离线
+                logger.warning("发送心跳失败: 无响应")
+                return False
         except Exception as e:
             logger.error(f"发送心跳出错: {str(e)}")
             self.connected = False
             return False
     
+    def _check_push_link(self):
+        """
+        推送通道的心跳任务：连接由保活ping维持，只在断开时重连
+        
+        Returns:
+            bool: 连接是否可用
+        """
+        if not self.push_transport.is_connected():
+            if not self.circuit_breaker.allow_request():
+                return True
+            if not self.push_transport.connect():
+                self.circuit_breaker.record_failure()
+                return False
+            self.circuit_breaker.record_success()
+        
+        self.last_heartbeat_time = time.time()
+        if not self.connected and self.scheduler:
+            # 恢复连接后尽快发送缓存数据
+            self.scheduler.trigger('sync')
+        self.connected = True
+        return True
+    
+    def get_offline_usage(self):
+        """
+        获取离线缓存的内存与磁盘占用
+        
+        Returns:
+            dict: 总体及各类别的占用统计
+        """
+        usage = self.offline_store.get_usage()
+        if self.telemetry_rollup:
+            usage['telemetry_rollup'] = self.telemetry_rollup.get_stats()
+        return usage
+    
     def _cache_status(self, status):
-        """缓存状态"""
+        """缓存状态（启用遥测汇总时只累加到聚合缓冲区）"""
+        if self.telemetry_rollup:
+            self.telemetry_rollup.add(status)
+            return
+        
         status_copy = status.copy()
         status_copy['timestamp'] = time.time()
         
-        self.status_cache.append(status_copy)
-        
-        # 限制缓存大小
-        if len(self.status_cache) > self.max_cache_size:
-            self.status_cache = self.status_cache[-self.max_cache_size:]
+        self.offline_store.append('status', status_copy)
     
     def _cache_transaction(self, transaction):
         """缓存交易"""
         transaction_copy = transaction.copy()
         transaction_copy['cache_time'] = time.time()
         
-        self.transaction_cache.append(transaction_copy)
-        
-        # 限制缓存大小
-        if len(self.transaction_cache) > self.max_cache_size:
-            self.transaction_cache = self.transaction_cache[-self.max_cache_size:]
+        self.offline_store.append('transaction', transaction_copy)
     
     def _cache_error(self, error):
         """缓存错误"""
         error_copy = error.copy()
         error_copy['cache_time'] = time.time()
         
-        self.error_cache.append(error_copy)
-        
-        # 限制缓存大小
-        if len(self.error_cache) > self.max_cache_size:
-            self.error_cache = self.error_cache[-self.max_cache_size:]
+        self.offline_store.append('error', error_copy)
     
     def _cache_warning(self, warning):
         """缓存警告"""
         warning_copy = warning.copy()
         warning_copy['cache_time'] = time.time()
         
-        self.warning_cache.append(warning_copy)
-        
-        # 限制缓存大小
-        if len(self.warning_cache) > self.max_cache_size:
-            self.warning_cache = self.warning_cache[-self.max_cache_size:]
+        self.offline_store.append('warning', warning_copy)
     
     def _cache_replenishment(self, replenishment):
         """缓存补货需求"""
         replenishment_copy = replenishment.copy()
         replenishment_copy['cache_time'] = time.time()
         
-        self.replenishment_cache.append(replenishment_copy)
-        
-        # 限制缓存大小
-        if len(self.replenishment_cache) > self.max_cache_size:
-            self.replenishment_cache = self.replenishment_cache[-self.max_cache_size:]
+        self.offline_store.append('replenishment', replenishment_copy)
     
     def _send_cached_data(self):
         """发送缓存数据"""
         # 发送缓存的状态
-        if self.status_cache:
+        status_count = self.offline_store.count('status')
+        if status_count:
             try:
                 # 只发送最新的状态
-                latest_status = self.status_cache[-1]
+                latest_status = self.offline_store.latest('status')
                 response = self._send_request('/device/status', {
                     'device_id': self.device_id,
                     'timestamp': time.time(),
@@ -655,120 +1405,201 @@ class CloudManager:
                 })
                 
                 if response and response.get('status') == 'success':
-                    logger.info(f"成功发送缓存状态: {len(self.status_cache)} 条")
-                    self.status_cache = []
+                    logger.info(f"成功发送缓存状态: {status_count} 条")
+                    self.offline_store.ack('status', status_count)
             except Exception as e:
                 logger.error(f"发送缓存状态出错: {str(e)}")
         
-        # 发送缓存的交易
-        if self.transaction_cache:
-            try:
-                # 尝试发送所有缓存的交易
-                transactions_to_send = self.transaction_cache.copy()
-                response = self._send_request('/device/transactions_batch', {
-                    'device_id': self.device_id,
-                    'timestamp': time.time(),
-                    'transactions': transactions_to_send
-                })
-                
-                if response and response.get('status') == 'success':
-                    logger.info(f"成功发送缓存交易: {len(transactions_to_send)} 条")
-                    self.transaction_cache = []
-            except Exception as e:
-                logger.error(f"发送缓存交易出错: {str(e)}")
+        # 各类别分块并行发送，每块确认后立即推进日志游标
+        # 按优先级顺序提交，交易记录最先发送
+        categories = sorted((category for category in self.BATCH_ENDPOINTS if self.offline_store.count(category)),
+                            key=lambda category: self.offline_store.lanes[category].priority)
         
-        # 发送缓存的错误
-        if self.error_cache:
-            try:
-                # 尝试发送所有缓存的错误
-                errors_to_send = self.error_cache.copy()
-                response = self._send_request('/device/errors_batch', {
-                    'device_id': self.device_id,
-                    'timestamp': time.time(),
-                    'errors': errors_to_send
-                })
-                
-                if response and response.get('status') == 'success':
-                    logger.info(f"成功发送缓存错误: {len(errors_to_send)} 条")
-                    self.error_cache = []
-            except Exception as e:
-                logger.error(f"发送缓存错误出错: {str(e)}")
+        if self.replay_workers > 1 and len(categories) > 1:
+            with ThreadPoolExecutor(max_workers=min(self.replay_workers, len(categories))) as executor:
+                list(executor.map(self._replay_category, categories))
+        else:
+            for category in categories:
+                self._replay_category(category)
         
-        # 发送缓存的警告
-        if self.warning_cache:
-            try:
-                # 尝试发送所有缓存的警告
-                warnings_to_send = self.warning_cache.copy()
-                response = self._send_request('/device/warnings_batch', {
-                    'device_id': self.device_id,
-                    'timestamp': time.time(),
-                    'warnings': warnings_to_send
-                })
-                
-                if response and response.get('status') == 'success':
-                    logger.info(f"成功发送缓存警告: {len(warnings_to_send)} 条")
-                    self.warning_cache = []
-            except Exception as e:
-                logger.error(f"发送缓存警告出错: {str(e)}")
+        # 离线期间的遥测聚合数据
+        if self.telemetry_rollup and self.connected:
+            self._send_telemetry_rollups()
+    
+    def _send_telemetry_rollups(self):
+        """
+        上传离线期间的按分钟和按小时遥测聚合数据
+        
+        Returns:
+            bool: 是否上传成功（没有待上传数据时也返回True）
+        """
+        rollups, marker = self.telemetry_rollup.collect()
+        if not rollups['minute'] and not rollups['hour']:
+            return True
+        
+        try:
+            response = self._send_request('/device/telemetry_rollups', {
+                'device_id': self.device_id,
+                'timestamp': time.time(),
+                'rollups': rollups
+            })
+        except Exception as e:
+            logger.error(f"上传遥测汇总出错: {str(e)}")
+            return False
+        
+        if response and response.get('status') == 'success':
+            self.telemetry_rollup.acknowledge(marker)
+            logger.info(f"成功上传遥测汇总: {len(rollups['minute'])} 分钟, {len(rollups['hour'])} 小时")
+            return True
+        
+        logger.warning(f"上传遥测汇总失败: {response}")
+        return False
+    
+    def _replay_category(self, category):
+        """
+        分块重放某一类别的缓存记录
+        
+        每块发送成功后确认该块（写入日志水位线），重启后从未确认的尾部继续；
+        某块失败时停止本轮，只有未确认的部分会在下次重发。
+        
+        Args:
+            category (str): 缓存类别
+        
+        Returns:
+            int: 本轮成功发送的记录数
+        """
+        endpoint, key = self.BATCH_ENDPOINTS[category]
+        name = self.CATEGORY_NAMES[category]
+        sent = 0
         
-        # 发送缓存的补货需求
-        if self.replenishment_cache:
+        while self.connected:
+            chunk = self.offline_store.peek(category, self.replay_chunk_size)
+            if not chunk:
+                break
+            
             try:
-                # 尝试发送所有缓存的补货需求
-                replenishments_to_send = self.replenishment_cache.copy()
-                response = self._send_request('/device/replenishments_batch', {
+                response = self._send_request(endpoint, {
                     'device_id': self.device_id,
                     'timestamp': time.time(),
-                    'replenishments': replenishments_to_send
+                    key: chunk
                 })
-                
-                if response and response.get('status') == 'success':
-                    logger.info(f"成功发送缓存补货需求: {len(replenishments_to_send)} 条")
-                    self.replenishment_cache = []
             except Exception as e:
-                logger.error(f"发送缓存补货需求出错: {str(e)}")
+                logger.error(f"发送缓存{name}出错: {str(e)}")
+                break
+            
+            if not response or response.get('status') != 'success':
+                logger.warning(f"发送缓存{name}失败，已确认 {sent} 条，剩余部分下次重发")
+                break
+            
+            self.offline_store.ack_records(category, chunk)
+            sent += len(chunk)
+        
+        if sent:
+            # 确保确认游标落盘，重启后不再重发已确认的块
+            self.cache_journal.sync()
+            logger.info(f"成功发送缓存{name}: {sent} 条")
+        return sent
+    
+    def _create_scheduler(self):
+        """
+        创建云平台定时任务调度器
+        
+        Returns:
+            TaskScheduler: 调度器
+        """
+        scheduler = TaskScheduler()
+        scheduler.add_job('heartbeat', self._send_heartbeat, self.heartbeat_interval,
+                          max_backoff=self.heartbeat_interval * 10)
+        scheduler.add_job('sync', self._sync_job, self.data_sync_interval)
+        if len(self.endpoint_selector.get_urls()) > 1:
+            scheduler.add_job('endpoint_probe', self._probe_endpoints, self.endpoint_probe_interval,
+                              initial_delay=self.endpoint_probe_interval)
+        if not self.config_long_poll:
+            scheduler.add_job('config', self._config_job, self.config_check_interval,
+                              initial_delay=self.report_interval)
+        scheduler.add_job('cache_save', self._save_cache, self.cache_save_interval,
+                          initial_delay=self.cache_save_interval)
+        scheduler.add_job('journal_sync', self._sync_journal, self.cache_save_interval,
+                          initial_delay=self.cache_save_interval)
+        if self.ota_enabled:
+            scheduler.add_job('ota', self._ota_job, self.ota_check_interval,
+                              initial_delay=self.ota_check_interval * 0.1)
+        return scheduler
+    
+    def _on_journal_pending(self):
+        """缓存日志出现未落盘写入时，安排在fsync间隔后只落盘日志（遥测汇总和流量统计按cache_save周期保存）"""
+        scheduler = self.scheduler
+        if scheduler:
+            scheduler.trigger('journal_sync', self.cache_journal.fsync_interval)
+    
+    def _sync_job(self):
+        """定时任务：发送缓存数据"""
+        if not self.connected:
+            return True
+        
+        self._send_cached_data()
+        self.last_sync_time = time.time()
+        return True
+    
+    def _config_job(self):
+        """定时任务：检查配置更新"""
+        if not self.connected:
+            return True
+        
+        return self.get_config_update() is not None
+    
+    def _config_poll_loop(self):
+        """配置长轮询线程：服务器在配置变化或等待超时时返回，随即发起下一次请求"""
+        logger.info("启动配置长轮询线程")
+        failures = 0
+        
+        while self.running and not self.config_poll_stop.is_set():
+            if not self.connected:
+                self.config_poll_stop.wait(self.heartbeat_interval)
+                continue
+            
+            if self.get_config_update(wait=self.config_long_poll_timeout) is None:
+                # 请求失败时退避，避免在服务器异常时快速重试
+                failures += 1
+                self.config_poll_stop.wait(min(2 ** failures, self.config_check_interval))
+            else:
+                failures = 0
+        
+        logger.info("配置长轮询线程退出")
+    
+    def _ota_job(self):
+        """定时任务：检查并下载OTA更新"""
+        if not self.connected:
+            return True
+        
+        update_info = self.check_ota_update()
+        if update_info:
+            if self.download_ota_update(update_info):
+                self.apply_ota_update(update_info)
+        self.last_ota_check_time = time.time()
+        return True
+    
+    def get_scheduler_stats(self):
+        """
+        获取定时任务调度统计
+        
+        Returns:
+            dict: 统计数据
+        """
+        return self.scheduler.get_stats() if self.scheduler else {}
     
     def _cloud_monitor(self):
-        """云平台监控线程"""
+        """云平台监控线程（休眠到最近的任务截止时间）"""
         logger.info("启动云平台监控线程")
         
+        # 多个接入点时先探测延迟，连接到最快的接入点
+        if len(self.endpoint_selector.get_urls()) > 1:
+            self._probe_endpoints()
+        
         # 连接到云平台
         if not self.connected:
             self.connect()
         
-        while self.running:
-            try:
-                current_time = time.time()
-                
-                # 发送心跳
-                if current_time - self.last_heartbeat_time > self.heartbeat_interval:
-                    self._send_heartbeat()
-                
-                # 如果连接正常，发送缓存数据
-                if self.connected:
-                    # 发送缓存数据
-                    if current_time - self.last_sync_time > self.data_sync_interval:
-                        self._send_cached_data()
-                        self.last_sync_time = current_time
-                    
-                    # 检查配置更新
-                    if current_time - self.last_report_time > self.report_interval * 10:
-                        self.get_config_update()
-                    
-                    # 检查OTA更新
-                    if self.ota_enabled and current_time - self.last_ota_check_time > self.ota_check_interval:
-                        update_info = self.check_ota_update()
-                        if update_info:
-                            if self.download_ota_update(update_info):
-                                self.apply_ota_update(update_info)
-                        self.last_ota_check_time = current_time
-                
-                # 保存缓存（每小时）
-                if int(current_time) % 3600 < 1:
-                    self._save_cache()
-                
-                # 休眠一段时间
-                time.sleep(1.0)
-            except Exception as e:
-                logger.error(f"云平台监控线程出错: {str(e)}")
-                time.sleep(5.0)  # 出错后等待较长时间再重试
\ No newline at end of file
+        self.scheduler.run()
+        
+        logger.info("云平台监控线程退出")
@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+接入点选择模块 - 多个区域接入点的延迟探测、最快健康接入点选择与粘性故障转移
+"""
+
+import time
+import threading
+
+from src.utils.logger import get_logger
+
+logger = get_logger('endpoint_selector')
+
+
+class Endpoint:
+    """接入点状态"""
+
+    def __init__(self, url):
+        """
+        初始化接入点
+
+        Args:
+            url (str): 接入点地址
+        """
+        self.url = url
+        self.rtt = None
+        self.failures = 0
+        self.down_until = 0.0
+        self.requests = 0
+        self.last_probe_time = None
+
+    def is_healthy(self, now):
+        """是否可用（不在故障冷却期内）"""
+        return now >= self.down_until
+
+    def to_dict(self, now):
+        """转换为统计字典"""
+        return {
+            'url': self.url,
+            'rtt_ms': self.rtt * 1000 if self.rtt is not None else None,
+            'healthy': self.is_healthy(now),
+            'failures': self.failures,
+            'requests': self.requests,
+            'last_probe_time': self.last_probe_time
+        }
+
+
+class EndpointSelector:
+    """
+    接入点选择器
+
+    定期探测各接入点的往返延迟（指数滑动平均），请求固定发往当前接入点（粘性），
+    只有其他健康接入点明显更快（超过切换余量）时才切换，避免在延迟相近的接入点之间来回跳动；
+    当前接入点请求失败时进入冷却期，立即切换到下一个最快的健康接入点。
+    """
+
+    def __init__(self, urls, switch_margin=0.3, min_switch_gain=0.02, failure_cooldown=60.0, ewma_alpha=0.3,
+                 on_switch=None):
+        """
+        初始化接入点选择器
+
+        Args:
+            urls (list): 接入点地址列表（第一个为默认接入点）
+            switch_margin (float, optional): 切换所需的相对延迟改善比例
+            min_switch_gain (float, optional): 切换所需的最小绝对延迟改善（秒）
+            failure_cooldown (float, optional): 接入点失败后的冷却时间（秒）
+            ewma_alpha (float, optional): 延迟滑动平均系数
+            on_switch (callable, optional): 切换回调 on_switch(old_url, new_url)
+        """
+        self.endpoints = [Endpoint(url.rstrip('/')) for url in dict.fromkeys(urls)]
+        if not self.endpoints:
+            raise ValueError("至少需要一个接入点")
+        self.switch_margin = switch_margin
+        self.min_switch_gain = min_switch_gain
+        self.failure_cooldown = failure_cooldown
+        self.ewma_alpha = ewma_alpha
+        self.on_switch = on_switch
+
+        self.current = self.endpoints[0]
+        self.switches = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        """当前接入点地址"""
+        return self.current.url
+
+    def _find(self, url):
+        """按地址查找接入点（调用方持有锁）"""
+        for endpoint in self.endpoints:
+            if endpoint.url == url:
+                return endpoint
+        return None
+
+    def _best(self, now, exclude=None):
+        """
+        获取最快的健康接入点（调用方持有锁）
+
+        未探测过延迟的接入点排在已探测的之后，按配置顺序选择。
+
+        Returns:
+            Endpoint: 接入点，没有健康接入点时返回None
+        """
+        candidates = [endpoint for endpoint in self.endpoints
+                      if endpoint is not exclude and endpoint.is_healthy(now)]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda endpoint: (endpoint.rtt is None, endpoint.rtt or 0.0))
+
+    def _switch(self, endpoint, reason):
+        """
+        切换当前接入点（调用方持有锁）
+
+        Returns:
+            tuple: (旧地址, 新地址)，未切换时返回None
+        """
+        if endpoint is None or endpoint is self.current:
+            return None
+        old_url = self.current.url
+        self.current = endpoint
+        self.switches += 1
+        logger.info(f"切换云平台接入点（{reason}）: {old_url} -> {endpoint.url}")
+        return old_url, endpoint.url
+
+    def _notify(self, change):
+        """在锁外调用切换回调"""
+        if change and self.on_switch:
+            try:
+                self.on_switch(*change)
+            except Exception as e:
+                logger.error(f"接入点切换回调出错: {str(e)}")
+
+    def record_probe(self, url, rtt):
+        """
+        记录一次探测结果
+
+        Args:
+            url (str): 接入点地址
+            rtt (float): 往返延迟（秒），None表示探测失败
+        """
+        with self.lock:
+            endpoint = self._find(url)
+            if endpoint is None:
+                return
+            now = time.monotonic()
+            endpoint.last_probe_time = time.time()
+            if rtt is None:
+                endpoint.failures += 1
+                endpoint.down_until = now + self.failure_cooldown
+            else:
+                endpoint.failures = 0
+                endpoint.down_until = 0.0
+                endpoint.rtt = rtt if endpoint.rtt is None else (
+                    self.ewma_alpha * rtt + (1 - self.ewma_alpha) * endpoint.rtt)
+
+    def reselect(self):
+        """
+        探测后重新选择接入点（有明显更快的健康接入点或当前接入点不可用时切换）
+
+        Returns:
+            str: 当前接入点地址
+        """
+        with self.lock:
+            now = time.monotonic()
+            best = self._best(now)
+            current = self.current
+            change = None
+            if best is not None and best is not current:
+                if not current.is_healthy(now):
+                    change = self._switch(best, '当前接入点不可用')
+                elif current.rtt is None or (
+                        best.rtt is not None
+                        and best.rtt < current.rtt * (1 - self.switch_margin)
+                        and current.rtt - best.rtt >= self.min_switch_gain):
+                    change = self._switch(best, '延迟更低')
+            url = self.current.url
+
+        self._notify(change)
+        return url
+
+    def record_success(self, url):
+        """
+        记录请求成功
+
+        Args:
+            url (str): 接入点地址
+        """
+        with self.lock:
+            endpoint = self._find(url)
+            if endpoint is not None:
+                endpoint.requests += 1
+                endpoint.failures = 0
+
+    def record_failure(self, url):
+        """
+        记录请求失败：接入点进入冷却期，当前接入点失败时切换到下一个最快的健康接入点
+
+        Args:
+            url (str): 接入点地址
+
+        Returns:
+            str: 失败后应使用的接入点地址，没有其他健康接入点时返回None
+        """
+        with self.lock:
+            endpoint = self._find(url)
+            if endpoint is None:
+                return None
+            now = time.monotonic()
+            endpoint.requests += 1
+            endpoint.failures += 1
+            endpoint.down_until = now + self.failure_cooldown
+
+            change = None
+            if endpoint is self.current:
+                change = self._switch(self._best(now, exclude=endpoint), '请求失败')
+            alternative = self.current if self.current is not endpoint else None
+            url = alternative.url if alternative else None
+
+        self._notify(change)
+        return url
+
+    def get_urls(self):
+        """
+        获取所有接入点地址
+
+        Returns:
+            list: 地址列表
+        """
+        return [endpoint.url for endpoint in self.endpoints]
+
+    def get_stats(self):
+        """
+        获取接入点统计
+
+        Returns:
+            dict: 当前接入点、切换次数及各接入点状态
+        """
+        with self.lock:
+            now = time.monotonic()
+            return {
+                'current': self.current.url,
+                'switches': self.switches,
+                'endpoints': [endpoint.to_dict(now) for endpoint in self.endpoints]
+            }
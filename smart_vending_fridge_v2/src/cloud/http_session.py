@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+云平台HTTP会话模块 - 长连接连接池、请求体压缩与连接复用统计
+"""
+
+import gzip
+import json
+import time
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.utils.logger import get_logger
+from src.cloud.serializer import JsonSerializer, create_serializer, parse_content_type
+from src.cloud.traffic_shaper import classify_endpoint
+
+logger = get_logger('http_session')
+
+# 默认超时（连接超时, 读取超时），单位秒
+DEFAULT_TIMEOUT = (3.05, 10)
+
+# 各端点默认超时：心跳要快速失败，批量上传允许更长的读取时间
+DEFAULT_ENDPOINT_TIMEOUTS = {
+    '/device/heartbeat': (3.05, 5),
+    '/device/status': (3.05, 10),
+    '/device/transaction': (3.05, 15),
+    '/device/transactions_batch': (5, 30),
+    '/device/errors_batch': (5, 30),
+    '/device/warnings_batch': (5, 30),
+    '/device/replenishments_batch': (5, 30),
+    '/device/config': (3.05, 10),
+}
+
+# 一次TLS完整握手的估算流量（字节），用于估算连接复用节省的带宽
+TLS_HANDSHAKE_BYTES = 5000
+
+# 负载格式协商请求头：设备声明支持的格式，服务器在响应中回传选定的格式
+PAYLOAD_ACCEPT_HEADER = 'X-Payload-Accept'
+PAYLOAD_FORMAT_HEADER = 'X-Payload-Format'
+
+
+class CloudHttpSession:
+    """云平台HTTP会话，所有请求共享同一个长连接连接池"""
+
+    def __init__(self, config=None, headers=None, traffic_shaper=None, traffic_wait_timeout=30.0):
+        """
+        初始化HTTP会话
+
+        Args:
+            config (dict, optional): HTTP配置
+            headers (dict, optional): 公共请求头
+            traffic_shaper (TrafficShaper, optional): 流量整形器，请求按端点类别等待带宽并计入用量
+            traffic_wait_timeout (float, optional): 请求等待带宽的最长时间（秒）
+        """
+        self.config = config or {}
+        self.traffic_shaper = traffic_shaper
+        self.traffic_wait_timeout = traffic_wait_timeout
+        self.pool_size = self.config.get('pool_size', 4)
+        self.gzip_enabled = self.config.get('gzip', True)
+        self.gzip_min_bytes = self.config.get('gzip_min_bytes', 1024)
+        self.default_timeout = tuple(self.config.get('timeout', DEFAULT_TIMEOUT))
+        self.record_payloads_path = self.config.get('record_payloads_path')
+
+        # 负载格式：首选格式需经服务器确认后才启用，之前使用JSON
+        self.preferred_serializer = create_serializer(
+            self.config.get('payload_format', 'json'),
+            self.config.get('payload_compression', 'zlib')
+        )
+        self.serializer = JsonSerializer()
+
+        self.endpoint_timeouts = dict(DEFAULT_ENDPOINT_TIMEOUTS)
+        for endpoint, timeout in self.config.get('endpoint_timeouts', {}).items():
+            self.endpoint_timeouts[endpoint] = tuple(timeout) if isinstance(timeout, (list, tuple)) else timeout
+
+        # 连接池
+        self.session = requests.Session()
+        self.adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+        self.session.headers.update(headers or {})
+        self.session.headers['Accept-Encoding'] = 'gzip, deflate'
+
+        # 统计
+        self.lock = threading.Lock()
+        self.stats = {
+            'requests': 0,
+            'failures': 0,
+            'new_connections': 0,
+            'reused_connections': 0,
+            'new_connection_latency': 0.0,
+            'reused_connection_latency': 0.0,
+            'raw_bytes': 0,
+            'sent_bytes': 0,
+            'received_bytes': 0
+        }
+
+    def get_timeout(self, endpoint):
+        """
+        获取端点超时设置
+
+        Args:
+            endpoint (str): API端点
+
+        Returns:
+            tuple: (连接超时, 读取超时)
+        """
+        return self.endpoint_timeouts.get(endpoint, self.default_timeout)
+
+    def _encode_body(self, data):
+        """
+        编码请求体：使用已协商的格式，JSON超过阈值时进行gzip压缩
+
+        Returns:
+            tuple: (请求体字节, 附加请求头, 原始JSON字节数)
+        """
+        json_body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        raw_size = len(json_body)
+
+        if self.serializer.name != 'json':
+            body = self.serializer.encode(data)
+            return body, {'Content-Type': self.serializer.content_type_header}, raw_size
+
+        body = json_body
+        headers = {'Content-Type': 'application/json'}
+        if self.preferred_serializer.name != 'json':
+            # 尚未协商成功，声明本设备支持的格式
+            headers[PAYLOAD_ACCEPT_HEADER] = self.preferred_serializer.content_type_header
+
+        if self.gzip_enabled and raw_size >= self.gzip_min_bytes:
+            body = gzip.compress(body, compresslevel=6)
+            headers['Content-Encoding'] = 'gzip'
+
+        return body, headers, raw_size
+
+    def _negotiate(self, response):
+        """根据服务器响应头切换负载格式"""
+        selected = response.headers.get(PAYLOAD_FORMAT_HEADER)
+        if selected is None or self.preferred_serializer.name == 'json':
+            return
+
+        serializer = parse_content_type(selected)
+        if serializer.name != self.serializer.name:
+            logger.info(f"云平台负载格式切换为: {serializer.content_type_header}")
+            self.serializer = serializer
+
+    def decode_response(self, response):
+        """
+        按响应的Content-Type解码响应体
+
+        Args:
+            response (requests.Response): 响应对象
+
+        Returns:
+            dict: 响应数据
+        """
+        content_type = response.headers.get('Content-Type', '')
+        if content_type.startswith(self.preferred_serializer.content_type):
+            return parse_content_type(content_type).decode(response.content)
+        return response.json()
+
+    def _record_payload(self, endpoint, data):
+        """记录请求负载（JSON Lines），供序列化基准测试回放"""
+        try:
+            with open(self.record_payloads_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'endpoint': endpoint, 'data': data}, ensure_ascii=False) + '\n')
+        except Exception as e:
+            logger.error(f"记录请求负载失败: {str(e)}")
+
+    def _connection_count(self):
+        """获取连接池累计建立的连接数"""
+        try:
+            pools = self.adapter.poolmanager.pools
+            return sum(pools[key].num_connections for key in pools.keys())
+        except Exception:
+            return 0
+
+    def _shape(self, endpoint, nbytes):
+        """按端点的流量类别等待带宽（超过月流量上限时抛出TrafficBudgetExceeded）"""
+        if self.traffic_shaper:
+            self.traffic_shaper.acquire(classify_endpoint(endpoint), nbytes, timeout=self.traffic_wait_timeout)
+
+    def _record_received(self, endpoint, response):
+        """将响应字节计入流量用量"""
+        if self.traffic_shaper:
+            self.traffic_shaper.record_received(classify_endpoint(endpoint), len(response.content))
+
+    def post(self, url, endpoint, data, headers=None):
+        """
+        发送POST请求
+
+        Args:
+            url (str): 完整URL
+            endpoint (str): API端点（用于选择超时和流量类别）
+            data (dict): 请求数据
+            headers (dict, optional): 附加请求头
+
+        Returns:
+            requests.Response: 响应对象
+
+        Raises:
+            TrafficBudgetExceeded: 启用流量整形且超过该类别的月流量上限或等待带宽超时
+        """
+        if self.record_payloads_path:
+            self._record_payload(endpoint, data)
+
+        body, body_headers, raw_size = self._encode_body(data)
+        if headers:
+            body_headers.update(headers)
+        self._shape(endpoint, len(body))
+
+        connections_before = self._connection_count()
+        start_time = time.perf_counter()
+        try:
+            response = self.session.post(url, data=body, headers=body_headers, timeout=self.get_timeout(endpoint))
+            if response.status_code == 415 and self.serializer.name != 'json':
+                # 服务器不再接受二进制格式，回退到JSON重发
+                logger.warning("云平台不支持当前负载格式，回退到JSON")
+                self.serializer = JsonSerializer()
+                self.preferred_serializer = JsonSerializer()
+                body, body_headers, raw_size = self._encode_body(data)
+                if headers:
+                    body_headers.update(headers)
+                self._shape(endpoint, len(body))
+                response = self.session.post(url, data=body, headers=body_headers, timeout=self.get_timeout(endpoint))
+        except requests.exceptions.RequestException:
+            with self.lock:
+                self.stats['requests'] += 1
+                self.stats['failures'] += 1
+            raise
+
+        self._negotiate(response)
+        self._record_stats(start_time, connections_before, raw_size, len(body), response)
+        self._record_received(endpoint, response)
+        return response
+
+    def get(self, url, endpoint, params=None, headers=None, timeout=None):
+        """
+        发送GET请求（用于条件请求和长轮询）
+
+        Args:
+            url (str): 完整URL
+            endpoint (str): API端点（用于选择超时）
+            params (dict, optional): 查询参数
+            headers (dict, optional): 附加请求头
+            timeout (tuple, optional): (连接超时, 读取超时)，默认按端点选择
+
+        Returns:
+            requests.Response: 响应对象
+
+        Raises:
+            TrafficBudgetExceeded: 启用流量整形且超过该类别的月流量上限或等待带宽超时
+        """
+        self._shape(endpoint, 0)
+        request_headers = {}
+        if self.preferred_serializer.name != 'json':
+            request_headers[PAYLOAD_ACCEPT_HEADER] = self.preferred_serializer.content_type_header
+        if headers:
+            request_headers.update(headers)
+
+        connections_before = self._connection_count()
+        start_time = time.perf_counter()
+        try:
+            response = self.session.get(url, params=params, headers=request_headers,
+                                        timeout=timeout or self.get_timeout(endpoint))
+        except requests.exceptions.RequestException:
+            with self.lock:
+                self.stats['requests'] += 1
+                self.stats['failures'] += 1
+            raise
+
+        self._record_stats(start_time, connections_before, 0, 0, response)
+        self._record_received(endpoint, response)
+        return response
+
+    def _record_stats(self, start_time, connections_before, raw_size, sent_size, response):
+        """记录一次请求的连接复用和流量统计"""
+        elapsed = time.perf_counter() - start_time
+        new_connection = self._connection_count() > connections_before
+
+        with self.lock:
+            self.stats['requests'] += 1
+            self.stats['raw_bytes'] += raw_size
+            self.stats['sent_bytes'] += sent_size
+            self.stats['received_bytes'] += len(response.content)
+            if new_connection:
+                self.stats['new_connections'] += 1
+                self.stats['new_connection_latency'] += elapsed
+            else:
+                self.stats['reused_connections'] += 1
+                self.stats['reused_connection_latency'] += elapsed
+
+    def get_stats(self):
+        """
+        获取连接复用统计
+
+        Returns:
+            dict: 统计数据，包含估算节省的延迟和握手流量（estimated_前缀表示估算值）
+        """
+        with self.lock:
+            stats = dict(self.stats)
+
+        new_count = stats['new_connections']
+        reused_count = stats['reused_connections']
+        avg_new = stats['new_connection_latency'] / new_count if new_count else 0.0
+        avg_reused = stats['reused_connection_latency'] / reused_count if reused_count else 0.0
+
+        stats.update({
+            'avg_new_connection_latency': avg_new,
+            'avg_reused_connection_latency': avg_reused,
+            'reuse_ratio': reused_count / max(new_count + reused_count, 1),
+            # 每次复用省下的握手时间按新建连接与复用连接的平均延迟差估算
+            'latency_saved': max(avg_new - avg_reused, 0.0) * reused_count if new_count and reused_count else 0.0,
+            'compression_bytes_saved': stats['raw_bytes'] - stats['sent_bytes'],
+            # 估算值（非实测）：每次复用按省下一次完整TLS握手的TLS_HANDSHAKE_BYTES字节计
+            'estimated_handshake_bytes_saved': reused_count * TLS_HANDSHAKE_BYTES
+        })
+        return stats
+
+    def close(self):
+        """关闭会话，释放所有连接"""
+        self.session.close()
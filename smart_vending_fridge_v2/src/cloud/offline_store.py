@@ -0,0 +1,360 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+离线存储模块 - 按优先级分通道、按字节配额管理的统一离线缓存
+"""
+
+import itertools
+import threading
+from collections import deque
+
+from src.utils.logger import get_logger
+
+logger = get_logger('offline_store')
+
+
+class OfflineLane:
+    """单个类别的离线缓存通道"""
+
+    def __init__(self, category, priority, max_memory_bytes, spill=False):
+        """
+        初始化缓存通道
+
+        Args:
+            category (str): 记录类别
+            priority (int): 优先级，数值越小越重要，越晚被淘汰
+            max_memory_bytes (int): 内存配额（字节）
+            spill (bool, optional): 超出配额时是否转存到磁盘（只保留在日志中）而不是淘汰
+        """
+        self.category = category
+        self.priority = priority
+        self.max_memory_bytes = max_memory_bytes
+        self.spill = spill
+
+        # 内存中的记录: (记录, 字节数)，始终对应日志中最早的未确认记录
+        self.records = deque()
+        self.memory_bytes = 0
+
+        # 只保存在磁盘上的记录数（位于内存记录之后）
+        self.spilled = 0
+
+        # 统计
+        self.evicted_count = 0
+        self.evicted_bytes = 0
+
+    def __len__(self):
+        return len(self.records) + self.spilled
+
+
+class OfflineStore:
+    """
+    统一离线存储
+
+    所有类别共享一个预写日志和一个总内存预算，每个类别有自己的优先级和字节配额。
+    超出配额时从优先级最低的通道淘汰最早的记录；允许转存的通道（交易）不会被淘汰，
+    超出部分只保留在磁盘日志中，发送时再分页载入，保证长时间断网时内存有界。
+    """
+
+    # 默认通道配置
+    DEFAULT_LANES = {
+        'transaction': {'priority': 0, 'max_memory_bytes': 512 * 1024, 'spill': True},
+        'error': {'priority': 1, 'max_memory_bytes': 128 * 1024},
+        'replenishment': {'priority': 2, 'max_memory_bytes': 64 * 1024},
+        'warning': {'priority': 3, 'max_memory_bytes': 64 * 1024},
+        'status': {'priority': 4, 'max_memory_bytes': 64 * 1024}
+    }
+
+    def __init__(self, journal, lanes=None, max_memory_bytes=1024 * 1024, max_disk_bytes=64 * 1024 * 1024,
+                 page_size=100):
+        """
+        初始化离线存储
+
+        Args:
+            journal (CacheJournal): 缓存预写日志
+            lanes (dict, optional): 类别 -> {priority, max_memory_bytes, spill}，覆盖默认配置
+            max_memory_bytes (int, optional): 所有通道的总内存预算（字节）
+            max_disk_bytes (int, optional): 日志磁盘预算（字节），超出时淘汰可淘汰通道的记录
+            page_size (int, optional): 从磁盘分页载入的记录数
+        """
+        self.journal = journal
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.page_size = page_size
+
+        self.lanes = {}
+        for category, defaults in self.DEFAULT_LANES.items():
+            lane_config = dict(defaults)
+            lane_config.update((lanes or {}).get(category, {}))
+            self.lanes[category] = OfflineLane(
+                category,
+                lane_config.get('priority', 0),
+                lane_config.get('max_memory_bytes', 64 * 1024),
+                lane_config.get('spill', False)
+            )
+        for category, lane_config in (lanes or {}).items():
+            if category not in self.lanes:
+                self.lanes[category] = OfflineLane(
+                    category,
+                    lane_config.get('priority', len(self.lanes)),
+                    lane_config.get('max_memory_bytes', 64 * 1024),
+                    lane_config.get('spill', False)
+                )
+
+        # 淘汰顺序：优先级数值从大到小
+        self.eviction_order = sorted(self.lanes.values(), key=lambda lane: -lane.priority)
+
+        self.memory_bytes = 0
+        self.lock = threading.RLock()
+
+    def load(self, recovered):
+        """
+        载入从日志恢复的记录，并按配额转存或淘汰
+
+        Args:
+            recovered (dict): 类别 -> 记录列表（与日志中未确认记录一一对应）
+        """
+        with self.lock:
+            live_seqs = self.journal.live_seqs
+            for category, records in recovered.items():
+                lane = self.lanes.get(category)
+                if lane is None:
+                    logger.warning(f"离线存储忽略未知类别: {category}")
+                    continue
+
+                sizes = [size for _, size in live_seqs.get(category, ())]
+                for record, size in zip(records, sizes):
+                    if lane.spilled:
+                        lane.spilled += 1
+                        continue
+                    lane.records.append((record, size))
+                    lane.memory_bytes += size
+                    self.memory_bytes += size
+                    self._enforce_lane_quota(lane)
+
+            self._enforce_memory_budget()
+
+    def append(self, category, record):
+        """
+        追加一条离线记录（同时写入预写日志）
+
+        Args:
+            category (str): 记录类别
+            record (dict): 记录内容
+        """
+        with self.lock:
+            lane = self.lanes[category]
+            _, size = self.journal.append(category, record)
+
+            if lane.spilled:
+                # 已有记录只在磁盘上，新记录也留在磁盘，保持先后顺序
+                lane.spilled += 1
+                return
+
+            lane.records.append((record, size))
+            lane.memory_bytes += size
+            self.memory_bytes += size
+
+            self._enforce_lane_quota(lane)
+            self._enforce_memory_budget()
+
+    def _release(self, lane, count):
+        """从通道内存头部移除若干条记录"""
+        for _ in range(count):
+            _, size = lane.records.popleft()
+            lane.memory_bytes -= size
+            self.memory_bytes -= size
+
+    def _shrink(self, lane):
+        """
+        让通道释放一条记录的内存
+
+        Returns:
+            bool: 是否释放成功
+        """
+        if not lane.records:
+            return False
+
+        if lane.spill:
+            # 最新的记录改为只保存在磁盘上
+            _, size = lane.records.pop()
+            lane.memory_bytes -= size
+            self.memory_bytes -= size
+            lane.spilled += 1
+        else:
+            # 淘汰最早的记录，在日志中视为已确认
+            size = lane.records[0][1]
+            self._release(lane, 1)
+            self.journal.ack(lane.category, 1)
+            lane.evicted_count += 1
+            lane.evicted_bytes += size
+        return True
+
+    def _enforce_lane_quota(self, lane):
+        """保证通道不超过自己的内存配额（至少保留一条记录）"""
+        while lane.memory_bytes > lane.max_memory_bytes and len(lane.records) > 1:
+            self._shrink(lane)
+
+    def _enforce_memory_budget(self):
+        """保证所有通道的总内存不超过预算，从优先级最低的通道开始释放（各通道保留最新一条）"""
+        for lane in self.eviction_order:
+            while self.memory_bytes > self.max_memory_bytes and len(lane.records) > 1:
+                self._shrink(lane)
+            if self.memory_bytes <= self.max_memory_bytes:
+                break
+
+    def enforce_disk_budget(self):
+        """
+        检查日志磁盘占用，超出预算时从优先级最低的可淘汰通道淘汰记录
+
+        允许转存的通道（交易）永不因磁盘预算被淘汰，已淘汰记录占用的空间在下次日志压缩后释放。
+
+        Returns:
+            int: 淘汰的记录数
+        """
+        with self.lock:
+            # 已确认但尚未压缩的记录不计入占用，避免重复淘汰
+            overflow = self.journal.get_disk_usage() - self.journal.acked_bytes - self.max_disk_bytes
+            if overflow <= 0:
+                return 0
+
+            evicted = 0
+            for lane in self.eviction_order:
+                if lane.spill:
+                    continue
+                while overflow > 0 and lane.records:
+                    overflow -= lane.records[0][1]
+                    self._shrink(lane)
+                    evicted += 1
+                if overflow <= 0:
+                    break
+
+            if overflow > 0:
+                logger.warning(f"离线缓存超出磁盘预算 {overflow} 字节，交易记录不会被淘汰")
+            elif evicted:
+                logger.warning(f"离线缓存超出磁盘预算，淘汰 {evicted} 条低优先级记录")
+            return evicted
+
+    def _page_in(self, lane, count):
+        """从磁盘载入通道中只保存在磁盘上的最早若干条记录"""
+        count = min(count, lane.spilled)
+        if count <= 0:
+            return
+
+        offset = len(lane.records)
+        records = self.journal.read_live(lane.category, offset, count)
+        live = self.journal.live_seqs[lane.category]
+        sizes = [size for _, size in itertools.islice(live, offset, offset + len(records))]
+        for record, size in zip(records, sizes):
+            lane.records.append((record, size))
+            lane.memory_bytes += size
+            self.memory_bytes += size
+        lane.spilled -= len(records)
+
+    def peek(self, category, limit):
+        """
+        获取某类别最早的若干条记录（不移除），必要时从磁盘分页载入
+
+        Args:
+            category (str): 记录类别
+            limit (int): 最多返回的记录数
+
+        Returns:
+            list: 记录列表
+        """
+        with self.lock:
+            lane = self.lanes[category]
+            if len(lane.records) < limit and lane.spilled:
+                self._page_in(lane, max(limit - len(lane.records), self.page_size))
+            return [record for record, _ in itertools.islice(lane.records, limit)]
+
+    def latest(self, category):
+        """
+        获取某类别最新的一条内存记录
+
+        Args:
+            category (str): 记录类别
+
+        Returns:
+            dict: 最新记录，没有时返回None
+        """
+        with self.lock:
+            lane = self.lanes[category]
+            return lane.records[-1][0] if lane.records and not lane.spilled else None
+
+    def count(self, category):
+        """
+        获取某类别的记录数（含只在磁盘上的记录）
+
+        Args:
+            category (str): 记录类别
+
+        Returns:
+            int: 记录数
+        """
+        with self.lock:
+            return len(self.lanes[category])
+
+    def ack(self, category, count):
+        """
+        确认已发送的最早若干条记录
+
+        Args:
+            category (str): 记录类别
+            count (int): 记录数量
+        """
+        with self.lock:
+            lane = self.lanes[category]
+            count = min(count, len(lane.records))
+            if count <= 0:
+                return
+            self._release(lane, count)
+            self.journal.ack(category, count)
+
+    def ack_records(self, category, records):
+        """
+        确认已发送的一块记录
+
+        发送期间通道可能因超出配额从头部淘汰了部分记录，
+        因此按该块最后一条记录在通道中的位置确定确认数量。
+
+        Args:
+            category (str): 记录类别
+            records (list): 已发送的记录
+        """
+        if not records:
+            return
+        with self.lock:
+            lane = self.lanes[category]
+            for index, (record, _) in enumerate(itertools.islice(lane.records, len(records))):
+                if record is records[-1]:
+                    self.ack(category, index + 1)
+                    break
+
+    def get_usage(self):
+        """
+        获取内存与磁盘占用
+
+        Returns:
+            dict: 总体及各通道的占用统计
+        """
+        with self.lock:
+            return {
+                'memory_bytes': self.memory_bytes,
+                'max_memory_bytes': self.max_memory_bytes,
+                'disk_bytes': self.journal.get_disk_usage(),
+                'max_disk_bytes': self.max_disk_bytes,
+                'lanes': {
+                    category: {
+                        'priority': lane.priority,
+                        'records': len(lane),
+                        'memory_records': len(lane.records),
+                        'disk_only_records': lane.spilled,
+                        'memory_bytes': lane.memory_bytes,
+                        'max_memory_bytes': lane.max_memory_bytes,
+                        'evicted': lane.evicted_count,
+                        'evicted_bytes': lane.evicted_bytes
+                    }
+                    for category, lane in self.lanes.items()
+                }
+            }
@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+OTA下载模块 - 流式分块下载、断点续传、增量SHA-256校验与限速
+"""
+
+import os
+import time
+import hashlib
+
+import requests
+
+from src.utils.logger import get_logger
+from src.cloud.traffic_shaper import TrafficBudgetExceeded
+
+logger = get_logger('ota_downloader')
+
+
+class OtaDownloader:
+    """OTA固件下载器，固件按固定大小分块写入磁盘，不在内存中缓存整个镜像"""
+
+    def __init__(self, session=None, chunk_size=64 * 1024, max_bytes_per_second=0, max_retries=5,
+                 timeout=(5, 30), progress_callback=None, traffic_shaper=None):
+        """
+        初始化OTA下载器
+
+        Args:
+            session (requests.Session, optional): HTTP会话，默认创建不带设备凭证的独立会话
+                （下载地址可能在其他主机上，不能复用带Authorization头的云平台会话）
+            chunk_size (int, optional): 分块大小（字节）
+            max_bytes_per_second (int, optional): 下载限速（字节/秒），0表示不限速
+            max_retries (int, optional): 断线后最大续传次数
+            timeout (tuple, optional): (连接超时, 读取超时)
+            progress_callback (callable, optional): 进度回调 progress_callback(downloaded, total)
+            traffic_shaper (TrafficShaper, optional): 流量整形器，每个数据块按OTA类别（最低优先级）等待带宽
+        """
+        self.owns_session = session is None
+        self.session = session or requests.Session()
+        self.chunk_size = chunk_size
+        self.max_bytes_per_second = max_bytes_per_second
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.progress_callback = progress_callback
+        self.traffic_shaper = traffic_shaper
+
+    def _hash_existing(self, path):
+        """
+        计算已下载部分的哈希，用于续传时恢复增量校验状态
+
+        Returns:
+            tuple: (哈希对象, 已下载字节数)
+        """
+        sha256 = hashlib.sha256()
+        size = 0
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(self.chunk_size), b''):
+                    sha256.update(block)
+                    size += len(block)
+        return sha256, size
+
+    def _throttle(self, start_time, transferred):
+        """按限速要求休眠"""
+        if self.max_bytes_per_second <= 0:
+            return
+        expected = transferred / self.max_bytes_per_second
+        elapsed = time.monotonic() - start_time
+        if expected > elapsed:
+            time.sleep(expected - elapsed)
+
+    def _report_progress(self, downloaded, total):
+        """上报下载进度"""
+        if self.progress_callback:
+            try:
+                self.progress_callback(downloaded, total)
+            except Exception as e:
+                logger.error(f"OTA进度回调出错: {str(e)}")
+
+    def download(self, url, dest_path, expected_sha256=None, expected_size=None):
+        """
+        下载文件，支持断点续传；校验失败时删除已下载部分并从头重新下载一次
+
+        Args:
+            url (str): 下载地址
+            dest_path (str): 保存路径
+            expected_sha256 (str, optional): 期望的SHA-256（十六进制）
+            expected_size (int, optional): 期望的文件大小
+
+        Returns:
+            bool: 是否下载并校验成功
+        """
+        part_path = dest_path + '.part'
+        for attempt in range(2):
+            result = self._fetch(url, part_path, expected_sha256, expected_size)
+            if result is None:
+                return False
+            sha256, downloaded = result
+
+            if expected_size is not None and downloaded != expected_size:
+                error = f"OTA更新大小不符: {downloaded} != {expected_size}"
+            elif expected_sha256 and sha256.hexdigest() != expected_sha256.lower():
+                error = f"OTA更新校验失败: {sha256.hexdigest()} != {expected_sha256}"
+            else:
+                os.replace(part_path, dest_path)
+                return True
+
+            # 已下载部分可能已损坏（如续传拼接了服务器上更换过的文件），丢弃后从头下载
+            self._discard(part_path)
+            if attempt == 0:
+                logger.warning(f"{error}，重新下载OTA更新")
+            else:
+                logger.error(error)
+        return False
+
+    def _fetch(self, url, part_path, expected_sha256=None, expected_size=None):
+        """
+        下载到临时文件，从已下载部分的末尾续传
+
+        Returns:
+            tuple: (哈希对象, 已下载字节数)，下载失败或流量预算用尽时返回None
+        """
+        sha256, downloaded = self._hash_existing(part_path)
+        total = expected_size
+        retries = 0
+
+        if downloaded:
+            logger.info(f"续传OTA更新: 已下载 {downloaded} 字节")
+
+        while True:
+            # 续传偏移按原始文件字节计算，不能让服务器对响应做内容编码
+            headers = {'Accept-Encoding': 'identity'}
+            if downloaded:
+                headers['Range'] = f"bytes={downloaded}-"
+            try:
+                with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                    if response.status_code == 416 and downloaded:
+                        # 续传起点已超出文件末尾：已下载部分完整时直接完成，否则丢弃后从头下载
+                        _, range_total = _parse_content_range(response.headers.get('Content-Range'))
+                        if self._is_complete(sha256, downloaded, expected_sha256, expected_size, range_total):
+                            return sha256, downloaded
+                        logger.warning("OTA续传位置超出文件大小，重新下载OTA更新")
+                        self._discard(part_path)
+                        sha256, downloaded = hashlib.sha256(), 0
+                        continue
+
+                    response.raise_for_status()
+
+                    range_total = None
+                    if downloaded and response.status_code == 206:
+                        start, range_total = _parse_content_range(response.headers.get('Content-Range'))
+                        if start != downloaded:
+                            logger.warning(f"OTA续传位置不符: 请求 {downloaded}，服务器返回 {start}，重新下载OTA更新")
+                            sha256, downloaded = hashlib.sha256(), 0
+                            continue
+                        mode = 'ab'
+                    elif downloaded:
+                        # 服务器不支持Range请求，从头开始
+                        logger.warning("服务器不支持断点续传，重新下载OTA更新")
+                        sha256, downloaded = hashlib.sha256(), 0
+                        mode = 'wb'
+                    else:
+                        mode = 'wb'
+
+                    if total is None:
+                        content_length = response.headers.get('Content-Length')
+                        if range_total is not None:
+                            total = range_total
+                        elif content_length:
+                            total = downloaded + int(content_length)
+
+                    start_time = time.monotonic()
+                    transferred = 0
+                    with open(part_path, mode) as f:
+                        for block in response.iter_content(chunk_size=self.chunk_size):
+                            if not block:
+                                continue
+                            if self.traffic_shaper:
+                                self.traffic_shaper.acquire('ota', len(block), direction='received')
+                            f.write(block)
+                            sha256.update(block)
+                            downloaded += len(block)
+                            transferred += len(block)
+                            self._report_progress(downloaded, total)
+                            self._throttle(start_time, transferred)
+                        f.flush()
+                        os.fsync(f.fileno())
+
+                if total is None or downloaded >= total:
+                    return sha256, downloaded
+                raise requests.exceptions.ConnectionError(f"连接中断: {downloaded}/{total}")
+            except TrafficBudgetExceeded as e:
+                # 已下载的部分保留，下个计费月或上限调整后续传
+                logger.warning(f"暂停下载OTA更新: {str(e)}")
+                return None
+            except requests.exceptions.RequestException as e:
+                retries += 1
+                if retries > self.max_retries:
+                    logger.error(f"下载OTA更新失败，已重试 {self.max_retries} 次: {str(e)}")
+                    return None
+                wait_time = min(2 ** retries, 60)
+                logger.warning(f"下载OTA更新中断，{wait_time} 秒后从 {downloaded} 字节续传: {str(e)}")
+                time.sleep(wait_time)
+
+    @staticmethod
+    def _is_complete(sha256, downloaded, expected_sha256, expected_size, range_total):
+        """
+        判断已下载部分是否就是完整文件（服务器对续传请求返回416时）
+
+        Args:
+            sha256: 已下载部分的哈希对象
+            downloaded (int): 已下载字节数
+            expected_sha256 (str): 期望的SHA-256
+            expected_size (int): 期望的文件大小
+            range_total (int): 416响应Content-Range中的文件大小
+
+        Returns:
+            bool: 是否完整
+        """
+        if expected_size is not None and downloaded != expected_size:
+            return False
+        if expected_sha256:
+            return sha256.hexdigest() == expected_sha256.lower()
+        if expected_size is not None:
+            return True
+        return range_total == downloaded
+
+    @staticmethod
+    def _discard(path):
+        """删除已下载的部分"""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        """关闭下载器自己创建的HTTP会话"""
+        if self.owns_session:
+            self.session.close()
+
+
+def _parse_content_range(value):
+    """
+    解析Content-Range响应头（bytes 起点-终点/总大小 或 bytes */总大小）
+
+    Returns:
+        tuple: (起点, 总大小)，无法解析的部分为None
+    """
+    start = total = None
+    if not value or not value.startswith('bytes '):
+        return start, total
+    span, _, size = value[6:].partition('/')
+    first = span.partition('-')[0].strip()
+    if first.isdigit():
+        start = int(first)
+    if size.strip().isdigit():
+        total = int(size.strip())
+    return start, total
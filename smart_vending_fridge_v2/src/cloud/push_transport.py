@@ -0,0 +1,412 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+推送通道模块 - 基于单个TCP长连接的MQTT风格发布/订阅传输（QoS 1确认、保活心跳、服务器下发命令）
+
+帧格式: 4字节大端长度 + 紧凑JSON报文，报文类型与MQTT对应:
+connect/connack、publish/puback、subscribe/suback、pingreq/pingresp、disconnect。
+"""
+
+import json
+import time
+import socket
+import struct
+import threading
+
+from src.utils.logger import get_logger
+from src.cloud.traffic_shaper import TrafficBudgetExceeded
+
+logger = get_logger('push_transport')
+
+# 帧长度前缀
+FRAME_HEADER = struct.Struct('>I')
+
+# 单帧最大字节数
+MAX_FRAME_BYTES = 4 * 1024 * 1024
+
+
+def encode_frame(packet):
+    """
+    编码一个报文帧
+
+    Args:
+        packet (dict): 报文
+
+    Returns:
+        bytes: 帧字节
+    """
+    body = json.dumps(packet, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+    return FRAME_HEADER.pack(len(body)) + body
+
+
+def read_frame(stream):
+    """
+    从流中读取一个报文帧
+
+    Args:
+        stream: socket.makefile('rb')返回的文件对象
+
+    Returns:
+        tuple: (报文, 帧字节数)，连接关闭时返回(None, 0)
+    """
+    header = stream.read(FRAME_HEADER.size)
+    if len(header) < FRAME_HEADER.size:
+        return None, 0
+    length = FRAME_HEADER.unpack(header)[0]
+    if length > MAX_FRAME_BYTES:
+        raise ValueError(f"帧过大: {length} 字节")
+    body = stream.read(length)
+    if len(body) < length:
+        return None, 0
+    return json.loads(body), FRAME_HEADER.size + length
+
+
+def topic_matches(topic_filter, topic):
+    """
+    判断主题是否匹配订阅过滤器（支持MQTT通配符 + 和 #）
+
+    Args:
+        topic_filter (str): 订阅过滤器
+        topic (str): 主题
+
+    Returns:
+        bool: 是否匹配
+    """
+    filter_levels = topic_filter.split('/')
+    topic_levels = topic.split('/')
+    for index, level in enumerate(filter_levels):
+        if level == '#':
+            return True
+        if index >= len(topic_levels) or (level != '+' and level != topic_levels[index]):
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+class _PendingAck:
+    """等待确认的QoS 1消息"""
+
+    __slots__ = ('event', 'ack')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.ack = None
+
+
+class PushTransport:
+    """
+    推送通道客户端
+
+    与服务器保持一条双向长连接：设备上报以QoS 1发布并等待确认（确认中可携带服务器的处理结果），
+    空闲时发送保活ping代替HTTP心跳；服务器可随时向订阅的主题下发命令（如配置变更）。
+    连接断开时所有等待确认的消息立即失败，由调用方写入离线缓存，重连后自动恢复订阅。
+    """
+
+    def __init__(self, host, port, client_id, token='', keepalive=30, ack_timeout=10.0, connect_timeout=5.0,
+                 on_disconnect=None, traffic_shaper=None):
+        """
+        初始化推送通道
+
+        Args:
+            host (str): 服务器地址
+            port (int): 服务器端口
+            client_id (str): 客户端ID（设备ID）
+            token (str, optional): 认证令牌
+            keepalive (float, optional): 保活间隔（秒），超过1.5倍间隔没有收到任何数据视为断开
+            ack_timeout (float, optional): 等待QoS 1确认的最长时间（秒）
+            connect_timeout (float, optional): 连接超时（秒）
+            on_disconnect (callable, optional): 连接断开回调 on_disconnect(reason)
+            traffic_shaper (TrafficShaper, optional): 流量整形器，发布的消息按主题类别计入用量
+        """
+        self.host = host
+        self.port = port
+        self.client_id = client_id
+        self.token = token
+        self.keepalive = keepalive
+        self.ack_timeout = ack_timeout
+        self.connect_timeout = connect_timeout
+        self.on_disconnect = on_disconnect
+        self.traffic_shaper = traffic_shaper
+
+        self.sock = None
+        self.connected = False
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+
+        self.next_packet_id = 0
+        self.pending = {}
+        self.subscriptions = {}
+
+        self.last_sent = 0.0
+        self.last_received = 0.0
+        self.stop_event = threading.Event()
+        self.keepalive_thread = None
+
+        # 统计
+        self.stats = {
+            'connects': 0,
+            'disconnects': 0,
+            'published': 0,
+            'acked': 0,
+            'ack_timeouts': 0,
+            'received': 0,
+            'pings': 0,
+            'sent_bytes': 0,
+            'received_bytes': 0,
+            'ack_latency': 0.0
+        }
+
+    def is_connected(self):
+        """是否已连接"""
+        return self.connected
+
+    def connect(self):
+        """
+        建立连接并恢复订阅
+
+        Returns:
+            bool: 是否连接成功
+        """
+        with self.lock:
+            if self.connected:
+                return True
+            try:
+                sock = socket.create_connection((self.host, self.port), timeout=self.connect_timeout)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                stream = sock.makefile('rb')
+                sock.sendall(encode_frame({'type': 'connect', 'client_id': self.client_id, 'token': self.token,
+                                           'keepalive': self.keepalive}))
+                connack, _ = read_frame(stream)
+                if not connack or connack.get('type') != 'connack' or not connack.get('accepted'):
+                    logger.error(f"推送通道连接被拒绝: {connack}")
+                    sock.close()
+                    return False
+                sock.settimeout(None)
+            except (OSError, ValueError) as e:
+                logger.error(f"推送通道连接失败: {str(e)}")
+                return False
+
+            self.sock = sock
+            self.connected = True
+            self.last_sent = self.last_received = time.monotonic()
+            self.stats['connects'] += 1
+            filters = list(self.subscriptions)
+
+        threading.Thread(target=self._reader_loop, args=(sock, stream), daemon=True).start()
+        if self.keepalive_thread is None:
+            self.keepalive_thread = threading.Thread(target=self._keepalive_loop, daemon=True)
+            self.keepalive_thread.start()
+
+        for topic_filter in filters:
+            self._send({'type': 'subscribe', 'topic': topic_filter})
+
+        logger.info(f"推送通道已连接: {self.host}:{self.port}")
+        return True
+
+    def _send(self, packet):
+        """
+        发送一个报文
+
+        Returns:
+            int: 帧字节数，发送失败时返回0
+        """
+        frame = encode_frame(packet)
+        sock = self.sock
+        if sock is None:
+            return 0
+        try:
+            with self.write_lock:
+                sock.sendall(frame)
+        except OSError as e:
+            self._connection_lost(f"发送失败: {str(e)}", sock)
+            return 0
+        self.last_sent = time.monotonic()
+        with self.lock:
+            self.stats['sent_bytes'] += len(frame)
+        return len(frame)
+
+    def publish(self, topic, payload, qos=1, traffic_class='telemetry'):
+        """
+        发布消息
+
+        Args:
+            topic (str): 主题
+            payload (dict): 消息内容
+            qos (int, optional): 0为不确认，1为至少一次（等待服务器确认）
+            traffic_class (str, optional): 流量类别（用于流量整形）
+
+        Returns:
+            dict: 服务器确认中携带的处理结果（QoS 0为空字典），未连接或确认超时时返回None
+
+        Raises:
+            TrafficBudgetExceeded: 启用流量整形且超过该类别的月流量上限或等待带宽超时
+        """
+        if not self.connected:
+            return None
+
+        packet = {'type': 'publish', 'topic': topic, 'qos': qos, 'payload': payload}
+        pending = None
+        with self.lock:
+            if qos:
+                self.next_packet_id += 1
+                packet['packet_id'] = self.next_packet_id
+                pending = self.pending[packet['packet_id']] = _PendingAck()
+
+        if self.traffic_shaper:
+            try:
+                self.traffic_shaper.acquire(traffic_class, len(encode_frame(packet)))
+            except TrafficBudgetExceeded:
+                with self.lock:
+                    self.pending.pop(packet.get('packet_id'), None)
+                raise
+
+        start_time = time.monotonic()
+        sent = self._send(packet)
+        with self.lock:
+            self.stats['published'] += 1
+        if not qos:
+            return {} if sent else None
+
+        acked = sent and pending.event.wait(self.ack_timeout)
+        with self.lock:
+            self.pending.pop(packet['packet_id'], None)
+            if acked and pending.ack is not None:
+                self.stats['acked'] += 1
+                self.stats['ack_latency'] += time.monotonic() - start_time
+            elif sent and not acked:
+                self.stats['ack_timeouts'] += 1
+
+        if acked and pending.ack is not None:
+            return pending.ack.get('data') or {}
+        if sent and not acked:
+            # 确认超时说明连接已不可用，断开后由调用方重连
+            self._connection_lost("等待确认超时", self.sock)
+        return None
+
+    def subscribe(self, topic_filter, callback):
+        """
+        订阅主题（重连后自动恢复）
+
+        Args:
+            topic_filter (str): 订阅过滤器（支持 + 和 # 通配符）
+            callback (callable): 消息回调 callback(topic, payload)，返回值随确认发回服务器
+        """
+        with self.lock:
+            self.subscriptions[topic_filter] = callback
+        if self.connected:
+            self._send({'type': 'subscribe', 'topic': topic_filter})
+
+    def _dispatch(self, packet):
+        """分发服务器下发的消息，QoS 1消息处理后回复确认"""
+        topic = packet.get('topic', '')
+        with self.lock:
+            self.stats['received'] += 1
+            callbacks = [callback for topic_filter, callback in self.subscriptions.items()
+                         if topic_matches(topic_filter, topic)]
+
+        result = None
+        for callback in callbacks:
+            try:
+                result = callback(topic, packet.get('payload') or {})
+            except Exception as e:
+                logger.error(f"处理推送消息 {topic} 出错: {str(e)}")
+                result = {'error': str(e)}
+
+        if packet.get('qos') and 'packet_id' in packet:
+            self._send({'type': 'puback', 'packet_id': packet['packet_id'], 'data': result or {}})
+
+    def _reader_loop(self, sock, stream):
+        """读取线程：处理确认、下发消息和ping响应，直到连接断开"""
+        reason = "服务器关闭连接"
+        try:
+            while True:
+                packet, size = read_frame(stream)
+                if packet is None:
+                    break
+                self.last_received = time.monotonic()
+                with self.lock:
+                    self.stats['received_bytes'] += size
+                if self.traffic_shaper:
+                    self.traffic_shaper.record_received('telemetry', size)
+
+                packet_type = packet.get('type')
+                if packet_type == 'puback':
+                    with self.lock:
+                        pending = self.pending.get(packet.get('packet_id'))
+                    if pending:
+                        pending.ack = packet
+                        pending.event.set()
+                elif packet_type == 'publish':
+                    self._dispatch(packet)
+                elif packet_type == 'disconnect':
+                    reason = "服务器断开连接"
+                    break
+        except (OSError, ValueError) as e:
+            reason = f"读取失败: {str(e)}"
+        self._connection_lost(reason, sock)
+
+    def _keepalive_loop(self):
+        """保活线程：空闲时发送ping，长时间没有收到数据时判定连接断开"""
+        interval = max(self.keepalive / 4, 0.05)
+        while not self.stop_event.wait(interval):
+            if not self.connected:
+                continue
+            now = time.monotonic()
+            if now - self.last_received > self.keepalive * 1.5:
+                self._connection_lost("保活超时", self.sock)
+            elif now - self.last_sent >= self.keepalive:
+                if self._send({'type': 'pingreq'}):
+                    with self.lock:
+                        self.stats['pings'] += 1
+
+    def _connection_lost(self, reason, sock):
+        """
+        处理连接断开：关闭套接字，等待确认的消息立即失败
+
+        Args:
+            reason (str): 断开原因
+            sock (socket.socket): 断开的连接（已被新连接替换时忽略）
+        """
+        with self.lock:
+            if sock is None or sock is not self.sock:
+                return
+            self.sock = None
+            self.connected = False
+            self.stats['disconnects'] += 1
+            pending, self.pending = self.pending, {}
+
+        try:
+            sock.close()
+        except OSError:
+            pass
+        for entry in pending.values():
+            entry.event.set()
+
+        if not self.stop_event.is_set():
+            logger.warning(f"推送通道断开: {reason}")
+            if self.on_disconnect:
+                try:
+                    self.on_disconnect(reason)
+                except Exception as e:
+                    logger.error(f"推送通道断开回调出错: {str(e)}")
+
+    def close(self):
+        """关闭连接并停止保活线程"""
+        self.stop_event.set()
+        if self.connected:
+            self._send({'type': 'disconnect'})
+        self._connection_lost("客户端关闭", self.sock)
+
+    def get_stats(self):
+        """
+        获取推送通道统计
+
+        Returns:
+            dict: 连接、消息、确认和流量统计
+        """
+        with self.lock:
+            stats = dict(self.stats)
+            stats['connected'] = self.connected
+            stats['in_flight'] = len(self.pending)
+        stats['avg_ack_latency'] = stats['ack_latency'] / stats['acked'] if stats['acked'] else 0.0
+        return stats
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+记录序号模块 - 为上报记录分配跨重启单调递增的序号，作为幂等键
+"""
+
+import os
+import json
+import secrets
+import threading
+
+from src.utils.logger import get_logger
+
+logger = get_logger('record_sequence')
+
+
+def _new_epoch():
+    """生成新的随机纪元ID"""
+    return secrets.token_hex(8)
+
+
+class RecordSequence:
+    """
+    单调递增的记录序号
+
+    序号按块预留：文件中只保存纪元和已预留的上限，块内分配只在内存中递增，
+    每块只写一次文件；重启后从上次预留的上限继续，跳过未用完的序号但绝不重复。
+    序号文件丢失或损坏时无法知道用过哪些序号，此时生成新的随机纪元（epoch）从1重新编号，
+    服务器按(设备, 纪元, 序号)去重，新纪元的记录不会被当作旧记录的重复。
+    """
+
+    def __init__(self, path, block_size=1000):
+        """
+        初始化记录序号
+
+        Args:
+            path (str): 序号文件路径
+            block_size (int, optional): 每次预留的序号数量
+        """
+        self.path = path
+        self.block_size = max(1, block_size)
+        self.lock = threading.Lock()
+
+        self.epoch, self.reserved = self._load()
+        self.next_seq = self.reserved + 1
+        # 当前纪元是否已落盘（未落盘的纪元只在本次运行中使用）
+        self.persisted = True
+
+    def _load(self):
+        """
+        读取纪元和已预留的序号上限
+
+        Returns:
+            tuple: (纪元ID, 上次预留的上限)，文件不存在或损坏时为(新纪元ID, 0)；
+                旧版文件没有纪元，沿用空纪元继续编号
+        """
+        if not os.path.exists(self.path):
+            return _new_epoch(), 0
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return str(data.get('epoch', '')), int(data.get('reserved', 0))
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            logger.error(f"加载记录序号失败，启用新的序号纪元: {str(e)}")
+        return _new_epoch(), 0
+
+    def _reserve(self, upper):
+        """
+        持久化纪元和新的预留上限（先落盘再使用，断电后不会重复分配）
+
+        Args:
+            upper (int): 新的预留上限
+        """
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'epoch': self.epoch, 'reserved': upper}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        self.reserved = upper
+        self.persisted = True
+
+    def next(self):
+        """
+        分配下一个序号（不抛出异常）
+
+        Returns:
+            tuple: (纪元ID, 序号)
+        """
+        with self.lock:
+            if self.next_seq > self.reserved:
+                upper = self.next_seq + self.block_size - 1
+                try:
+                    self._reserve(upper)
+                except OSError as e:
+                    # 预留无法落盘时重启后可能重复分配，换用新的随机纪元，后续块再尝试落盘
+                    if self.persisted:
+                        logger.error(f"保存记录序号失败，启用新的序号纪元: {str(e)}")
+                        self.epoch = _new_epoch()
+                        self.next_seq = 1
+                        upper = self.block_size
+                    self.persisted = False
+                    self.reserved = upper
+            seq = self.next_seq
+            self.next_seq += 1
+            return self.epoch, seq
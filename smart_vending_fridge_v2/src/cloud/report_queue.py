@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+云平台上报队列模块 - 有界内存队列与后台批量发送线程
+"""
+
+import time
+import threading
+from collections import deque
+
+from src.utils.logger import get_logger
+
+logger = get_logger('report_queue')
+
+
+class ReportQueue:
+    """
+    非阻塞上报队列
+
+    report_* 调用只负责入队并立即返回，后台发送线程按类别合并记录，
+    在积累到批量大小或最早记录超过最大等待时间时发送。
+    """
+
+    def __init__(self, send_batch, overflow_handler=None, max_size=500, batch_size=50, max_age=2.0):
+        """
+        初始化上报队列
+
+        Args:
+            send_batch (callable): 发送回调 send_batch(category, records)，失败时由回调负责缓存
+            overflow_handler (callable, optional): 队列满时处理被挤出的记录 overflow_handler(category, record)
+            max_size (int, optional): 队列最大长度
+            batch_size (int, optional): 达到此数量立即发送
+            max_age (float, optional): 最早记录等待超过此秒数时发送
+        """
+        self.send_batch = send_batch
+        self.overflow_handler = overflow_handler
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.max_age = max_age
+
+        # 队列元素: (入队时间, 类别, 记录)
+        self.queue = deque()
+        self.condition = threading.Condition()
+
+        # 统计
+        self.enqueued_count = 0
+        self.processed_count = 0
+        self.dropped_count = 0
+        self.batch_count = 0
+
+        # 线程控制
+        self.running = False
+        self.sender_thread = None
+
+    def start(self):
+        """启动发送线程"""
+        if self.running:
+            return
+
+        self.running = True
+        self.sender_thread = threading.Thread(target=self._sender_loop, daemon=True)
+        self.sender_thread.start()
+
+    def stop(self, timeout=5.0):
+        """
+        停止发送线程，尽量发送剩余记录
+
+        Args:
+            timeout (float, optional): 等待线程结束的最长时间
+        """
+        if not self.running:
+            return
+
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+        if self.sender_thread and self.sender_thread.is_alive():
+            self.sender_thread.join(timeout=timeout)
+
+    def put(self, category, record):
+        """
+        入队一条记录（不阻塞）
+
+        Args:
+            category (str): 记录类别
+            record (dict): 记录内容
+
+        Returns:
+            bool: 是否入队成功
+        """
+        overflow = None
+        with self.condition:
+            if not self.running:
+                return False
+
+            if len(self.queue) >= self.max_size:
+                overflow = self.queue.popleft()
+                self.dropped_count += 1
+
+            self.queue.append((time.time(), category, record))
+            self.enqueued_count += 1
+
+            # 队列由空变为非空时唤醒发送线程开始计时，达到批量大小时立即发送
+            if len(self.queue) == 1 or len(self.queue) >= self.batch_size:
+                self.condition.notify()
+
+        # 被挤出的记录交给溢出处理（通常写入离线缓存），避免在持锁时做IO
+        if overflow and self.overflow_handler:
+            _, overflow_category, overflow_record = overflow
+            self.overflow_handler(overflow_category, overflow_record)
+
+        return True
+
+    def drain(self):
+        """
+        取出队列中剩余的全部记录（停止后用于转存离线缓存）
+
+        Returns:
+            list: (类别, 记录) 列表
+        """
+        with self.condition:
+            remaining = [item[1:] for item in self.queue]
+            self.queue.clear()
+            return remaining
+
+    def get_depth(self):
+        """
+        获取当前队列深度
+
+        Returns:
+            int: 队列中的记录数
+        """
+        with self.condition:
+            return len(self.queue)
+
+    def get_stats(self):
+        """
+        获取队列统计
+
+        Returns:
+            dict: 统计数据
+        """
+        with self.condition:
+            return {
+                'depth': len(self.queue),
+                'max_size': self.max_size,
+                'enqueued': self.enqueued_count,
+                'processed': self.processed_count,
+                'dropped': self.dropped_count,
+                'batches': self.batch_count
+            }
+
+    def _take_batch(self):
+        """
+        等待并取出一批记录
+
+        Returns:
+            list: (类别, 记录) 列表，停止且队列为空时返回None
+        """
+        with self.condition:
+            while True:
+                if self.queue:
+                    age = time.time() - self.queue[0][0]
+                    if len(self.queue) >= self.batch_size or age >= self.max_age or not self.running:
+                        count = min(len(self.queue), self.batch_size)
+                        return [self.queue.popleft()[1:] for _ in range(count)]
+                    self.condition.wait(self.max_age - age)
+                elif not self.running:
+                    return None
+                else:
+                    self.condition.wait()
+
+    def _sender_loop(self):
+        """发送线程"""
+        logger.info("启动上报队列发送线程")
+
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                break
+
+            # 按类别合并，保持各类别内的先后顺序
+            grouped = {}
+            for category, record in batch:
+                grouped.setdefault(category, []).append(record)
+
+            for category, records in grouped.items():
+                try:
+                    self.send_batch(category, records)
+                except Exception as e:
+                    logger.error(f"上报队列发送出错: {str(e)}")
+
+            with self.condition:
+                self.processed_count += len(batch)
+                self.batch_count += 1
+
+        logger.info("上报队列发送线程退出")
@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+定时任务调度模块 - 基于最小堆的截止时间调度器
+"""
+
+import time
+import heapq
+import random
+import threading
+
+from src.utils.logger import get_logger
+
+logger = get_logger('scheduler')
+
+
+class ScheduledJob:
+    """周期任务"""
+
+    def __init__(self, name, func, interval, jitter=0.1, backoff_factor=2.0, max_backoff=None, initial_delay=0.0):
+        """
+        初始化周期任务
+
+        Args:
+            name (str): 任务名称
+            func (callable): 任务函数，返回False表示失败（触发退避）
+            interval (float): 执行间隔（秒）
+            jitter (float, optional): 随机抖动比例，避免设备群同时请求
+            backoff_factor (float, optional): 连续失败时间隔的放大倍数
+            max_backoff (float, optional): 退避后的最长间隔（秒），默认为10倍间隔
+            initial_delay (float, optional): 首次执行延迟（秒）
+        """
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff if max_backoff is not None else interval * 10
+        self.initial_delay = initial_delay
+
+        self.deadline = 0.0
+        self.failures = 0
+        self.run_count = 0
+        self.last_run_time = None
+        self.last_duration = 0.0
+        self.enabled = True
+        self.executing = False
+        self.retrigger_delay = None
+
+    def next_delay(self):
+        """
+        计算下次执行的延迟（含退避和抖动）
+
+        Returns:
+            float: 延迟秒数
+        """
+        delay = self.interval
+        if self.failures:
+            delay = min(self.interval * self.backoff_factor ** self.failures, max(self.max_backoff, self.interval))
+        if self.jitter:
+            delay *= 1 + random.uniform(-self.jitter, self.jitter)
+        return max(delay, 0.0)
+
+
+class TaskScheduler:
+    """
+    截止时间调度器
+
+    所有周期任务放在按截止时间排序的最小堆中，线程休眠到最近的截止时间，
+    而不是每秒轮询检查各任务的经过时间。
+    """
+
+    def __init__(self):
+        """初始化调度器"""
+        self.jobs = {}
+        self.heap = []
+        self.counter = 0
+        self.condition = threading.Condition()
+        self.running = True
+        self.wakeups = 0
+
+    def add_job(self, name, func, interval, **kwargs):
+        """
+        添加周期任务
+
+        Args:
+            name (str): 任务名称
+            func (callable): 任务函数
+            interval (float): 执行间隔（秒）
+            **kwargs: 传给ScheduledJob的其他参数
+
+        Returns:
+            ScheduledJob: 任务对象
+        """
+        job = ScheduledJob(name, func, interval, **kwargs)
+        with self.condition:
+            self.jobs[name] = job
+            self._push(job, time.monotonic() + job.initial_delay)
+            self.condition.notify()
+        return job
+
+    def _push(self, job, deadline):
+        """将任务按截止时间放入堆中"""
+        job.deadline = deadline
+        self.counter += 1
+        heapq.heappush(self.heap, (deadline, self.counter, job))
+
+    def trigger(self, name, delay=0.0):
+        """
+        提前任务的执行时间（不会推迟已有的更早截止时间）
+
+        Args:
+            name (str): 任务名称
+            delay (float, optional): 在多少秒后执行
+        """
+        with self.condition:
+            job = self.jobs.get(name)
+            if not job:
+                return
+            if job.executing:
+                # 任务正在执行，执行结束后按此延迟重新调度
+                if job.retrigger_delay is None or delay < job.retrigger_delay:
+                    job.retrigger_delay = delay
+                return
+            deadline = time.monotonic() + delay
+            if deadline < job.deadline:
+                # 旧的堆元素在弹出时会因截止时间不匹配而被忽略
+                self._push(job, deadline)
+                self.condition.notify()
+
+    def set_interval(self, name, interval):
+        """
+        修改任务执行间隔
+
+        Args:
+            name (str): 任务名称
+            interval (float): 新的间隔（秒）
+        """
+        with self.condition:
+            job = self.jobs.get(name)
+            if job:
+                job.interval = interval
+
+    def set_enabled(self, name, enabled):
+        """
+        启用或禁用任务
+
+        Args:
+            name (str): 任务名称
+            enabled (bool): 是否启用
+        """
+        with self.condition:
+            job = self.jobs.get(name)
+            if job:
+                job.enabled = enabled
+
+    def _next_due_job(self):
+        """
+        等待下一个到期任务
+
+        Returns:
+            ScheduledJob: 到期任务，调度器停止时返回None
+        """
+        with self.condition:
+            while self.running:
+                if not self.heap:
+                    self.condition.wait()
+                    continue
+
+                deadline, _, job = self.heap[0]
+                if deadline != job.deadline:
+                    # 已被trigger替换的过期元素
+                    heapq.heappop(self.heap)
+                    continue
+
+                wait_time = deadline - time.monotonic()
+                if wait_time <= 0:
+                    heapq.heappop(self.heap)
+                    job.executing = True
+                    return job
+
+                self.condition.wait(wait_time)
+                self.wakeups += 1
+            return None
+
+    def run(self):
+        """在当前线程中运行调度循环，直到stop()被调用"""
+        while True:
+            job = self._next_due_job()
+            if job is None:
+                break
+
+            success = True
+            start_time = time.monotonic()
+            if job.enabled:
+                try:
+                    success = job.func() is not False
+                except Exception as e:
+                    logger.error(f"定时任务 {job.name} 出错: {str(e)}")
+                    success = False
+
+            with self.condition:
+                job.run_count += 1
+                job.last_run_time = time.time()
+                job.last_duration = time.monotonic() - start_time
+                job.failures = 0 if success else job.failures + 1
+                job.executing = False
+
+                # 截止时间从本次执行结束起算，避免长任务造成连续补跑
+                delay = job.next_delay()
+                if job.retrigger_delay is not None:
+                    delay = min(delay, job.retrigger_delay)
+                    job.retrigger_delay = None
+                self._push(job, time.monotonic() + delay)
+
+    def stop(self):
+        """停止调度循环"""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+    def get_stats(self):
+        """
+        获取调度统计
+
+        Returns:
+            dict: 各任务状态和唤醒次数
+        """
+        with self.condition:
+            now = time.monotonic()
+            return {
+                'wakeups': self.wakeups,
+                'jobs': {
+                    name: {
+                        'interval': job.interval,
+                        'next_run_in': max(job.deadline - now, 0.0),
+                        'failures': job.failures,
+                        'run_count': job.run_count,
+                        'last_run_time': job.last_run_time,
+                        'last_duration': job.last_duration
+                    }
+                    for name, job in self.jobs.items()
+                }
+            }
@@ -0,0 +1,369 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+云平台序列化模块 - JSON与基于字段字典的紧凑二进制编码
+
+二进制编码中TIMESTAMP_FIELDS字段的非负时间戳按毫秒取整（varint），解码后与原值最多相差0.5毫秒；
+整数时间戳按秒编码并解码为整数，JSON与二进制之间往返不变；
+其他浮点数按原值编码（能精确表示时用4字节，否则8字节）。
+"""
+
+import json
+import zlib
+import struct
+
+from src.utils.logger import get_logger
+
+logger = get_logger('serializer')
+
+# 尝试导入zstd压缩库
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    logger.info("zstandard库不可用，二进制编码仅支持zlib压缩")
+    ZSTD_AVAILABLE = False
+
+JSON_CONTENT_TYPE = 'application/json'
+BINARY_CONTENT_TYPE = 'application/x-svf-binary'
+
+# 字段字典：常见键名编码为1字节序号（只能在末尾追加，修改需升级版本号）
+FIELD_DICTIONARY_VERSION = 1
+FIELD_DICTIONARY = (
+    'device_id', 'timestamp', 'status', 'data', 'message', 'resolved',
+    'id', 'user_id', 'auth_method', 'start_time', 'end_time', 'report_time', 'cache_time',
+    'products_taken', 'before_products', 'after_products', 'total_amount', 'payment_details', 'payment_request',
+    'product_id', 'name', 'quantity', 'price', 'amount', 'confidence',
+    'transactions', 'errors', 'warnings', 'replenishments', 'products',
+    'current_stock', 'predicted_sales', 'replenishment_quantity', 'priority',
+    'running', 'door_status', 'temperature', 'humidity', 'inventory', 'location',
+    'latitude', 'longitude', 'address', 'power_status', 'power_outage', 'voltage', 'power_consumption',
+    'security', 'intrusion_detected', 'last_maintenance', 'version',
+    'encoding', 'status_seq', 'base_seq', 'ops', 'op', 'path', 'value',
+)
+FIELD_INDEX = {name: index for index, name in enumerate(FIELD_DICTIONARY)}
+
+# 以毫秒整数varint编码的时间戳字段（有损：精度为1毫秒，亚毫秒部分四舍五入）
+TIMESTAMP_FIELDS = frozenset((
+    'timestamp', 'start_time', 'end_time', 'report_time', 'cache_time', 'last_sale',
+))
+
+# 值类型标记
+TAG_NONE = 0x00
+TAG_FALSE = 0x01
+TAG_TRUE = 0x02
+TAG_INT = 0x03
+TAG_FLOAT32 = 0x04
+TAG_FLOAT64 = 0x05
+TAG_STR = 0x06
+TAG_LIST = 0x07
+TAG_DICT = 0x08
+TAG_TIMESTAMP_MS = 0x09
+TAG_TIMESTAMP_S = 0x0A  # 整数秒时间戳，解码后仍为int
+
+# 头部：魔数 + 版本 + 压缩方式
+MAGIC = b'SV'
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_ZSTD = 2
+COMPRESSION_CODES = {None: COMPRESSION_NONE, 'none': COMPRESSION_NONE, 'zlib': COMPRESSION_ZLIB, 'zstd': COMPRESSION_ZSTD}
+
+# 截断或损坏的二进制负载在解压和解码时可能引发的异常（统一转换为ValueError）
+DECODE_ERRORS = (IndexError, struct.error, zlib.error, RecursionError)
+if ZSTD_AVAILABLE:
+    DECODE_ERRORS += (zstandard.ZstdError,)
+
+_FLOAT32 = struct.Struct('<f')
+_FLOAT64 = struct.Struct('<d')
+
+
+def _write_varint(out, value):
+    """写入无符号varint"""
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, pos):
+    """读取无符号varint，返回(值, 新位置)"""
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _encode_value(out, value, key=None):
+    """编码一个值"""
+    if value is None:
+        out.append(TAG_NONE)
+    elif value is True:
+        out.append(TAG_TRUE)
+    elif value is False:
+        out.append(TAG_FALSE)
+    elif isinstance(value, int) and key in TIMESTAMP_FIELDS and value >= 0:
+        out.append(TAG_TIMESTAMP_S)
+        _write_varint(out, value)
+    elif isinstance(value, float) and key in TIMESTAMP_FIELDS and value >= 0:
+        out.append(TAG_TIMESTAMP_MS)
+        _write_varint(out, int(round(value * 1000)))
+    elif isinstance(value, int):
+        if not -(1 << 63) <= value < (1 << 63):
+            raise ValueError(f"整数超出64位范围: {value}")
+        out.append(TAG_INT)
+        _write_varint(out, (value << 1) ^ (value >> 63))
+    elif isinstance(value, float):
+        packed = _FLOAT32.pack(value) if abs(value) < 3.4e38 else None
+        if packed is not None and _FLOAT32.unpack(packed)[0] == value:
+            out.append(TAG_FLOAT32)
+            out.extend(packed)
+        else:
+            out.append(TAG_FLOAT64)
+            out.extend(_FLOAT64.pack(value))
+    elif isinstance(value, str):
+        encoded = value.encode('utf-8')
+        out.append(TAG_STR)
+        _write_varint(out, len(encoded))
+        out.extend(encoded)
+    elif isinstance(value, (list, tuple)):
+        out.append(TAG_LIST)
+        _write_varint(out, len(value))
+        for item in value:
+            _encode_value(out, item)
+    elif isinstance(value, dict):
+        out.append(TAG_DICT)
+        _write_varint(out, len(value))
+        for item_key, item_value in value.items():
+            item_key = str(item_key)
+            index = FIELD_INDEX.get(item_key)
+            if index is not None:
+                _write_varint(out, index + 1)
+            else:
+                encoded = item_key.encode('utf-8')
+                out.append(0)
+                _write_varint(out, len(encoded))
+                out.extend(encoded)
+            _encode_value(out, item_value, item_key)
+    else:
+        raise TypeError(f"无法编码的类型: {type(value).__name__}")
+
+
+def _decode_value(data, pos):
+    """解码一个值，返回(值, 新位置)"""
+    tag = data[pos]
+    pos += 1
+
+    if tag == TAG_NONE:
+        return None, pos
+    if tag == TAG_TRUE:
+        return True, pos
+    if tag == TAG_FALSE:
+        return False, pos
+    if tag == TAG_TIMESTAMP_MS:
+        value, pos = _read_varint(data, pos)
+        return value / 1000.0, pos
+    if tag == TAG_TIMESTAMP_S:
+        return _read_varint(data, pos)
+    if tag == TAG_INT:
+        value, pos = _read_varint(data, pos)
+        return (value >> 1) ^ -(value & 1), pos
+    if tag == TAG_FLOAT32:
+        return _FLOAT32.unpack_from(data, pos)[0], pos + 4
+    if tag == TAG_FLOAT64:
+        return _FLOAT64.unpack_from(data, pos)[0], pos + 8
+    if tag == TAG_STR:
+        length, pos = _read_varint(data, pos)
+        return bytes(data[pos:pos + length]).decode('utf-8'), pos + length
+    if tag == TAG_LIST:
+        count, pos = _read_varint(data, pos)
+        items = []
+        for _ in range(count):
+            item, pos = _decode_value(data, pos)
+            items.append(item)
+        return items, pos
+    if tag == TAG_DICT:
+        count, pos = _read_varint(data, pos)
+        result = {}
+        for _ in range(count):
+            key_index, pos = _read_varint(data, pos)
+            if key_index:
+                key = FIELD_DICTIONARY[key_index - 1]
+            else:
+                length, pos = _read_varint(data, pos)
+                key = bytes(data[pos:pos + length]).decode('utf-8')
+                pos += length
+            result[key], pos = _decode_value(data, pos)
+        return result, pos
+
+    raise ValueError(f"未知的类型标记: {tag}")
+
+
+class JsonSerializer:
+    """JSON序列化（默认及回退格式）"""
+
+    name = 'json'
+    content_type = JSON_CONTENT_TYPE
+    content_type_header = JSON_CONTENT_TYPE
+
+    def encode(self, obj):
+        """
+        编码对象
+
+        Args:
+            obj: 待编码对象
+
+        Returns:
+            bytes: 编码结果
+        """
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def decode(self, data):
+        """
+        解码字节
+
+        Args:
+            data (bytes): 编码数据
+
+        Returns:
+            解码后的对象
+        """
+        return json.loads(data)
+
+
+class BinarySerializer:
+    """
+    紧凑二进制序列化
+
+    常见字段名使用字段字典编码为单字节序号，时间戳以毫秒varint编码（精度1毫秒），
+    可精确表示的浮点数使用4字节，整体可选zlib或zstd压缩。
+    """
+
+    name = 'binary'
+    content_type = BINARY_CONTENT_TYPE
+
+    def __init__(self, compression='zlib', level=6):
+        """
+        初始化二进制序列化器
+
+        Args:
+            compression (str, optional): 压缩方式 none/zlib/zstd，zstd不可用时回退到zlib
+            level (int, optional): 压缩级别
+        """
+        if compression == 'zstd' and not ZSTD_AVAILABLE:
+            logger.warning("zstandard库不可用，改用zlib压缩")
+            compression = 'zlib'
+        if compression not in COMPRESSION_CODES:
+            raise ValueError(f"不支持的压缩方式: {compression}")
+
+        self.compression = compression or 'none'
+        self.level = level
+        self.compression_code = COMPRESSION_CODES[compression]
+
+    @property
+    def content_type_header(self):
+        """带参数的Content-Type，用于与服务器协商"""
+        return f"{BINARY_CONTENT_TYPE}; v={FIELD_DICTIONARY_VERSION}; compression={self.compression}"
+
+    def encode(self, obj):
+        """
+        编码对象
+
+        Args:
+            obj: 待编码对象
+
+        Returns:
+            bytes: 编码结果
+        """
+        body = bytearray()
+        _encode_value(body, obj)
+
+        if self.compression_code == COMPRESSION_ZLIB:
+            body = zlib.compress(bytes(body), self.level)
+        elif self.compression_code == COMPRESSION_ZSTD:
+            body = zstandard.ZstdCompressor(level=self.level).compress(bytes(body))
+
+        return MAGIC + bytes((FIELD_DICTIONARY_VERSION, self.compression_code)) + bytes(body)
+
+    def decode(self, data):
+        """
+        解码字节
+
+        Args:
+            data (bytes): 编码数据
+
+        Returns:
+            解码后的对象
+
+        Raises:
+            ValueError: 负载格式无效、被截断或已损坏
+        """
+        if len(data) < 4 or data[:2] != MAGIC:
+            raise ValueError("不是有效的二进制负载")
+        if data[2] != FIELD_DICTIONARY_VERSION:
+            raise ValueError(f"不支持的字段字典版本: {data[2]}")
+
+        compression_code = data[3]
+        body = data[4:]
+        try:
+            if compression_code == COMPRESSION_ZLIB:
+                body = zlib.decompress(body)
+            elif compression_code == COMPRESSION_ZSTD:
+                if not ZSTD_AVAILABLE:
+                    raise ValueError("zstandard库不可用，无法解压")
+                body = zstandard.ZstdDecompressor().decompress(body)
+            elif compression_code != COMPRESSION_NONE:
+                raise ValueError(f"未知的压缩方式: {compression_code}")
+
+            value, _ = _decode_value(memoryview(body), 0)
+        except DECODE_ERRORS as e:
+            raise ValueError(f"二进制负载已损坏: {str(e)}") from e
+        return value
+
+
+def create_serializer(name='json', compression='zlib'):
+    """
+    按名称创建序列化器
+
+    Args:
+        name (str, optional): json 或 binary
+        compression (str, optional): 二进制格式的压缩方式
+
+    Returns:
+        JsonSerializer|BinarySerializer: 序列化器
+    """
+    if name == 'binary':
+        return BinarySerializer(compression=compression)
+    return JsonSerializer()
+
+
+def parse_content_type(header):
+    """
+    解析Content-Type头，返回对应的序列化器
+
+    Args:
+        header (str): Content-Type或协商响应头
+
+    Returns:
+        JsonSerializer|BinarySerializer: 序列化器
+
+    Raises:
+        ValueError: 压缩方式参数不受支持
+    """
+    if not header or not header.startswith(BINARY_CONTENT_TYPE):
+        return JsonSerializer()
+
+    params = {}
+    for part in header.split(';')[1:]:
+        if '=' in part:
+            key, value = part.split('=', 1)
+            params[key.strip()] = value.strip()
+
+    if params.get('v', str(FIELD_DICTIONARY_VERSION)) != str(FIELD_DICTIONARY_VERSION):
+        return JsonSerializer()
+    return BinarySerializer(compression=params.get('compression', 'zlib'))
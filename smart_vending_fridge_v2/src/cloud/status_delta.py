@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+状态增量编码模块 - 基于最后确认快照的JSON Patch增量上报
+"""
+
+import copy
+import time
+import threading
+
+from src.utils.logger import get_logger
+
+logger = get_logger('status_delta')
+
+
+def _escape_path(key):
+    """按RFC 6901转义JSON Pointer路径片段"""
+    return str(key).replace('~', '~0').replace('/', '~1')
+
+
+def diff(base, target, path=''):
+    """
+    生成从base到target的JSON Patch操作列表
+
+    字典按键递归比较；列表若只是在末尾追加（如errors/warnings）则生成追加操作，
+    否则整体替换。
+
+    Args:
+        base: 基准值
+        target: 目标值
+        path (str, optional): 当前JSON Pointer路径
+
+    Returns:
+        list: JSON Patch操作列表
+    """
+    if isinstance(base, dict) and isinstance(target, dict):
+        ops = []
+        for key in base:
+            if key not in target:
+                ops.append({'op': 'remove', 'path': f"{path}/{_escape_path(key)}"})
+        for key, value in target.items():
+            child_path = f"{path}/{_escape_path(key)}"
+            if key not in base:
+                ops.append({'op': 'add', 'path': child_path, 'value': value})
+            elif base[key] != value:
+                ops.extend(diff(base[key], value, child_path))
+        return ops
+
+    if isinstance(base, list) and isinstance(target, list):
+        if len(target) > len(base) and target[:len(base)] == base:
+            return [{'op': 'add', 'path': f"{path}/-", 'value': item} for item in target[len(base):]]
+
+    if base == target:
+        return []
+    return [{'op': 'replace', 'path': path, 'value': target}]
+
+
+def _unescape_path(part):
+    """按RFC 6901还原JSON Pointer路径片段"""
+    return part.replace('~1', '/').replace('~0', '~')
+
+
+def apply_patch(document, ops):
+    """
+    将diff生成的JSON Patch操作应用到文档（服务器端重建完整状态）
+
+    Args:
+        document: 基准文档（不会被修改）
+        ops (list): JSON Patch操作列表
+
+    Returns:
+        应用后的新文档
+
+    Raises:
+        KeyError, IndexError, TypeError, ValueError: 操作与基准文档不匹配
+    """
+    document = copy.deepcopy(document)
+    for op in ops:
+        action = op['op']
+        if action not in ('add', 'remove', 'replace'):
+            raise ValueError(f"不支持的操作: {action}")
+
+        path = op['path']
+        if path == '':
+            document = copy.deepcopy(op['value'])
+            continue
+
+        parts = [_unescape_path(part) for part in path.split('/')[1:]]
+        parent = document
+        for part in parts[:-1]:
+            parent = parent[int(part)] if isinstance(parent, list) else parent[part]
+
+        key = parts[-1]
+        if isinstance(parent, list):
+            if action == 'remove':
+                del parent[int(key)]
+            elif key == '-':
+                parent.append(op['value'])
+            elif action == 'add':
+                parent.insert(int(key), op['value'])
+            else:
+                parent[int(key)] = op['value']
+        elif action == 'remove':
+            del parent[key]
+        else:
+            if action == 'replace' and key not in parent:
+                raise KeyError(key)
+            parent[key] = op['value']
+    return document
+
+
+class StatusDeltaEncoder:
+    """
+    状态增量编码器
+
+    保存服务器最后确认的状态快照，只发送变化的字段；
+    定期发送完整关键帧，服务器也可以通过响应要求重新同步。
+    """
+
+    def __init__(self, keyframe_interval=30, keyframe_max_age=3600):
+        """
+        初始化状态增量编码器
+
+        Args:
+            keyframe_interval (int, optional): 每隔多少次上报发送一次完整关键帧
+            keyframe_max_age (float, optional): 关键帧最长间隔（秒）
+        """
+        self.keyframe_interval = keyframe_interval
+        self.keyframe_max_age = keyframe_max_age
+
+        # 最后确认的快照
+        self.base_snapshot = None
+        self.base_seq = 0
+
+        # 已发送未确认的快照: seq -> 快照
+        self.pending = {}
+        self.next_seq = 1
+
+        self.deltas_since_keyframe = 0
+        self.last_keyframe_time = 0
+        self.resync_requested = False
+
+        # 统计
+        self.full_bytes = 0
+        self.encoded_bytes = 0
+
+        self.lock = threading.Lock()
+
+    def _needs_keyframe(self):
+        """判断是否需要发送完整关键帧"""
+        return (self.base_snapshot is None
+                or self.resync_requested
+                or self.deltas_since_keyframe >= self.keyframe_interval
+                or time.time() - self.last_keyframe_time >= self.keyframe_max_age)
+
+    def encode(self, status):
+        """
+        编码状态
+
+        Args:
+            status (dict): 完整状态（调用方保证不会再被修改）
+
+        Returns:
+            dict: 上报负载，encoding为full时包含完整状态，为json-patch时包含ops
+        """
+        with self.lock:
+            seq = self.next_seq
+            self.next_seq += 1
+            self.pending[seq] = status
+
+            if self._needs_keyframe():
+                self.resync_requested = False
+                self.deltas_since_keyframe = 0
+                self.last_keyframe_time = time.time()
+                payload = dict(status)
+                payload.update({'encoding': 'full', 'status_seq': seq})
+                return payload
+
+            self.deltas_since_keyframe += 1
+            return {
+                'encoding': 'json-patch',
+                'status_seq': seq,
+                'base_seq': self.base_seq,
+                'ops': diff(self.base_snapshot, status)
+            }
+
+    def acknowledge(self, seq):
+        """
+        服务器确认某次上报，将其快照作为新的增量基准
+
+        Args:
+            seq (int): 上报序号
+        """
+        with self.lock:
+            snapshot = self.pending.pop(seq, None)
+            if snapshot is None or seq < self.base_seq:
+                return
+
+            self.base_snapshot = snapshot
+            self.base_seq = seq
+
+            # 丢弃更早的未确认快照
+            for stale_seq in [s for s in self.pending if s < seq]:
+                del self.pending[stale_seq]
+
+    def reject(self, seq):
+        """
+        某次上报失败，丢弃其快照（基准保持不变）
+
+        Args:
+            seq (int): 上报序号
+        """
+        with self.lock:
+            self.pending.pop(seq, None)
+
+    def request_resync(self):
+        """服务器要求重新同步，下一次上报发送完整关键帧"""
+        with self.lock:
+            self.resync_requested = True
+            logger.info("服务器要求重新同步状态，下次发送完整关键帧")
+
+    def record_size(self, full_size, encoded_size):
+        """
+        记录编码前后的字节数
+
+        Args:
+            full_size (int): 完整状态字节数
+            encoded_size (int): 实际发送字节数
+        """
+        with self.lock:
+            self.full_bytes += full_size
+            self.encoded_bytes += encoded_size
+
+    def get_stats(self):
+        """
+        获取编码统计
+
+        Returns:
+            dict: 统计数据
+        """
+        with self.lock:
+            return {
+                'base_seq': self.base_seq,
+                'full_bytes': self.full_bytes,
+                'encoded_bytes': self.encoded_bytes,
+                'compression_ratio': self.full_bytes / self.encoded_bytes if self.encoded_bytes else 1.0
+            }
+
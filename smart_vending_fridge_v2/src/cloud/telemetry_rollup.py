@@ -0,0 +1,335 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+遥测汇总模块 - 离线期间将状态采样降采样为按分钟和按小时的聚合数据
+"""
+
+import os
+import time
+import threading
+from array import array
+
+from src.utils.logger import get_logger
+
+logger = get_logger('telemetry_rollup')
+
+# 每个聚合桶的字段（存储在连续的double数组中）
+BUCKET_FIELDS = (
+    'start', 'samples',
+    'temperature_min', 'temperature_max', 'temperature_sum', 'temperature_count',
+    'humidity_sum', 'humidity_count',
+    'door_opens', 'door_open_samples',
+    'power_sum', 'power_count', 'voltage_min', 'voltage_max',
+    'power_outage_samples',
+)
+FIELD_OFFSET = {name: index for index, name in enumerate(BUCKET_FIELDS)}
+FIELD_COUNT = len(BUCKET_FIELDS)
+
+# 空桶的起始时间标记
+EMPTY_START = -1.0
+
+
+class RollupRing:
+    """
+    固定大小的环形聚合缓冲区
+
+    桶按时间直接映射到槽位（起始时间 // 粒度 % 槽位数），
+    槽位中保存的起始时间与当前桶不一致时视为过期并重置，内存大小恒定。
+    """
+
+    def __init__(self, resolution, slots):
+        """
+        初始化环形缓冲区
+
+        Args:
+            resolution (int): 桶粒度（秒）
+            slots (int): 槽位数
+        """
+        self.resolution = resolution
+        self.slots = slots
+        self.data = array('d', [0.0]) * (slots * FIELD_COUNT)
+        for slot in range(slots):
+            self.data[slot * FIELD_COUNT] = EMPTY_START
+
+    def bucket_start(self, timestamp):
+        """获取时间戳所在桶的起始时间"""
+        return float(int(timestamp // self.resolution) * self.resolution)
+
+    def _slot_base(self, start):
+        """获取桶在数组中的起始下标，过期槽位会被重置"""
+        base = (int(start // self.resolution) % self.slots) * FIELD_COUNT
+        if self.data[base] != start:
+            self.data[base:base + FIELD_COUNT] = array('d', [0.0]) * FIELD_COUNT
+            self.data[base] = start
+            self.data[base + FIELD_OFFSET['temperature_min']] = float('inf')
+            self.data[base + FIELD_OFFSET['temperature_max']] = float('-inf')
+            self.data[base + FIELD_OFFSET['voltage_min']] = float('inf')
+            self.data[base + FIELD_OFFSET['voltage_max']] = float('-inf')
+        return base
+
+    def add(self, timestamp, temperature, humidity, door_open, door_opened, power, voltage, power_outage):
+        """
+        将一个采样累加到所在的桶
+
+        Args:
+            timestamp (float): 采样时间
+            temperature (float): 温度，None表示缺失
+            humidity (float): 湿度，None表示缺失
+            door_open (bool): 门是否打开
+            door_opened (bool): 本次采样是否检测到开门（由关到开）
+            power (float): 功率，None表示缺失
+            voltage (float): 电压，None表示缺失
+            power_outage (bool): 是否断电
+        """
+        data = self.data
+        base = self._slot_base(self.bucket_start(timestamp))
+        data[base + FIELD_OFFSET['samples']] += 1
+
+        if temperature is not None:
+            offset = base + FIELD_OFFSET['temperature_min']
+            data[offset] = min(data[offset], temperature)
+            offset = base + FIELD_OFFSET['temperature_max']
+            data[offset] = max(data[offset], temperature)
+            data[base + FIELD_OFFSET['temperature_sum']] += temperature
+            data[base + FIELD_OFFSET['temperature_count']] += 1
+
+        if humidity is not None:
+            data[base + FIELD_OFFSET['humidity_sum']] += humidity
+            data[base + FIELD_OFFSET['humidity_count']] += 1
+
+        if door_opened:
+            data[base + FIELD_OFFSET['door_opens']] += 1
+        if door_open:
+            data[base + FIELD_OFFSET['door_open_samples']] += 1
+
+        if power is not None:
+            data[base + FIELD_OFFSET['power_sum']] += power
+            data[base + FIELD_OFFSET['power_count']] += 1
+        if voltage is not None:
+            offset = base + FIELD_OFFSET['voltage_min']
+            data[offset] = min(data[offset], voltage)
+            offset = base + FIELD_OFFSET['voltage_max']
+            data[offset] = max(data[offset], voltage)
+
+        if power_outage:
+            data[base + FIELD_OFFSET['power_outage_samples']] += 1
+
+    def collect(self, since):
+        """
+        导出起始时间不早于since的非空桶
+
+        Args:
+            since (float): 起始时间下限
+
+        Returns:
+            list: 按时间排序的聚合字典
+        """
+        rollups = []
+        for slot in range(self.slots):
+            base = slot * FIELD_COUNT
+            start = self.data[base]
+            if start == EMPTY_START or start < since or not self.data[base + FIELD_OFFSET['samples']]:
+                continue
+            rollups.append(self._to_dict(base))
+        rollups.sort(key=lambda rollup: rollup['start'])
+        return rollups
+
+    def _to_dict(self, base):
+        """将一个桶转换为上报格式"""
+        values = {name: self.data[base + index] for index, name in enumerate(BUCKET_FIELDS)}
+        rollup = {
+            'start': values['start'],
+            'resolution': self.resolution,
+            'samples': int(values['samples']),
+            'door_opens': int(values['door_opens']),
+            'door_open_ratio': values['door_open_samples'] / values['samples'],
+            'power_outage_samples': int(values['power_outage_samples'])
+        }
+        if values['temperature_count']:
+            rollup.update({
+                'temperature_min': values['temperature_min'],
+                'temperature_max': values['temperature_max'],
+                'temperature_mean': values['temperature_sum'] / values['temperature_count']
+            })
+        if values['humidity_count']:
+            rollup['humidity_mean'] = values['humidity_sum'] / values['humidity_count']
+        if values['power_count']:
+            rollup['power_mean'] = values['power_sum'] / values['power_count']
+        if values['voltage_min'] <= values['voltage_max']:
+            rollup.update({'voltage_min': values['voltage_min'], 'voltage_max': values['voltage_max']})
+        return rollup
+
+
+class TelemetryRollup:
+    """
+    遥测汇总
+
+    离线期间的状态采样只累加到按分钟和按小时的环形缓冲区中，不保存完整状态副本；
+    恢复连接后上传尚未确认的聚合数据。
+    """
+
+    def __init__(self, minute_slots=1440, hour_slots=168):
+        """
+        初始化遥测汇总
+
+        Args:
+            minute_slots (int, optional): 保留的分钟桶数量（默认24小时）
+            hour_slots (int, optional): 保留的小时桶数量（默认7天）
+        """
+        self.minutes = RollupRing(60, minute_slots)
+        self.hours = RollupRing(3600, hour_slots)
+
+        # 已确认上传的水位线（各粒度下一个需要上传的桶起始时间）
+        self.uploaded = {'minute': 0.0, 'hour': 0.0}
+        self.last_door_open = False
+        self.sample_count = 0
+
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _extract(status):
+        """从状态字典中提取聚合所需的指标"""
+        temperature = status.get('temperature')
+        humidity = status.get('humidity')
+
+        door = status.get('door')
+        if isinstance(door, dict):
+            door_open = bool(door.get('is_open'))
+        else:
+            door_open = status.get('door_status') == 'open'
+
+        power = status.get('power') or {}
+        power_status = status.get('power_status') or {}
+        power_consumption = power.get('power_consumption', power_status.get('power_consumption'))
+        voltage = power.get('voltage', power_status.get('voltage'))
+
+        return (
+            float(temperature) if isinstance(temperature, (int, float)) else None,
+            float(humidity) if isinstance(humidity, (int, float)) else None,
+            door_open,
+            float(power_consumption) if isinstance(power_consumption, (int, float)) else None,
+            float(voltage) if isinstance(voltage, (int, float)) else None,
+            bool(power_status.get('power_outage', False))
+        )
+
+    def add(self, status, timestamp=None):
+        """
+        累加一个状态采样
+
+        Args:
+            status (dict): 设备状态
+            timestamp (float, optional): 采样时间，默认为当前时间
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        temperature, humidity, door_open, power, voltage, power_outage = self._extract(status)
+
+        with self.lock:
+            door_opened = door_open and not self.last_door_open
+            self.last_door_open = door_open
+            self.sample_count += 1
+            for ring in (self.minutes, self.hours):
+                ring.add(timestamp, temperature, humidity, door_open, door_opened, power, voltage, power_outage)
+
+    def collect(self, now=None):
+        """
+        导出尚未确认的聚合数据
+
+        当前（未结束的）桶也会导出，服务器按(设备, 粒度, 起始时间)覆盖写入，
+        因此之后重新上传同一个桶是安全的。
+
+        Args:
+            now (float, optional): 当前时间
+
+        Returns:
+            tuple: ({'minute': [...], 'hour': [...]}, 确认标记)
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            rollups = {
+                'minute': self.minutes.collect(self.uploaded['minute']),
+                'hour': self.hours.collect(self.uploaded['hour'])
+            }
+            # 确认后水位线推进到当前桶，当前桶之后仍可能继续累加
+            marker = {'minute': self.minutes.bucket_start(now), 'hour': self.hours.bucket_start(now)}
+            return rollups, marker
+
+    def acknowledge(self, marker):
+        """
+        上传成功后推进水位线
+
+        Args:
+            marker (dict): collect返回的确认标记
+        """
+        with self.lock:
+            for resolution, start in marker.items():
+                self.uploaded[resolution] = max(self.uploaded[resolution], start)
+
+    def save(self, path):
+        """
+        将缓冲区保存到文件（断电后仍保留离线期间的历史）
+
+        Args:
+            path (str): 文件路径
+        """
+        with self.lock:
+            header = array('d', [self.minutes.slots, self.hours.slots,
+                                 self.uploaded['minute'], self.uploaded['hour'], float(self.last_door_open)])
+            temp_path = path + '.tmp'
+            with open(temp_path, 'wb') as f:
+                header.tofile(f)
+                self.minutes.data.tofile(f)
+                self.hours.data.tofile(f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, path)
+
+    def load(self, path):
+        """
+        从文件恢复缓冲区（槽位数变化时忽略旧文件）
+
+        Args:
+            path (str): 文件路径
+
+        Returns:
+            bool: 是否恢复成功
+        """
+        if not os.path.exists(path):
+            return False
+
+        with self.lock:
+            try:
+                with open(path, 'rb') as f:
+                    header = array('d')
+                    header.fromfile(f, 5)
+                    if int(header[0]) != self.minutes.slots or int(header[1]) != self.hours.slots:
+                        logger.warning("遥测汇总槽位数已变化，忽略旧的汇总文件")
+                        return False
+                    minutes = array('d')
+                    minutes.fromfile(f, len(self.minutes.data))
+                    hours = array('d')
+                    hours.fromfile(f, len(self.hours.data))
+            except (EOFError, OSError) as e:
+                logger.error(f"加载遥测汇总失败: {str(e)}")
+                return False
+
+            self.minutes.data = minutes
+            self.hours.data = hours
+            self.uploaded = {'minute': header[2], 'hour': header[3]}
+            self.last_door_open = bool(header[4])
+            return True
+
+    def get_stats(self):
+        """
+        获取汇总统计
+
+        Returns:
+            dict: 采样数及缓冲区占用
+        """
+        with self.lock:
+            return {
+                'samples': self.sample_count,
+                'minute_slots': self.minutes.slots,
+                'hour_slots': self.hours.slots,
+                'memory_bytes': (len(self.minutes.data) + len(self.hours.data)) * self.minutes.data.itemsize
+            }
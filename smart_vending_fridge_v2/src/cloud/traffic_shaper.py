@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+流量整形模块 - 按优先级分类的令牌桶限速、月流量上限与分类用量统计
+"""
+
+import os
+import json
+import time
+import threading
+from datetime import datetime
+
+from src.utils.logger import get_logger
+
+logger = get_logger('traffic_shaper')
+
+# 流量类别（按优先级从高到低）
+TRAFFIC_CLASSES = ('payment', 'alert', 'telemetry', 'ota')
+
+# 端点 -> 流量类别（未列出的端点归为遥测）
+ENDPOINT_CLASSES = {
+    # 心跳和上下线很小且决定设备是否在线，与告警同级
+    '/device/connect': 'alert',
+    '/device/disconnect': 'alert',
+    '/device/heartbeat': 'alert',
+    '/device/transaction': 'payment',
+    '/device/transactions_batch': 'payment',
+    '/device/error': 'alert',
+    '/device/errors_batch': 'alert',
+    '/device/warning': 'alert',
+    '/device/warnings_batch': 'alert',
+    '/device/replenishment': 'alert',
+    '/device/replenishments_batch': 'alert',
+}
+
+# 达到月流量上限的多少比例后停止该类别的流量（None表示不受上限限制）
+DEFAULT_CAP_RATIOS = {
+    'payment': None,
+    'alert': 1.0,
+    'telemetry': 0.9,
+    'ota': 0.8,
+}
+
+
+class TrafficBudgetExceeded(Exception):
+    """本月流量已达到该类别的上限，或等待令牌超时"""
+
+
+def classify_endpoint(endpoint):
+    """
+    获取端点所属的流量类别
+
+    Args:
+        endpoint (str): API端点
+
+    Returns:
+        str: 流量类别
+    """
+    if endpoint.startswith('/device/ota/'):
+        return 'ota'
+    return ENDPOINT_CLASSES.get(endpoint, 'telemetry')
+
+
+class TrafficShaper:
+    """
+    流量整形器
+
+    所有上传共享一个令牌桶（字节/秒），等待令牌时高优先级类别先得到令牌，
+    低优先级类别在有更高优先级请求等待时让出；下载的字节同样从令牌桶中扣除。
+    按自然月统计各类别的发送和接收字节数，超过月流量上限的对应比例后拒绝该类别的流量，
+    交易记录不受上限限制。
+    """
+
+    def __init__(self, bytes_per_second=0, burst_bytes=64 * 1024, monthly_cap_bytes=0, cap_ratios=None,
+                 usage_file=None, clock=None):
+        """
+        初始化流量整形器
+
+        Args:
+            bytes_per_second (int, optional): 链路预算（字节/秒），0表示不限速
+            burst_bytes (int, optional): 令牌桶容量（允许的突发字节数）
+            monthly_cap_bytes (int, optional): 月流量上限（字节），0表示不限制
+            cap_ratios (dict, optional): 各类别可使用的月流量上限比例
+            usage_file (str, optional): 月用量持久化文件
+            clock (callable, optional): 补充令牌和计算等待时间的单调时钟，默认为time.monotonic（测试时传入虚拟时钟）
+        """
+        self.bytes_per_second = bytes_per_second
+        self.burst_bytes = max(burst_bytes, 1)
+        self.monthly_cap_bytes = monthly_cap_bytes
+        self.cap_ratios = dict(DEFAULT_CAP_RATIOS)
+        self.cap_ratios.update(cap_ratios or {})
+        self.usage_file = usage_file
+        self.clock = clock or time.monotonic
+
+        self.tokens = float(self.burst_bytes)
+        self.last_refill = self.clock()
+        self.waiting = {traffic_class: 0 for traffic_class in TRAFFIC_CLASSES}
+        self.condition = threading.Condition()
+
+        self.month = self._current_month()
+        self.usage = self._empty_usage()
+        self._load()
+
+    @staticmethod
+    def _current_month():
+        """当前自然月（YYYY-MM）"""
+        return datetime.now().strftime('%Y-%m')
+
+    @staticmethod
+    def _empty_usage():
+        """空的分类用量"""
+        return {
+            traffic_class: {'sent_bytes': 0, 'received_bytes': 0, 'requests': 0, 'denied': 0, 'wait_time': 0.0}
+            for traffic_class in TRAFFIC_CLASSES
+        }
+
+    def _load(self):
+        """加载本月已用流量（跨月的旧记录忽略）"""
+        if not self.usage_file or not os.path.exists(self.usage_file):
+            return
+        try:
+            with open(self.usage_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get('month') == self.month:
+                for traffic_class, counters in state.get('usage', {}).items():
+                    if traffic_class in self.usage:
+                        self.usage[traffic_class].update(counters)
+        except Exception as e:
+            logger.error(f"加载流量用量失败: {str(e)}")
+
+    def save(self):
+        """保存本月已用流量"""
+        if not self.usage_file:
+            return
+        with self.condition:
+            state = {'month': self.month, 'usage': self.usage}
+            content = json.dumps(state)
+        try:
+            temp_file = self.usage_file + '.tmp'
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(temp_file, self.usage_file)
+        except Exception as e:
+            logger.error(f"保存流量用量失败: {str(e)}")
+
+    def _roll_month(self):
+        """进入新的自然月时清零用量（调用方持有锁）"""
+        month = self._current_month()
+        if month != self.month:
+            logger.info(f"进入新的计费月 {month}，上月流量 {self._month_total()} 字节")
+            self.month = month
+            self.usage = self._empty_usage()
+
+    def _month_total(self):
+        """本月总流量（调用方持有锁）"""
+        return sum(counters['sent_bytes'] + counters['received_bytes'] for counters in self.usage.values())
+
+    def _within_cap(self, traffic_class, nbytes):
+        """判断该类别本次流量是否在月流量上限内（调用方持有锁）"""
+        if self.monthly_cap_bytes <= 0:
+            return True
+        ratio = self.cap_ratios.get(traffic_class)
+        if ratio is None:
+            return True
+        return self._month_total() + nbytes <= self.monthly_cap_bytes * ratio
+
+    def _refill(self):
+        """按经过的时间补充令牌（调用方持有锁）"""
+        now = self.clock()
+        self.tokens = min(self.burst_bytes, self.tokens + (now - self.last_refill) * self.bytes_per_second)
+        self.last_refill = now
+
+    def _higher_priority_waiting(self, traffic_class):
+        """是否有更高优先级的请求在等待（调用方持有锁）"""
+        for other in TRAFFIC_CLASSES:
+            if other == traffic_class:
+                return False
+            if self.waiting[other]:
+                return True
+        return False
+
+    def acquire(self, traffic_class, nbytes, timeout=None, direction='sent'):
+        """
+        为一次传输获取令牌并计入用量
+
+        超过令牌桶容量的大请求在桶满时放行，令牌余额变为负数，后续请求等待补足。
+
+        Args:
+            traffic_class (str): 流量类别
+            nbytes (int): 传输字节数
+            timeout (float, optional): 最长等待时间（秒），None表示一直等待
+            direction (str, optional): 计入发送(sent)还是接收(received)用量，下载的数据块按接收计入
+
+        Raises:
+            TrafficBudgetExceeded: 超过月流量上限或等待超时
+        """
+        start_time = self.clock()
+        deadline = None if timeout is None else start_time + timeout
+
+        with self.condition:
+            self._roll_month()
+            counters = self.usage[traffic_class]
+            if not self._within_cap(traffic_class, nbytes):
+                counters['denied'] += 1
+                raise TrafficBudgetExceeded(f"本月流量已达到{traffic_class}类别上限")
+
+            if self.bytes_per_second > 0:
+                self.waiting[traffic_class] += 1
+                try:
+                    while True:
+                        self._refill()
+                        needed = min(nbytes, self.burst_bytes)
+                        if not self._higher_priority_waiting(traffic_class) and self.tokens >= needed:
+                            break
+                        wait_time = max((needed - self.tokens) / self.bytes_per_second, 0.01)
+                        if deadline is not None:
+                            remaining = deadline - self.clock()
+                            if remaining <= 0:
+                                counters['denied'] += 1
+                                raise TrafficBudgetExceeded(f"{traffic_class}类别等待带宽超时")
+                            wait_time = min(wait_time, remaining)
+                        self.condition.wait(wait_time)
+                finally:
+                    self.waiting[traffic_class] -= 1
+                    # 唤醒被本请求阻挡的低优先级请求
+                    self.condition.notify_all()
+                self.tokens -= nbytes
+
+            counters[f'{direction}_bytes'] += nbytes
+            counters['requests'] += 1
+            counters['wait_time'] += self.clock() - start_time
+
+    def record_received(self, traffic_class, nbytes):
+        """
+        计入接收的字节（不等待，但从令牌桶中扣除）
+
+        Args:
+            traffic_class (str): 流量类别
+            nbytes (int): 接收字节数
+        """
+        with self.condition:
+            self._roll_month()
+            self.usage[traffic_class]['received_bytes'] += nbytes
+            if self.bytes_per_second > 0:
+                self._refill()
+                self.tokens -= nbytes
+
+    def get_stats(self):
+        """
+        获取流量统计
+
+        Returns:
+            dict: 本月各类别用量、总量及上限
+        """
+        with self.condition:
+            self._roll_month()
+            return {
+                'month': self.month,
+                'month_total_bytes': self._month_total(),
+                'monthly_cap_bytes': self.monthly_cap_bytes,
+                'bytes_per_second': self.bytes_per_second,
+                'tokens': self.tokens,
+                'classes': {traffic_class: dict(counters) for traffic_class, counters in self.usage.items()}
+            }
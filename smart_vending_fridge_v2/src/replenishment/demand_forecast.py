@@ -0,0 +1,672 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+需求预测模块 - 基于商品×星期小时需求矩阵的全商品批量预测（预测销量、趋势因子和补货优先级）
+
+星期小时销量按可配置的半衰期指数衰减，旧季节的销量逐渐失去权重；趋势窗口的销量随时间推进增量维护，
+单个商品的预测和趋势查询为常数时间。
+"""
+
+import math
+import time
+import threading
+import numpy as np
+from datetime import datetime
+
+from src.utils.logger import get_logger
+
+logger = get_logger('demand_forecast')
+
+# 一周的小时数（星期几 * 24 + 小时）
+HOURS_PER_WEEK = 7 * 24
+
+# 趋势比较窗口（天）：最近N天与之前N天的销量之比
+TREND_DAYS = 7
+
+# 趋势桶宽度（小时）及每个趋势窗口包含的桶数
+TREND_BUCKET_HOURS = 6
+TREND_WINDOW_BUCKETS = TREND_DAYS * 24 // TREND_BUCKET_HOURS
+
+# 环形趋势桶数（两个趋势窗口加上被窗口边界切开的一个桶）
+TREND_SLOTS = 2 * TREND_WINDOW_BUCKETS + 1
+
+# 趋势因子范围
+TREND_MIN = 0.5
+TREND_MAX = 2.0
+
+# 衰减缩放指数上限：超过后把累计值换算到新的基准时间，避免浮点溢出
+RESCALE_EXPONENT = 40.0
+
+# 一天的秒数
+SECONDS_PER_DAY = 24 * 3600
+
+
+def _trend_bucket(moment):
+    """获取本地时间所在的趋势桶序号"""
+    return moment.toordinal() * (24 // TREND_BUCKET_HOURS) + moment.hour // TREND_BUCKET_HOURS
+
+
+def _time_buckets(timestamps):
+    """
+    计算时间戳所在的星期小时和趋势桶序号（本地时间）
+
+    Args:
+        timestamps: 时间戳序列
+
+    Returns:
+        tuple: (星期小时数组, 趋势桶序号数组)
+    """
+    # 所有时区的偏移都是15分钟的整数倍，同一个15分钟内的时间戳本地小时相同，每个15分钟只转换一次
+    quarters, inverse = np.unique(np.floor_divide(np.asarray(timestamps, dtype=np.float64), 900).astype(np.int64),
+                                  return_inverse=True)
+    moments = [datetime.fromtimestamp(quarter * 900) for quarter in quarters.tolist()]
+    hours = np.fromiter((moment.weekday() * 24 + moment.hour for moment in moments), dtype=np.int64,
+                        count=len(moments))
+    buckets = np.fromiter((_trend_bucket(moment) for moment in moments), dtype=np.int64, count=len(moments))
+    return hours[inverse], buckets[inverse]
+
+
+class DemandForecaster:
+    """
+    批量需求预测器
+
+    每个商品一行，按星期小时（168列）累计销量，并按6小时一桶累计最近两个趋势窗口的销量（环形趋势桶）；
+    forecast_all() 对所有商品一次性完成小时/星期加权、趋势因子和补货优先级的向量化计算。
+    商品ID可以是任意可哈希值，中央计划可以用 (设备ID, 商品ID) 作为键把整个设备群放进一个预测器。
+
+    启用衰减时，星期小时销量和总销量以 exp(λ(t - decay_origin)) 缩放后累加，每笔销售O(1)写入，
+    读取时再乘以 exp(-λ(now - decay_origin))，等价于所有历史销量按半衰期衰减到当前时刻。
+    最近窗口和之前窗口的销量和在趋势桶推进时增量更新，查询趋势因子不再扫描趋势桶。
+    环形趋势桶只在写入销量或显式调用advance()时推进（持有锁），预测和查询不修改状态；
+    预测时刻晚于最新趋势桶时按趋势桶权重计算，结果与推进后相同。
+    """
+
+    def __init__(self, prediction_window=24, algorithm='predictive', capacity=32, half_life_days=0):
+        """
+        初始化需求预测器
+
+        Args:
+            prediction_window (float, optional): 预测窗口（小时）
+            algorithm (str, optional): 预测算法 simple, predictive, ml（ml没有模型的商品按predictive计算）
+            capacity (int, optional): 初始商品容量
+            half_life_days (float, optional): 销量衰减半衰期（天），0表示不衰减
+        """
+        self.prediction_window = prediction_window
+        self.algorithm = algorithm
+        self.half_life_days = half_life_days or 0
+        # 衰减率（每秒）
+        self.decay_rate = math.log(2) / (self.half_life_days * SECONDS_PER_DAY) if self.half_life_days > 0 else 0.0
+        # 销售线程写入与补货计算读取之间的锁
+        self.lock = threading.RLock()
+        self.reset(capacity)
+
+    def reset(self, capacity=32):
+        """
+        清空所有销售数据
+
+        Args:
+            capacity (int, optional): 初始商品容量
+        """
+        with self.lock:
+            capacity = max(capacity, 1)
+            self.product_ids = []
+            self.rows = {}
+            # 星期小时销量和总销量（启用衰减时为相对decay_origin缩放后的值）
+            self.demand = np.zeros((capacity, HOURS_PER_WEEK), dtype=np.float64)
+            self.total_quantity = np.zeros(capacity, dtype=np.float64)
+            self.decay_origin = None
+            self.first_sale = np.full(capacity, np.inf)
+            self.last_sale = np.full(capacity, -np.inf)
+            # 环形趋势桶：趋势桶b位于列 b % TREND_SLOTS，trend_head为环中最新的趋势桶序号
+            self.trend_counts = np.zeros((capacity, TREND_SLOTS), dtype=np.float64)
+            self.trend_head = None
+            # 相对trend_head的最近窗口（桶龄0..N-1）和之前窗口（桶龄N+1..2N-1）销量和，边界桶查询时按比例计入
+            self.recent_sum = np.zeros(capacity, dtype=np.float64)
+            self.prior_sum = np.zeros(capacity, dtype=np.float64)
+
+    def _row(self, product_id):
+        """获取商品所在行（新商品追加一行，容量不足时翻倍）"""
+        row = self.rows.get(product_id)
+        if row is not None:
+            return row
+
+        row = len(self.product_ids)
+        capacity = len(self.total_quantity)
+        if row >= capacity:
+            extra = capacity
+            self.demand = np.vstack([self.demand, np.zeros((extra, HOURS_PER_WEEK))])
+            self.total_quantity = np.concatenate([self.total_quantity, np.zeros(extra)])
+            self.first_sale = np.concatenate([self.first_sale, np.full(extra, np.inf)])
+            self.last_sale = np.concatenate([self.last_sale, np.full(extra, -np.inf)])
+            self.trend_counts = np.vstack([self.trend_counts, np.zeros((extra, TREND_SLOTS))])
+            self.recent_sum = np.concatenate([self.recent_sum, np.zeros(extra)])
+            self.prior_sum = np.concatenate([self.prior_sum, np.zeros(extra)])
+        self.product_ids.append(product_id)
+        self.rows[product_id] = row
+        return row
+
+    def _rebase(self, latest):
+        """
+        写入销量前检查缩放基准时间，缩放指数过大时把累计值换算到新的基准时间
+
+        Args:
+            latest (float): 本次写入的最新销售时间戳
+        """
+        if self.decay_origin is None:
+            self.decay_origin = latest
+        elif self.decay_rate * (latest - self.decay_origin) > RESCALE_EXPONENT:
+            factor = math.exp(-self.decay_rate * (latest - self.decay_origin))
+            self.demand *= factor
+            self.total_quantity *= factor
+            self.decay_origin = latest
+
+    def _decay_scale(self, timestamps):
+        """
+        计算销量写入或移除时的缩放系数（不衰减时为1）
+
+        Args:
+            timestamps (np.ndarray): 销售时间戳数组
+
+        Returns:
+            np.ndarray: 缩放系数
+        """
+        if not self.decay_rate or self.decay_origin is None:
+            return np.ones(len(timestamps))
+        return np.exp(self.decay_rate * (timestamps - self.decay_origin))
+
+    def _decay_factor(self, now):
+        """获取缩放值换算到指定时刻的系数"""
+        if not self.decay_rate or self.decay_origin is None:
+            return 1.0
+        return math.exp(-self.decay_rate * (now - self.decay_origin))
+
+    def _advance(self, bucket):
+        """
+        把环形趋势桶推进到指定趋势桶，同时增量更新两个窗口的销量和
+
+        每推进一个桶，跨过窗口边界的桶从最近窗口移入之前窗口、从之前窗口移出，离开环形窗口的列清零。
+
+        Args:
+            bucket (int): 趋势桶序号
+        """
+        head = self.trend_head
+        if head is not None and bucket <= head:
+            return
+        if head is None or bucket - head >= TREND_SLOTS:
+            self.trend_counts.fill(0.0)
+            self.recent_sum.fill(0.0)
+            self.prior_sum.fill(0.0)
+        else:
+            window = TREND_WINDOW_BUCKETS
+            counts = self.trend_counts
+            for head in range(head + 1, bucket + 1):
+                self.recent_sum -= counts[:, (head - window) % TREND_SLOTS]
+                self.prior_sum += counts[:, (head - window - 1) % TREND_SLOTS]
+                self.prior_sum -= counts[:, (head - 2 * window) % TREND_SLOTS]
+                counts[:, head % TREND_SLOTS] = 0.0
+            # 浮点累计误差不应产生负销量
+            np.maximum(self.recent_sum, 0.0, out=self.recent_sum)
+            np.maximum(self.prior_sum, 0.0, out=self.prior_sum)
+        self.trend_head = int(bucket)
+
+    def advance(self, now=None):
+        """
+        把环形趋势桶推进到指定时刻（补货计算前调用，使趋势查询走常数时间的增量窗口和）
+
+        Args:
+            now (float, optional): 时间戳，默认为当前时间
+        """
+        with self.lock:
+            if self.trend_head is not None:
+                self._advance(_trend_bucket(datetime.fromtimestamp(time.time() if now is None else now)))
+
+    def _add_trend(self, rows, buckets, quantities):
+        """
+        把销量计入趋势桶和窗口销量和（数量为负时表示移除），早于环形窗口的销量忽略
+
+        Args:
+            rows (np.ndarray): 行号数组
+            buckets (np.ndarray): 趋势桶序号数组
+            quantities (np.ndarray): 销售数量数组
+        """
+        if quantities.max(initial=0.0) > 0:
+            self._advance(int(buckets.max()))
+        if self.trend_head is None:
+            return
+
+        window = TREND_WINDOW_BUCKETS
+        age = self.trend_head - buckets
+        valid = (age >= 0) & (age < TREND_SLOTS)
+        np.add.at(self.trend_counts, (rows[valid], buckets[valid] % TREND_SLOTS), quantities[valid])
+        recent = valid & (age < window)
+        np.add.at(self.recent_sum, rows[recent], quantities[recent])
+        prior = valid & (age > window) & (age < 2 * window)
+        np.add.at(self.prior_sum, rows[prior], quantities[prior])
+
+    def add_sales(self, product_ids, timestamps, quantities):
+        """
+        批量写入销售记录
+
+        Args:
+            product_ids (list): 商品ID列表
+            timestamps (list): 销售时间戳列表
+            quantities (list): 销售数量列表
+        """
+        if not len(product_ids):
+            return
+        # 先对商品ID编号，每种商品只查找（或分配）一次行
+        codes = {}
+        keys = np.fromiter((codes.setdefault(product_id, len(codes)) for product_id in product_ids), dtype=np.int64,
+                           count=len(product_ids))
+        self.add_sales_coded(list(codes), keys, timestamps, quantities)
+
+    def add_sales_coded(self, product_ids, codes, timestamps, quantities):
+        """
+        批量写入按商品编号存放的销售记录（启动时直接使用快照的列）
+
+        Args:
+            product_ids (list): 商品编号对应的商品ID
+            codes (array-like): 每条记录的商品编号
+            timestamps (array-like): 销售时间戳
+            quantities (array-like): 销售数量
+        """
+        codes = np.asarray(codes, dtype=np.int64)
+        if not len(codes):
+            return
+        with self.lock:
+            # 只为出现的商品分配行（编号表中可能有已被截断、没有记录的商品）
+            present = np.unique(codes)
+            table = np.zeros(len(product_ids), dtype=np.int64)
+            table[present] = [self._row(product_ids[code]) for code in present.tolist()]
+            rows = table[codes]
+            timestamps = np.asarray(timestamps, dtype=np.float64)
+            quantities = np.asarray(quantities, dtype=np.float64)
+            hours, buckets = _time_buckets(timestamps)
+
+            if self.decay_rate:
+                self._rebase(float(timestamps.max()))
+            scaled = quantities * self._decay_scale(timestamps)
+            np.add.at(self.demand, (rows, hours), scaled)
+            np.add.at(self.total_quantity, rows, scaled)
+            np.minimum.at(self.first_sale, rows, timestamps)
+            np.maximum.at(self.last_sale, rows, timestamps)
+
+            self._add_trend(rows, buckets, quantities)
+
+    def add_sale(self, product_id, timestamp, quantity):
+        """
+        写入一条销售记录（O(1)，趋势桶推进到新桶时除外）
+
+        Args:
+            product_id: 商品ID
+            timestamp (float): 销售时间戳
+            quantity (float): 销售数量
+        """
+        with self.lock:
+            row = self._row(product_id)
+            moment = datetime.fromtimestamp(timestamp)
+            scaled = quantity
+            if self.decay_rate:
+                self._rebase(timestamp)
+                scaled = quantity * math.exp(self.decay_rate * (timestamp - self.decay_origin))
+            self.demand[row, moment.weekday() * 24 + moment.hour] += scaled
+            self.total_quantity[row] += scaled
+            if timestamp < self.first_sale[row]:
+                self.first_sale[row] = timestamp
+            if timestamp > self.last_sale[row]:
+                self.last_sale[row] = timestamp
+
+            # 与_add_trend相同的规则，单条记录直接按标量更新
+            bucket = _trend_bucket(moment)
+            self._advance(bucket)
+            age = self.trend_head - bucket
+            if age < TREND_SLOTS:
+                self.trend_counts[row, bucket % TREND_SLOTS] += quantity
+                if age < TREND_WINDOW_BUCKETS:
+                    self.recent_sum[row] += quantity
+                elif TREND_WINDOW_BUCKETS < age < 2 * TREND_WINDOW_BUCKETS:
+                    self.prior_sum[row] += quantity
+
+    def remove_sales(self, product_ids, timestamps, quantities):
+        """
+        批量移除销售记录（销售历史截断时调用），移除后需用set_time_range更新首末销售时间
+
+        Args:
+            product_ids (list): 商品ID列表
+            timestamps (list): 销售时间戳列表
+            quantities (list): 销售数量列表
+        """
+        with self.lock:
+            known = [index for index, product_id in enumerate(product_ids) if product_id in self.rows]
+            if not known:
+                return
+            rows = np.array([self.rows[product_ids[index]] for index in known], dtype=np.int64)
+            timestamps = np.asarray(timestamps, dtype=np.float64)[known]
+            quantities = np.asarray(quantities, dtype=np.float64)[known]
+            hours, buckets = _time_buckets(timestamps)
+
+            scaled = quantities * self._decay_scale(timestamps)
+            np.subtract.at(self.demand, (rows, hours), scaled)
+            np.subtract.at(self.total_quantity, rows, scaled)
+            # 浮点累计误差不应产生负销量
+            np.maximum(self.demand, 0.0, out=self.demand)
+            np.maximum(self.total_quantity, 0.0, out=self.total_quantity)
+
+            self._add_trend(rows, buckets, -quantities)
+            np.maximum(self.trend_counts, 0.0, out=self.trend_counts)
+            np.maximum(self.recent_sum, 0.0, out=self.recent_sum)
+            np.maximum(self.prior_sum, 0.0, out=self.prior_sum)
+
+    def set_time_range(self, product_id, time_range):
+        """
+        设置商品的首末销售时间
+
+        Args:
+            product_id: 商品ID
+            time_range (tuple): (最早时间戳, 最晚时间戳)，None表示没有销售记录
+        """
+        with self.lock:
+            row = self.rows.get(product_id)
+            if row is None:
+                return
+            self.first_sale[row], self.last_sale[row] = time_range if time_range else (np.inf, -np.inf)
+
+    def forecast_all(self, product_ids=None, stock=None, now=None, models=None, temperature=None):
+        """
+        一次性预测所有商品
+
+        没有销售记录的商品预测销量为1.0、趋势因子为1.0，补货优先级不计销量加成。
+        提供训练好的模型时，有模型的商品使用模型预测，其余商品按predictive计算。
+
+        Args:
+            product_ids (list, optional): 要预测的商品ID，None表示所有已知商品
+            stock (array-like, optional): 与product_ids对应的当前库存，提供时计算补货优先级
+            now (float, optional): 预测时刻的时间戳，默认为当前时间
+            models (ModelSet, optional): 训练好的预测模型（ml算法）
+            temperature (float, optional): 当前温度，传给模型的回归温度特征
+
+        Returns:
+            dict: product_ids、predicted_sales、trend_factors、priorities（未提供库存时为None）和timestamp
+        """
+        now = time.time() if now is None else now
+        moment = datetime.fromtimestamp(now)
+        product_ids = list(self.product_ids) if product_ids is None else list(product_ids)
+        count = len(product_ids)
+
+        predicted = np.ones(count, dtype=np.float64)
+        trend = np.ones(count, dtype=np.float64)
+        total_quantity = np.zeros(count, dtype=np.float64)
+
+        with self.lock:
+            rows = np.fromiter((self.rows.get(product_id, -1) for product_id in product_ids), dtype=np.int64,
+                               count=count)
+            known = rows >= 0
+            known[known] = self.total_quantity[rows[known]] > 0
+            rows = rows[known]
+
+            if len(rows):
+                total_quantity[known] = self.total_quantity[rows] * self._decay_factor(now)
+                base = self._base(rows, now)
+
+                if self.algorithm == 'simple':
+                    predicted[known] = base
+                else:
+                    row_trend = self._trend(rows, moment)
+                    trend[known] = row_trend
+                    predicted[known] = np.maximum(base * self._seasonal(rows, moment) * row_trend, 0.1)
+
+        if models is not None and len(models):
+            modeled_sales, modeled = models.predict_all(product_ids, now, temperature)
+            predicted = np.where(modeled, np.maximum(modeled_sales, 0.1), predicted)
+
+        priorities = None
+        if stock is not None:
+            priorities = self.priorities(np.asarray(stock, dtype=np.float64), predicted, total_quantity, known)
+
+        return {
+            'product_ids': product_ids,
+            'predicted_sales': predicted,
+            'trend_factors': trend,
+            'priorities': priorities,
+            'timestamp': now
+        }
+
+    def _base(self, rows, now):
+        """
+        计算预测窗口内的基础销量（平均日销量折算到预测窗口）
+
+        不衰减时为总销量除以首末销售时间跨度（至少1天）；衰减时为衰减到当前时刻的销量除以
+        从首次销售到当前时刻的衰减加权天数，销量稳定时两者一致。
+
+        Args:
+            rows (np.ndarray): 行号数组
+            now (float): 预测时刻的时间戳
+
+        Returns:
+            np.ndarray: 基础销量
+        """
+        first_sale = self.first_sale[rows]
+        if self.decay_rate:
+            total = self.total_quantity[rows] * self._decay_factor(now)
+            exposure = np.maximum(now - np.where(np.isfinite(first_sale), first_sale, now), SECONDS_PER_DAY)
+            span = -np.expm1(-self.decay_rate * exposure) / self.decay_rate / SECONDS_PER_DAY
+        else:
+            total = self.total_quantity[rows]
+            span = (self.last_sale[rows] - first_sale) / SECONDS_PER_DAY + 1
+            span = np.maximum(np.where(np.isfinite(span), span, 1.0), 1.0)
+        return total / span * (self.prediction_window / 24)
+
+    def _seasonal(self, rows, moment):
+        """
+        计算当前小时和当前星期几在历史销量中的平均占比
+
+        Args:
+            rows (np.ndarray): 行号数组
+            moment (datetime): 预测时刻
+
+        Returns:
+            np.ndarray: 季节权重
+        """
+        weekday = moment.weekday()
+        demand = self.demand[rows]
+        total = self.total_quantity[rows]
+        hourly_weight = demand[:, moment.hour::24].sum(axis=1) / total
+        daily_weight = demand[:, weekday * 24:(weekday + 1) * 24].sum(axis=1) / total
+        return (hourly_weight + daily_weight) / 2
+
+    def _trend(self, rows, moment):
+        """
+        计算最近N天与之前N天的销量之比
+
+        Args:
+            rows (np.ndarray): 行号数组
+            moment (datetime): 预测时刻
+
+        Returns:
+            np.ndarray: 趋势因子
+        """
+        if self.trend_head is None:
+            return np.ones(len(rows))
+        recent, older = self._window_sums(rows, moment)
+        trend = np.where(older > 0, recent / np.where(older > 0, older, 1.0), 1.0)
+        return np.clip(trend, TREND_MIN, TREND_MAX)
+
+    def _window_sums(self, rows, moment):
+        """
+        获取最近窗口和之前窗口的销量（rows可以是行号数组或单个行号）
+
+        预测时刻位于最新的趋势桶时，直接使用增量维护的窗口销量和加上两个边界桶（常数时间）；
+        否则（趋势桶尚未推进、回测或时钟回拨）按各趋势桶的窗口权重计算，已移出窗口的趋势桶不计入。
+        只读取状态，不推进环形趋势桶。
+
+        Args:
+            rows: 行号数组或行号
+            moment (datetime): 预测时刻
+
+        Returns:
+            tuple: (最近窗口销量, 之前窗口销量)
+        """
+        bucket = _trend_bucket(moment)
+        if bucket == self.trend_head:
+            window = TREND_WINDOW_BUCKETS
+            elapsed = self._bucket_elapsed(moment)
+            edge = self.trend_counts[rows, (bucket - window) % TREND_SLOTS]
+            oldest = self.trend_counts[rows, (bucket - 2 * window) % TREND_SLOTS]
+            recent = self.recent_sum[rows] + (1.0 - elapsed) * edge
+            older = elapsed * edge + self.prior_sum[rows] + (1.0 - elapsed) * oldest
+            return recent, older
+
+        recent_weights, older_weights = self._trend_weights(moment)
+        counts = self.trend_counts[rows]
+        return counts @ recent_weights, counts @ older_weights
+
+    @staticmethod
+    def _bucket_elapsed(moment):
+        """获取当前趋势桶已过去的比例"""
+        seconds = (moment.hour % TREND_BUCKET_HOURS) * 3600 + moment.minute * 60 + moment.second
+        return seconds / (TREND_BUCKET_HOURS * 3600)
+
+    def _trend_weights(self, moment):
+        """
+        计算各趋势桶在两个趋势窗口中的权重
+
+        窗口边界落在某个桶中间时，按当前桶已过去的比例把边界桶拆分到两侧（假设桶内均匀销售），
+        避免把不完整的当前桶与完整的桶直接比较。
+
+        Args:
+            moment (datetime): 预测时刻
+
+        Returns:
+            tuple: (最近窗口权重, 之前窗口权重)
+        """
+        elapsed = self._bucket_elapsed(moment)
+        window = TREND_WINDOW_BUCKETS
+        column_buckets = self.trend_head - (self.trend_head - np.arange(TREND_SLOTS)) % TREND_SLOTS
+        age = _trend_bucket(moment) - column_buckets
+        recent = np.where(age < window, 1.0, 0.0) + np.where(age == window, 1.0 - elapsed, 0.0)
+        older = (np.where(age == window, elapsed, 0.0)
+                 + np.where((age > window) & (age < 2 * window), 1.0, 0.0)
+                 + np.where(age == 2 * window, 1.0 - elapsed, 0.0))
+        # 晚于预测时刻的趋势桶（时钟回拨）不计入
+        recent[age < 0] = 0.0
+        return recent, older
+
+    def _known_row(self, product_id):
+        """获取有销售数据的商品所在行，没有时返回None"""
+        row = self.rows.get(product_id)
+        if row is None or self.total_quantity[row] <= 0:
+            return None
+        return row
+
+    def has_sales(self, product_id):
+        """
+        商品是否有销售数据
+
+        Args:
+            product_id: 商品ID
+
+        Returns:
+            bool: 是否有销售数据
+        """
+        return self._known_row(product_id) is not None
+
+    def base_prediction(self, product_id, now=None):
+        """
+        预测单个商品在预测窗口内的基础销量（不含季节权重和趋势）
+
+        Args:
+            product_id: 商品ID
+            now (float, optional): 预测时刻的时间戳，默认为当前时间
+
+        Returns:
+            float: 基础销量，没有销售数据时为1.0
+        """
+        with self.lock:
+            row = self._known_row(product_id)
+            if row is None:
+                return 1.0
+            return float(self._base(np.array([row]), time.time() if now is None else now)[0])
+
+    def seasonal_weight(self, product_id, now=None):
+        """
+        获取单个商品当前小时和星期几的平均销量占比
+
+        Args:
+            product_id: 商品ID
+            now (float, optional): 预测时刻的时间戳，默认为当前时间
+
+        Returns:
+            float: 季节权重，没有销售数据时为1.0
+        """
+        moment = datetime.fromtimestamp(time.time() if now is None else now)
+        weekday = moment.weekday()
+        with self.lock:
+            row = self._known_row(product_id)
+            if row is None:
+                return 1.0
+            demand = self.demand[row].copy()
+            total = self.total_quantity[row]
+        hourly_weight = demand[moment.hour::24].sum() / total
+        daily_weight = demand[weekday * 24:(weekday + 1) * 24].sum() / total
+        return float(hourly_weight + daily_weight) / 2
+
+    def trend_factor(self, product_id, now=None):
+        """
+        获取单个商品的趋势因子（常数时间）
+
+        Args:
+            product_id: 商品ID
+            now (float, optional): 预测时刻的时间戳，默认为当前时间
+
+        Returns:
+            float: 趋势因子，没有销售数据时为1.0
+        """
+        moment = datetime.fromtimestamp(time.time() if now is None else now)
+        with self.lock:
+            row = self._known_row(product_id)
+            if row is None:
+                return 1.0
+            recent, older = self._window_sums(row, moment)
+        if older <= 0:
+            return 1.0
+        return min(max(float(recent / older), TREND_MIN), TREND_MAX)
+
+    @staticmethod
+    def priorities(stock, predicted, total_quantity, has_sales):
+        """
+        计算补货优先级（库存覆盖率越低越优先，销量越大越优先，缺货为最高的100分）
+
+        销量系数使用衰减到当前时刻的总销量（未启用衰减时即保留历史内的总销量），
+        长期不再畅销的商品不会因为早期的累计销量一直排在前面。
+
+        Args:
+            stock (np.ndarray): 当前库存
+            predicted (np.ndarray): 预测销量
+            total_quantity (np.ndarray): 衰减后的总销量
+            has_sales (np.ndarray): 是否有销售数据
+
+        Returns:
+            np.ndarray: 优先级分数
+        """
+        coverage = stock / np.maximum(predicted, 0.1)
+        priority = 1.0 / np.maximum(coverage, 0.01)
+        priority = np.where(has_sales, priority * np.minimum(total_quantity / 10.0, 2.0), priority)
+        priority = np.minimum(priority, 100.0)
+        return np.where(stock == 0, 100.0, priority)
+
+    def get_stats(self):
+        """
+        获取预测器统计
+
+        Returns:
+            dict: 商品数、衰减半衰期和矩阵占用字节数
+        """
+        return {
+            'products': len(self.product_ids),
+            'capacity': len(self.total_quantity),
+            'half_life_days': self.half_life_days,
+            'memory_bytes': (self.demand.nbytes + self.total_quantity.nbytes + self.first_sale.nbytes
+                             + self.last_sale.nbytes + self.trend_counts.nbytes + self.recent_sum.nbytes
+                             + self.prior_sum.nbytes)
+        }
@@ -0,0 +1,733 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+预测模型模块 - ml补货算法使用的预测模型与后台训练
+
+平稳商品使用Holt-Winters（加性日季节、阻尼趋势），间歇性商品使用Croston/TSB，另有基于小时、星期和
+温度特征的岭回归；每种商品按最近一周的留出误差在时间序列模型和回归之间选择。模型在后台进程池中训练，
+参数以带版本号的JSON保存，训练完成后整体替换，推理只做常数次数组运算。
+"""
+
+import os
+import json
+import time
+import threading
+import multiprocessing
+import numpy as np
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from src.utils.logger import get_logger
+
+logger = get_logger('forecast_models')
+
+# 模型文件格式版本（参数结构变化时加一，旧格式的文件被忽略）
+MODEL_FORMAT_VERSION = 1
+
+HOURS_PER_DAY = 24
+HOURS_PER_WEEK = 7 * 24
+
+# Holt-Winters 参数网格（水平、趋势、季节平滑系数）与趋势阻尼系数
+HW_ALPHAS = (0.02, 0.05, 0.1, 0.2, 0.4)
+HW_BETAS = (0.0, 0.01, 0.05)
+HW_GAMMAS = (0.05, 0.1, 0.2, 0.4)
+HW_DAMPING = 0.98
+
+# TSB 参数网格（需求量、需求概率平滑系数）
+TSB_ALPHAS = (0.05, 0.1, 0.2, 0.4)
+TSB_BETAS = (0.02, 0.05, 0.1, 0.2, 0.4)
+
+# 平均需求间隔（天）超过该值的商品视为间歇性需求（Syntetos-Boylan分类）
+INTERMITTENT_ADI = 1.32
+
+# 岭回归惩罚系数（截距不惩罚）
+RIDGE_PENALTY = 1.0
+
+# 留出评估天数
+HOLDOUT_DAYS = 7
+
+# 温度观测覆盖的小时比例低于该值时回归不使用温度特征
+MIN_TEMPERATURE_COVERAGE = 0.5
+
+# 模型类型编号
+MODEL_KINDS = {'holt_winters': 0, 'tsb': 1, 'regression': 2}
+
+
+def _cyclic_sum(prefix, start, length):
+    """
+    计算24小时循环数组从start开始连续length个位置的和
+
+    Args:
+        prefix (np.ndarray): 每行的前缀和（25列）
+        start (int): 起始位置
+        length (int): 长度
+
+    Returns:
+        np.ndarray: 每行的和
+    """
+    full, remainder = divmod(length, HOURS_PER_DAY)
+    total = full * prefix[:, HOURS_PER_DAY]
+    end = start + remainder
+    if end <= HOURS_PER_DAY:
+        return total + prefix[:, end] - prefix[:, start]
+    return total + prefix[:, HOURS_PER_DAY] - prefix[:, start] + prefix[:, end - HOURS_PER_DAY]
+
+
+def _holt_winters_window(level, trend, prefix, horizon, window, position):
+    """
+    Holt-Winters在最后观测之后第horizon+1到horizon+window小时的预测销量之和
+
+    Args:
+        level (np.ndarray): 水平
+        trend (np.ndarray): 趋势
+        prefix (np.ndarray): 季节项前缀和（按本地小时）
+        horizon (int): 窗口开始前已经过的小时数
+        window (int): 窗口小时数
+        position (int): 窗口第一个小时的本地小时
+
+    Returns:
+        np.ndarray: 预测销量之和
+    """
+    phi = HW_DAMPING
+    geometric = phi ** (horizon + 1) * (1 - phi ** window) / (1 - phi)
+    trend_sum = phi / (1 - phi) * (window - geometric)
+    return level * window + trend * trend_sum + _cyclic_sum(prefix, position, window)
+
+
+def _hourly_grid(end_time, days):
+    """
+    生成截至end_time所在小时之前的小时网格
+
+    Returns:
+        tuple: (结束小时序号, 本地小时数组, 本地星期数组)
+    """
+    end_hour = int(end_time // 3600)
+    start_hour = end_hour - days * HOURS_PER_DAY
+    moments = [datetime.fromtimestamp(hour * 3600) for hour in range(start_hour, end_hour)]
+    hour_of_day = np.array([moment.hour for moment in moments], dtype=np.int64)
+    weekday = np.array([moment.weekday() for moment in moments], dtype=np.int64)
+    return end_hour, hour_of_day, weekday
+
+
+def _fit_holt_winters(series, hour_of_day, split):
+    """
+    对所有商品同时网格搜索Holt-Winters参数
+
+    按split之前的一步预测误差选择参数，返回split时刻（用于留出评估）和最后时刻的状态。
+
+    Args:
+        series (np.ndarray): 每小时销量 (商品数, 小时数)
+        hour_of_day (np.ndarray): 每个小时的本地小时
+        split (int): 留出期开始的小时位置
+
+    Returns:
+        dict: 参数和状态
+    """
+    count, hours = series.shape
+    combos = np.array([(alpha, beta, gamma) for alpha in HW_ALPHAS for beta in HW_BETAS for gamma in HW_GAMMAS])
+    alpha, beta, gamma = (combos[:, index][None, :] for index in range(3))
+    width = len(combos)
+
+    # 初始化：第一周（不足时用前一半数据）各本地小时的平均销量为季节项，总平均为水平
+    warmup = min(HOURS_PER_WEEK, max(split // 2 // HOURS_PER_DAY, 1) * HOURS_PER_DAY)
+    level = np.repeat(series[:, :warmup].mean(axis=1, keepdims=True), width, axis=1)
+    trend = np.zeros((count, width))
+    season = np.zeros((count, width, HOURS_PER_DAY))
+    for hour in range(HOURS_PER_DAY):
+        columns = np.flatnonzero(hour_of_day[:warmup] == hour)
+        if len(columns):
+            season[:, :, hour] = (series[:, columns].mean(axis=1) - level[:, 0])[:, None]
+
+    sse = np.zeros((count, width))
+    snapshot = None
+    for position in range(hours):
+        if position == split:
+            snapshot = (level.copy(), trend.copy(), season.copy())
+        hour = hour_of_day[position]
+        seasonal = season[:, :, hour]
+        observed = series[:, position][:, None]
+        damped = level + HW_DAMPING * trend
+        if warmup <= position < split:
+            sse += (observed - damped - seasonal) ** 2
+        new_level = alpha * (observed - seasonal) + (1 - alpha) * damped
+        trend = beta * (new_level - level) + (1 - beta) * HW_DAMPING * trend
+        season[:, :, hour] = gamma * (observed - new_level) + (1 - gamma) * seasonal
+        level = new_level
+    if snapshot is None:
+        snapshot = (level.copy(), trend.copy(), season.copy())
+
+    best = sse.argmin(axis=1)
+    rows = np.arange(count)
+    return {
+        'params': combos[best],
+        'level': level[rows, best],
+        'trend': trend[rows, best],
+        'season': season[rows, best],
+        'split_level': snapshot[0][rows, best],
+        'split_trend': snapshot[1][rows, best],
+        'split_season': snapshot[2][rows, best]
+    }
+
+
+def _fit_tsb(daily, split_day):
+    """
+    对所有商品同时网格搜索TSB参数（需求概率每天更新，需求量只在有销售的日子更新）
+
+    Args:
+        daily (np.ndarray): 每日销量 (商品数, 天数)
+        split_day (int): 留出期开始的日位置
+
+    Returns:
+        dict: 参数、最终日销量预测和split时刻的日销量预测
+    """
+    count, days = daily.shape
+    combos = np.array([(alpha, beta) for alpha in TSB_ALPHAS for beta in TSB_BETAS])
+    alpha, beta = combos[:, 0][None, :], combos[:, 1][None, :]
+    width = len(combos)
+
+    warmup = min(7, max(split_day // 2, 1))
+    first = daily[:, :warmup]
+    occurred = first > 0
+    probability = np.repeat(occurred.mean(axis=1, keepdims=True), width, axis=1)
+    nonzero = np.where(occurred.any(axis=1), (first * occurred).sum(axis=1) / np.maximum(occurred.sum(axis=1), 1),
+                       daily.sum(axis=1) / np.maximum((daily > 0).sum(axis=1), 1))
+    size = np.repeat(nonzero[:, None], width, axis=1)
+
+    sse = np.zeros((count, width))
+    split_rate = None
+    for day in range(days):
+        if day == split_day:
+            split_rate = probability * size
+        observed = daily[:, day][:, None]
+        if warmup <= day < split_day:
+            sse += (observed - probability * size) ** 2
+        demand = observed > 0
+        probability = probability + beta * (demand - probability)
+        size = np.where(demand, size + alpha * (observed - size), size)
+    if split_rate is None:
+        split_rate = probability * size
+
+    best = sse.argmin(axis=1)
+    rows = np.arange(count)
+    return {
+        'params': combos[best],
+        'rate': (probability * size)[rows, best],
+        'split_rate': split_rate[rows, best]
+    }
+
+
+def _design_matrix(hour_of_day, weekday, temperature):
+    """构建回归设计矩阵：截距、本地小时和星期的独热编码，以及标准化温度（可选）"""
+    hours = len(hour_of_day)
+    columns = 1 + HOURS_PER_DAY + 7 + (1 if temperature is not None else 0)
+    design = np.zeros((hours, columns))
+    design[:, 0] = 1.0
+    design[np.arange(hours), 1 + hour_of_day] = 1.0
+    design[np.arange(hours), 1 + HOURS_PER_DAY + weekday] = 1.0
+    if temperature is not None:
+        design[:, -1] = temperature
+    return design
+
+
+def _fit_regression(series, design):
+    """
+    对所有商品同时求解岭回归（共享设计矩阵，一次求解）
+
+    Args:
+        series (np.ndarray): 每小时销量 (商品数, 小时数)
+        design (np.ndarray): 设计矩阵 (小时数, 特征数)
+
+    Returns:
+        np.ndarray: 系数 (商品数, 特征数)
+    """
+    penalty = np.full(design.shape[1], RIDGE_PENALTY)
+    penalty[0] = 0.0
+    gram = design.T @ design + np.diag(penalty)
+    return np.linalg.solve(gram, design.T @ series.T).T
+
+
+def _temperature_series(temperatures, end_hour, hours):
+    """
+    把温度观测按小时平均并前后填充到小时网格
+
+    Returns:
+        np.ndarray: 每小时温度，观测覆盖不足时返回None
+    """
+    if not temperatures:
+        return None
+    timestamps = np.asarray(temperatures[0], dtype=np.float64)
+    values = np.asarray(temperatures[1], dtype=np.float64)
+    positions = np.floor_divide(timestamps, 3600).astype(np.int64) - (end_hour - hours)
+    valid = (positions >= 0) & (positions < hours)
+    sums = np.bincount(positions[valid], weights=values[valid], minlength=hours)
+    counts = np.bincount(positions[valid], minlength=hours)
+    observed = counts > 0
+    if observed.mean() < MIN_TEMPERATURE_COVERAGE:
+        return None
+
+    indices = np.where(observed, np.arange(hours), -1)
+    np.maximum.accumulate(indices, out=indices)
+    first = int(np.flatnonzero(observed)[0])
+    indices[indices < 0] = first
+    return (sums / np.maximum(counts, 1))[indices]
+
+
+def train_models(product_ids, timestamps, quantities, end_time, temperatures=None, history_days=30,
+                 min_history_days=14):
+    """
+    训练预测模型（在后台进程中运行，只使用可序列化的参数和返回值）
+
+    Args:
+        product_ids (list): 销售记录的商品ID
+        timestamps (array-like): 销售时间戳
+        quantities (array-like): 销售数量
+        end_time (float): 训练截止时间（只使用之前完整小时的数据）
+        temperatures (tuple, optional): (观测时间戳数组, 温度数组)
+        history_days (int, optional): 使用的历史天数
+        min_history_days (int, optional): 商品至少有多少天的销售历史才训练模型
+
+    Returns:
+        dict: 可JSON序列化的模型参数
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    quantities = np.asarray(quantities, dtype=np.float64)
+    result = {'end_time': end_time, 'end_hour': int(end_time // 3600), 'temperature': None, 'products': {}}
+    if not len(timestamps):
+        return result
+
+    # 历史天数不超过最早销售到截止时间的跨度
+    span_days = int((end_time - timestamps.min()) // (HOURS_PER_DAY * 3600))
+    days = min(history_days, span_days)
+    if days < max(min_history_days, 2 * HOLDOUT_DAYS):
+        return result
+    hours = days * HOURS_PER_DAY
+    end_hour, hour_of_day, weekday = _hourly_grid(end_time, days)
+
+    # 每小时销量矩阵（只训练最早销售早于min_history_days天前的商品）
+    codes = {}
+    keys = np.fromiter((codes.setdefault(product_id, len(codes)) for product_id in product_ids), dtype=np.int64,
+                       count=len(product_ids))
+    first_sale = np.full(len(codes), np.inf)
+    np.minimum.at(first_sale, keys, timestamps)
+    positions = np.floor_divide(timestamps, 3600).astype(np.int64) - (end_hour - hours)
+    valid = (positions >= 0) & (positions < hours)
+    series = np.zeros((len(codes), hours))
+    np.add.at(series, (keys[valid], positions[valid]), quantities[valid])
+
+    eligible = (first_sale <= end_time - min_history_days * HOURS_PER_DAY * 3600) & (series.sum(axis=1) > 0)
+    unique_ids = list(codes)
+    trained_ids = [unique_ids[index] for index in np.flatnonzero(eligible)]
+    series = series[eligible]
+    if not len(series):
+        return result
+
+    split = hours - HOLDOUT_DAYS * HOURS_PER_DAY
+    split_day = split // HOURS_PER_DAY
+    daily = series.reshape(len(series), days, HOURS_PER_DAY).sum(axis=2)
+    actual = daily[:, split_day:]
+
+    # 间歇性需求分类：平均需求间隔
+    adi = days / np.maximum((daily > 0).sum(axis=1), 1)
+    intermittent = adi > INTERMITTENT_ADI
+
+    holt_winters = _fit_holt_winters(series, hour_of_day, split)
+    tsb = _fit_tsb(daily, split_day)
+
+    temperature = _temperature_series(temperatures, end_hour, hours)
+    temperature_stats = None
+    if temperature is not None:
+        temperature_stats = {'mean': float(temperature.mean()), 'std': float(max(temperature.std(), 1e-6))}
+        temperature = (temperature - temperature_stats['mean']) / temperature_stats['std']
+        result['temperature'] = temperature_stats
+    design = _design_matrix(hour_of_day, weekday, temperature)
+    holdout_coefficients = _fit_regression(series[:, :split], design[:split])
+    coefficients = _fit_regression(series, design)
+
+    # 留出期每日预测误差
+    holdout_days = days - split_day
+    hw_prefix = np.zeros((len(series), HOURS_PER_DAY + 1))
+    np.cumsum(holt_winters['split_season'], axis=1, out=hw_prefix[:, 1:])
+    hw_forecast = np.stack([
+        _holt_winters_window(holt_winters['split_level'], holt_winters['split_trend'], hw_prefix,
+                             day * HOURS_PER_DAY, HOURS_PER_DAY, int(hour_of_day[split + day * HOURS_PER_DAY]))
+        for day in range(holdout_days)
+    ], axis=1)
+    hw_error = np.abs(np.maximum(hw_forecast, 0.0) - actual).mean(axis=1)
+    tsb_error = np.abs(tsb['split_rate'][:, None] - actual).mean(axis=1)
+    regression_forecast = np.maximum(design[split:] @ holdout_coefficients.T, 0.0).T
+    regression_forecast = regression_forecast.reshape(len(series), holdout_days, HOURS_PER_DAY).sum(axis=2)
+    regression_error = np.abs(regression_forecast - actual).mean(axis=1)
+
+    series_error = np.where(intermittent, tsb_error, hw_error)
+    for index, product_id in enumerate(trained_ids):
+        if regression_error[index] < series_error[index]:
+            model = {
+                'model': 'regression',
+                'intercept': float(coefficients[index, 0]),
+                'hour': coefficients[index, 1:1 + HOURS_PER_DAY].tolist(),
+                'weekday': coefficients[index, 1 + HOURS_PER_DAY:1 + HOURS_PER_DAY + 7].tolist(),
+                'temperature': float(coefficients[index, -1]) if temperature is not None else 0.0,
+                'holdout_mae': float(regression_error[index])
+            }
+        elif intermittent[index]:
+            alpha, beta = tsb['params'][index]
+            model = {
+                'model': 'tsb',
+                'daily_rate': float(tsb['rate'][index]),
+                'alpha': float(alpha),
+                'beta': float(beta),
+                'holdout_mae': float(tsb_error[index])
+            }
+        else:
+            alpha, beta, gamma = holt_winters['params'][index]
+            model = {
+                'model': 'holt_winters',
+                'level': float(holt_winters['level'][index]),
+                'trend': float(holt_winters['trend'][index]),
+                'season': holt_winters['season'][index].tolist(),
+                'alpha': float(alpha),
+                'beta': float(beta),
+                'gamma': float(gamma),
+                'holdout_mae': float(hw_error[index])
+            }
+        result['products'][product_id] = model
+    return result
+
+
+class ModelSet:
+    """
+    一组训练好的模型（不可变，训练完成后整体替换）
+
+    构建时把各商品的参数编译为按行排列的数组，并为回归预计算从每个星期小时开始的窗口和，
+    predict_all() 对所有商品只做常数次数组运算。
+    """
+
+    def __init__(self, params=None, version=0, window=24):
+        """
+        初始化模型组
+
+        Args:
+            params (dict, optional): train_models() 返回的模型参数
+            version (int, optional): 模型版本号
+            window (int, optional): 预测窗口（小时）
+        """
+        params = params or {}
+        self.params = params
+        self.version = version
+        self.window = max(int(round(window)), 1)
+        self.trained_at = params.get('trained_at')
+        self.end_hour = params.get('end_hour', 0)
+        self.temperature_stats = params.get('temperature')
+
+        products = params.get('products', {})
+        self.product_ids = list(products)
+        self.rows = {product_id: row for row, product_id in enumerate(self.product_ids)}
+        count = len(self.product_ids)
+
+        self.kinds = np.array([MODEL_KINDS[products[product_id]['model']] for product_id in self.product_ids],
+                              dtype=np.int64)
+        self.level = np.zeros(count)
+        self.trend = np.zeros(count)
+        season = np.zeros((count, HOURS_PER_DAY))
+        self.daily_rate = np.zeros(count)
+        self.intercept = np.zeros(count)
+        self.temperature_coefficient = np.zeros(count)
+        hour_coefficients = np.zeros((count, HOURS_PER_DAY))
+        weekday_coefficients = np.zeros((count, 7))
+
+        for row, product_id in enumerate(self.product_ids):
+            model = products[product_id]
+            if model['model'] == 'holt_winters':
+                self.level[row] = model['level']
+                self.trend[row] = model['trend']
+                season[row] = model['season']
+            elif model['model'] == 'tsb':
+                self.daily_rate[row] = model['daily_rate']
+            else:
+                self.intercept[row] = model['intercept']
+                self.temperature_coefficient[row] = model.get('temperature', 0.0)
+                hour_coefficients[row] = model['hour']
+                weekday_coefficients[row] = model['weekday']
+
+        self.season_prefix = np.zeros((count, HOURS_PER_DAY + 1))
+        np.cumsum(season, axis=1, out=self.season_prefix[:, 1:])
+
+        # 回归：从每个星期小时开始的窗口内小时项和星期项之和
+        offsets = (np.arange(HOURS_PER_WEEK)[:, None] + np.arange(self.window)[None, :]) % HOURS_PER_WEEK
+        self.regression_table = (hour_coefficients[:, offsets % HOURS_PER_DAY].sum(axis=2)
+                                 + weekday_coefficients[:, offsets // HOURS_PER_DAY].sum(axis=2))
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    def predict_all(self, product_ids, now=None, temperature=None):
+        """
+        预测从当前小时开始的预测窗口内的销量
+
+        Args:
+            product_ids (list): 商品ID列表
+            now (float, optional): 预测时刻的时间戳，默认为当前时间
+            temperature (float, optional): 当前温度，未提供时使用训练期平均温度
+
+        Returns:
+            tuple: (预测销量数组, 是否有模型的布尔数组)
+        """
+        now = time.time() if now is None else now
+        rows = np.fromiter((self.rows.get(product_id, -1) for product_id in product_ids), dtype=np.int64,
+                           count=len(product_ids))
+        modeled = rows >= 0
+        predicted = np.zeros(len(rows))
+        rows = rows[modeled]
+        if not len(rows):
+            return predicted, modeled
+
+        moment = datetime.fromtimestamp(now)
+        window = self.window
+        horizon = max(int(now // 3600) - self.end_hour, 0)
+
+        holt_winters = _holt_winters_window(self.level[rows], self.trend[rows], self.season_prefix[rows], horizon,
+                                            window, moment.hour)
+        tsb = self.daily_rate[rows] * (window / HOURS_PER_DAY)
+        standardized = 0.0
+        if temperature is not None and self.temperature_stats:
+            standardized = (temperature - self.temperature_stats['mean']) / self.temperature_stats['std']
+        regression = (self.regression_table[rows, moment.weekday() * HOURS_PER_DAY + moment.hour]
+                      + window * (self.intercept[rows] + self.temperature_coefficient[rows] * standardized))
+
+        kinds = self.kinds[rows]
+        forecast = np.where(kinds == MODEL_KINDS['holt_winters'], holt_winters,
+                            np.where(kinds == MODEL_KINDS['tsb'], tsb, regression))
+        predicted[modeled] = np.maximum(forecast, 0.0)
+        return predicted, modeled
+
+    def get_stats(self):
+        """
+        获取模型组统计
+
+        Returns:
+            dict: 版本号、训练时间和各类模型数量
+        """
+        return {
+            'version': self.version,
+            'trained_at': self.trained_at,
+            'products': len(self.product_ids),
+            'models': {name: int((self.kinds == kind).sum()) for name, kind in MODEL_KINDS.items()},
+            'temperature': self.temperature_stats is not None
+        }
+
+
+class ModelTrainer:
+    """
+    后台模型训练器
+
+    按商品把销售数据分块提交到进程池训练，所有块完成后合并参数、写入模型文件（临时文件改名），
+    再用新的ModelSet整体替换当前模型；推理方只需读取一次 model_set 引用。
+    """
+
+    def __init__(self, model_file, window=24, workers=1, retrain_interval=3600, history_days=30,
+                 min_history_days=14):
+        """
+        初始化模型训练器
+
+        Args:
+            model_file (str): 模型文件路径
+            window (int, optional): 预测窗口（小时）
+            workers (int, optional): 训练进程数，0表示在后台线程中训练
+            retrain_interval (float, optional): 重新训练间隔（秒）
+            history_days (int, optional): 训练使用的历史天数
+            min_history_days (int, optional): 商品至少有多少天的销售历史才训练模型
+        """
+        self.model_file = model_file
+        self.window = window
+        self.workers = workers
+        self.retrain_interval = retrain_interval
+        self.history_days = history_days
+        self.min_history_days = min_history_days
+
+        self.model_set = ModelSet(window=window)
+        self.pending = None
+        self.idle = threading.Event()
+        self.idle.set()
+        self.last_started = 0.0
+        self.trainings = 0
+        self.failures = 0
+        self.executor = None
+        self.lock = threading.Lock()
+
+        self.load()
+
+    def load(self):
+        """加载模型文件（格式版本或预测窗口不一致时忽略）"""
+        if not os.path.exists(self.model_file):
+            return
+        try:
+            with open(self.model_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('format') != MODEL_FORMAT_VERSION or data.get('window') != self.window:
+                logger.info(f"忽略不兼容的预测模型文件: {self.model_file}")
+                return
+            self.model_set = ModelSet(data.get('params'), data.get('version', 0), self.window)
+            logger.info(f"加载预测模型: 版本 {self.model_set.version}, {len(self.model_set)} 种商品")
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.error(f"加载预测模型失败: {str(e)}")
+
+    def _save(self, model_set):
+        """写入模型文件（先写临时文件再改名）"""
+        data = {
+            'format': MODEL_FORMAT_VERSION,
+            'version': model_set.version,
+            'window': self.window,
+            'params': model_set.params
+        }
+        os.makedirs(os.path.dirname(self.model_file) or '.', exist_ok=True)
+        temp_file = self.model_file + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.model_file)
+
+    def _get_executor(self):
+        """获取训练执行器（进程池使用spawn启动，避免在多线程进程中fork）"""
+        if self.executor is None:
+            if self.workers > 0:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                    mp_context=multiprocessing.get_context('spawn'))
+            else:
+                self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='model-trainer')
+        return self.executor
+
+    def needs_training(self, now=None):
+        """
+        判断是否需要开始新的训练
+
+        Returns:
+            bool: 没有进行中的训练且距上次开始训练超过重新训练间隔
+        """
+        now = time.time() if now is None else now
+        return self.pending is None and now - self.last_started >= self.retrain_interval
+
+    def start_training(self, product_ids, timestamps, quantities, temperatures=None, end_time=None):
+        """
+        提交一次后台训练
+
+        Args:
+            product_ids (list): 销售记录的商品ID
+            timestamps (array-like): 销售时间戳
+            quantities (array-like): 销售数量
+            temperatures (tuple, optional): (观测时间戳数组, 温度数组)
+            end_time (float, optional): 训练截止时间，默认为当前时间
+
+        Returns:
+            bool: 是否已提交
+        """
+        end_time = time.time() if end_time is None else end_time
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        quantities = np.asarray(quantities, dtype=np.float64)
+
+        with self.lock:
+            if self.pending is not None:
+                return False
+
+            # 按商品分块，每块交给一个进程
+            codes = {}
+            keys = np.fromiter((codes.setdefault(product_id, len(codes)) for product_id in product_ids),
+                               dtype=np.int64, count=len(product_ids))
+            chunks = max(min(self.workers, len(codes)), 1)
+            futures = []
+            try:
+                executor = self._get_executor()
+                for chunk in range(chunks):
+                    selected = np.flatnonzero(keys % chunks == chunk)
+                    futures.append(executor.submit(
+                        train_models, [product_ids[index] for index in selected], timestamps[selected],
+                        quantities[selected], end_time, temperatures, self.history_days, self.min_history_days
+                    ))
+            except Exception as e:
+                for future in futures:
+                    future.cancel()
+                self.failures += 1
+                logger.error(f"提交模型训练失败: {str(e)}")
+                return False
+
+            self.pending = futures
+            self.idle.clear()
+            # 与needs_training使用同一时间基准（回测时为虚拟时钟）
+            self.last_started = end_time
+
+        for future in futures:
+            future.add_done_callback(self._on_chunk_done)
+        return True
+
+    def _on_chunk_done(self, future):
+        """训练块完成回调：全部完成后合并参数并替换模型"""
+        with self.lock:
+            futures = self.pending
+            if futures is None or future not in futures or not all(item.done() for item in futures):
+                return
+            self.pending = None
+
+        try:
+            self._install([item.result() for item in futures])
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"模型训练失败: {str(e)}")
+        finally:
+            self.idle.set()
+
+    def _install(self, results):
+        """合并各训练块的参数，保存并替换当前模型"""
+        params = {
+            'end_time': results[0]['end_time'],
+            'end_hour': results[0]['end_hour'],
+            'temperature': results[0]['temperature'],
+            'products': {},
+            'trained_at': time.time()
+        }
+        for result in results:
+            params['products'].update(result['products'])
+
+        model_set = ModelSet(params, self.model_set.version + 1, self.window)
+        try:
+            self._save(model_set)
+        except OSError as e:
+            logger.error(f"保存预测模型失败: {str(e)}")
+
+        # 原子替换：推理方持有旧引用时继续使用旧模型
+        self.model_set = model_set
+        self.trainings += 1
+        logger.info(f"预测模型已更新: 版本 {model_set.version}, {model_set.get_stats()['models']}")
+
+    def wait(self, timeout=None):
+        """
+        等待进行中的训练完成（用于测试和基准测试）
+
+        Returns:
+            bool: 是否已没有进行中的训练
+        """
+        return self.idle.wait(timeout)
+
+    def get_stats(self):
+        """
+        获取训练统计
+
+        Returns:
+            dict: 当前模型统计、训练次数和失败次数
+        """
+        stats = self.model_set.get_stats()
+        stats.update({
+            'training': self.pending is not None,
+            'trainings': self.trainings,
+            'failures': self.failures
+        })
+        return stats
+
+    def close(self):
+        """停止训练执行器"""
+        with self.lock:
+            executor, self.executor = self.executor, None
+            self.pending = None
+        self.idle.set()
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
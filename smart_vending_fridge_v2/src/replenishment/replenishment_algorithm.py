@@ -6,14 +6,22 @@
 """
 
 import os
+import copy
 import time
 import json
 import threading
 import numpy as np
+from collections import deque
 import pandas as pd
 from datetime import datetime, timedelta
 
 from src.utils.logger import get_logger
+from src.utils.config_manager import ConfigManager
+from src.replenishment.sales_index import SalesIndex
+from src.replenishment.demand_forecast import DemandForecaster
+from src.replenishment.sales_log import SalesLog
+from src.replenishment.sales_history import SalesHistory
+from src.replenishment.forecast_models import ModelTrainer
 
 logger = get_logger('replenishment_algorithm')
 
@@ -21,16 +29,20 @@ logger = get_logger('replenishment_algorithm')
 class ReplenishmentAlgorithm:
     """智能补货算法类"""
     
-    def __init__(self, config=None, simulation=False):
+    def __init__(self, config=None, simulation=False, config_manager=None, clock=None):
         """
         初始化智能补货算法
         
         Args:
             config (dict, optional): 配置字典
             simulation (bool, optional): 是否使用模拟模式
+            config_manager (ConfigManager, optional): 配置管理器，商品目录从中读取
+            clock (callable, optional): 返回当前时间戳的时钟，默认为time.time（回测时传入虚拟时钟）
         """
         self.config = config or {}
         self.simulation = simulation
+        self.config_manager = config_manager or ConfigManager()
+        self.clock = clock or time.time
         
         # 补货配置
         self.algorithm = self.config.get('algorithm', 'predictive')  # simple, predictive, ml
@@ -38,17 +50,70 @@ class ReplenishmentAlgorithm:
         self.prediction_window = self.config.get('prediction_window', 24)  # 预测窗口（小时）
         self.data_history_days = self.config.get('data_history_days', 30)  # 历史数据天数
         self.auto_order = self.config.get('auto_order', False)  # 自动下单
+        self.decay_half_life_days = self.config.get('decay_half_life_days', 14)  # 销量衰减半衰期（天）
         
-        # 销售数据
+        # 销售数据（销售历史按列存放）
         self.sales_data = {}
-        self.sales_history = []
+        self.sales_history = SalesHistory()
+        
+        # 按商品的列式销售索引（与销售历史同步维护，预测时不再扫描全部历史）
+        self.sales_index = SalesIndex()
+        
+        # 商品×星期小时需求矩阵（按半衰期衰减的销量，全商品批量预测）
+        self.forecaster = DemandForecaster(self.prediction_window, self.algorithm,
+                                           half_life_days=self.decay_half_life_days)
+        
+        # 销售数据版本号（每次写入或淘汰销售记录加一）
+        self.sales_version = 0
         
         # 补货建议
         self.replenishment_suggestions = {}
         
+        # 上次检查自动补货的小时（按时钟的整点检查，启动时所在的小时不检查）
+        self.auto_order_hour = int(self.clock() // 3600)
+        
+        # 商品目录快照（配置版本变化时重新获取）
+        self.product_catalog = None
+        self.product_catalog_version = None
+        
+        # 补货检查结果缓存: (缓存键, 结果)，库存、销售数据、商品目录和当前小时都未变化时直接返回
+        self.replenishment_cache = None
+        self.cache_hits = 0
+        self.cache_misses = 0
+        
         # 数据文件
-        self.data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data')
-        self.sales_data_file = os.path.join(self.data_dir, 'sales_data.json')
+        self.data_dir = self.config.get('data_dir') or os.path.join(
+            os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data')
+        self.sales_data_file = os.path.join(self.data_dir, 'sales_data.json')  # 旧格式，首次加载时导入
+        self.max_history = 10000  # 最多保留10000条历史记录
+        
+        # 销售日志：每笔销售追加写入，定期写入快照
+        log_config = self.config.get('sales_log', {})
+        self.sales_log = SalesLog(
+            os.path.join(self.data_dir, 'sales_log'),
+            segment_max_bytes=log_config.get('segment_max_bytes', 64 * 1024),
+            snapshot_interval=log_config.get('snapshot_interval', 2000),
+            fsync_batch=log_config.get('fsync_batch', 16),
+            fsync_interval=log_config.get('fsync_interval', 2.0)
+        )
+        # 后台写入快照的线程（交易处理线程只确定快照内容）
+        self.snapshot_thread = None
+        
+        # ml算法的预测模型（后台进程训练，训练完成后整体替换）
+        self.model_trainer = None
+        if self.algorithm == 'ml':
+            model_config = self.config.get('ml_models', {})
+            self.model_trainer = ModelTrainer(
+                os.path.join(self.data_dir, 'forecast_models.json'),
+                window=self.prediction_window,
+                workers=model_config.get('workers', 1),
+                retrain_interval=model_config.get('retrain_interval', 3600),
+                history_days=self.data_history_days,
+                min_history_days=model_config.get('min_history_days', 14)
+            )
+        
+        # 温度观测（回归模型的温度特征），每小时一个平均值: [小时序号, 温度和, 次数]
+        self.temperature_readings = deque(maxlen=self.data_history_days * 24)
         
         # 线程控制
         self.running = False
@@ -60,48 +125,117 @@ class ReplenishmentAlgorithm:
         logger.info(f"智能补货算法初始化完成，使用{self.algorithm}算法")
     
     def _load_sales_data(self):
-        """加载历史销售数据"""
+        """加载历史销售数据（最新快照加上之后的日志记录）"""
         try:
-            if os.path.exists(self.sales_data_file):
+            product_sales, records, tail = self.sales_log.load()
+            
+            if records is None and os.path.exists(self.sales_data_file):
+                # 旧格式的JSON文件，导入后在下次保存时写入快照
                 with open(self.sales_data_file, 'r', encoding='utf-8') as f:
                     data = json.load(f)
-                    self.sales_data = data.get('product_sales', {})
-                    self.sales_history = data.get('sales_history', [])
-                
+                product_sales = data.get('product_sales', {})
+                records = SalesHistory.from_records(data.get('sales_history', []))
+                for product in product_sales.values():
+                    product.pop('sales_trend', None)
+                self.sales_log.request_snapshot()
+                logger.info(f"导入旧格式销售数据: {self.sales_data_file}")
+            
+            # 按小时和星期的终身计数已由需求预测器的矩阵替代，旧快照中的计数不再保留
+            for product in (product_sales or {}).values():
+                product.pop('hourly_sales', None)
+                product.pop('daily_sales', None)
+            self.sales_data = product_sales or {}
+            self.sales_history = records if records is not None else SalesHistory()
+            
+            # 重放快照之后的销售记录
+            for record in tail:
+                self.sales_history.append(record)
+                self._update_product_sales(record)
+            
+            if len(self.sales_history) or self.sales_data:
                 logger.info(f"加载历史销售数据: {len(self.sales_data)} 种商品, {len(self.sales_history)} 条记录")
             else:
-                self.sales_data = {}
-                self.sales_history = []
                 logger.info("未找到历史销售数据，使用空数据")
         except Exception as e:
             logger.error(f"加载历史销售数据失败: {str(e)}")
             self.sales_data = {}
-            self.sales_history = []
+            self.sales_history = SalesHistory()
+        
+        self._rebuild_indexes()
+    
+    def _rebuild_indexes(self):
+        """从销售历史重建销售索引和需求矩阵（直接使用商品编号列）"""
+        product_ids, columns = self.sales_history.coded_columns()
+        self.sales_index.rebuild_coded(product_ids, columns['code'], columns['timestamp'], columns['quantity'])
+        self.forecaster.reset()
+        self.forecaster.add_sales_coded(product_ids, columns['code'], columns['timestamp'], columns['quantity'])
+        self.sales_version += 1
+    
+    def _forget_sales(self, dropped):
+        """
+        从需求矩阵中移除被截断的历史记录
+        
+        Args:
+            dropped (dict): 被截断记录的列（SalesHistory.trim的返回值）
+        """
+        self.forecaster.remove_sales(dropped['product_id'], dropped['timestamp'], dropped['quantity'])
+        for product_id in set(dropped['product_id'].tolist()):
+            self.forecaster.set_time_range(product_id, self.sales_index.time_range(product_id))
+        self.sales_version += 1
+    
+    def _trim_history(self):
+        """限制历史记录数量"""
+        if len(self.sales_history) > self.max_history:
+            dropped = self.sales_history.trim(self.max_history)
+            self.sales_index.trim(self.max_history)
+            self._forget_sales(dropped)
     
     def _save_sales_data(self):
-        """保存销售数据"""
+        """同步保存销售数据快照（停止时调用；单笔销售已追加到销售日志，这里只压缩日志）"""
+        if self.snapshot_thread and self.snapshot_thread.is_alive():
+            self.snapshot_thread.join()
         try:
-            # 确保目录存在
-            os.makedirs(os.path.dirname(self.sales_data_file), exist_ok=True)
-            
-            # 限制历史记录数量
-            max_history = 10000  # 最多保留10000条历史记录
-            if len(self.sales_history) > max_history:
-                self.sales_history = self.sales_history[-max_history:]
-            
-            data = {
-                'product_sales': self.sales_data,
-                'sales_history': self.sales_history,
-                'last_update': time.time()
-            }
-            
-            with open(self.sales_data_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            
+            self._trim_history()
+            if self.sales_log.write_snapshot(self.sales_history, self.sales_data) is not None:
+                self._backup_legacy_file()
             logger.debug("保存销售数据")
         except Exception as e:
             logger.error(f"保存销售数据失败: {str(e)}")
     
+    def _start_snapshot(self):
+        """
+        在后台线程写入销售快照：交易处理线程只截断历史、切换日志段并复制快照内容，
+        写文件和fsync不占用交易处理路径
+        """
+        try:
+            self._trim_history()
+            ticket = self.sales_log.begin_snapshot()
+            if ticket is None:
+                return
+            history = self.sales_history.copy()
+            product_sales = copy.deepcopy(self.sales_data)
+        except Exception as e:
+            logger.error(f"准备销售快照失败: {str(e)}")
+            return
+        
+        self.snapshot_thread = threading.Thread(target=self._write_snapshot,
+                                                args=(ticket, history, product_sales), daemon=True)
+        self.snapshot_thread.start()
+    
+    def _write_snapshot(self, ticket, history, product_sales):
+        """后台写入销售快照"""
+        try:
+            self.sales_log.finish_snapshot(ticket, history, product_sales)
+            self._backup_legacy_file()
+        except Exception as e:
+            logger.error(f"写入销售快照失败: {str(e)}")
+    
+    def _backup_legacy_file(self):
+        """旧格式文件已导入快照，保留为备份"""
+        if os.path.exists(self.sales_data_file):
+            os.replace(self.sales_data_file, self.sales_data_file + '.bak')
+            logger.info(f"旧格式销售数据已导入快照: {self.sales_data_file}")
+    
     def start(self):
         """启动智能补货算法"""
         if self.running:
@@ -114,6 +248,9 @@ class ReplenishmentAlgorithm:
         self.replenishment_thread = threading.Thread(target=self._replenishment_loop, daemon=True)
         self.replenishment_thread.start()
         
+        # 启动时在后台训练预测模型
+        self._train_models()
+        
         logger.info("智能补货算法启动完成")
     
     def stop(self):
@@ -130,6 +267,10 @@ class ReplenishmentAlgorithm:
         
         # 保存销售数据
         self._save_sales_data()
+        self.sales_log.close()
+        
+        if self.model_trainer:
+            self.model_trainer.close()
         
         logger.info("智能补货算法停止完成")
     
@@ -144,7 +285,7 @@ class ReplenishmentAlgorithm:
             return
         
         products_taken = transaction.get('products_taken', [])
-        transaction_time = transaction.get('end_time', time.time())
+        transaction_time = transaction.get('end_time', self.clock())
         
         # 更新销售历史
         for product in products_taken:
@@ -156,57 +297,75 @@ class ReplenishmentAlgorithm:
                 continue
             
             # 添加到销售历史
-            self.sales_history.append({
+            record = {
                 'product_id': product_id,
                 'quantity': quantity,
                 'price': price,
                 'amount': quantity * price,
                 'timestamp': transaction_time
-            })
-            
-            # 更新商品销售数据
-            if product_id not in self.sales_data:
-                self.sales_data[product_id] = {
-                    'total_sales': 0,
-                    'total_quantity': 0,
-                    'last_sale': None,
-                    'hourly_sales': [0] * 24,  # 按小时统计
-                    'daily_sales': [0] * 7,    # 按星期几统计
-                    'sales_trend': []          # 销售趋势
-                }
-            
-            # 更新总销量
-            self.sales_data[product_id]['total_sales'] += quantity * price
-            self.sales_data[product_id]['total_quantity'] += quantity
-            self.sales_data[product_id]['last_sale'] = transaction_time
-            
-            # 更新按小时统计
-            hour = datetime.fromtimestamp(transaction_time).hour
-            self.sales_data[product_id]['hourly_sales'][hour] += quantity
-            
-            # 更新按星期几统计
-            weekday = datetime.fromtimestamp(transaction_time).weekday()
-            self.sales_data[product_id]['daily_sales'][weekday] += quantity
+            }
+            self.sales_history.append(record)
+            self.sales_index.append(product_id, transaction_time, quantity)
+            self.forecaster.add_sale(product_id, transaction_time, quantity)
+            self.sales_version += 1
             
-            # 更新销售趋势
-            self.sales_data[product_id]['sales_trend'].append({
-                'timestamp': transaction_time,
-                'quantity': quantity
-            })
+            # 追加到销售日志
+            try:
+                self.sales_log.append(record)
+            except Exception as e:
+                logger.error(f"写入销售日志失败: {str(e)}")
             
-            # 限制趋势数据量
-            max_trend = 100
-            if len(self.sales_data[product_id]['sales_trend']) > max_trend:
-                self.sales_data[product_id]['sales_trend'] = self.sales_data[product_id]['sales_trend'][-max_trend:]
-        
-        # 定期保存销售数据
-        if len(self.sales_history) % 10 == 0:  # 每10笔交易保存一次
-            self._save_sales_data()
+            # 更新商品销售数据
+            self._update_product_sales(record)
+        
+        # 积累足够的记录后在后台写入快照
+        if self.sales_log.needs_snapshot():
+            self._start_snapshot()
+    
+    def _update_product_sales(self, record):
+        """
+        按一条销售记录更新商品销售统计（总销售额、总销量和最后销售时间，随快照保存供查询；
+        预测使用的按小时和星期的销量在需求预测器的矩阵中维护）
+        
+        Args:
+            record (dict): 销售记录
+        """
+        product_id = record['product_id']
+        quantity = record['quantity']
+        transaction_time = record['timestamp']
+        
+        if product_id not in self.sales_data:
+            self.sales_data[product_id] = {
+                'total_sales': 0,
+                'total_quantity': 0,
+                'last_sale': None
+            }
+        
+        # 更新总销量
+        self.sales_data[product_id]['total_sales'] += record['amount']
+        self.sales_data[product_id]['total_quantity'] += quantity
+        self.sales_data[product_id]['last_sale'] = transaction_time
+    
+    def _get_product_catalog(self):
+        """
+        获取商品目录快照（配置更新后重新获取，否则不读取配置）
+        
+        Returns:
+            dict: 商品ID -> 商品信息
+        """
+        version = self.config_manager.version
+        if self.product_catalog is None or version != self.product_catalog_version:
+            self.product_catalog = dict(self.config_manager.get_config().get('products', {}))
+            self.product_catalog_version = version
+            logger.debug(f"更新商品目录快照: {len(self.product_catalog)} 种商品")
+        return self.product_catalog
     
     def check_replenishment_needs(self, inventory):
         """
         检查补货需求
         
+        各商品库存数量、销售数据、商品目录、预测模型版本和当前小时都未变化时直接返回上次的结果（时间戳为计算时间）。
+        
         Args:
             inventory (dict): 当前库存
         
@@ -216,42 +375,53 @@ class ReplenishmentAlgorithm:
         if not inventory:
             return None
         
+        # 获取商品数据库
+        product_database = self._get_product_catalog()
+        
+        # 库存按目录中各商品的数量判断是否变化（每次检查遍历一遍目录，与计算补货需求相比开销很小）
+        stock_key = tuple(inventory.get(product_id, {}).get('quantity', 0) for product_id in product_database)
+        now = self.clock()
+        models = self.model_trainer.model_set if self.model_trainer else None
+        cache_key = (stock_key, self.sales_version, self.product_catalog_version,
+                     models.version if models else None, int(now // 3600))
+        cache = self.replenishment_cache
+        if cache is not None and cache[0] == cache_key:
+            self.cache_hits += 1
+            return cache[1]
+        self.cache_misses += 1
+        
         replenishment_needs = {
-            'timestamp': time.time(),
+            'timestamp': now,
             'products': []
         }
         
-        # 获取商品数据库
-        from src.utils.config_manager import ConfigManager
-        config_manager = ConfigManager()
-        product_database = config_manager.get_config().get('products', {})
-        
-        # 检查每种商品
-        for product_id, product_info in product_database.items():
-            # 获取当前库存
-            current_stock = inventory.get(product_id, {}).get('quantity', 0)
-            
-            # 获取预测销量
-            predicted_sales = self._predict_sales(product_id)
-            
-            # 计算补货阈值
-            max_stock = 10  # 最大库存量
-            threshold_quantity = max_stock * self.threshold
-            
-            # 如果当前库存低于阈值且预测销量大于0，需要补货
-            if current_stock <= threshold_quantity and predicted_sales > 0:
-                # 计算补货数量
-                replenishment_quantity = max_stock - current_stock
-                
-                if replenishment_quantity > 0:
-                    replenishment_needs['products'].append({
-                        'product_id': product_id,
-                        'name': product_info.get('name', 'Unknown'),
-                        'current_stock': current_stock,
-                        'predicted_sales': predicted_sales,
-                        'replenishment_quantity': replenishment_quantity,
-                        'priority': self._calculate_priority(product_id, current_stock, predicted_sales)
-                    })
+        # 所有商品一次性批量预测销量和补货优先级（先推进趋势桶，预测本身不修改预测器状态）
+        product_ids = list(product_database)
+        stock = [inventory.get(product_id, {}).get('quantity', 0) for product_id in product_ids]
+        self.forecaster.advance(now)
+        forecast = self.forecaster.forecast_all(product_ids, stock, now, models=models,
+                                                temperature=self._current_temperature())
+        predicted_sales = forecast['predicted_sales']
+        priorities = forecast['priorities']
+        
+        # 计算补货阈值
+        max_stock = 10  # 最大库存量
+        threshold_quantity = max_stock * self.threshold
+        
+        # 当前库存低于阈值、预测销量大于0且未满库存的商品需要补货
+        stock_levels = np.asarray(stock, dtype=np.float64)
+        needed = (stock_levels <= threshold_quantity) & (predicted_sales > 0) & (stock_levels < max_stock)
+        for index in np.flatnonzero(needed):
+            product_id = product_ids[index]
+            current_stock = stock[index]
+            replenishment_needs['products'].append({
+                'product_id': product_id,
+                'name': product_database[product_id].get('name', 'Unknown'),
+                'current_stock': current_stock,
+                'predicted_sales': float(predicted_sales[index]),
+                'replenishment_quantity': max_stock - current_stock,
+                'priority': float(priorities[index])
+            })
         
         # 按优先级排序
         replenishment_needs['products'].sort(key=lambda x: x['priority'], reverse=True)
@@ -261,7 +431,48 @@ class ReplenishmentAlgorithm:
             self.replenishment_suggestions = replenishment_needs
             logger.info(f"发现补货需求: {len(replenishment_needs['products'])} 种商品")
         
-        return replenishment_needs if replenishment_needs['products'] else None
+        result = replenishment_needs if replenishment_needs['products'] else None
+        self.replenishment_cache = (cache_key, result)
+        return result
+    
+    def get_check_stats(self):
+        """
+        获取补货检查缓存统计
+        
+        Returns:
+            dict: 命中次数、未命中次数和命中率
+        """
+        total = self.cache_hits + self.cache_misses
+        return {
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+            'hit_rate': self.cache_hits / total if total else 0.0,
+            'sales_version': self.sales_version,
+            'catalog_version': self.product_catalog_version,
+            'model_version': self.model_trainer.model_set.version if self.model_trainer else None
+        }
+    
+    def forecast_all(self, inventory=None, product_ids=None):
+        """
+        批量预测所有商品的销量、趋势因子和补货优先级
+        
+        Args:
+            inventory (dict, optional): 当前库存，提供时计算补货优先级
+            product_ids (list, optional): 商品ID列表，默认为商品目录中的所有商品
+        
+        Returns:
+            dict: product_ids、predicted_sales、trend_factors、priorities（数组与product_ids一一对应）和timestamp
+        """
+        if product_ids is None:
+            product_ids = list(self._get_product_catalog())
+        stock = None
+        if inventory is not None:
+            stock = [inventory.get(product_id, {}).get('quantity', 0) for product_id in product_ids]
+        models = self.model_trainer.model_set if self.model_trainer else None
+        now = self.clock()
+        self.forecaster.advance(now)
+        return self.forecaster.forecast_all(product_ids, stock, now, models=models,
+                                            temperature=self._current_temperature())
     
     def _predict_sales(self, product_id):
         """
@@ -292,32 +503,8 @@ class ReplenishmentAlgorithm:
         Returns:
             float: 预测销量
         """
-        # 如果没有销售数据，返回默认值
-        if product_id not in self.sales_data:
-            return 1.0
-        
-        # 计算平均日销量
-        total_quantity = self.sales_data[product_id]['total_quantity']
-        
-        # 获取最早和最晚的销售记录
-        sales_records = [record for record in self.sales_history if record['product_id'] == product_id]
-        if not sales_records:
-            return 1.0
-        
-        earliest_sale = min(record['timestamp'] for record in sales_records)
-        latest_sale = max(record['timestamp'] for record in sales_records)
-        
-        # 计算销售天数
-        days = (latest_sale - earliest_sale) / (24 * 3600) + 1
-        days = max(days, 1)  # 至少1天
-        
-        # 计算平均日销量
-        avg_daily_sales = total_quantity / days
-        
-        # 预测窗口内的销量
-        predicted_sales = avg_daily_sales * (self.prediction_window / 24)
-        
-        return predicted_sales
+        # 平均日销量折算到预测窗口（没有销售数据时返回默认值1.0）
+        return self.forecaster.base_prediction(product_id, self.clock())
     
     def _predictive_analysis(self, product_id):
         """
@@ -330,44 +517,14 @@ class ReplenishmentAlgorithm:
             float: 预测销量
         """
         # 如果没有销售数据，返回默认值
-        if product_id not in self.sales_data:
-            return 1.0
-        
-        # 获取销售记录
-        sales_records = [record for record in self.sales_history if record['product_id'] == product_id]
-        if not sales_records:
+        if not self.forecaster.has_sales(product_id):
             return 1.0
         
-        # 获取当前时间
-        now = datetime.now()
-        
-        # 计算当前小时和星期几
-        current_hour = now.hour
-        current_weekday = now.weekday()
-        
-        # 获取小时和星期几的销售数据
-        hourly_sales = self.sales_data[product_id]['hourly_sales']
-        daily_sales = self.sales_data[product_id]['daily_sales']
-        
-        # 计算小时权重和星期几权重
-        total_hourly = sum(hourly_sales)
-        total_daily = sum(daily_sales)
-        
-        if total_hourly == 0:
-            hourly_weight = 1.0
-        else:
-            hourly_weight = hourly_sales[current_hour] / total_hourly
-        
-        if total_daily == 0:
-            daily_weight = 1.0
-        else:
-            daily_weight = daily_sales[current_weekday] / total_daily
-        
         # 计算基础预测
         base_prediction = self._simple_prediction(product_id)
         
-        # 应用权重
-        weighted_prediction = base_prediction * (hourly_weight + daily_weight) / 2
+        # 应用当前小时和星期几的权重（按半衰期衰减后的销量计算）
+        weighted_prediction = base_prediction * self.forecaster.seasonal_weight(product_id, self.clock())
         
         # 考虑趋势
         trend_factor = self._calculate_trend_factor(product_id)
@@ -387,82 +544,79 @@ class ReplenishmentAlgorithm:
         Returns:
             float: 预测销量
         """
-        # 简化实现，实际应该使用机器学习模型
-        # 这里使用预测性分析算法的结果，并添加一些随机性
-        base_prediction = self._predictive_analysis(product_id)
+        # 使用后台训练的模型（Holt-Winters、Croston/TSB或回归），还没有模型的商品使用预测性分析
+        models = self.model_trainer.model_set if self.model_trainer else None
+        if models is not None and product_id in models.rows:
+            predicted, _ = models.predict_all([product_id], self.clock(), self._current_temperature())
+            return max(float(predicted[0]), 0.1)
         
-        # 添加随机因子（模拟ML的波动）
-        import random
-        random_factor = 0.8 + random.random() * 0.4  # 0.8-1.2
-        
-        return base_prediction * random_factor
+        return self._predictive_analysis(product_id)
     
-    def _calculate_trend_factor(self, product_id):
+    def record_temperature(self, temperature, timestamp=None):
         """
-        计算趋势因子
+        记录温度观测（环境温度，用作回归模型的温度特征）
         
         Args:
-            product_id (str): 商品ID
+            temperature (float): 温度（摄氏度）
+            timestamp (float, optional): 观测时间戳，默认为当前时间
+        """
+        timestamp = self.clock() if timestamp is None else timestamp
+        hour = int(timestamp // 3600)
+        if self.temperature_readings and self.temperature_readings[-1][0] == hour:
+            self.temperature_readings[-1][1] += temperature
+            self.temperature_readings[-1][2] += 1
+        else:
+            self.temperature_readings.append([hour, temperature, 1])
+    
+    def _current_temperature(self):
+        """
+        获取当前温度（最近3小时内的最后一个小时平均值）
         
         Returns:
-            float: 趋势因子
+            float: 当前温度，没有最近的观测时返回None
         """
-        # 获取销售趋势数据
-        if product_id not in self.sales_data:
-            return 1.0
-        
-        trend_data = self.sales_data[product_id]['sales_trend']
-        if len(trend_data) < 2:
-            return 1.0
-        
-        # 计算最近7天和前7天的销量
-        now = time.time()
-        recent_sales = sum(item['quantity'] for item in trend_data 
-                          if now - item['timestamp'] <= 7 * 24 * 3600)
-        
-        older_sales = sum(item['quantity'] for item in trend_data 
-                         if 7 * 24 * 3600 < now - item['timestamp'] <= 14 * 24 * 3600)
-        
-        # 计算趋势因子
-        if older_sales == 0:
-            trend_factor = 1.0
-        else:
-            trend_factor = recent_sales / older_sales
+        if not self.temperature_readings:
+            return None
+        hour, total, count = self.temperature_readings[-1]
+        if int(self.clock() // 3600) - hour > 3:
+            return None
+        return total / count
+    
+    def _train_models(self, force=False):
+        """
+        需要时提交一次后台模型训练（只在补货线程中提取训练数据）
         
-        # 限制趋势因子范围
-        trend_factor = max(min(trend_factor, 2.0), 0.5)
+        Args:
+            force (bool, optional): 是否忽略重新训练间隔
         
-        return trend_factor
+        Returns:
+            bool: 是否已提交训练
+        """
+        if not self.model_trainer or not (force or self.model_trainer.needs_training(self.clock())):
+            return False
+        
+        # 各列为同一时刻的副本，销售线程同时追加记录时长度仍然一致
+        columns = self.sales_history.columns()
+        product_ids, timestamps, quantities = columns['product_id'], columns['timestamp'], columns['quantity']
+        temperatures = None
+        if self.temperature_readings:
+            readings = np.array(list(self.temperature_readings), dtype=np.float64)
+            temperatures = (readings[:, 0] * 3600, readings[:, 1] / readings[:, 2])
+        return self.model_trainer.start_training(product_ids, timestamps, quantities, temperatures,
+                                                 end_time=self.clock())
     
-    def _calculate_priority(self, product_id, current_stock, predicted_sales):
+    def _calculate_trend_factor(self, product_id):
         """
-        计算补货优先级
+        计算趋势因子
         
         Args:
             product_id (str): 商品ID
-            current_stock (int): 当前库存
-            predicted_sales (float): 预测销量
         
         Returns:
-            float: 优先级分数
+            float: 趋势因子
         """
-        # 如果库存为0，最高优先级
-        if current_stock == 0:
-            return 100.0
-        
-        # 计算库存覆盖率
-        coverage = current_stock / max(predicted_sales, 0.1)
-        
-        # 覆盖率越低，优先级越高
-        priority = 1.0 / max(coverage, 0.01)
-        
-        # 考虑销售量
-        if product_id in self.sales_data:
-            total_quantity = self.sales_data[product_id]['total_quantity']
-            sales_factor = min(total_quantity / 10.0, 2.0)  # 最多提升2倍
-            priority *= sales_factor
-        
-        return min(priority, 100.0)  # 最高100分
+        # 最近7天与之前7天的销量之比（窗口销量增量维护，常数时间查询）
+        return self.forecaster.trend_factor(product_id, self.clock())
     
     def get_replenishment_suggestions(self):
         """
@@ -485,16 +639,11 @@ class ReplenishmentAlgorithm:
             dict: 销售分析
         """
         # 获取时间范围
-        end_time = time.time()
+        end_time = self.clock()
         start_time = end_time - days * 24 * 3600
         
-        # 筛选销售记录
-        if product_id:
-            records = [r for r in self.sales_history 
-                      if r['product_id'] == product_id and start_time <= r['timestamp'] <= end_time]
-        else:
-            records = [r for r in self.sales_history 
-                      if start_time <= r['timestamp'] <= end_time]
+        # 筛选销售记录（只转换时间窗口内的记录）
+        records = self.sales_history.records(start_time, end_time, product_id or None)
         
         # 按商品分组
         product_sales = {}
@@ -553,9 +702,7 @@ class ReplenishmentAlgorithm:
         
         while self.running:
             try:
-                # 每小时检查一次自动补货
-                if self.auto_order and int(time.time()) % 3600 < 10:
-                    self._check_auto_replenishment()
+                self._run_scheduled_tasks()
                 
                 # 休眠一段时间
                 time.sleep(60.0)
@@ -563,8 +710,24 @@ class ReplenishmentAlgorithm:
                 logger.error(f"补货循环出错: {str(e)}")
                 time.sleep(300.0)  # 出错后等待较长时间再重试
     
+    def _run_scheduled_tasks(self):
+        """执行补货线程的定时任务（时间均取自self.clock）"""
+        # 每进入新的一小时检查一次自动补货
+        hour = int(self.clock() // 3600)
+        if self.auto_order and hour != self.auto_order_hour:
+            self.auto_order_hour = hour
+            self._check_auto_replenishment()
+        
+        # 按重新训练间隔在后台训练预测模型
+        self._train_models()
+    
     def _check_auto_replenishment(self):
-        """检查自动补货"""
+        """
+        检查自动补货
+        
+        Returns:
+            dict: 自动下单的订单，没有补货建议时返回None
+        """
         # 如果有补货建议，自动下单
         if self.replenishment_suggestions and self.replenishment_suggestions.get('products'):
             logger.info("执行自动补货")
@@ -572,9 +735,10 @@ class ReplenishmentAlgorithm:
             # TODO: 实现实际的自动下单逻辑
             
             # 模拟下单
+            now = self.clock()
             order = {
-                'order_id': f"O{int(time.time())}",
-                'timestamp': time.time(),
+                'order_id': f"O{int(now)}",
+                'timestamp': now,
                 'products': self.replenishment_suggestions['products'],
                 'status': 'placed'
             }
@@ -582,4 +746,6 @@ class ReplenishmentAlgorithm:
             logger.info(f"自动下单成功: {order['order_id']}, {len(order['products'])} 种商品")
             
             # 清空补货建议
-            self.replenishment_suggestions = {}
\ No newline at end of file
+            self.replenishment_suggestions = {}
+            return order
+        return None
\ No newline at end of file
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+销售历史模块 - 按列存放的销售历史（商品编号、时间戳、数量、单价、金额），可直接从快照的内存映射列构建
+"""
+
+import threading
+import numpy as np
+
+# 数值列
+VALUE_FIELDS = ('timestamp', 'quantity', 'price', 'amount')
+
+
+class SalesHistory:
+    """
+    列式销售历史
+
+    商品ID编号后与各数值列一起存放在预分配的NumPy数组中（容量不足时翻倍），[start, size) 为有效区间，
+    截断最旧的记录只移动起点；启动时从快照的列直接复制，不为每条记录创建Python对象。
+    读取列时返回有效区间的副本，销售线程同时追加记录时各列长度仍然一致。
+    """
+
+    def __init__(self, capacity=1024):
+        """
+        初始化销售历史
+
+        Args:
+            capacity (int, optional): 初始容量
+        """
+        capacity = max(capacity, 1)
+        # 商品编号 -> 商品ID，以及反向映射
+        self.product_ids = []
+        self.product_codes = {}
+        self.codes = np.empty(capacity, dtype=np.int32)
+        self.values = {field: np.empty(capacity, dtype=np.float64) for field in VALUE_FIELDS}
+        self.start = 0
+        self.size = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_columns(cls, product_ids, codes, **columns):
+        """
+        从按列存放的数据构建（如快照的内存映射列）
+
+        Args:
+            product_ids (list): 商品编号对应的商品ID
+            codes (array-like): 每条记录的商品编号
+            **columns: timestamp、quantity、price、amount列
+
+        Returns:
+            SalesHistory: 销售历史
+        """
+        count = len(codes)
+        history = cls(max(count, 1024))
+        history.product_ids = list(product_ids)
+        history.product_codes = {product_id: code for code, product_id in enumerate(history.product_ids)}
+        history.codes[:count] = codes
+        for field in VALUE_FIELDS:
+            history.values[field][:count] = columns.get(field, 0.0)
+        history.size = count
+        return history
+
+    @classmethod
+    def from_records(cls, records):
+        """
+        从销售记录列表构建（导入旧格式数据）
+
+        Args:
+            records (list): 销售记录（product_id、timestamp、quantity、price、amount）
+
+        Returns:
+            SalesHistory: 销售历史
+        """
+        product_codes = {}
+        codes = [product_codes.setdefault(record['product_id'], len(product_codes)) for record in records]
+        columns = {field: [record.get(field, 0.0) for record in records] for field in VALUE_FIELDS}
+        return cls.from_columns(list(product_codes), codes, **columns)
+
+    def __len__(self):
+        return self.size - self.start
+
+    def _reserve(self):
+        """保证还能追加一条记录：前部已截断过半时原地压缩，否则扩容"""
+        capacity = len(self.codes)
+        if self.size < capacity:
+            return
+        count = self.size - self.start
+        new_capacity = capacity if self.start >= capacity // 2 else capacity * 2
+        codes = np.empty(new_capacity, dtype=np.int32)
+        codes[:count] = self.codes[self.start:self.size]
+        values = {}
+        for field, column in self.values.items():
+            values[field] = np.empty(new_capacity, dtype=np.float64)
+            values[field][:count] = column[self.start:self.size]
+        self.codes, self.values = codes, values
+        self.start, self.size = 0, count
+
+    def append(self, record):
+        """
+        追加一条销售记录
+
+        Args:
+            record (dict): 销售记录（product_id、timestamp、quantity、price、amount）
+        """
+        with self.lock:
+            code = self.product_codes.get(record['product_id'])
+            if code is None:
+                code = self.product_codes[record['product_id']] = len(self.product_ids)
+                self.product_ids.append(record['product_id'])
+            self._reserve()
+            self.codes[self.size] = code
+            for field, column in self.values.items():
+                column[self.size] = record.get(field, 0.0)
+            self.size += 1
+
+    def trim(self, keep):
+        """
+        只保留最近的keep条记录
+
+        Args:
+            keep (int): 保留的记录数
+
+        Returns:
+            dict: 被截断记录的列（product_id为商品ID数组，其余同columns()）
+        """
+        with self.lock:
+            start = max(self.size - keep, self.start)
+            dropped = self._columns(self.start, start)
+            self.start = start
+            return dropped
+
+    def _columns(self, begin, end):
+        """复制[begin, end)区间的各列"""
+        columns = {field: column[begin:end].copy() for field, column in self.values.items()}
+        columns['code'] = self.codes[begin:end].copy()
+        product_ids = np.empty(len(self.product_ids), dtype=object)
+        product_ids[:] = self.product_ids
+        columns['product_id'] = product_ids[columns['code']]
+        return columns
+
+    def columns(self):
+        """
+        获取有效记录的各列（副本）
+
+        Returns:
+            dict: product_id（商品ID数组）、code（商品编号数组）和各数值列
+        """
+        with self.lock:
+            return self._columns(self.start, self.size)
+
+    def coded_columns(self):
+        """
+        获取商品编号表和有效记录的各列（副本，不展开商品ID）
+
+        Returns:
+            tuple: (商品编号对应的商品ID列表, 各列字典（code和各数值列）)
+        """
+        with self.lock:
+            columns = {field: column[self.start:self.size].copy() for field, column in self.values.items()}
+            columns['code'] = self.codes[self.start:self.size].copy()
+            return list(self.product_ids), columns
+
+    def copy(self):
+        """
+        复制销售历史（后台写入快照时使用，之后追加的记录不影响副本）
+
+        Returns:
+            SalesHistory: 副本
+        """
+        product_ids, columns = self.coded_columns()
+        return SalesHistory.from_columns(product_ids, columns.pop('code'), **columns)
+
+    def records(self, start_time=None, end_time=None, product_id=None):
+        """
+        把有效记录转换为销售记录字典，可按时间窗口和商品筛选
+
+        Args:
+            start_time (float, optional): 开始时间戳（包含）
+            end_time (float, optional): 结束时间戳（包含）
+            product_id (str, optional): 商品ID
+
+        Returns:
+            list: 销售记录
+        """
+        columns = self.columns()
+        mask = np.ones(len(columns['code']), dtype=bool)
+        if start_time is not None:
+            mask &= columns['timestamp'] >= start_time
+        if end_time is not None:
+            mask &= columns['timestamp'] <= end_time
+        if product_id is not None:
+            mask &= columns['code'] == self.product_codes.get(product_id, -1)
+        fields = ('product_id',) + VALUE_FIELDS
+        return [dict(zip(fields, row)) for row in zip(
+            columns['product_id'][mask].tolist(), *(columns[field][mask].tolist() for field in VALUE_FIELDS)
+        )]
@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+销售索引模块 - 按商品分列存储的销售时间戳与数量，支持增量追加、与销售历史同步截断和首末销售时间查询
+"""
+
+import threading
+import numpy as np
+
+from src.utils.logger import get_logger
+
+logger = get_logger('sales_index')
+
+
+class _ProductSeries:
+    """
+    单个商品的销售序列
+
+    按写入顺序存放在预分配的NumPy数组中（容量不足时翻倍），[start, size) 为有效区间。
+    """
+
+    __slots__ = ('seq', 'timestamps', 'quantities', 'start', 'size', 'ordered')
+
+    def __init__(self, capacity):
+        self.seq = np.empty(capacity, dtype=np.int64)
+        self.timestamps = np.empty(capacity, dtype=np.float64)
+        self.quantities = np.empty(capacity, dtype=np.float64)
+        self.start = 0
+        self.size = 0
+        # 时间戳是否非递减（交易按结束时间写入，通常有序；有序时首末记录即为最早和最晚销售时间）
+        self.ordered = True
+
+    def count(self):
+        """有效记录数"""
+        return self.size - self.start
+
+    def _reserve(self):
+        """保证还能追加一条记录：前部已淘汰过半时原地压缩，否则扩容"""
+        capacity = len(self.timestamps)
+        if self.size < capacity:
+            return
+
+        live = slice(self.start, self.size)
+        count = self.count()
+        if self.start >= capacity // 2:
+            new_capacity = capacity
+        else:
+            new_capacity = capacity * 2
+
+        seq = np.empty(new_capacity, dtype=np.int64)
+        timestamps = np.empty(new_capacity, dtype=np.float64)
+        quantities = np.empty(new_capacity, dtype=np.float64)
+        seq[:count] = self.seq[live]
+        timestamps[:count] = self.timestamps[live]
+        quantities[:count] = self.quantities[live]
+
+        self.seq, self.timestamps, self.quantities = seq, timestamps, quantities
+        self.start, self.size = 0, count
+
+    def append(self, seq, timestamp, quantity):
+        """追加一条记录"""
+        self._reserve()
+        index = self.size
+        if index > self.start and timestamp < self.timestamps[index - 1]:
+            self.ordered = False
+        self.seq[index] = seq
+        self.timestamps[index] = timestamp
+        self.quantities[index] = quantity
+        self.size = index + 1
+
+    def load(self, seq, timestamps, quantities):
+        """批量写入（用于重建索引）"""
+        count = len(timestamps)
+        capacity = max(len(self.timestamps), 1 << max(count - 1, 0).bit_length())
+        self.seq = np.empty(capacity, dtype=np.int64)
+        self.timestamps = np.empty(capacity, dtype=np.float64)
+        self.quantities = np.empty(capacity, dtype=np.float64)
+        self.seq[:count] = seq
+        self.timestamps[:count] = timestamps
+        self.quantities[:count] = quantities
+        self.start, self.size = 0, count
+        self.ordered = bool(count < 2 or np.all(np.diff(timestamps) >= 0))
+
+    def trim(self, min_seq):
+        """淘汰全局序号小于min_seq的记录"""
+        live_seq = self.seq[self.start:self.size]
+        self.start += int(np.searchsorted(live_seq, min_seq, side='left'))
+        if not self.ordered:
+            live = self.timestamps[self.start:self.size]
+            self.ordered = bool(len(live) < 2 or np.all(np.diff(live) >= 0))
+
+
+class SalesIndex:
+    """
+    按商品的列式销售索引
+
+    与销售历史列表同步维护：每条销售记录追加到所属商品的时间戳和数量数组中（均摊O(1)），
+    历史截断时按全局写入序号淘汰最旧的记录。查询某商品的记录数、首末销售时间为O(1)；
+    窗口销量由需求预测器的矩阵提供，这里不再维护前缀和。
+    """
+
+    def __init__(self, initial_capacity=64):
+        """
+        初始化销售索引
+
+        Args:
+            initial_capacity (int, optional): 每个商品序列的初始容量
+        """
+        self.initial_capacity = max(initial_capacity, 1)
+        self.series = {}
+        self.total = 0
+        self.lock = threading.Lock()
+
+    def rebuild(self, records):
+        """
+        从销售历史重建索引
+
+        Args:
+            records (list): 销售历史记录（包含product_id、timestamp和quantity）
+        """
+        self.rebuild_columns(
+            [record['product_id'] for record in records],
+            [record['timestamp'] for record in records],
+            [record['quantity'] for record in records]
+        )
+
+    def rebuild_columns(self, product_ids, timestamps, quantities):
+        """
+        从按列存放的销售历史重建索引
+
+        Args:
+            product_ids (list): 商品ID列表
+            timestamps (list): 销售时间戳列表
+            quantities (list): 销售数量列表
+        """
+        codes = {}
+        keys = np.fromiter((codes.setdefault(product_id, len(codes)) for product_id in product_ids),
+                           dtype=np.int64, count=len(product_ids))
+        self.rebuild_coded(list(codes), keys, timestamps, quantities)
+
+    def rebuild_coded(self, product_ids, codes, timestamps, quantities):
+        """
+        从按商品编号存放的销售历史重建索引（启动时直接使用快照的列）
+
+        Args:
+            product_ids (list): 商品编号对应的商品ID
+            codes (array-like): 每条记录的商品编号
+            timestamps (array-like): 销售时间戳
+            quantities (array-like): 销售数量
+        """
+        keys = np.asarray(codes, dtype=np.int64)
+        count = len(keys)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        quantities = np.asarray(quantities, dtype=np.float64)
+
+        series = {}
+        if count:
+            # 按商品编号分组，组内保持写入顺序
+            order = np.argsort(keys, kind='stable')
+            boundaries = np.flatnonzero(np.diff(keys[order])) + 1
+            for group in np.split(order, boundaries):
+                product_series = _ProductSeries(self.initial_capacity)
+                product_series.load(group, timestamps[group], quantities[group])
+                series[product_ids[keys[group[0]]]] = product_series
+
+        with self.lock:
+            self.series = series
+            self.total = count
+
+        logger.debug(f"重建销售索引: {len(series)} 种商品, {count} 条记录")
+
+    def append(self, product_id, timestamp, quantity):
+        """
+        追加一条销售记录
+
+        Args:
+            product_id (str): 商品ID
+            timestamp (float): 销售时间戳
+            quantity (float): 销售数量
+        """
+        with self.lock:
+            product_series = self.series.get(product_id)
+            if product_series is None:
+                product_series = self.series[product_id] = _ProductSeries(self.initial_capacity)
+            product_series.append(self.total, timestamp, quantity)
+            self.total += 1
+
+    def trim(self, keep):
+        """
+        只保留最近写入的keep条记录（与销售历史截断保持一致）
+
+        Args:
+            keep (int): 保留的记录数
+        """
+        with self.lock:
+            min_seq = self.total - keep
+            if min_seq <= 0:
+                return
+            for product_series in self.series.values():
+                product_series.trim(min_seq)
+
+    def count(self, product_id):
+        """
+        获取商品的销售记录数
+
+        Args:
+            product_id (str): 商品ID
+
+        Returns:
+            int: 记录数
+        """
+        with self.lock:
+            product_series = self.series.get(product_id)
+            return product_series.count() if product_series else 0
+
+    def time_range(self, product_id):
+        """
+        获取商品最早和最晚的销售时间
+
+        Args:
+            product_id (str): 商品ID
+
+        Returns:
+            tuple: (最早时间戳, 最晚时间戳)，没有记录时返回None
+        """
+        with self.lock:
+            product_series = self.series.get(product_id)
+            if not product_series or not product_series.count():
+                return None
+            if product_series.ordered:
+                return (float(product_series.timestamps[product_series.start]),
+                        float(product_series.timestamps[product_series.size - 1]))
+            live = product_series.timestamps[product_series.start:product_series.size]
+            return float(live.min()), float(live.max())
+
+    def get_stats(self):
+        """
+        获取索引统计
+
+        Returns:
+            dict: 商品数、有效记录数和数组占用字节数
+        """
+        with self.lock:
+            return {
+                'products': len(self.series),
+                'records': sum(product_series.count() for product_series in self.series.values()),
+                'appended': self.total,
+                'memory_bytes': sum(
+                    product_series.seq.nbytes + product_series.timestamps.nbytes
+                    + product_series.quantities.nbytes
+                    for product_series in self.series.values()
+                )
+            }
@@ -0,0 +1,398 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+销售日志模块 - 分段追加写入的销售记录日志与定期压缩的二进制快照
+"""
+
+import os
+import json
+import time
+import struct
+import zlib
+import threading
+import numpy as np
+
+from src.utils.logger import get_logger
+from src.replenishment.sales_history import SalesHistory
+
+logger = get_logger('sales_log')
+
+# 快照中销售历史的列式结构（商品按快照元数据中的商品列表编号）
+SNAPSHOT_DTYPE = np.dtype([
+    ('product', '<i4'),
+    ('timestamp', '<f8'),
+    ('quantity', '<f8'),
+    ('price', '<f8'),
+    ('amount', '<f8')
+])
+
+
+class SalesLog:
+    """
+    销售记录的分段日志与快照
+
+    每条销售记录以带长度和CRC的二进制帧追加到当前段文件（O(1)，fsync按批次或时间间隔合并执行）；
+    积累一定数量的记录后写入快照：销售历史保存为列式 .npy 文件（加载时内存映射），商品销售统计
+    保存为JSON元数据，随后删除已被快照覆盖的段。加载时读取最新快照并重放快照之后的日志尾部，
+    保存和启动的开销不再随销售历史长度增长。
+
+    写入快照分两步：begin_snapshot() 在持有锁时切换段并确定覆盖到的序号（很快），
+    finish_snapshot() 写文件和fsync时不持有锁，可以在后台线程中执行，期间追加写入不受影响。
+    """
+
+    SEGMENT_PREFIX = 'segment_'
+    SEGMENT_SUFFIX = '.bin'
+    SNAPSHOT_PREFIX = 'snapshot_'
+
+    # 帧头：负载长度 + CRC32
+    FRAME_HEADER = struct.Struct('<II')
+
+    # 负载：序号、时间戳、数量、单价、金额，之后为UTF-8编码的商品ID
+    RECORD = struct.Struct('<Qdddd')
+
+    def __init__(self, log_dir, segment_max_bytes=64 * 1024, snapshot_interval=2000, fsync_batch=16,
+                 fsync_interval=2.0):
+        """
+        初始化销售日志
+
+        Args:
+            log_dir (str): 日志目录
+            segment_max_bytes (int, optional): 单个段文件最大字节数
+            snapshot_interval (int, optional): 距上次快照累积多少条记录后需要写入新快照
+            fsync_batch (int, optional): 累积多少条写入后执行一次fsync
+            fsync_interval (float, optional): 距上次fsync超过多少秒后执行fsync
+        """
+        self.log_dir = log_dir
+        self.segment_max_bytes = segment_max_bytes
+        self.snapshot_interval = snapshot_interval
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+
+        # 记录序号与快照覆盖到的序号
+        self.next_seq = 1
+        self.snapshot_seq = 0
+        self.snapshot_requested = False
+        self.snapshot_in_progress = False
+
+        # 段文件状态
+        self.segment_index = 0
+        self.segment_file = None
+        self.segment_size = 0
+        self.pending_sync = 0
+        self.last_sync_time = time.time()
+
+        self.lock = threading.RLock()
+
+    def _segment_path(self, index):
+        """获取段文件路径"""
+        return os.path.join(self.log_dir, f"{self.SEGMENT_PREFIX}{index:08d}{self.SEGMENT_SUFFIX}")
+
+    def _snapshot_paths(self, seq):
+        """获取快照的 (销售历史, 元数据) 文件路径"""
+        base = os.path.join(self.log_dir, f"{self.SNAPSHOT_PREFIX}{seq:012d}")
+        return base + '.npy', base + '.json'
+
+    def _list_files(self, prefix, suffix):
+        """
+        按编号顺序列出日志目录中的文件
+
+        Returns:
+            list: (编号, 路径) 列表
+        """
+        if not os.path.isdir(self.log_dir):
+            return []
+        files = []
+        for name in os.listdir(self.log_dir):
+            if name.startswith(prefix) and name.endswith(suffix):
+                try:
+                    files.append((int(name[len(prefix):-len(suffix)]), os.path.join(self.log_dir, name)))
+                except ValueError:
+                    continue
+        return sorted(files)
+
+    def _read_segment(self, path):
+        """
+        读取段文件中的全部记录
+
+        Yields:
+            dict: 销售记录（包含seq）
+        """
+        header_size = self.FRAME_HEADER.size
+        with open(path, 'rb') as f:
+            while True:
+                header = f.read(header_size)
+                if len(header) < header_size:
+                    break
+                length, crc = self.FRAME_HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or length < self.RECORD.size or zlib.crc32(payload) != crc:
+                    # 断电造成的不完整帧，之后的数据不可信
+                    logger.warning(f"忽略损坏的销售日志记录: {path}")
+                    break
+                seq, timestamp, quantity, price, amount = self.RECORD.unpack_from(payload)
+                yield {
+                    'seq': seq,
+                    'product_id': payload[self.RECORD.size:].decode('utf-8'),
+                    'quantity': quantity,
+                    'price': price,
+                    'amount': amount,
+                    'timestamp': timestamp
+                }
+
+    def _load_snapshot(self):
+        """
+        加载最新的完整快照（销售历史以内存映射方式打开）
+
+        Returns:
+            tuple: (元数据, 销售历史数组)，没有快照时返回 (None, None)
+        """
+        for seq, meta_path in reversed(self._list_files(self.SNAPSHOT_PREFIX, '.json')):
+            history_path, _ = self._snapshot_paths(seq)
+            try:
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+                history = np.load(history_path, mmap_mode='r')
+                if history.dtype != SNAPSHOT_DTYPE or len(history) != meta.get('records'):
+                    raise ValueError('快照与元数据不一致')
+                return meta, history
+            except (OSError, ValueError) as e:
+                logger.warning(f"忽略无法读取的销售快照 {meta_path}: {str(e)}")
+        return None, None
+
+    def load(self):
+        """
+        加载最新快照并重放之后的日志记录
+
+        Returns:
+            tuple: (商品销售统计, 快照中的销售历史（SalesHistory）, 快照之后的日志记录列表)，
+                   没有快照时前两项为None
+        """
+        with self.lock:
+            meta, history = self._load_snapshot()
+            product_sales = records = None
+            if meta is not None:
+                self.snapshot_seq = meta.get('seq', 0)
+                # 直接按列复制内存映射数组，不为每条记录创建Python对象
+                records = SalesHistory.from_columns(
+                    meta.get('products', []), history['product'],
+                    **{field: history[field] for field in ('timestamp', 'quantity', 'price', 'amount')}
+                )
+                product_sales = meta.get('product_sales', {})
+
+            tail = []
+            max_seq = self.snapshot_seq
+            for index, path in self._list_files(self.SEGMENT_PREFIX, self.SEGMENT_SUFFIX):
+                for record in self._read_segment(path):
+                    seq = record.pop('seq')
+                    # 写入快照后、删除旧段前断电时，段中可能还有已被快照覆盖的记录
+                    if seq > self.snapshot_seq:
+                        tail.append(record)
+                    max_seq = max(max_seq, seq)
+                self.segment_index = index
+            self.next_seq = max_seq + 1
+
+            logger.info(f"加载销售日志: 快照 {len(records) if records is not None else 0} 条, 日志尾部 {len(tail)} 条")
+            return product_sales, records, tail
+
+    def _open_segment(self, index):
+        """打开新的段文件"""
+        if self.segment_file:
+            self._sync()
+            self.segment_file.close()
+
+        os.makedirs(self.log_dir, exist_ok=True)
+        self.segment_index = index
+        self.segment_file = open(self._segment_path(index), 'ab')
+        self.segment_size = self.segment_file.tell()
+
+    def _sync(self):
+        """将已写入的数据刷到磁盘"""
+        if self.segment_file and self.pending_sync:
+            os.fsync(self.segment_file.fileno())
+            self.pending_sync = 0
+        self.last_sync_time = time.time()
+
+    def append(self, record):
+        """
+        追加一条销售记录
+
+        Args:
+            record (dict): 销售记录（product_id、quantity、price、amount、timestamp）
+
+        Returns:
+            int: 记录序号
+        """
+        with self.lock:
+            if self.segment_file is None:
+                # 加载后总是开启新段，避免在可能损坏的尾部继续追加
+                self._open_segment(self.segment_index + 1)
+
+            seq = self.next_seq
+            self.next_seq += 1
+            payload = self.RECORD.pack(seq, record['timestamp'], record['quantity'], record.get('price', 0.0),
+                                       record.get('amount', 0.0)) + str(record['product_id']).encode('utf-8')
+            data = self.FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+            self.segment_file.write(data)
+            self.segment_file.flush()
+            self.segment_size += len(data)
+            self.pending_sync += 1
+
+            if self.pending_sync >= self.fsync_batch or time.time() - self.last_sync_time >= self.fsync_interval:
+                self._sync()
+            if self.segment_size >= self.segment_max_bytes:
+                self._open_segment(self.segment_index + 1)
+            return seq
+
+    def needs_snapshot(self):
+        """
+        判断是否需要写入新快照
+
+        Returns:
+            bool: 没有快照正在写入，且距上次快照的记录数达到阈值或有快照请求
+        """
+        if self.snapshot_in_progress:
+            return False
+        return self.snapshot_requested or self.next_seq - 1 - self.snapshot_seq >= self.snapshot_interval
+
+    def request_snapshot(self):
+        """请求在下次保存时写入快照（例如从旧格式导入数据后）"""
+        self.snapshot_requested = True
+
+    def begin_snapshot(self):
+        """
+        开始写入快照：切换到新段，确定快照覆盖到的序号（调用时销售历史必须与已追加的日志一致）
+
+        Returns:
+            tuple: (快照序号, 可删除的段编号上界)，已有快照正在写入时返回None
+        """
+        with self.lock:
+            if self.snapshot_in_progress:
+                return None
+            seq = self.next_seq - 1
+            # 当前段有记录时先切换到新段，之后当前段之前的段只包含已被快照覆盖的记录；
+            # 加载后还没有写入过的话，已有的段全部被覆盖
+            if self.segment_file is not None and self.segment_size:
+                self._open_segment(self.segment_index + 1)
+            covered = self.segment_index if self.segment_file is not None else self.segment_index + 1
+            self.snapshot_in_progress = True
+            self.snapshot_requested = False
+            return seq, covered
+
+    def finish_snapshot(self, ticket, sales_history, product_sales):
+        """
+        写入快照文件，并删除已被覆盖的段和旧快照（不持有日志锁，可在后台线程执行）
+
+        Args:
+            ticket (tuple): begin_snapshot() 的返回值
+            sales_history (SalesHistory): begin_snapshot() 时的销售历史（后台写入时传入副本）
+            product_sales (dict): begin_snapshot() 时的商品销售统计（调用方提供副本）
+
+        Returns:
+            int: 快照覆盖到的记录序号
+        """
+        seq, covered = ticket
+        try:
+            product_ids, columns = sales_history.coded_columns()
+            history = np.empty(len(columns['code']), dtype=SNAPSHOT_DTYPE)
+            history['product'] = columns['code']
+            for field in ('timestamp', 'quantity', 'price', 'amount'):
+                history[field] = columns[field]
+
+            meta = {
+                'seq': seq,
+                'records': len(history),
+                'products': product_ids,
+                'product_sales': product_sales,
+                'created_at': time.time()
+            }
+
+            # 先落盘销售历史和元数据，元数据改名完成即快照生效
+            os.makedirs(self.log_dir, exist_ok=True)
+            history_path, meta_path = self._snapshot_paths(seq)
+            with open(history_path + '.tmp', 'wb') as f:
+                np.save(f, history)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(history_path + '.tmp', history_path)
+            with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False, separators=(',', ':'))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(meta_path + '.tmp', meta_path)
+
+            with self.lock:
+                for index, path in self._list_files(self.SEGMENT_PREFIX, self.SEGMENT_SUFFIX):
+                    if index < covered:
+                        os.remove(path)
+                for old_seq, old_meta_path in self._list_files(self.SNAPSHOT_PREFIX, '.json'):
+                    if old_seq < seq:
+                        os.remove(old_meta_path)
+                        old_history_path, _ = self._snapshot_paths(old_seq)
+                        if os.path.exists(old_history_path):
+                            os.remove(old_history_path)
+                self.snapshot_seq = seq
+            logger.debug(f"写入销售快照: {len(history)} 条记录, 覆盖到序号 {seq}")
+            return seq
+        except Exception:
+            # 快照未生效，下次保存时重试
+            with self.lock:
+                self.snapshot_requested = True
+            raise
+        finally:
+            with self.lock:
+                self.snapshot_in_progress = False
+
+    def write_snapshot(self, sales_history, product_sales):
+        """
+        同步写入快照（begin_snapshot加finish_snapshot）
+
+        Args:
+            sales_history (SalesHistory): 销售历史，必须是写入当前所有日志记录后的状态
+            product_sales (dict): 商品销售统计
+
+        Returns:
+            int: 快照覆盖到的记录序号，已有快照正在写入时返回None
+        """
+        ticket = self.begin_snapshot()
+        if ticket is None:
+            return None
+        return self.finish_snapshot(ticket, sales_history, product_sales)
+
+    def get_stats(self):
+        """
+        获取日志统计
+
+        Returns:
+            dict: 序号、快照序号、段数和磁盘占用
+        """
+        with self.lock:
+            segments = self._list_files(self.SEGMENT_PREFIX, self.SEGMENT_SUFFIX)
+            snapshots = self._list_files(self.SNAPSHOT_PREFIX, '.json')
+            disk_bytes = 0
+            for _, path in segments + snapshots:
+                try:
+                    disk_bytes += os.path.getsize(path)
+                    if path.endswith('.json'):
+                        disk_bytes += os.path.getsize(path[:-len('.json')] + '.npy')
+                except OSError:
+                    pass
+            return {
+                'last_seq': self.next_seq - 1,
+                'snapshot_seq': self.snapshot_seq,
+                'segments': len(segments),
+                'disk_bytes': disk_bytes
+            }
+
+    def sync(self):
+        """立即执行fsync"""
+        with self.lock:
+            self._sync()
+
+    def close(self):
+        """关闭日志"""
+        with self.lock:
+            if self.segment_file:
+                self._sync()
+                self.segment_file.close()
+                self.segment_file = None
@@ -92,13 +92,104 @@ DEFAULT_CONFIG = {
     },
     'cloud': {
         'server_url': 'https://api.smartfridge.example.com',
+        'server_urls': [],  # 区域接入点列表（为空时只使用server_url）
         'api_key': 'YOUR_CLOUD_API_KEY',
         'report_interval': 60,  # 状态上报间隔（秒）
         'heartbeat_interval': 30,  # 心跳间隔（秒）
         'data_sync_interval': 300,  # 数据同步间隔（秒）
+        'transport': 'http',  # 上报传输方式：http, push（长连接推送通道）
+        'push': {
+            'host': 'localhost',  # 推送通道服务器地址
+            'port': 1883,  # 推送通道服务器端口
+            'keepalive': 30,  # 保活ping间隔（秒），代替HTTP心跳
+            'ack_timeout': 10.0,  # 等待服务器确认的最长时间（秒）
+            'connect_timeout': 5.0  # 连接超时（秒）
+        },
+        'http': {
+            'pool_size': 4,  # 长连接池大小
+            'gzip': True,  # 压缩请求体
+            'gzip_min_bytes': 1024,  # 超过此字节数才压缩
+            'payload_format': 'json',  # 首选负载格式：json, binary（需服务器协商确认）
+            'payload_compression': 'zlib',  # 二进制负载压缩：none, zlib, zstd
+            'timeout': [3.05, 10],  # 默认（连接, 读取）超时（秒）
+            'endpoint_timeouts': {
+                '/device/heartbeat': [3.05, 5],
+                '/device/transactions_batch': [5, 30]
+            }
+        },
+        'circuit_breaker': {
+            'failure_threshold': 3,  # 连续失败多少次后熔断，熔断期间上报直接写入离线缓存
+            'base_delay': 5.0,  # 首次熔断的退避时间（秒），之后每次探测失败翻倍
+            'max_delay': 300.0,  # 最长退避时间（秒）
+            'jitter': 0.5  # 退避时间随机缩短的最大比例，避免设备群同时重连
+        },
+        'traffic_shaping': {
+            'bytes_per_second': 0,  # 上传和下载共享的带宽预算（字节/秒），0为不限速
+            'burst_bytes': 65536,  # 令牌桶容量（允许的突发字节数）
+            'monthly_cap_bytes': 0,  # 月流量上限（字节），0为不限制
+            'cap_ratios': {  # 各类别可使用的月流量上限比例，交易记录不受限制
+                'alert': 1.0,
+                'telemetry': 0.9,
+                'ota': 0.8
+            },
+            'max_wait': 30.0  # 请求等待带宽的最长时间（秒）
+        },
+        'endpoint_selection': {
+            'probe_interval': 300,  # 接入点延迟探测间隔（秒）
+            'probe_timeout': 2.0,  # 探测超时（秒）
+            'switch_margin': 0.3,  # 其他接入点延迟低于当前接入点此比例以上才切换（粘性会话）
+            'failure_cooldown': 60.0,  # 接入点请求失败后的冷却时间（秒）
+            'max_failover_attempts': 2  # 单个请求最多尝试的接入点数
+        },
+        'report_queue': {
+            'max_size': 500,  # 上报队列最大长度
+            'batch_size': 50,  # 达到此数量立即批量发送
+            'max_age': 2.0  # 最早记录最长等待时间（秒）
+        },
+        'status_delta': {
+            'enabled': True,  # 状态增量上报
+            'keyframe_interval': 30,  # 每隔多少次上报发送完整关键帧
+            'keyframe_max_age': 3600  # 关键帧最长间隔（秒）
+        },
+        'replay': {
+            'chunk_size': 100,  # 缓存重放每块记录数
+            'max_workers': 4  # 并行重放的类别数
+        },
+        'cache_journal': {
+            'segment_max_bytes': 262144,  # 缓存日志单段最大字节数
+            'fsync_batch': 16,  # 累积多少条写入后fsync
+            'fsync_interval': 2.0,  # fsync最大间隔（秒）
+            'save_interval': 300,  # 遥测汇总、流量统计落盘和日志压缩的间隔（秒），日志本身按fsync_interval落盘
+            'record_format': 'json'  # 缓存日志记录格式：json, binary
+        },
+        'config_sync': {
+            'interval': 600,  # 配置检查间隔（秒），配置未变化时服务器返回304
+            'long_poll': False,  # 是否使用长轮询（服务器在配置变化时立即返回）
+            'long_poll_timeout': 60  # 长轮询最长等待时间（秒）
+        },
+        'telemetry_rollup': {
+            'enabled': True,  # 离线时将状态汇总为按分钟/小时的聚合数据，而不是缓存完整状态
+            'minute_slots': 1440,  # 保留的分钟聚合数量（24小时）
+            'hour_slots': 168  # 保留的小时聚合数量（7天）
+        },
+        'offline_store': {
+            'max_memory_bytes': 1048576,  # 离线缓存总内存预算（字节）
+            'max_disk_bytes': 67108864,  # 离线缓存磁盘预算（字节），交易记录不受此限制淘汰
+            'page_size': 100,  # 从磁盘分页载入的记录数
+            'lanes': {  # 各类别优先级（数值越小越晚淘汰）、内存配额及是否转存磁盘
+                'transaction': {'priority': 0, 'max_memory_bytes': 524288, 'spill': True},
+                'error': {'priority': 1, 'max_memory_bytes': 131072},
+                'replenishment': {'priority': 2, 'max_memory_bytes': 65536},
+                'warning': {'priority': 3, 'max_memory_bytes': 65536},
+                'status': {'priority': 4, 'max_memory_bytes': 65536}
+            }
+        },
         'ota_update': {
             'enabled': True,
-            'check_interval': 3600  # 检查更新间隔（秒）
+            'check_interval': 3600,  # 检查更新间隔（秒）
+            'chunk_size': 65536,  # 下载分块大小（字节）
+            'max_bytes_per_second': 65536,  # 下载限速（字节/秒），0为不限速
+            'max_retries': 5  # 断线续传最大次数
         }
     },
     'replenishment': {
@@ -106,7 +197,19 @@ DEFAULT_CONFIG = {
         'threshold': 0.2,  # 库存阈值（低于此比例触发补货）
         'prediction_window': 24,  # 预测窗口（小时）
         'data_history_days': 30,  # 历史数据天数
-        'auto_order': False  # 自动下单
+        'decay_half_life_days': 14,  # 销量衰减半衰期（天），0为不衰减
+        'auto_order': False,  # 自动下单
+        'sales_log': {
+            'segment_max_bytes': 64 * 1024,  # 销售日志单个段文件最大字节数
+            'snapshot_interval': 2000,  # 累积多少条销售记录后写入快照
+            'fsync_batch': 16,  # 累积多少条写入后执行一次fsync
+            'fsync_interval': 2.0  # fsync最大间隔（秒）
+        },
+        'ml_models': {
+            'workers': 1,  # 模型训练进程数，0为在后台线程中训练
+            'retrain_interval': 3600,  # 重新训练间隔（秒）
+            'min_history_days': 14  # 商品至少有多少天销售历史才训练模型
+        }
     },
     'advertising': {
         'display_type': 'touch_screen',  # 显示类型：touch_screen, digital_signage
@@ -124,6 +227,9 @@ DEFAULT_CONFIG = {
             'time': '03:00'  # 自动重启时间
         }
     },
+    'backend': {
+        'device_db_path': 'data/device_ingest.db'  # 后台设备接入数据库路径（相对路径相对于项目根目录，可用环境变量SVF_DEVICE_DB覆盖）
+    },
     'products': {
         'SKU001': {
             'name': '可口可乐',
@@ -190,6 +296,9 @@ class ConfigManager:
         self.config_path = config_path or DEFAULT_CONFIG_PATH
         self.config = self._load_config()
         
+        # 配置版本号（每次更新加一，供缓存了配置派生数据的模块判断是否失效）
+        self.version = 0
+        
         # 确保配置文件存在
         self._ensure_config_file()
     
@@ -249,6 +358,7 @@ class ConfigManager:
         try:
             # 合并配置
             self._merge_config(self.config, new_config)
+            self.version += 1
             
             # 保存配置
             with open(self.config_path, 'w', encoding='utf-8') as f:
@@ -318,6 +428,7 @@ class ConfigManager:
         # 设置值
         try:
             target[keys[-1]] = value
+            self.version += 1
             
             # 保存配置
             with open(self.config_path, 'w', encoding='utf-8') as f:
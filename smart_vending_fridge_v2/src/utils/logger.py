@@ -60,4 +60,16 @@ def setup_logger(log_level=logging.INFO, log_file=None, max_bytes=10*1024*1024,
         # 添加文件处理器
         logger.addHandler(file_handler)
     
-    return logger
\ No newline at end of file
+    return logger
+
+def get_logger(name):
+    """
+    获取模块日志记录器（输出由 setup_logger 配置的根日志记录器处理）
+    
+    Args:
+        name (str): 日志记录器名称
+    
+    Returns:
+        logging.Logger: 日志记录器
+    """
+    return logging.getLogger(name)
@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+
+"""
+测试公共配置 - 把项目根目录和后台目录加入模块搜索路径（后台模块使用平铺导入）
+"""
+
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for path in (PROJECT_ROOT, os.path.join(PROJECT_ROOT, 'backend')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+
+"""
+后台应用测试 - 验证导入模块时不创建设备数据库，数据库路径可由环境变量指定，并在首次请求时打开
+"""
+
+import importlib
+import sys
+
+
+def test_device_store_opened_on_first_request(tmp_path, monkeypatch):
+    db_path = tmp_path / 'ingest' / 'device.db'
+    monkeypatch.setenv('SVF_DEVICE_DB', str(db_path))
+    app_module = importlib.reload(sys.modules['app']) if 'app' in sys.modules else importlib.import_module('app')
+
+    assert app_module.device_store is None
+    assert not db_path.exists()
+
+    app_module.app.test_client().get('/login')
+    try:
+        assert app_module.device_store is not None
+        assert db_path.exists()
+        # 再次初始化返回同一个存储
+        assert app_module.init_device_ingest() is app_module.device_store
+    finally:
+        app_module.device_store.close()
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+"""
+缓存日志与离线存储测试 - 恢复、按偏移索引分页读取、压缩后定位、损坏尾部、转存通道分页载入、延迟fsync只落盘日志、
+分块重放中途失败后重启只重发未确认的尾部
+"""
+
+import time
+
+import pytest
+
+from src.cloud.cache_journal import CacheJournal
+from src.cloud.cloud_manager import CloudManager
+from src.cloud.offline_store import OfflineStore
+
+
+def _journal(path, record_format='json', segment_max_bytes=512):
+    journal = CacheJournal(str(path), segment_max_bytes=segment_max_bytes, fsync_batch=1000,
+                           record_format=record_format)
+    journal.recover()
+    return journal
+
+
+@pytest.mark.parametrize('record_format', ['json', 'binary'])
+def test_read_live_pages_across_segments(tmp_path, record_format):
+    journal = _journal(tmp_path, record_format)
+    for index in range(50):
+        journal.append('transaction', {'id': f"T{index}"})
+        journal.append('status', {'n': index})
+    journal.ack('transaction', 10)
+
+    assert len(journal._list_segments()) > 3
+    assert journal.read_live('transaction', 0, 5) == [{'id': f"T{index}"} for index in range(10, 15)]
+    assert journal.read_live('transaction', 35, 10) == [{'id': f"T{index}"} for index in range(45, 50)]
+    assert journal.read_live('transaction', 40, 10) == []
+    journal.close()
+
+
+@pytest.mark.parametrize('record_format', ['json', 'binary'])
+def test_recover_and_compact_keep_offsets(tmp_path, record_format):
+    journal = _journal(tmp_path, record_format)
+    for index in range(40):
+        journal.append('transaction', {'id': f"T{index}"})
+    journal.ack('transaction', 25)
+    journal.close()
+
+    journal = CacheJournal(str(tmp_path), segment_max_bytes=512, record_format=record_format)
+    recovered = journal.recover()
+    assert recovered['transaction'] == [{'id': f"T{index}"} for index in range(25, 40)]
+    assert journal.read_live('transaction', 3, 2) == [{'id': 'T28'}, {'id': 'T29'}]
+
+    assert journal.compact() > 0
+    assert journal.read_live('transaction', 0, 20) == recovered['transaction']
+    journal.append('transaction', {'id': 'T40'})
+    assert journal.read_live('transaction', 14, 2) == [{'id': 'T39'}, {'id': 'T40'}]
+    journal.close()
+
+
+def test_torn_json_tail_is_ignored(tmp_path):
+    journal = _journal(tmp_path, segment_max_bytes=1 << 20)
+    journal.append('error', {'message': 'a'})
+    journal.append('error', {'message': 'b'})
+    path = journal.segment_file.name
+    journal.close()
+    with open(path, 'ab') as f:
+        f.write(b'{"op":"add","cat":"error","seq":3,"rec":{"mes')
+
+    journal = CacheJournal(str(tmp_path))
+    assert journal.recover() == {'error': [{'message': 'a'}, {'message': 'b'}]}
+    assert journal.read_live('error', 1, 5) == [{'message': 'b'}]
+    journal.close()
+
+
+def test_offline_store_pages_spilled_records_in_order(tmp_path):
+    journal = _journal(tmp_path, segment_max_bytes=4096)
+    store = OfflineStore(journal, lanes={'transaction': {'max_memory_bytes': 1000}}, page_size=7)
+    for index in range(100):
+        store.append('transaction', {'id': f"T{index}", 'pad': 'x' * 40})
+
+    assert store.count('transaction') == 100
+    sent = []
+    while store.count('transaction'):
+        chunk = store.peek('transaction', 10)
+        sent.extend(record['id'] for record in chunk)
+        store.ack_records('transaction', chunk)
+        if journal.needs_compaction(1024):
+            journal.compact()
+
+    assert sent == [f"T{index}" for index in range(100)]
+    journal.close()
+
+
+def test_offline_store_evicts_low_priority_lane(tmp_path):
+    journal = _journal(tmp_path)
+    store = OfflineStore(journal, lanes={'status': {'max_memory_bytes': 300}})
+    for index in range(20):
+        store.append('status', {'n': index})
+
+    records = store.peek('status', 100)
+    assert records[-1] == {'n': 19}
+    assert len(records) < 20
+    assert store.lanes['status'].evicted_count == 20 - len(records)
+
+    journal.close()
+    journal = CacheJournal(str(tmp_path))
+    assert journal.recover()['status'] == records
+    journal.close()
+
+
+def test_pending_write_schedules_journal_sync_only(tmp_path):
+    manager = CloudManager({'data_dir': str(tmp_path), 'ota_update': {'enabled': False}}, device_id='SVF-TEST')
+    manager.scheduler = manager._create_scheduler()
+    jobs = manager.scheduler.jobs
+    cache_save_deadline = jobs['cache_save'].deadline
+
+    manager.offline_store.append('error', {'message': 'door sensor'})
+
+    assert jobs['journal_sync'].deadline <= time.monotonic() + manager.cache_journal.fsync_interval
+    assert jobs['cache_save'].deadline == cache_save_deadline
+
+    manager._sync_journal()
+    assert manager.cache_journal.pending_sync == 0
+    assert not (tmp_path / 'telemetry_rollup_SVF-TEST.bin').exists()
+    manager.scheduler.stop()
+    manager.cache_journal.close()
+
+
+def test_replay_resumes_after_failed_chunk_without_duplicates(tmp_path):
+    config = {'data_dir': str(tmp_path), 'ota_update': {'enabled': False}, 'replay': {'chunk_size': 10}}
+    manager = CloudManager(config, device_id='SVF-TEST')
+    for index in range(35):
+        manager._cache_transaction({'transaction_id': f"T{index}"})
+
+    delivered = []
+
+    def flaky_request(endpoint, data):
+        # 前两块成功，第三块链路中断
+        if len(delivered) >= 20:
+            return None
+        delivered.extend(record['transaction_id'] for record in data['transactions'])
+        return {'status': 'success'}
+
+    manager.connected = True
+    manager._send_request = flaky_request
+    assert manager._replay_category('transaction') == 20
+    assert manager.offline_store.count('transaction') == 15
+    # 模拟进程退出：只关闭日志，不做其他保存
+    manager.cache_journal.close()
+
+    restarted = CloudManager(config, device_id='SVF-TEST')
+    assert restarted.offline_store.count('transaction') == 15
+    resent = []
+
+    def healthy_request(endpoint, data):
+        resent.append([record['transaction_id'] for record in data['transactions']])
+        return {'status': 'success'}
+
+    restarted.connected = True
+    restarted._send_request = healthy_request
+    assert restarted._replay_category('transaction') == 15
+
+    assert resent == [[f"T{index}" for index in range(20, 30)], [f"T{index}" for index in range(30, 35)]]
+    assert delivered + sum(resent, []) == [f"T{index}" for index in range(35)]
+    assert restarted.offline_store.count('transaction') == 0
+    restarted.cache_journal.close()
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+"""
+熔断器测试 - 使用虚拟时钟验证断开、半开、恢复的状态转换，退避时间的指数增长与抖动，以及探测失败后重新断开
+"""
+
+import pytest
+
+from src.cloud.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class FakeClock:
+    """可手动推进的虚拟时钟"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def _breaker(clock, **kwargs):
+    changes = []
+    options = {'failure_threshold': 3, 'base_delay': 5.0, 'max_delay': 60.0, 'jitter': 0.0}
+    options.update(kwargs)
+    breaker = CircuitBreaker(on_state_change=lambda old, new: changes.append((old, new)), clock=clock, **options)
+    return breaker, changes
+
+
+def _trip(breaker):
+    while breaker.state != OPEN:
+        assert breaker.allow_request()
+        breaker.record_failure()
+
+
+def test_opens_after_threshold_then_half_open_probe_closes():
+    clock = FakeClock()
+    breaker, changes = _breaker(clock)
+
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.retry_in() == pytest.approx(5.0)
+
+    # 退避期间请求立即失败
+    clock.advance(4.9)
+    assert not breaker.allow_request()
+    assert breaker.get_stats()['short_circuited'] == 1
+
+    # 退避结束后半开，只放行一个探测
+    clock.advance(0.1)
+    assert breaker.allow_request()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow_request()
+    assert changes == [(CLOSED, OPEN), (OPEN, HALF_OPEN), (HALF_OPEN, CLOSED)]
+
+
+def test_failed_probe_reopens_with_longer_backoff():
+    clock = FakeClock()
+    breaker, changes = _breaker(clock)
+    _trip(breaker)
+
+    delays = [breaker.retry_in()]
+    for _ in range(5):
+        clock.advance(breaker.retry_in())
+        assert breaker.allow_request()
+        assert breaker.state == HALF_OPEN
+        # 探测失败立即重新断开，不需要再累计到阈值
+        breaker.record_failure()
+        assert breaker.state == OPEN
+        delays.append(breaker.retry_in())
+
+    assert delays == [5.0, 10.0, 20.0, 40.0, 60.0, 60.0]
+    assert breaker.get_stats()['trips'] == 6
+    assert changes[:4] == [(CLOSED, OPEN), (OPEN, HALF_OPEN), (HALF_OPEN, OPEN), (OPEN, HALF_OPEN)]
+
+    # 恢复后退避时间重新从基础值开始
+    clock.advance(breaker.retry_in())
+    assert breaker.allow_request()
+    breaker.record_success()
+    _trip(breaker)
+    assert breaker.retry_in() == pytest.approx(5.0)
+
+
+def test_backoff_jitter_stays_within_bounds():
+    clock = FakeClock()
+    breaker, _ = _breaker(clock, jitter=0.5, failure_threshold=1)
+    for expected in (5.0, 10.0, 20.0):
+        breaker.record_failure()
+        assert expected * 0.5 <= breaker.retry_in() <= expected
+        clock.advance(breaker.retry_in())
+        assert breaker.allow_request()
+
+
+def test_released_probe_allows_next_probe():
+    clock = FakeClock()
+    breaker, _ = _breaker(clock, failure_threshold=1)
+    breaker.record_failure()
+    clock.advance(5.0)
+
+    assert breaker.allow_request()
+    breaker.release()
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow_request()
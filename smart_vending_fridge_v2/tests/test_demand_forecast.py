@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+"""
+需求预测测试 - 预测和趋势查询不修改预测器状态，未推进时的结果与推进后一致，批量预测与逐商品预测一致
+"""
+
+import numpy as np
+import pytest
+
+from src.replenishment.demand_forecast import DemandForecaster
+from src.replenishment.replenishment_algorithm import ReplenishmentAlgorithm
+
+HOUR = 3600.0
+
+
+def _forecaster(start):
+    forecaster = DemandForecaster(prediction_window=24, half_life_days=14)
+    rng = np.random.default_rng(3)
+    timestamps = start + np.sort(rng.uniform(0, 20 * 24 * HOUR, 600))
+    product_ids = [f"P{code}" for code in rng.integers(0, 5, len(timestamps))]
+    forecaster.add_sales(product_ids, timestamps, rng.integers(1, 4, len(timestamps)).astype(float))
+    return forecaster, float(timestamps[-1])
+
+
+def _state(forecaster):
+    return (forecaster.trend_head, forecaster.trend_counts.copy(), forecaster.recent_sum.copy(),
+            forecaster.prior_sum.copy())
+
+
+def test_reads_do_not_advance_trend_ring():
+    forecaster, last = _forecaster(1700000000.0)
+    before = _state(forecaster)
+
+    for hours in (1, 13, 50, 24 * 9):
+        forecaster.forecast_all(now=last + hours * HOUR)
+        forecaster.trend_factor('P1', now=last + hours * HOUR)
+
+    after = _state(forecaster)
+    assert after[0] == before[0]
+    for old, new in zip(before[1:], after[1:]):
+        np.testing.assert_array_equal(old, new)
+
+
+@pytest.mark.parametrize('hours', [0.5, 7, 30, 24 * 8, 24 * 15])
+def test_read_before_and_after_advance_agree(hours):
+    forecaster, last = _forecaster(1700000000.0)
+    now = last + hours * HOUR
+    pure = forecaster.forecast_all(now=now)
+
+    forecaster.advance(now)
+    advanced = forecaster.forecast_all(now=now)
+
+    np.testing.assert_allclose(pure['trend_factors'], advanced['trend_factors'], rtol=1e-9)
+    np.testing.assert_allclose(pure['predicted_sales'], advanced['predicted_sales'], rtol=1e-9)
+
+
+@pytest.mark.parametrize('algorithm_name', ['simple', 'predictive'])
+def test_batch_forecast_matches_per_product_path(tmp_path, algorithm_name):
+    start = 1700000000.0
+    now = start + 20 * 24 * HOUR + 1234.0
+    algorithm = ReplenishmentAlgorithm({'data_dir': str(tmp_path), 'algorithm': algorithm_name},
+                                       clock=lambda: now)
+    rng = np.random.default_rng(5)
+    for timestamp in np.sort(rng.uniform(start, now, 400)).tolist():
+        algorithm.update_sales_data({'status': 'completed', 'end_time': timestamp, 'products_taken': [
+            {'product_id': f"SKU{rng.integers(0, 6)}", 'quantity': int(rng.integers(1, 3)), 'price': 2.5}]})
+
+    product_ids = [f"SKU{index}" for index in range(7)]
+    batch = algorithm.forecast_all(product_ids=product_ids)['predicted_sales']
+    loop = [algorithm._predict_sales(product_id) for product_id in product_ids]
+
+    # 同一时刻两条路径读取相同的累计值，只有浮点运算顺序不同
+    np.testing.assert_allclose(batch, loop, rtol=1e-12)
+    algorithm._save_sales_data()
+    algorithm.sales_log.close()
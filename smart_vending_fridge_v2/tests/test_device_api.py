@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+
+"""
+设备接入API测试 - 通过Flask测试客户端验证负载解码的错误码、设备认证、批量写入与去重、增量状态、配置ETag与长轮询
+"""
+
+import gzip
+import json
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+import device_api
+from device_store import DeviceStore
+from src.cloud.serializer import BinarySerializer
+from src.cloud.status_delta import StatusDeltaEncoder
+
+API_KEY = 'test-key'
+AUTH = {'Authorization': 'Bearer ' + API_KEY}
+
+
+@pytest.fixture
+def client(tmp_path):
+    store = device_api.init_device_api(str(tmp_path / 'device.db'), {'replenishment': {'threshold': 0.3}})
+    store.register_device('D1', API_KEY)
+    app = Flask(__name__)
+    app.register_blueprint(device_api.device_api)
+    yield app.test_client()
+    store.close()
+
+
+def _post(client, path, data, **headers):
+    return client.post(path, data=data, headers={**AUTH, **headers})
+
+
+@pytest.mark.parametrize('data, headers, status', [
+    (b'{"id": ', {}, 400),
+    (b'\xff\xfe', {}, 400),
+    (b'[1, 2]', {}, 400),
+    (b'not gzip', {'Content-Encoding': 'gzip'}, 400),
+    (b'{}', {'Content-Encoding': 'br'}, 415),
+    (b'SV\x01\x00', {'Content-Type': 'application/x-svf-binary; v=1; compression=lz4'}, 415),
+    (b'SV\x01\x00\x08\x05', {'Content-Type': 'application/x-svf-binary; v=1; compression=none'}, 400),
+])
+def test_malformed_payload_is_rejected(client, data, headers, status):
+    assert _post(client, '/device/transaction', data, **headers).status_code == status
+
+
+def test_batch_field_must_be_list(client):
+    response = _post(client, '/device/transactions_batch', json.dumps({'transactions': 5}),
+                     **{'Content-Type': 'application/json'})
+    assert response.status_code == 400
+
+
+def test_gzip_and_binary_payloads_are_accepted(client):
+    gzipped = _post(client, '/device/transaction', gzip.compress(b'{"id": "T1", "record_seq": 1}'),
+                    **{'Content-Encoding': 'gzip'})
+    serializer = BinarySerializer('zlib')
+    binary = _post(client, '/device/transaction', serializer.encode({'id': 'T2', 'record_seq': 2}),
+                   **{'Content-Type': serializer.content_type_header})
+
+    assert gzipped.get_json()['data']['ack'] == 'ok'
+    assert binary.get_json()['data']['ack'] == 'ok'
+
+
+def _transaction(seq, epoch='e1', **extra):
+    record = {'id': f"T{seq}", 'end_time': 1700000000.0 + seq, 'total_amount': 3.5,
+              'record_epoch': epoch, 'record_seq': seq}
+    record.update(extra)
+    return record
+
+
+def test_requests_need_a_registered_key(client):
+    assert client.post('/device/heartbeat', json={}).status_code == 401
+    assert client.post('/device/heartbeat', json={}, headers={'Authorization': 'Bearer other'}).status_code == 401
+    assert client.post('/device/heartbeat', json={'device_id': 'D2'}, headers=AUTH).status_code == 403
+    assert client.post('/device/heartbeat', json={}, headers=AUTH).status_code == 200
+
+
+def test_transaction_batches_are_deduplicated(client, tmp_path):
+    # 新纪元的相同序号是另一条记录；交易ID相同的记录即使纪元不同也是重复
+    batch = [_transaction(1), _transaction(2), _transaction(2), _transaction(1, epoch='e2', id='T1b'),
+             _transaction(5, epoch='e2', id='T1')]
+    first = client.post('/device/transactions_batch', json={'transactions': batch}, headers=AUTH).get_json()
+    assert first['data']['acks'] == ['ok', 'ok', 'duplicate', 'ok', 'duplicate']
+    assert first['data']['accepted'] == 5
+
+    # 重放整批：全部确认为重复，不重复写入
+    again = client.post('/device/transactions_batch', json={'transactions': batch}, headers=AUTH).get_json()
+    assert again['data']['acks'] == ['duplicate'] * 5
+    assert device_api.store.count('transactions') == 3
+
+    # 服务重启后去重索引为空，由唯一索引识别重复
+    device_api.store.close()
+    store = DeviceStore(str(tmp_path / 'device.db'))
+    try:
+        assert store.insert_transactions('D1', [_transaction(2), _transaction(3)]) == ['duplicate', 'ok']
+        assert store.count('transactions') == 4
+    finally:
+        store.close()
+
+
+def test_events_and_rollups_are_idempotent(client):
+    errors = [{'message': 'door', 'record_epoch': 'e1', 'record_seq': 7},
+              {'message': 'fan', 'record_epoch': 'e1', 'record_seq': 8}]
+    assert client.post('/device/errors_batch', json={'errors': errors}, headers=AUTH).get_json()['data']['acks'] \
+        == ['ok', 'ok']
+    assert client.post('/device/error', json=errors[0], headers=AUTH).get_json()['data']['ack'] == 'duplicate'
+
+    rollups = {'minute': [{'resolution': 60, 'start': 1700000000.0, 'temperature': 4.1}],
+               'hour': [{'resolution': 3600, 'start': 1699999200.0, 'temperature': 4.0}, {'bad': True}]}
+    for _ in range(2):
+        acks = client.post('/device/telemetry_rollups', json={'rollups': rollups}, headers=AUTH).get_json()
+        assert acks['data']['acks'] == ['ok', 'ok', 'error']
+
+    assert device_api.store.count('events') == 2
+    assert device_api.store.count('telemetry_rollups') == 2
+
+
+def test_status_deltas_are_applied_to_the_stored_snapshot(client):
+    encoder = StatusDeltaEncoder()
+    for temperature in (4.0, 4.5):
+        payload = encoder.encode({'running': True, 'temperature': temperature, 'errors': []})
+        response = client.post('/device/status', json=payload, headers=AUTH).get_json()
+        assert response['data'] == {}
+        encoder.acknowledge(payload['status_seq'])
+    assert payload['encoding'] == 'json-patch'
+    assert device_api.store.get_status('D1')[0] == {'running': True, 'temperature': 4.5, 'errors': []}
+
+    # 基准序号不匹配时要求重新同步
+    stale = {'encoding': 'json-patch', 'status_seq': 9, 'base_seq': 1, 'ops': []}
+    assert client.post('/device/status', json=stale, headers=AUTH).get_json()['data'] == {'resync': True}
+
+
+def test_config_is_conditional_and_device_safe(client):
+    first = client.get('/device/config', headers=AUTH)
+    etag, data = first.headers['ETag'], first.get_json()['data']
+    assert data['config'] == {'replenishment': {'threshold': 0.3}}
+
+    assert client.get('/device/config', headers={**AUTH, 'If-None-Match': etag}).status_code == 304
+
+    # 只下发允许的配置项，且只返回相对设备已有版本的变化
+    device_api.config_publisher.publish(device_api.device_safe_config({
+        'replenishment': {'threshold': 0.4}, 'cloud': {'api_key': 'secret', 'report_interval': 60}}))
+    changed = client.get(f"/device/config?version={data['version']}", headers={**AUTH, 'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert changed.get_json()['data']['config'] == {'replenishment': {'threshold': 0.4},
+                                                    'cloud': {'report_interval': 60}}
+
+
+def test_etag_depends_only_on_content():
+    first, restarted = device_api.ConfigPublisher(), device_api.ConfigPublisher()
+    first.publish({'products': {'SKU1': {'price': 3.5}}})
+    restarted.publish({'products': {'SKU1': {'price': 3.5}}})
+    version = first.version
+    first.publish({'products': {'SKU1': {'price': 3.5}}})
+
+    assert first.etag == restarted.etag
+    assert first.version == version
+
+
+def test_config_version_survives_restart(tmp_path):
+    state_path = str(tmp_path / 'config_state.json')
+    first = device_api.ConfigPublisher(state_path=state_path)
+    first.publish({'replenishment': {'threshold': 0.3}})
+    first.publish({'replenishment': {'threshold': 0.4}, 'cloud': {'report_interval': 60}})
+    device_version = first.version
+
+    # 模拟服务重启：新的发布对象从状态文件恢复版本号，内容不变时不递增
+    restarted = device_api.ConfigPublisher(state_path=state_path)
+    restarted.publish({'replenishment': {'threshold': 0.4}, 'cloud': {'report_interval': 60}})
+    assert (restarted.version, restarted.etag) == (device_version, first.etag)
+
+    restarted.publish({'replenishment': {'threshold': 0.5}, 'cloud': {'report_interval': 60}})
+    version, _, changes = restarted.get_update(device_version)
+    assert version == device_version + 1
+    assert changes == {'replenishment': {'threshold': 0.5}}
+    # 更早的快照同样可用于增量，未知版本返回完整配置
+    assert restarted.get_update(1)[2] == {'replenishment': {'threshold': 0.5}, 'cloud': {'report_interval': 60}}
+    assert restarted.get_update(99)[2] == {'replenishment': {'threshold': 0.5}, 'cloud': {'report_interval': 60}}
+
+
+def test_long_poll_returns_when_config_changes(client):
+    etag = client.get('/device/config', headers=AUTH).headers['ETag']
+    timer = threading.Timer(0.2, device_api.config_publisher.publish, [{'replenishment': {'threshold': 0.5}}])
+    timer.start()
+
+    start = time.monotonic()
+    response = client.get('/device/config?wait=10', headers={**AUTH, 'If-None-Match': etag})
+    timer.join()
+
+    assert response.status_code == 200
+    assert time.monotonic() - start < 5
+    assert response.get_json()['data']['config'] == {'replenishment': {'threshold': 0.5}}
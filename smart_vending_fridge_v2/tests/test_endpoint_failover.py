@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+"""
+接入点故障转移测试 - 两个本地接入点之间的透明故障转移、冷却期和按探测延迟切回
+"""
+
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.cloud.cloud_manager import CloudManager
+from src.cloud.endpoint_selector import EndpointSelector
+
+
+class LocalEndpoint:
+    """本地接入点：记录收到的请求路径，down为True时返回503"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.down = False
+        self.paths = []
+        endpoint = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _reply(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                time.sleep(endpoint.latency)
+                endpoint.paths.append(self.path.split('?')[0])
+                status = 503 if endpoint.down else 200
+                body = json.dumps({'status': 'success' if status == 200 else 'error', 'data': {}}).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = _reply
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def _unused_url():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+@pytest.fixture
+def endpoints():
+    primary, secondary = LocalEndpoint(), LocalEndpoint(latency=0.05)
+    yield primary, secondary
+    primary.close()
+    secondary.close()
+
+
+def _manager(tmp_path, urls, cooldown=60.0):
+    return CloudManager({
+        'server_urls': urls,
+        'data_dir': str(tmp_path),
+        'endpoint_selection': {'failure_cooldown': cooldown, 'switch_margin': 0.3},
+        'ota_update': {'enabled': False},
+    }, device_id='SVF-FAILOVER')
+
+
+def test_request_fails_over_to_second_endpoint(tmp_path, endpoints):
+    primary, secondary = endpoints
+    manager = _manager(tmp_path, [primary.url, secondary.url])
+    assert manager._send_request('/device/heartbeat', {'device_id': manager.device_id})['status'] == 'success'
+    assert primary.paths == ['/device/heartbeat']
+
+    primary.down = True
+    response = manager._send_request('/device/heartbeat', {'device_id': manager.device_id})
+
+    assert response['status'] == 'success'
+    assert secondary.paths == ['/device/heartbeat']
+    assert manager.server_url == secondary.url
+    # 后续请求粘在新接入点上
+    manager._send_request('/device/heartbeat', {'device_id': manager.device_id})
+    assert len(primary.paths) == 2
+    assert len(secondary.paths) == 2
+
+
+def test_unreachable_endpoint_fails_over(tmp_path, endpoints):
+    _, secondary = endpoints
+    manager = _manager(tmp_path, [_unused_url(), secondary.url])
+
+    assert manager._send_request('/device/heartbeat', {'device_id': manager.device_id})['status'] == 'success'
+    assert manager.server_url == secondary.url
+
+
+def test_probe_returns_to_faster_endpoint_after_cooldown(tmp_path, endpoints):
+    primary, secondary = endpoints
+    manager = _manager(tmp_path, [primary.url, secondary.url], cooldown=0.3)
+    primary.down = True
+    manager._send_request('/device/heartbeat', {'device_id': manager.device_id})
+    assert manager.server_url == secondary.url
+
+    # 冷却期内探测失败，保持在备用接入点
+    manager._probe_endpoints()
+    assert manager.server_url == secondary.url
+
+    primary.down = False
+    time.sleep(0.35)
+    manager._probe_endpoints()
+    assert manager.server_url == primary.url
+    assert manager.endpoint_selector.get_stats()['switches'] == 2
+
+
+def test_selector_is_sticky_within_margin():
+    selector = EndpointSelector(['http://a', 'http://b'], switch_margin=0.3, min_switch_gain=0.02)
+    selector.record_probe('http://a', 0.100)
+    selector.record_probe('http://b', 0.080)
+    assert selector.reselect() == 'http://a'
+
+    for _ in range(10):
+        selector.record_probe('http://b', 0.020)
+    assert selector.reselect() == 'http://b'
+    assert selector.record_failure('http://b') == 'http://a'
+    assert selector.record_failure('http://a') is None
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+"""
+预测模型测试 - 验证按留出误差选择模型、各类模型的窗口预测，以及模型文件的保存、加载和版本处理
+"""
+
+import json
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from src.replenishment.forecast_models import (HOURS_PER_DAY, MODEL_FORMAT_VERSION, ModelSet, ModelTrainer,
+                                               train_models)
+
+END_TIME = 1_700_000_000.0 // 3600 * 3600
+DAYS = 30
+START_TIME = END_TIME - DAYS * HOURS_PER_DAY * 3600
+
+
+def _sales():
+    """趋势上升的平稳商品TREND，以及最近10天需求变频繁的间歇性商品INT"""
+    product_ids, timestamps, quantities = [], [], []
+    for hour in range(DAYS * HOURS_PER_DAY):
+        product_ids.append('TREND')
+        timestamps.append(START_TIME + hour * 3600 + 60)
+        quantities.append(0.2 + 2.0 * hour / (DAYS * HOURS_PER_DAY))
+    for day in range(DAYS):
+        if day % (5 if day < DAYS - 10 else 2) == 0:
+            product_ids.append('INT')
+            timestamps.append(START_TIME + day * 86400 + 12 * 3600)
+            quantities.append(3.0)
+    return product_ids, timestamps, quantities
+
+
+def test_model_selected_by_holdout_error():
+    products = train_models(*_sales(), END_TIME)['products']
+
+    assert products['TREND']['model'] == 'holt_winters'
+    assert products['INT']['model'] == 'tsb'
+    assert all(model['holdout_mae'] >= 0 for model in products.values())
+
+
+def test_temperature_driven_product_uses_regression():
+    rng = np.random.default_rng(0)
+    daily_temperature = 20 + 8 * rng.standard_normal(DAYS)
+    product_ids, timestamps, quantities, readings = [], [], [], []
+    for hour in range(DAYS * HOURS_PER_DAY):
+        timestamp = START_TIME + hour * 3600 + 60
+        temperature = daily_temperature[hour // HOURS_PER_DAY]
+        readings.append(temperature)
+        if temperature > 20:
+            product_ids.append('COLD')
+            timestamps.append(timestamp)
+            quantities.append((temperature - 20) * 0.5)
+    temperatures = (START_TIME + np.arange(DAYS * HOURS_PER_DAY) * 3600 + 60, readings)
+
+    result = train_models(product_ids, timestamps, quantities, END_TIME, temperatures)
+
+    assert result['temperature'] is not None
+    assert result['products']['COLD']['model'] == 'regression'
+    assert result['products']['COLD']['temperature'] > 0
+
+
+def test_too_short_history_trains_nothing():
+    product_ids, timestamps, quantities = _sales()
+    assert train_models(product_ids, timestamps, quantities, START_TIME + 10 * 86400)['products'] == {}
+
+
+def _params():
+    return {
+        'end_time': END_TIME,
+        'end_hour': int(END_TIME // 3600),
+        'temperature': {'mean': 20.0, 'std': 5.0},
+        'products': {
+            'HW': {'model': 'holt_winters', 'level': 1.0, 'trend': 0.0, 'season': [0.5] * HOURS_PER_DAY},
+            'TSB': {'model': 'tsb', 'daily_rate': 12.0},
+            'REG': {'model': 'regression', 'intercept': 0.25, 'hour': [0.0] * HOURS_PER_DAY, 'weekday': [0.0] * 7,
+                    'temperature': 0.1}
+        }
+    }
+
+
+def test_predict_all_for_each_model_kind():
+    params = _params()
+    params['products']['REG']['hour'][3] = 2.0
+    models = ModelSet(params, version=1, window=6)
+
+    predicted, modeled = models.predict_all(['HW', 'TSB', 'REG', 'UNKNOWN'], now=END_TIME, temperature=30.0)
+
+    assert modeled.tolist() == [True, True, True, False]
+    assert predicted[0] == pytest.approx(6 * (1.0 + 0.5))
+    assert predicted[1] == pytest.approx(12.0 * 6 / HOURS_PER_DAY)
+    # 窗口包含本地3点时加上该小时的系数；温度比训练期平均高2个标准差
+    window_hours = [(datetime.fromtimestamp(END_TIME).hour + offset) % HOURS_PER_DAY for offset in range(6)]
+    expected = 6 * (0.25 + 0.1 * 2.0) + (2.0 if 3 in window_hours else 0.0)
+    assert predicted[2] == pytest.approx(expected)
+    assert predicted[3] == 0.0
+
+    # 未提供温度时使用训练期平均温度
+    predicted, _ = models.predict_all(['REG'], now=END_TIME)
+    assert predicted[0] == pytest.approx(6 * 0.25 + (2.0 if 3 in window_hours else 0.0))
+    assert models.get_stats()['models'] == {'holt_winters': 1, 'tsb': 1, 'regression': 1}
+
+
+def test_predictions_are_not_negative():
+    params = _params()
+    params['products']['REG']['intercept'] = -5.0
+    predicted, _ = ModelSet(params, window=6).predict_all(['REG'], now=END_TIME)
+    assert predicted[0] == 0.0
+
+
+def test_trainer_saves_and_loads_versioned_models(tmp_path):
+    model_file = str(tmp_path / 'models.json')
+    trainer = ModelTrainer(model_file, window=6, workers=0)
+    trainer._install([_params()])
+    trainer._install([_params()])
+    assert trainer.model_set.version == 2
+
+    reloaded = ModelTrainer(model_file, window=6, workers=0)
+    assert reloaded.model_set.version == 2
+    assert sorted(reloaded.model_set.product_ids) == ['HW', 'REG', 'TSB']
+    # 新训练的版本号在加载的版本上继续递增
+    reloaded._install([_params()])
+    assert reloaded.model_set.version == 3
+
+
+def test_trainer_ignores_incompatible_model_file(tmp_path):
+    model_file = tmp_path / 'models.json'
+    ModelTrainer(str(model_file), window=6, workers=0)._install([_params()])
+
+    # 预测窗口不一致
+    assert len(ModelTrainer(str(model_file), window=12, workers=0).model_set) == 0
+
+    # 格式版本不一致
+    data = json.loads(model_file.read_text(encoding='utf-8'))
+    data['format'] = MODEL_FORMAT_VERSION + 1
+    model_file.write_text(json.dumps(data), encoding='utf-8')
+    trainer = ModelTrainer(str(model_file), window=6, workers=0)
+    assert len(trainer.model_set) == 0
+    assert trainer.model_set.version == 0
+
+
+def test_background_training_replaces_model_set(tmp_path):
+    trainer = ModelTrainer(str(tmp_path / 'models.json'), window=24, workers=0)
+    try:
+        previous = trainer.model_set
+        assert trainer.start_training(*_sales(), end_time=END_TIME)
+        assert trainer.wait(30)
+        assert trainer.model_set is not previous
+        assert trainer.model_set.version == 1
+        assert trainer.get_stats()['trainings'] == 1
+    finally:
+        trainer.close()
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+"""
+云平台HTTP会话测试 - 使用本地HTTP服务器验证连接复用、gzip压缩阈值、端点超时，以及415时回退JSON重发
+"""
+
+import gzip
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from src.cloud.http_session import PAYLOAD_ACCEPT_HEADER, PAYLOAD_FORMAT_HEADER, CloudHttpSession
+from src.cloud.serializer import BINARY_CONTENT_TYPE, BinarySerializer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """记录收到的请求；/slow 延迟响应，/binary_rejected 对二进制负载返回415，/negotiate 确认二进制格式"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.requests.append({'path': self.path, 'client': self.client_address, 'headers': dict(self.headers),
+                                     'body': body})
+        if self.path == '/slow':
+            time.sleep(0.5)
+        status, headers = 200, {}
+        content_type = self.headers.get('Content-Type', '')
+        if self.path == '/binary_rejected' and content_type.startswith(BINARY_CONTENT_TYPE):
+            status = 415
+        elif self.path == '/negotiate' and self.headers.get(PAYLOAD_ACCEPT_HEADER):
+            headers[PAYLOAD_FORMAT_HEADER] = self.headers[PAYLOAD_ACCEPT_HEADER]
+        self._reply(status, headers)
+
+    def _reply(self, status, headers):
+        response = json.dumps({'status': 'success'}).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(response)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    httpd.daemon_threads = True
+    httpd.requests = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _url(server, path):
+    return f"http://127.0.0.1:{server.server_address[1]}{path}"
+
+
+def _decode(request):
+    body = request['body']
+    if request['headers'].get('Content-Encoding') == 'gzip':
+        body = gzip.decompress(body)
+    return json.loads(body)
+
+
+def test_requests_reuse_one_connection(server):
+    session = CloudHttpSession()
+    try:
+        for index in range(3):
+            assert session.post(_url(server, '/device/heartbeat'), '/device/heartbeat', {'n': index}).ok
+        stats = session.get_stats()
+    finally:
+        session.close()
+
+    assert len({request['client'] for request in server.requests}) == 1
+    assert (stats['new_connections'], stats['reused_connections']) == (1, 2)
+    assert stats['reuse_ratio'] == pytest.approx(2 / 3)
+    assert stats['estimated_handshake_bytes_saved'] > 0
+
+
+@pytest.mark.parametrize('size, compressed', [(1023, False), (1024, True)])
+def test_gzip_threshold(server, size, compressed):
+    # 补齐到恰好size字节的JSON（{"p":"..."} 占8字节）
+    data = {'p': 'x' * (size - 8)}
+    session = CloudHttpSession()
+    try:
+        session.post(_url(server, '/device/status'), '/device/status', data)
+        stats = session.get_stats()
+    finally:
+        session.close()
+
+    request = server.requests[0]
+    assert (request['headers'].get('Content-Encoding') == 'gzip') is compressed
+    assert _decode(request) == data
+    assert stats['raw_bytes'] == size
+    assert (stats['compression_bytes_saved'] > 0) is compressed
+
+
+def test_endpoint_timeouts(server):
+    session = CloudHttpSession({'endpoint_timeouts': {'/slow': [1, 0.2]}, 'timeout': [1, 2]})
+    try:
+        assert session.get_timeout('/device/heartbeat') == (3.05, 5)
+        assert session.get_timeout('/slow') == (1, 0.2)
+        assert session.get_timeout('/unknown') == (1, 2)
+
+        with pytest.raises(requests.exceptions.Timeout):
+            session.post(_url(server, '/slow'), '/slow', {})
+        # 同一个慢端点按默认超时请求可以完成
+        assert session.post(_url(server, '/slow'), '/other', {}).ok
+        assert session.get_stats()['failures'] == 1
+    finally:
+        session.close()
+
+
+def test_binary_rejected_retries_once_as_json(server):
+    session = CloudHttpSession({'payload_format': 'binary', 'payload_compression': 'zlib'})
+    try:
+        # 服务器确认二进制格式后切换
+        session.post(_url(server, '/negotiate'), '/negotiate', {'n': 1})
+        assert session.serializer.name == 'binary'
+        session.post(_url(server, '/negotiate'), '/negotiate', {'n': 2})
+        assert BinarySerializer().decode(server.requests[1]['body']) == {'n': 2}
+
+        # 415时回退到JSON并只重发一次
+        response = session.post(_url(server, '/binary_rejected'), '/binary_rejected', {'n': 3})
+        assert response.status_code == 200
+        retried = server.requests[2:]
+        assert [request['headers']['Content-Type'].split(';')[0] for request in retried] == \
+            [BINARY_CONTENT_TYPE, 'application/json']
+        assert _decode(retried[1]) == {'n': 3}
+
+        # 回退后不再声明二进制格式
+        session.post(_url(server, '/negotiate'), '/negotiate', {'n': 4})
+        assert session.serializer.name == 'json'
+        assert PAYLOAD_ACCEPT_HEADER not in server.requests[-1]['headers']
+    finally:
+        session.close()
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+"""
+离线存储测试 - 各通道超出配额时的淘汰与转存、总内存预算的淘汰顺序、磁盘预算，以及重新打开日志后的转存记录分页载入
+"""
+
+import pytest
+
+from src.cloud.cache_journal import CacheJournal
+from src.cloud.offline_store import OfflineStore
+
+CATEGORIES = ['transaction', 'error', 'replenishment', 'warning', 'status']
+
+
+def _journal(path):
+    journal = CacheJournal(str(path), segment_max_bytes=4096, fsync_batch=1000)
+    journal.recover()
+    return journal
+
+
+def _record(category, index):
+    return {'id': f"{category}-{index}", 'pad': 'x' * 40}
+
+
+def test_each_lane_over_quota_evicts_oldest_or_spills(tmp_path):
+    journal = _journal(tmp_path)
+    store = OfflineStore(journal, lanes={category: {'max_memory_bytes': 500} for category in CATEGORIES},
+                         max_memory_bytes=1 << 20)
+    for category in CATEGORIES:
+        for index in range(30):
+            store.append(category, _record(category, index))
+
+    usage = store.get_usage()['lanes']
+    for category in CATEGORIES:
+        lane = usage[category]
+        assert lane['memory_bytes'] <= 500
+        if category == 'transaction':
+            # 交易不淘汰：超出配额的记录只保留在磁盘上
+            assert (lane['evicted'], lane['records']) == (0, 30)
+            assert lane['disk_only_records'] == 30 - lane['memory_records'] > 0
+        else:
+            # 其他类别淘汰最早的记录，保留最新的
+            kept = store.peek(category, 100)
+            assert lane['evicted'] == 30 - len(kept) > 0
+            assert kept == [_record(category, index) for index in range(30 - len(kept), 30)]
+
+    assert [record['id'] for record in store.peek('transaction', 30)] == [f"transaction-{index}" for index in range(30)]
+    journal.close()
+
+
+def test_memory_budget_evicts_lowest_priority_first(tmp_path):
+    journal = _journal(tmp_path)
+    store = OfflineStore(journal, lanes={category: {'max_memory_bytes': 1 << 20} for category in CATEGORIES},
+                         max_memory_bytes=1 << 20)
+    for category in CATEGORIES:
+        for index in range(10):
+            store.append(category, _record(category, index))
+    size = store.lanes['status'].records[0][1]
+
+    # 总预算收紧到比当前占用少约15条记录：状态先淘汰到只剩1条，再淘汰告警
+    store.max_memory_bytes = store.memory_bytes - 15 * size
+    store.append('error', _record('error', 10))
+
+    lanes = store.lanes
+    assert store.memory_bytes <= store.max_memory_bytes
+    assert len(lanes['status'].records) == 1
+    assert lanes['status'].evicted_count == 9
+    assert lanes['warning'].evicted_count == 7
+    assert lanes['replenishment'].evicted_count == lanes['error'].evicted_count == 0
+    assert lanes['transaction'].evicted_count == 0 and len(lanes['transaction']) == 10
+
+    # 继续收紧时交易转存到磁盘而不是丢弃
+    store.max_memory_bytes = 8 * size
+    store.append('status', _record('status', 10))
+    assert store.memory_bytes <= store.max_memory_bytes
+    assert lanes['transaction'].evicted_count == 0
+    assert lanes['transaction'].spilled > 0 and len(lanes['transaction']) == 10
+    journal.close()
+
+
+def test_disk_budget_never_evicts_transactions(tmp_path):
+    journal = _journal(tmp_path)
+    store = OfflineStore(journal, max_disk_bytes=0)
+    for index in range(5):
+        store.append('transaction', _record('transaction', index))
+        store.append('status', _record('status', index))
+
+    assert store.enforce_disk_budget() == 5
+    assert store.count('status') == 0
+    assert store.count('transaction') == 5
+    # 已淘汰记录在压缩前不重复计入
+    assert store.enforce_disk_budget() == 0
+    journal.close()
+
+
+@pytest.mark.parametrize('page_size', [3, 100])
+def test_spilled_records_page_in_after_reopen(tmp_path, page_size):
+    journal = _journal(tmp_path)
+    store = OfflineStore(journal, lanes={'transaction': {'max_memory_bytes': 400}})
+    for index in range(40):
+        store.append('transaction', _record('transaction', index))
+    assert store.lanes['transaction'].spilled > 0
+    store.ack_records('transaction', store.peek('transaction', 5))
+    journal.close()
+
+    # 重新打开日志：恢复的记录同样按配额只在内存中保留一部分
+    journal = CacheJournal(str(tmp_path), segment_max_bytes=4096, fsync_batch=1000)
+    store = OfflineStore(journal, lanes={'transaction': {'max_memory_bytes': 400}}, page_size=page_size)
+    store.load(journal.recover())
+    lane = store.lanes['transaction']
+    assert len(lane) == 35
+    assert lane.spilled > 0 and lane.memory_bytes <= 400
+    assert store.latest('transaction') is None
+
+    sent = []
+    while store.count('transaction'):
+        chunk = store.peek('transaction', 4)
+        sent.extend(record['id'] for record in chunk)
+        store.ack_records('transaction', chunk)
+    assert sent == [f"transaction-{index}" for index in range(5, 40)]
+    journal.close()
+
+    journal = CacheJournal(str(tmp_path))
+    assert journal.recover().get('transaction', []) == []
+    journal.close()
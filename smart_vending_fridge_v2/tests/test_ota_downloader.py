@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+
+"""
+OTA下载测试 - 在本地支持Range请求的HTTP服务器上测试断点续传、续传位置校验和损坏重下
+"""
+
+import os
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.cloud import ota_downloader
+from src.cloud.ota_downloader import OtaDownloader
+from src.cloud.cloud_manager import CloudManager
+
+FIRMWARE = bytes(range(256)) * 1024
+FIRMWARE_SHA256 = hashlib.sha256(FIRMWARE).hexdigest()
+
+
+class FirmwareHandler(BaseHTTPRequestHandler):
+    """返回固件镜像，按服务器上的选项模拟断线、忽略Range和错误的续传位置"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        data = server.data
+        start = 0
+        range_header = self.headers.get('Range')
+        if range_header and server.support_range:
+            start = int(range_header[len('bytes='):].split('-')[0])
+            if start >= len(data):
+                self.send_response(416)
+                self.send_header('Content-Range', f"bytes */{len(data)}")
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            # 模拟返回了错误位置的代理或CDN
+            start = max(start - server.range_shift, 0)
+            body = data[start:]
+            self.send_response(206)
+            self.send_header('Content-Range', f"bytes {start}-{len(data) - 1}/{len(data)}")
+        else:
+            body = data
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+
+        if server.cut_after is not None:
+            # 发出部分数据后断开连接（只断一次）
+            cut, server.cut_after = server.cut_after, None
+            self.wfile.write(body[:cut])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def firmware_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FirmwareHandler)
+    server.data = FIRMWARE
+    server.requests = []
+    server.support_range = True
+    server.range_shift = 0
+    server.cut_after = None
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/firmware.bin"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    """断线重试不等待"""
+    monkeypatch.setattr(ota_downloader.time, 'sleep', lambda seconds: None)
+
+
+def _download(server, tmp_path, **kwargs):
+    dest = str(tmp_path / 'firmware.bin')
+    downloader = OtaDownloader(chunk_size=4096, max_retries=3)
+    try:
+        ok = downloader.download(server.url, dest, **kwargs)
+    finally:
+        downloader.close()
+    return ok, dest
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_resumes_after_connection_drop(firmware_server, tmp_path):
+    firmware_server.cut_after = 100 * 1024
+
+    ok, dest = _download(firmware_server, tmp_path, expected_sha256=FIRMWARE_SHA256, expected_size=len(FIRMWARE))
+
+    assert ok
+    assert _read(dest) == FIRMWARE
+    assert not os.path.exists(dest + '.part')
+    assert [request.get('Range') for request in firmware_server.requests] == [None, 'bytes=102400-']
+    assert all(request.get('Accept-Encoding') == 'identity' for request in firmware_server.requests)
+
+
+def test_resumes_existing_part_file(firmware_server, tmp_path):
+    with open(tmp_path / 'firmware.bin.part', 'wb') as f:
+        f.write(FIRMWARE[:50000])
+
+    ok, dest = _download(firmware_server, tmp_path, expected_sha256=FIRMWARE_SHA256)
+
+    assert ok
+    assert _read(dest) == FIRMWARE
+    assert [request.get('Range') for request in firmware_server.requests] == ['bytes=50000-']
+
+
+def test_content_range_mismatch_restarts_from_zero(firmware_server, tmp_path):
+    with open(tmp_path / 'firmware.bin.part', 'wb') as f:
+        f.write(FIRMWARE[:50000])
+    firmware_server.range_shift = 1000
+
+    ok, dest = _download(firmware_server, tmp_path, expected_sha256=FIRMWARE_SHA256)
+
+    assert ok
+    assert _read(dest) == FIRMWARE
+    assert [request.get('Range') for request in firmware_server.requests] == ['bytes=50000-', None]
+
+
+def test_server_without_range_support_restarts(firmware_server, tmp_path):
+    with open(tmp_path / 'firmware.bin.part', 'wb') as f:
+        f.write(FIRMWARE[:50000])
+    firmware_server.support_range = False
+
+    ok, dest = _download(firmware_server, tmp_path, expected_sha256=FIRMWARE_SHA256)
+
+    assert ok
+    assert _read(dest) == FIRMWARE
+    assert len(firmware_server.requests) == 1
+
+
+def test_416_with_complete_part_file_finishes(firmware_server, tmp_path):
+    with open(tmp_path / 'firmware.bin.part', 'wb') as f:
+        f.write(FIRMWARE)
+
+    ok, dest = _download(firmware_server, tmp_path, expected_sha256=FIRMWARE_SHA256)
+
+    assert ok
+    assert _read(dest) == FIRMWARE
+    assert [request.get('Range') for request in firmware_server.requests] == [f"bytes={len(FIRMWARE)}-"]
+
+
+def test_416_with_oversized_part_file_restarts(firmware_server, tmp_path):
+    with open(tmp_path / 'firmware.bin.part', 'wb') as f:
+        f.write(FIRMWARE + b'garbage')
+
+    ok, dest = _download(firmware_server, tmp_path, expected_sha256=FIRMWARE_SHA256)
+
+    assert ok
+    assert _read(dest) == FIRMWARE
+    assert [request.get('Range') for request in firmware_server.requests] == [f"bytes={len(FIRMWARE) + 7}-", None]
+
+
+def test_corrupt_part_file_is_discarded_and_downloaded_again(firmware_server, tmp_path):
+    with open(tmp_path / 'firmware.bin.part', 'wb') as f:
+        f.write(b'\xff' * 50000)
+
+    ok, dest = _download(firmware_server, tmp_path, expected_sha256=FIRMWARE_SHA256)
+
+    assert ok
+    assert _read(dest) == FIRMWARE
+    assert [request.get('Range') for request in firmware_server.requests] == ['bytes=50000-', None]
+
+
+def test_checksum_failure_restarts_only_once(firmware_server, tmp_path):
+    ok, dest = _download(firmware_server, tmp_path, expected_sha256='0' * 64)
+
+    assert not ok
+    assert not os.path.exists(dest)
+    assert not os.path.exists(dest + '.part')
+    assert len(firmware_server.requests) == 2
+
+
+def test_cloud_manager_does_not_send_device_key_to_download_host(firmware_server, tmp_path):
+    manager = CloudManager({
+        'api_key': 'device-secret',
+        'data_dir': str(tmp_path),
+        'ota_update': {'chunk_size': 4096}
+    }, device_id='SVF-TEST')
+    manager.connected = True
+
+    assert manager.download_ota_update({'version': '2.0.0', 'download_url': firmware_server.url,
+                                        'sha256': FIRMWARE_SHA256, 'size': len(FIRMWARE)})
+    assert _read(tmp_path / 'ota_update_2.0.0.bin') == FIRMWARE
+    assert all('Authorization' not in request for request in firmware_server.requests)
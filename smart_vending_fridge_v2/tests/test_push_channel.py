@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+"""
+推送通道测试 - 设备通过本地代理发布上报（转发到设备接入API并去重）、按设备认证、服务器下发命令、断线失败
+"""
+
+import threading
+
+import pytest
+from flask import Flask
+
+import device_api
+from push_broker import PushBroker, flask_message_handler
+from src.cloud.push_transport import PushTransport, topic_matches
+
+API_KEY = 'push-key'
+
+
+@pytest.fixture
+def broker(tmp_path):
+    store = device_api.init_device_api(str(tmp_path / 'device.db'))
+    store.register_device('D1', API_KEY)
+    app = Flask(__name__)
+    app.register_blueprint(device_api.device_api)
+    broker = PushBroker(host='127.0.0.1', port=0, message_handler=flask_message_handler(app),
+                        authenticator=lambda client_id, token: store.authenticate(token) == client_id)
+    broker.start()
+    yield broker
+    broker.stop()
+    store.close()
+
+
+def _transport(broker, client_id='D1', token=API_KEY, **kwargs):
+    return PushTransport('127.0.0.1', broker.port, client_id, token=token, ack_timeout=5.0, **kwargs)
+
+
+def test_publish_is_forwarded_to_device_api(broker):
+    transport = _transport(broker)
+    assert transport.connect()
+    try:
+        record = {'id': 'T1', 'total_amount': 3.5, 'record_epoch': 'e1', 'record_seq': 1}
+        # 确认中携带设备接入API的响应
+        assert transport.publish('devices/D1/transaction', record)['data'] == {'ack': 'ok'}
+        assert transport.publish('devices/D1/transaction', record)['data'] == {'ack': 'duplicate'}
+        assert device_api.store.count('transactions') == 1
+        assert broker.get_connected_devices() == ['D1']
+    finally:
+        transport.close()
+
+
+def test_connect_requires_the_device_key(broker):
+    assert not _transport(broker, token='wrong').connect()
+    # 密钥属于D1，不能冒充其他设备
+    assert not _transport(broker, client_id='D2').connect()
+    assert broker.get_stats()['rejected'] == 2
+
+
+def test_server_command_reaches_subscriber(broker):
+    transport = _transport(broker)
+    received = []
+    transport.subscribe('devices/D1/commands/#', lambda topic, payload: received.append((topic, payload)) or
+                        {'applied': payload['version']})
+    assert transport.connect()
+    try:
+        # 订阅在连接后发送，等待代理处理
+        subscribed = threading.Event()
+        for _ in range(100):
+            if broker.send_command('D1', 'config', {'version': 3}, timeout=2.0) is not None:
+                subscribed.set()
+                break
+            subscribed.wait(0.02)
+        assert subscribed.is_set()
+        assert received[-1] == ('devices/D1/commands/config', {'version': 3})
+        assert broker.send_command('D1', 'config', {'version': 4}, timeout=2.0) == {'applied': 4}
+        assert broker.send_command('D9', 'config', {'version': 4}, timeout=0.1) is None
+    finally:
+        transport.close()
+
+
+def test_broker_shutdown_fails_pending_publishes(broker):
+    lost = threading.Event()
+    transport = _transport(broker, on_disconnect=lambda reason: lost.set())
+    assert transport.connect()
+    broker.stop()
+
+    assert lost.wait(2.0)
+    assert not transport.is_connected()
+    assert transport.publish('devices/D1/heartbeat', {}) is None
+    transport.close()
+
+
+def test_reconnect_replaces_old_session(broker):
+    lost = threading.Event()
+    old = _transport(broker, on_disconnect=lambda reason: lost.set())
+    new = _transport(broker)
+    assert old.connect() and new.connect()
+    try:
+        assert lost.wait(2.0)
+        assert new.publish('devices/D1/heartbeat', {})['status'] == 'success'
+        assert broker.get_connected_devices() == ['D1']
+    finally:
+        old.close()
+        new.close()
+
+
+def test_topic_wildcards():
+    assert topic_matches('devices/+/commands/#', 'devices/D1/commands/config')
+    assert topic_matches('devices/D1/commands/config', 'devices/D1/commands/config')
+    assert not topic_matches('devices/+/commands', 'devices/D1/commands/config')
+    assert not topic_matches('devices/D2/#', 'devices/D1/commands/config')
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+"""
+记录序号测试 - 跨重启单调、序号文件丢失或损坏后更换纪元、落盘失败不抛异常
+"""
+
+import os
+
+from src.cloud.record_sequence import RecordSequence
+from src.cloud.cloud_manager import CloudManager
+from device_store import DeviceStore
+
+
+def test_sequence_continues_after_restart(tmp_path):
+    path = str(tmp_path / 'seq.json')
+    sequence = RecordSequence(path, block_size=10)
+    first = [sequence.next() for _ in range(3)]
+
+    restarted = RecordSequence(path, block_size=10)
+    epoch, seq = restarted.next()
+
+    assert [seq for _, seq in first] == [1, 2, 3]
+    assert epoch == first[0][0]
+    # 跳过上次未用完的块
+    assert seq == 11
+
+
+def test_lost_or_corrupt_file_starts_new_epoch(tmp_path):
+    path = str(tmp_path / 'seq.json')
+    epoch, _ = RecordSequence(path).next()
+
+    os.remove(path)
+    lost_epoch, lost_seq = RecordSequence(path).next()
+
+    with open(path, 'w') as f:
+        f.write('{"reserved": ')
+    corrupt_epoch, corrupt_seq = RecordSequence(path).next()
+
+    assert lost_seq == corrupt_seq == 1
+    assert len({epoch, lost_epoch, corrupt_epoch}) == 3
+
+
+def test_legacy_file_keeps_empty_epoch(tmp_path):
+    path = tmp_path / 'seq.json'
+    path.write_text('{"reserved": 2000}')
+
+    assert RecordSequence(str(path)).next() == ('', 2001)
+
+
+def test_reserve_failure_switches_epoch_without_raising(tmp_path, monkeypatch):
+    sequence = RecordSequence(str(tmp_path / 'seq.json'), block_size=2)
+    epoch, _ = sequence.next()
+    sequence.next()
+
+    def fail(upper):
+        raise OSError('disk full')
+    monkeypatch.setattr(sequence, '_reserve', fail)
+    allocated = [sequence.next() for _ in range(5)]
+
+    assert {allocated_epoch for allocated_epoch, _ in allocated} != {epoch}
+    # 落盘一直失败时保持同一个未落盘纪元继续编号
+    assert len({allocated_epoch for allocated_epoch, _ in allocated}) == 1
+    assert [seq for _, seq in allocated] == [1, 2, 3, 4, 5]
+
+
+def test_report_does_not_raise_when_sequence_fails(tmp_path, monkeypatch):
+    manager = CloudManager({'data_dir': str(tmp_path), 'ota_update': {'enabled': False}}, device_id='SVF-TEST')
+
+    def fail():
+        raise RuntimeError('unexpected')
+    monkeypatch.setattr(manager.record_sequence, 'next', fail)
+
+    assert manager.report_transaction({'id': 'T1', 'total_amount': 3.5}) is False
+
+
+def test_store_deduplicates_per_epoch(tmp_path):
+    store = DeviceStore(str(tmp_path / 'ingest.db'))
+    try:
+        assert store.insert_transactions('D1', [{'id': 'T1', 'record_epoch': 'a', 'record_seq': 1}]) == ['ok']
+        # 序号文件丢失后设备以新纪元从1重新编号，不能当作重复
+        assert store.insert_transactions('D1', [{'id': 'T2', 'record_epoch': 'b', 'record_seq': 1}]) == ['ok']
+        assert store.insert_transactions('D1', [{'id': 'T3', 'record_epoch': 'a', 'record_seq': 1}]) == ['duplicate']
+    finally:
+        store.close()
+
+    reopened = DeviceStore(str(tmp_path / 'ingest.db'))
+    try:
+        assert reopened.insert_events('D1', 'error', [{'record_epoch': 'b', 'record_seq': 1}]) == ['duplicate']
+        assert reopened.insert_events('D1', 'error', [{'record_epoch': 'c', 'record_seq': 1}]) == ['ok']
+    finally:
+        reopened.close()
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+"""
+补货检查缓存测试 - 库存、销售数据、商品目录、预测模型版本和当前小时任一变化都使缓存失效，否则返回上次的结果；
+定时任务按注入时钟的整点自动下单
+"""
+
+import json
+
+import pytest
+
+from src.replenishment.forecast_models import ModelSet
+from src.replenishment.replenishment_algorithm import ReplenishmentAlgorithm
+from src.utils.config_manager import ConfigManager
+
+START = 1_700_000_000 // 3600 * 3600
+
+
+class FakeClock:
+    """可手动推进的虚拟时钟"""
+
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def setup(tmp_path):
+    config_path = tmp_path / 'config.json'
+    config_path.write_text(json.dumps({'products': {
+        'SKU1': {'name': '可乐', 'price': 3.5},
+        'SKU2': {'name': '矿泉水', 'price': 2.0}
+    }}), encoding='utf-8')
+    config_manager = ConfigManager(str(config_path))
+    clock = FakeClock(START + 10 * 24 * 3600 + 60)
+    algorithm = ReplenishmentAlgorithm({'data_dir': str(tmp_path), 'algorithm': 'ml', 'ml_models': {'workers': 0}},
+                                       config_manager=config_manager, clock=clock)
+    for day in range(10):
+        _sell(algorithm, START + day * 24 * 3600 + 3600, 'SKU1')
+    yield algorithm, config_manager, clock
+    algorithm._save_sales_data()
+    algorithm.sales_log.close()
+    algorithm.model_trainer.close()
+
+
+def _sell(algorithm, timestamp, product_id):
+    algorithm.update_sales_data({'status': 'completed', 'end_time': timestamp, 'products_taken': [
+        {'product_id': product_id, 'quantity': 1, 'price': 3.5}]})
+
+
+def _inventory(sku1=1, sku2=8):
+    return {'SKU1': {'quantity': sku1}, 'SKU2': {'quantity': sku2}}
+
+
+def _check(algorithm, inventory=None):
+    """检查一次补货需求，返回(结果, 是否命中缓存)"""
+    hits = algorithm.cache_hits
+    result = algorithm.check_replenishment_needs(inventory or _inventory())
+    return result, algorithm.cache_hits > hits
+
+
+def test_unchanged_inputs_hit_cache(setup):
+    algorithm, _, clock = setup
+    first, hit = _check(algorithm)
+    assert not hit
+    assert [product['product_id'] for product in first['products']] == ['SKU1']
+
+    # 同一小时内时钟前进、库存字典是新对象但数量相同
+    clock.now += 600
+    second, hit = _check(algorithm, _inventory())
+    assert hit and second is first
+
+
+def test_inventory_change_invalidates(setup):
+    algorithm = setup[0]
+    _check(algorithm)
+    result, hit = _check(algorithm, _inventory(sku1=1, sku2=2))
+    assert not hit
+    # 矿泉水降到阈值以下，也需要补货
+    assert {product['product_id'] for product in result['products']} == {'SKU1', 'SKU2'}
+    assert _check(algorithm, _inventory(sku1=1, sku2=2))[1]
+
+
+def test_sales_change_invalidates(setup):
+    algorithm, _, clock = setup
+    before, _ = _check(algorithm, _inventory(sku1=1, sku2=1))
+    _sell(algorithm, clock.now, 'SKU2')
+    result, hit = _check(algorithm, _inventory(sku1=1, sku2=1))
+    assert not hit
+    assert result is not before
+
+
+def test_catalog_change_invalidates(setup):
+    algorithm, config_manager, _ = setup
+    _check(algorithm)
+    config_manager.set_value('products.SKU1.name', '零度可乐')
+    result, hit = _check(algorithm)
+    assert not hit
+    assert result['products'][0]['name'] == '零度可乐'
+
+
+def test_model_version_change_invalidates(setup):
+    algorithm = setup[0]
+    before, _ = _check(algorithm)
+    # 后台训练完成后整体替换模型组
+    algorithm.model_trainer.model_set = ModelSet({'end_hour': 0, 'products': {
+        'SKU1': {'model': 'tsb', 'daily_rate': 48.0}}}, version=1, window=algorithm.prediction_window)
+    result, hit = _check(algorithm)
+    assert not hit
+    assert result['products'][0]['predicted_sales'] == pytest.approx(48.0)
+    assert result['products'][0]['predicted_sales'] != before['products'][0]['predicted_sales']
+
+
+def test_hour_change_invalidates(setup):
+    algorithm, _, clock = setup
+    first, _ = _check(algorithm)
+    clock.now += 3600
+    second, hit = _check(algorithm)
+    assert not hit
+    assert second is not first
+    assert second['timestamp'] == clock.now
+
+
+def test_auto_order_follows_injected_clock(setup):
+    algorithm, _, clock = setup
+    algorithm.auto_order = True
+    algorithm.replenishment_suggestions = _check(algorithm)[0]
+
+    # 启动所在小时内不下单
+    algorithm._run_scheduled_tasks()
+    assert algorithm.replenishment_suggestions
+
+    clock.now += 3600
+    algorithm._run_scheduled_tasks()
+    assert algorithm.replenishment_suggestions == {}
+    assert algorithm.auto_order_hour == int(clock.now // 3600)
+
+    algorithm.replenishment_suggestions = _check(algorithm)[0]
+    order = algorithm._check_auto_replenishment()
+    assert order['timestamp'] == clock.now
+    assert order['order_id'] == f"O{int(clock.now)}"
+    assert [product['product_id'] for product in order['products']] == ['SKU1']
+    assert algorithm._check_auto_replenishment() is None
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+"""
+上报队列测试 - 队列满时最早的记录交给溢出处理并写入离线缓存、停止时剩余记录转入缓存、链路不通时report_*不阻塞
+"""
+
+import threading
+import time
+
+from src.cloud.cloud_manager import CloudManager
+from src.cloud.report_queue import ReportQueue
+
+
+def _manager(tmp_path, **queue_config):
+    return CloudManager({'data_dir': str(tmp_path), 'ota_update': {'enabled': False},
+                         'report_queue': queue_config}, device_id='SVF-TEST')
+
+
+def test_overflow_hands_oldest_records_to_handler():
+    overflowed = []
+    queue = ReportQueue(lambda category, records: None, overflow_handler=lambda *item: overflowed.append(item),
+                        max_size=3, batch_size=100, max_age=60)
+    queue.start()
+    try:
+        for index in range(5):
+            assert queue.put('error', {'n': index})
+        assert overflowed == [('error', {'n': 0}), ('error', {'n': 1})]
+        assert queue.get_stats()['dropped'] == 2
+        assert queue.get_depth() == 3
+    finally:
+        queue.stop()
+
+
+def test_overflowed_reports_are_cached(tmp_path):
+    manager = _manager(tmp_path, max_size=3, batch_size=100, max_age=60)
+    manager.connected = True
+    manager.report_queue.start()
+    try:
+        for index in range(5):
+            assert manager.report_error({'message': f"E{index}"})
+        cached = manager.offline_store.peek('error', 10)
+        assert [record['message'] for record in cached] == ['E0', 'E1']
+    finally:
+        manager.report_queue.stop()
+        manager.cache_journal.close()
+
+
+def test_stop_drains_unsent_records():
+    taken, release = threading.Event(), threading.Event()
+    sent = []
+
+    def send_batch(category, records):
+        taken.set()
+        release.wait(5)
+        sent.extend(records)
+
+    queue = ReportQueue(send_batch, batch_size=1, max_age=0)
+    queue.start()
+    for index in range(4):
+        queue.put('warning', {'n': index})
+    # 发送线程阻塞在第一条记录上，停止超时后剩余记录由drain取出
+    assert taken.wait(5)
+    queue.stop(timeout=0.1)
+    remaining = queue.drain()
+    release.set()
+    queue.sender_thread.join(5)
+
+    assert remaining == [('warning', {'n': 1}), ('warning', {'n': 2}), ('warning', {'n': 3})]
+    assert sent == [{'n': 0}]
+    assert not queue.put('warning', {'n': 4})
+
+
+def test_manager_stop_moves_pending_reports_to_cache(tmp_path, monkeypatch):
+    manager = _manager(tmp_path, batch_size=100, max_age=60)
+    monkeypatch.setattr(manager, '_send_request', lambda endpoint, data: None)
+    manager.scheduler = manager._create_scheduler()
+    manager.running = True
+    manager.connected = True
+    manager.report_queue.start()
+    for index in range(3):
+        manager.report_warning({'message': f"W{index}"})
+    assert manager.offline_store.count('warning') == 0
+
+    manager.stop()
+
+    assert manager.report_queue.get_depth() == 0
+    assert [record['message'] for record in manager.offline_store.peek('warning', 10)] == ['W0', 'W1', 'W2']
+
+
+def test_report_does_not_block_when_link_is_down(tmp_path, monkeypatch):
+    link_restored = threading.Event()
+
+    def hanging_request(endpoint, data):
+        # 链路不通：请求挂起直到超时
+        link_restored.wait(5)
+        return None
+
+    manager = _manager(tmp_path, batch_size=1, max_age=0)
+    monkeypatch.setattr(manager, '_send_request', hanging_request)
+    manager.connected = True
+    manager.report_queue.start()
+    try:
+        start = time.monotonic()
+        for index in range(20):
+            assert manager.report_transaction({'transaction_id': f"T{index}", 'amount': 1.0})
+            manager.report_error({'message': f"E{index}"})
+        assert time.monotonic() - start < 0.5
+    finally:
+        link_restored.set()
+        manager.report_queue.stop()
+        manager.cache_journal.close()
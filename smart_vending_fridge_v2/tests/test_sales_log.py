@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+"""
+销售日志测试 - 快照按列加载、快照写入期间继续追加、后台压缩不阻塞交易处理
+"""
+
+import threading
+
+import numpy as np
+
+from src.replenishment.sales_log import SalesLog
+from src.replenishment.sales_history import SalesHistory
+from src.replenishment.replenishment_algorithm import ReplenishmentAlgorithm
+
+START = 1700000000.0
+
+
+def _record(index):
+    return {'product_id': f"SKU{index % 3}", 'quantity': 1.0 + index % 2, 'price': 2.5,
+            'amount': 2.5 * (1.0 + index % 2), 'timestamp': START + index * 60}
+
+
+def test_snapshot_loads_as_columns(tmp_path):
+    sales_log = SalesLog(str(tmp_path))
+    history = SalesHistory()
+    for index in range(100):
+        record = _record(index)
+        sales_log.append(record)
+        history.append(record)
+    sales_log.write_snapshot(history, {'SKU0': {'total_quantity': 1}})
+    for index in range(100, 110):
+        sales_log.append(_record(index))
+    sales_log.close()
+
+    product_sales, loaded, tail = SalesLog(str(tmp_path)).load()
+
+    assert isinstance(loaded, SalesHistory)
+    assert product_sales == {'SKU0': {'total_quantity': 1}}
+    assert loaded.records() == [_record(index) for index in range(100)]
+    assert tail == [_record(index) for index in range(100, 110)]
+
+
+def test_appends_during_snapshot_write_are_replayed(tmp_path):
+    sales_log = SalesLog(str(tmp_path), segment_max_bytes=256)
+    history = SalesHistory()
+    for index in range(50):
+        sales_log.append(_record(index))
+        history.append(_record(index))
+
+    ticket = sales_log.begin_snapshot()
+    frozen = history.copy()
+    # 快照文件写入前后继续追加
+    for index in range(50, 60):
+        sales_log.append(_record(index))
+    assert sales_log.begin_snapshot() is None
+    sales_log.finish_snapshot(ticket, frozen, {})
+    for index in range(60, 70):
+        sales_log.append(_record(index))
+    sales_log.close()
+
+    _, loaded, tail = SalesLog(str(tmp_path)).load()
+
+    assert len(loaded) == 50
+    assert tail == [_record(index) for index in range(50, 70)]
+
+
+def test_unfinished_snapshot_keeps_segments(tmp_path):
+    sales_log = SalesLog(str(tmp_path))
+    for index in range(20):
+        sales_log.append(_record(index))
+    # 开始快照后断电：没有快照文件，段仍然完整
+    sales_log.begin_snapshot()
+    sales_log.close()
+
+    _, loaded, tail = SalesLog(str(tmp_path)).load()
+
+    assert loaded is None
+    assert tail == [_record(index) for index in range(20)]
+
+
+def test_history_trim_and_columns():
+    history = SalesHistory(capacity=4)
+    for index in range(10):
+        history.append(_record(index))
+
+    dropped = history.trim(6)
+    columns = history.columns()
+
+    assert len(history) == 6
+    assert dropped['product_id'].tolist() == [_record(index)['product_id'] for index in range(4)]
+    np.testing.assert_array_equal(columns['timestamp'], [START + index * 60 for index in range(4, 10)])
+    assert history.records(product_id='SKU1', start_time=START + 300) == [_record(7)]
+
+
+def test_transaction_path_does_not_wait_for_snapshot(tmp_path, monkeypatch):
+    algorithm = ReplenishmentAlgorithm({'data_dir': str(tmp_path), 'sales_log': {'snapshot_interval': 5}})
+    release = threading.Event()
+    original = algorithm.sales_log.finish_snapshot
+
+    def slow_finish(*args):
+        release.wait(5)
+        return original(*args)
+    monkeypatch.setattr(algorithm.sales_log, 'finish_snapshot', slow_finish)
+
+    for index in range(20):
+        algorithm.update_sales_data({'status': 'completed', 'end_time': START + index * 60,
+                                     'products_taken': [{'product_id': 'SKU1', 'quantity': 1, 'price': 2.0}]})
+    # 快照仍在写入，交易处理已经全部完成
+    assert algorithm.snapshot_thread.is_alive()
+    release.set()
+    algorithm.snapshot_thread.join()
+    algorithm._save_sales_data()
+    algorithm.sales_log.close()
+
+    reloaded = ReplenishmentAlgorithm({'data_dir': str(tmp_path)})
+    assert len(reloaded.sales_history) == 20
+    assert reloaded.sales_data['SKU1']['total_quantity'] == 20
+    assert reloaded.sales_index.count('SKU1') == 20
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+"""
+截止时间调度器测试 - 按截止时间执行、trigger提前执行、执行中trigger、失败退避、停止
+"""
+
+import threading
+import time
+
+import pytest
+
+from src.cloud.scheduler import ScheduledJob, TaskScheduler
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = TaskScheduler()
+    thread = threading.Thread(target=scheduler.run, daemon=True)
+    thread.start()
+    yield scheduler
+    scheduler.stop()
+    thread.join(2)
+    assert not thread.is_alive()
+
+
+def _wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+def test_jobs_run_by_deadline(scheduler):
+    runs = []
+    scheduler.add_job('fast', lambda: runs.append('fast'), 0.05, jitter=0)
+    scheduler.add_job('slow', lambda: runs.append('slow'), 60, jitter=0, initial_delay=60)
+
+    assert _wait_for(lambda: runs.count('fast') >= 3)
+    assert 'slow' not in runs
+    # 空闲时按截止时间休眠，不按固定间隔轮询
+    assert scheduler.get_stats()['wakeups'] < 20
+
+
+def test_trigger_brings_job_forward_but_never_later(scheduler):
+    runs = []
+    scheduler.add_job('sync', lambda: runs.append(time.monotonic()), 60, jitter=0, initial_delay=60)
+
+    start = time.monotonic()
+    scheduler.trigger('sync', 0.05)
+    scheduler.trigger('sync', 30)
+    assert _wait_for(lambda: runs)
+    assert runs[0] - start < 1.0
+    # 执行后按正常间隔重新调度
+    assert scheduler.get_stats()['jobs']['sync']['next_run_in'] > 50
+
+
+def test_trigger_while_executing_reschedules_after_run(scheduler):
+    started, release, runs = threading.Event(), threading.Event(), []
+
+    def job():
+        runs.append(time.monotonic())
+        if len(runs) == 1:
+            started.set()
+            release.wait(2)
+
+    scheduler.add_job('save', job, 60, jitter=0)
+    assert started.wait(2)
+    scheduler.trigger('save', 0)
+    release.set()
+    assert _wait_for(lambda: len(runs) == 2)
+
+
+def test_failures_back_off_and_reset():
+    job = ScheduledJob('heartbeat', lambda: None, 10, jitter=0, max_backoff=50)
+    assert job.next_delay() == 10
+    job.failures = 2
+    assert job.next_delay() == 40
+    job.failures = 5
+    assert job.next_delay() == 50
+
+
+def test_failing_job_is_backed_off(scheduler):
+    runs = []
+
+    def failing():
+        runs.append(1)
+        raise RuntimeError('offline')
+
+    scheduler.add_job('heartbeat', failing, 0.02, jitter=0, backoff_factor=10, max_backoff=60)
+    assert _wait_for(lambda: runs)
+    time.sleep(0.3)
+    stats = scheduler.get_stats()['jobs']['heartbeat']
+    assert stats['failures'] >= 1
+    assert len(runs) <= 3
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+"""
+序列化测试 - 二进制编码往返、时间戳按毫秒取整、整数时间戳保持整数、损坏负载和未知压缩方式抛出ValueError
+"""
+
+import pytest
+
+from src.cloud.serializer import (
+    BinarySerializer, JsonSerializer, create_serializer, parse_content_type, BINARY_CONTENT_TYPE,
+)
+
+
+def _transaction():
+    return {
+        'id': 'T1', 'device_id': 'D1', 'start_time': 1700000000.1234, 'end_time': 1700000012.5,
+        'total_amount': 12.5, 'resolved': False, 'custom_field': None,
+        'products_taken': [{'product_id': 'P1', 'quantity': 2, 'price': 3.3}],
+    }
+
+
+@pytest.mark.parametrize('compression', ['none', 'zlib'])
+def test_binary_round_trip(compression):
+    record = _transaction()
+    decoded = BinarySerializer(compression).decode(BinarySerializer(compression).encode(record))
+
+    assert decoded['products_taken'] == record['products_taken']
+    assert decoded['custom_field'] is None
+    assert decoded['end_time'] == record['end_time']
+
+
+def test_timestamps_are_rounded_to_milliseconds():
+    serializer = BinarySerializer('none')
+    decoded = serializer.decode(serializer.encode({'timestamp': 1700000000.12345, 'price': 1700000000.12345}))
+
+    # 时间戳字段有损（最多0.5毫秒），其他浮点数保持原值
+    assert decoded['timestamp'] == pytest.approx(1700000000.123, abs=1e-6)
+    assert abs(decoded['timestamp'] - 1700000000.12345) <= 0.0005
+    assert decoded['price'] == 1700000000.12345
+
+
+def test_integer_timestamps_round_trip_exactly():
+    json_serializer, binary_serializer = JsonSerializer(), BinarySerializer('zlib')
+    payload = json_serializer.encode({'id': 'T1', 'start_time': 1700000000, 'end_time': 0,
+                                      'items': [{'timestamp': 1700000012, 'last_sale': 1700000012.5}]})
+
+    record = json_serializer.decode(payload)
+    decoded = binary_serializer.decode(binary_serializer.encode(record))
+
+    assert decoded == record
+    assert json_serializer.encode(decoded) == payload
+    assert type(decoded['start_time']) is int and type(decoded['items'][0]['timestamp']) is int
+    assert type(decoded['items'][0]['last_sale']) is float
+
+
+def test_json_serializer_round_trip():
+    record = _transaction()
+    assert JsonSerializer().decode(JsonSerializer().encode(record)) == record
+
+
+@pytest.mark.parametrize('data', [b'', b'SV', b'XX\x01\x00', b'SV\x01\x07', b'SV\x01\x00\x08\x05', b'SV\x01\x01abc'])
+def test_corrupt_payload_raises_value_error(data):
+    with pytest.raises(ValueError):
+        BinarySerializer('zlib').decode(data)
+
+
+def test_truncated_payload_raises_value_error():
+    data = BinarySerializer('none').encode(_transaction())
+    for end in range(4, len(data)):
+        with pytest.raises(ValueError):
+            BinarySerializer('none').decode(data[:end])
+
+
+def test_content_type_round_trip_and_unknown_compression():
+    serializer = create_serializer('binary', 'zlib')
+    parsed = parse_content_type(serializer.content_type_header)
+
+    assert parsed.decode(serializer.encode({'id': 'T1'})) == {'id': 'T1'}
+    with pytest.raises(ValueError):
+        parse_content_type(BINARY_CONTENT_TYPE + '; v=1; compression=lz4')
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+"""
+状态增量编码测试 - diff/apply_patch往返、关键帧间隔、确认与拒绝后的增量基准、重新同步
+"""
+
+import pytest
+
+from src.cloud.status_delta import StatusDeltaEncoder, apply_patch, diff
+
+
+def _status(temperature=4.0, errors=None, **extra):
+    status = {'running': True, 'temperature': temperature, 'door_status': 'closed',
+              'inventory': {'SKU1': {'quantity': 5}, 'a/b~c': {'quantity': 1}}, 'errors': list(errors or [])}
+    status.update(extra)
+    return status
+
+
+@pytest.mark.parametrize('target', [
+    _status(4.5),
+    _status(errors=['door sensor']),
+    _status(inventory=None),
+    {'running': False},
+    _status(**{'a/b~c': 1}),
+])
+def test_diff_round_trip(target):
+    base = _status(errors=[])
+    ops = diff(base, target)
+
+    assert apply_patch(base, ops) == target
+    # 基准文档不被修改
+    assert base == _status(errors=[])
+
+
+def test_appended_list_items_use_append_ops():
+    ops = diff(_status(errors=['a']), _status(errors=['a', 'b', 'c']))
+    assert ops == [{'op': 'add', 'path': '/errors/-', 'value': 'b'}, {'op': 'add', 'path': '/errors/-', 'value': 'c'}]
+
+
+def test_apply_patch_rejects_mismatched_base():
+    with pytest.raises(KeyError):
+        apply_patch({}, [{'op': 'replace', 'path': '/temperature', 'value': 1}])
+    with pytest.raises(ValueError):
+        apply_patch({}, [{'op': 'move', 'path': '/a'}])
+
+
+def test_encoder_sends_deltas_against_acknowledged_base():
+    encoder = StatusDeltaEncoder(keyframe_interval=3)
+    first = encoder.encode(_status(4.0))
+    assert first['encoding'] == 'full'
+
+    # 未确认时仍发送关键帧
+    assert encoder.encode(_status(4.1))['encoding'] == 'full'
+    encoder.acknowledge(2)
+
+    delta = encoder.encode(_status(4.2))
+    assert delta['encoding'] == 'json-patch'
+    assert delta['base_seq'] == 2
+    assert delta['ops'] == [{'op': 'replace', 'path': '/temperature', 'value': 4.2}]
+
+    # 被拒绝的上报不改变基准
+    encoder.reject(delta['status_seq'])
+    assert encoder.encode(_status(4.3))['base_seq'] == 2
+
+    # 达到关键帧间隔后发送完整状态
+    encoder.encode(_status(4.4))
+    assert encoder.encode(_status(4.5))['encoding'] == 'full'
+
+
+def test_stale_acknowledgement_is_ignored_and_resync_forces_keyframe():
+    encoder = StatusDeltaEncoder()
+    for temperature in (4.0, 4.1, 4.2):
+        encoder.encode(_status(temperature))
+    encoder.acknowledge(3)
+    encoder.acknowledge(2)
+    assert encoder.get_stats()['base_seq'] == 3
+    assert encoder.encode(_status(4.3))['encoding'] == 'json-patch'
+
+    encoder.request_resync()
+    assert encoder.encode(_status(4.4))['encoding'] == 'full'
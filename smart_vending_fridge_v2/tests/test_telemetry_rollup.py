@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+"""
+遥测汇总测试 - 按分钟和按小时的最小、最大、平均值与采样数，开门次数，环形槽位的桶轮转，上传水位线与文件恢复
+"""
+
+import pytest
+
+from src.cloud.telemetry_rollup import TelemetryRollup
+
+# 整小时的起始时间
+HOUR = 1_700_000_000 // 3600 * 3600
+
+
+def _status(temperature, door_open=False, power=None, voltage=None):
+    status = {'temperature': temperature, 'humidity': 50.0, 'door_status': 'open' if door_open else 'closed'}
+    if power is not None:
+        status['power_status'] = {'power_consumption': power, 'voltage': voltage, 'power_outage': False}
+    return status
+
+
+def test_minute_and_hour_aggregates():
+    rollup = TelemetryRollup()
+    for offset, temperature, door_open in [(0, 4.0, False), (10, 8.0, True), (20, 6.0, True),
+                                           (60, 3.0, False), (90, 5.0, True)]:
+        rollup.add(_status(temperature, door_open, power=100.0 + offset, voltage=220.0 + offset / 10),
+                   timestamp=HOUR + offset)
+
+    rollups, _ = rollup.collect(now=HOUR + 120)
+    first, second = rollups['minute']
+    assert (first['start'], first['resolution'], first['samples']) == (HOUR, 60, 3)
+    assert (first['temperature_min'], first['temperature_max']) == (4.0, 8.0)
+    assert first['temperature_mean'] == pytest.approx(6.0)
+    assert first['door_opens'] == 1
+    assert first['door_open_ratio'] == pytest.approx(2 / 3)
+    assert first['power_mean'] == pytest.approx(110.0)
+    assert (first['voltage_min'], first['voltage_max']) == (220.0, 222.0)
+
+    assert (second['start'], second['samples']) == (HOUR + 60, 2)
+    assert (second['temperature_min'], second['temperature_max']) == (3.0, 5.0)
+    assert second['door_opens'] == 1
+
+    hour, = rollups['hour']
+    assert (hour['start'], hour['resolution'], hour['samples']) == (HOUR, 3600, 5)
+    assert (hour['temperature_min'], hour['temperature_max']) == (3.0, 8.0)
+    assert hour['temperature_mean'] == pytest.approx(5.2)
+    assert hour['door_opens'] == 2
+    assert hour['humidity_mean'] == pytest.approx(50.0)
+
+
+def test_missing_metrics_are_omitted():
+    rollup = TelemetryRollup()
+    rollup.add({'door': {'is_open': True}}, timestamp=HOUR)
+    minute, = rollup.collect(now=HOUR)[0]['minute']
+    assert minute['samples'] == 1 and minute['door_opens'] == 1
+    assert not {'temperature_mean', 'humidity_mean', 'power_mean', 'voltage_min'} & set(minute)
+
+
+def test_bucket_rollover_reuses_slots():
+    rollup = TelemetryRollup(minute_slots=3, hour_slots=2)
+    memory = rollup.get_stats()['memory_bytes']
+    for minute in range(5):
+        rollup.add(_status(float(minute)), timestamp=HOUR + minute * 60 + 30)
+    # 第3、4分钟覆盖第0、1分钟的槽位
+    minutes = rollup.collect(now=HOUR + 300)[0]['minute']
+    assert [bucket['start'] for bucket in minutes] == [HOUR + 120, HOUR + 180, HOUR + 240]
+    assert [bucket['temperature_mean'] for bucket in minutes] == [2.0, 3.0, 4.0]
+    assert all(bucket['samples'] == 1 for bucket in minutes)
+
+    # 小时桶同样轮转：第2小时覆盖第0小时
+    rollup.add(_status(9.0), timestamp=HOUR + 2 * 3600)
+    hours = rollup.collect(now=HOUR + 2 * 3600)[0]['hour']
+    assert [(bucket['start'], bucket['samples']) for bucket in hours] == [(HOUR + 2 * 3600, 1)]
+    assert rollup.get_stats()['memory_bytes'] == memory
+
+
+def test_acknowledged_buckets_are_not_uploaded_again():
+    rollup = TelemetryRollup()
+    rollup.add(_status(4.0), timestamp=HOUR + 10)
+    rollup.add(_status(5.0), timestamp=HOUR + 70)
+    rollups, marker = rollup.collect(now=HOUR + 80)
+    assert len(rollups['minute']) == 2
+    rollup.acknowledge(marker)
+
+    # 未结束的当前桶在确认后仍会重新上传（服务器按起始时间覆盖）
+    rollup.add(_status(6.0), timestamp=HOUR + 90)
+    rollups, _ = rollup.collect(now=HOUR + 100)
+    current, = rollups['minute']
+    assert (current['start'], current['samples']) == (HOUR + 60, 2)
+    assert rollups['hour'][0]['samples'] == 3
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / 'rollup.bin')
+    rollup = TelemetryRollup(minute_slots=10, hour_slots=4)
+    rollup.add(_status(4.0, door_open=True), timestamp=HOUR + 10)
+    rollup.save(path)
+
+    restored = TelemetryRollup(minute_slots=10, hour_slots=4)
+    assert restored.load(path)
+    assert restored.collect(now=HOUR + 20) == rollup.collect(now=HOUR + 20)
+    # 门仍为打开状态，下一次采样不重复计数
+    restored.add(_status(4.0, door_open=True), timestamp=HOUR + 20)
+    assert restored.collect(now=HOUR + 20)[0]['minute'][0]['door_opens'] == 1
+
+    assert not TelemetryRollup(minute_slots=20, hour_slots=4).load(path)
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+"""
+流量整形测试 - 使用虚拟时钟验证令牌补充、等待带宽时按优先级放行，以及月流量上限对各类别的限制（交易不受限、告警延后缓存）
+"""
+
+import threading
+import time
+
+import pytest
+
+from src.cloud.cloud_manager import CloudManager
+from src.cloud.traffic_shaper import TrafficBudgetExceeded, TrafficShaper, classify_endpoint
+
+
+class FakeClock:
+    """可手动推进的虚拟时钟"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def test_tokens_refill_with_elapsed_time():
+    clock = FakeClock()
+    shaper = TrafficShaper(bytes_per_second=400, burst_bytes=200, clock=clock)
+    shaper.acquire('telemetry', 200, timeout=0)
+
+    with pytest.raises(TrafficBudgetExceeded):
+        shaper.acquire('telemetry', 1, timeout=0)
+
+    clock.advance(0.25)
+    shaper.acquire('telemetry', 100, timeout=0)
+    with pytest.raises(TrafficBudgetExceeded):
+        shaper.acquire('telemetry', 1, timeout=0)
+
+    # 令牌不超过桶容量
+    clock.advance(100)
+    shaper.acquire('telemetry', 200, timeout=0)
+    with pytest.raises(TrafficBudgetExceeded):
+        shaper.acquire('telemetry', 1, timeout=0)
+
+    stats = shaper.get_stats()['classes']['telemetry']
+    assert (stats['sent_bytes'], stats['requests'], stats['denied']) == (500, 3, 3)
+
+
+def test_large_transfer_passes_when_bucket_is_full():
+    clock = FakeClock()
+    shaper = TrafficShaper(bytes_per_second=100, burst_bytes=100, clock=clock)
+    shaper.acquire('ota', 1000, timeout=0)
+    assert shaper.tokens == -900
+    with pytest.raises(TrafficBudgetExceeded):
+        shaper.acquire('ota', 100, timeout=0)
+    clock.advance(10)
+    shaper.acquire('ota', 100, timeout=0)
+
+
+def _wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_higher_priority_class_gets_tokens_first():
+    clock = FakeClock()
+    shaper = TrafficShaper(bytes_per_second=100, burst_bytes=100, clock=clock)
+    shaper.acquire('ota', 100)
+    finished = []
+
+    def transfer(traffic_class):
+        shaper.acquire(traffic_class, 100)
+        finished.append(traffic_class)
+
+    threads = []
+    for traffic_class in ('ota', 'telemetry', 'payment'):
+        thread = threading.Thread(target=transfer, args=(traffic_class,), daemon=True)
+        thread.start()
+        threads.append(thread)
+        _wait_until(lambda: shaper.waiting[traffic_class] == 1)
+
+    # 每次补充一个请求所需的令牌，按优先级依次放行
+    for count in range(1, 4):
+        clock.advance(1.0)
+        with shaper.condition:
+            shaper.condition.notify_all()
+        _wait_until(lambda: len(finished) == count)
+
+    for thread in threads:
+        thread.join(5)
+    assert finished == ['payment', 'telemetry', 'ota']
+
+
+def test_monthly_cap_limits_each_class():
+    shaper = TrafficShaper(monthly_cap_bytes=1000)
+    shaper.acquire('payment', 850)
+
+    # OTA在80%、遥测在90%时停止，告警可用到100%
+    with pytest.raises(TrafficBudgetExceeded):
+        shaper.acquire('ota', 1)
+    with pytest.raises(TrafficBudgetExceeded):
+        shaper.acquire('telemetry', 100)
+    shaper.acquire('telemetry', 50)
+    shaper.acquire('alert', 100)
+    with pytest.raises(TrafficBudgetExceeded):
+        shaper.acquire('alert', 1)
+
+    # 交易不受上限限制
+    shaper.acquire('payment', 500)
+    stats = shaper.get_stats()
+    assert stats['month_total_bytes'] == 1500
+    assert {name: counters['denied'] for name, counters in stats['classes'].items()} == \
+        {'payment': 0, 'alert': 1, 'telemetry': 1, 'ota': 1}
+
+
+def test_usage_survives_restart_within_month(tmp_path):
+    usage_file = str(tmp_path / 'usage.json')
+    shaper = TrafficShaper(monthly_cap_bytes=1000, usage_file=usage_file)
+    shaper.acquire('alert', 990)
+    shaper.save()
+
+    restarted = TrafficShaper(monthly_cap_bytes=1000, usage_file=usage_file)
+    with pytest.raises(TrafficBudgetExceeded):
+        restarted.acquire('alert', 20)
+    restarted.acquire('payment', 20)
+
+
+def test_capped_alert_is_deferred_to_offline_cache(tmp_path):
+    manager = CloudManager({'data_dir': str(tmp_path), 'ota_update': {'enabled': False},
+                            'traffic_shaping': {'monthly_cap_bytes': 1000}}, device_id='SVF-TEST')
+    manager.traffic_shaper.acquire('payment', 1000)
+    manager.connected = True
+
+    assert classify_endpoint('/device/error') == 'alert'
+    assert not manager.report_error({'message': 'door sensor'})
+
+    # 请求未发出：记录留在离线缓存等待下个计费月或上限调整，熔断器不计失败
+    assert [record['message'] for record in manager.offline_store.peek('error', 10)] == ['door sensor']
+    assert manager.circuit_breaker.get_stats()['consecutive_failures'] == 0
+    assert manager.traffic_shaper.get_stats()['classes']['alert']['denied'] == 1
+    manager.cache_journal.close()